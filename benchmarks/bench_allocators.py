@@ -0,0 +1,165 @@
+"""
+Compares the placement allocators on latency and isolation quality, replaying the same seeded sequence of workload
+arrivals and departures against each of them.
+
+    python -m benchmarks.bench_allocators --output results.json
+    python -m benchmarks.bench_allocators --allocators LOCAL_SEARCH,IP --quick
+
+Every allocator starts from an empty CPU and sees the same requests.  Latency is measured per call.  Quality is measured
+on the final placement: the integer program objective, evaluated with the configured ALPHA_* weights, and the cross
+package and shared core violation counts.  Properties are read from the environment, as TITUS_ISOLATE_* variables.
+"""
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+
+import numpy as np
+
+from benchmarks.bench_processor import get_workload
+from titus_isolate.allocate.allocate_threads_request import AllocateThreadsRequest
+from titus_isolate.allocate.local_search import PlacementObjective, get_assignment
+from titus_isolate.config.config_manager import ConfigManager
+from titus_isolate.config.constants import GREEDY, IP, LOCAL_SEARCH, ALPHA_NU, DEFAULT_ALPHA_NU, ALPHA_LLC, \
+    DEFAULT_ALPHA_LLC, ALPHA_L12, DEFAULT_ALPHA_L12, ALPHA_ORDER, DEFAULT_ALPHA_ORDER
+from titus_isolate.config.env_property_provider import EnvPropertyProvider
+from titus_isolate.isolate.detect import get_cross_package_violation_count, get_shared_core_violation_count
+from titus_isolate.isolate.utils import get_allocator
+from titus_isolate.model.processor.config import get_cpu
+from titus_isolate.model.processor.utils import get_placement_vector
+from titus_isolate.utils import set_config_manager
+
+SCHEMA_VERSION = 1
+DEFAULT_SEED = 42
+DEFAULT_ALLOCATORS = [GREEDY, LOCAL_SEARCH, IP]
+
+TOPOLOGIES = [(2, 8, 2), (2, 24, 2), (4, 28, 2)]
+QUICK_TOPOLOGIES = TOPOLOGIES[:2]
+TARGET_LOAD = 0.8
+DEPARTURE_PROBABILITY = 0.2
+
+
+def get_events(topology, seed: int):
+    """
+    Returns a sequence of ('assign', workload) and ('free', workload) events which fills the CPU to about TARGET_LOAD,
+    with occasional departures on the way.
+    """
+    rng = random.Random(seed)
+    thread_count = topology[0] * topology[1] * topology[2]
+    max_workload_threads = max(1, thread_count // 8)
+
+    events = []
+    running = []
+    claimed = 0
+    while True:
+        if len(running) > 1 and rng.random() < DEPARTURE_PROBABILITY:
+            workload = running.pop(rng.randrange(len(running)))
+            claimed -= workload.get_thread_count()
+            events.append(('free', workload))
+            continue
+
+        workload = get_workload(rng, rng.randint(1, max_workload_threads))
+        if claimed + workload.get_thread_count() > thread_count * TARGET_LOAD:
+            return events
+        running.append(workload)
+        claimed += workload.get_thread_count()
+        events.append(('assign', workload))
+
+
+def get_objective_cost(cpu, workloads, config_manager) -> float:
+    thread_ids = cpu.get_workload_ids_to_thread_ids()
+    placement = [get_placement_vector(cpu, thread_ids.get(w.get_id(), [])) for w in workloads]
+    assignment = get_assignment(placement, len(cpu.get_threads()))
+    objective = PlacementObjective(
+        cpu,
+        [w.get_thread_count() for w in workloads],
+        None,
+        alpha_nu=config_manager.get_float(ALPHA_NU, DEFAULT_ALPHA_NU),
+        alpha_llc=config_manager.get_float(ALPHA_LLC, DEFAULT_ALPHA_LLC),
+        alpha_l12=config_manager.get_float(ALPHA_L12, DEFAULT_ALPHA_L12),
+        alpha_order=config_manager.get_float(ALPHA_ORDER, DEFAULT_ALPHA_ORDER),
+        alpha_prev=0)
+    return objective.get_cost(assignment)
+
+
+def replay(allocator, topology, events):
+    cpu = get_cpu(*topology)
+    workloads = {}
+    latencies = []
+    for kind, workload in events:
+        if kind == 'assign':
+            workloads[workload.get_id()] = workload
+
+        request = AllocateThreadsRequest(cpu, workload.get_id(), dict(workloads), {}, {}, {}, {}, {}, {})
+        start = time.perf_counter()
+        if kind == 'assign':
+            cpu = allocator.assign_threads(request).get_cpu()
+        else:
+            cpu = allocator.free_threads(request).get_cpu()
+            workloads.pop(workload.get_id())
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    return cpu, list(workloads.values()), latencies
+
+
+def run(seed: int, quick: bool, allocator_names):
+    config_manager = ConfigManager(EnvPropertyProvider())
+    set_config_manager(config_manager)
+
+    results = []
+    for topology in QUICK_TOPOLOGIES if quick else TOPOLOGIES:
+        events = get_events(topology, seed)
+        for name in allocator_names:
+            allocator = get_allocator(name, config_manager)
+            cpu, workloads, latencies = replay(allocator, topology, events)
+            results.append({
+                "allocator": name,
+                "topology": "{}x{}x{}".format(*topology),
+                "threads": topology[0] * topology[1] * topology[2],
+                "calls": len(latencies),
+                "median_ms": round(float(np.median(latencies)), 3),
+                "p99_ms": round(float(np.percentile(latencies, 99)), 3),
+                "max_ms": round(max(latencies), 3),
+                "objective": round(get_objective_cost(cpu, workloads, config_manager), 3),
+                "cross_package_violations": get_cross_package_violation_count(cpu),
+                "shared_core_violations": get_shared_core_violation_count(cpu)
+            })
+            r = results[-1]
+            print("{:<14} {:>8} {:>4} calls  median: {:9.2f}ms  p99: {:9.2f}ms  objective: {:10.3f}  "
+                  "cross package: {:3}  shared core: {:3}".format(
+                    name, r["topology"], r["calls"], r["median_ms"], r["p99_ms"], r["objective"],
+                    r["cross_package_violations"], r["shared_core_violations"]), file=sys.stderr)
+
+    return {
+        "schema": SCHEMA_VERSION,
+        "seed": seed,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare the placement allocators on latency and isolation.")
+    parser.add_argument("--output", help="write the JSON report to this path instead of stdout")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--allocators", default=",".join(DEFAULT_ALLOCATORS), help="comma separated allocator names")
+    parser.add_argument("--quick", action="store_true", help="skip the largest topology")
+    args = parser.parse_args(argv)
+
+    report = run(args.seed, args.quick, args.allocators.split(","))
+
+    if args.output is None:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,202 @@
+"""
+Times the hot paths of the processor model on production sized topologies, with fixed seeds.
+
+    python -m benchmarks.bench_processor --output results.json
+    python -m benchmarks.bench_processor --baseline results.json --threshold 1.25
+
+Results are written as JSON, to stdout unless --output is given, and a summary table goes to stderr.  With --baseline,
+every benchmark whose median is more than --threshold times slower than the baseline median is reported and the exit
+status is 1.
+"""
+import argparse
+import copy
+import json
+import platform
+import random
+import sys
+import timeit
+import uuid
+
+from titus_isolate.allocate.allocate_response import get_workload_allocations
+from titus_isolate.allocate.packed import encode_cpu, decode_cpu
+from titus_isolate.allocate.utils import parse_cpu
+from titus_isolate.event.constants import STATIC
+from titus_isolate.isolate.detect import get_cross_package_violations, get_shared_core_violations
+from titus_isolate.model.legacy_workload import LegacyWorkload
+from titus_isolate.model.processor.config import get_cpu
+from titus_isolate.model.processor.utils import visualize_cpu_comparison
+
+SCHEMA_VERSION = 1
+DEFAULT_SEED = 42
+
+TOPOLOGIES = [(1, 28, 2), (2, 24, 2), (2, 48, 2), (4, 28, 2)]
+WORKLOAD_COUNTS = [50, 500]
+MAX_WORKLOAD_THREADS = 4
+CLAIM_FREE_THREADS = 8
+
+REPEAT = 5
+QUICK_REPEAT = 2
+MIN_REPEAT_SECONDS = 0.05
+
+
+def get_workload(rng: random.Random, thread_count: int) -> LegacyWorkload:
+    return LegacyWorkload(
+        launch_time=1500000000,
+        identifier=str(uuid.UUID(int=rng.getrandbits(128))),
+        thread_count=thread_count,
+        mem=256,
+        disk=512,
+        network=1024,
+        app_name='bench_app',
+        owner_email='bench@example.com',
+        image='bench_image',
+        command='bench_cmd',
+        entrypoint='bench_entrypoint',
+        job_type='SERVICE',
+        workload_type=STATIC,
+        opportunistic_thread_count=0,
+        duration_predictions=[])
+
+
+def get_populated_cpu(topology, workload_count: int, seed: int):
+    """
+    Returns a CPU with the given number of workloads, each claiming 1 to MAX_WORKLOAD_THREADS random threads.  When
+    there are more workloads than threads, threads are shared, as they are for burst workloads.
+    """
+    rng = random.Random(seed)
+    cpu = get_cpu(*topology)
+    threads = cpu.get_threads()
+    workloads = []
+    for _ in range(workload_count):
+        workload = get_workload(rng, rng.randint(1, MAX_WORKLOAD_THREADS))
+        for t in rng.sample(threads, workload.get_thread_count()):
+            t.claim(workload.get_id())
+        workloads.append(workload)
+    return cpu, workloads
+
+
+def get_cases(topology, workload_count: int, seed: int):
+    cpu, workloads = get_populated_cpu(topology, workload_count, seed)
+    other_cpu, _ = get_populated_cpu(topology, workload_count, seed + 1)
+    cpu_dict = cpu.to_dict()
+    packed_cpu = encode_cpu(cpu)
+    claim_threads = random.Random(seed).sample(cpu.get_threads(), CLAIM_FREE_THREADS)
+    claim_workload_id = str(uuid.UUID(int=seed))
+
+    def claim_free():
+        for t in claim_threads:
+            t.claim(claim_workload_id)
+        cpu.free(claim_workload_id)
+
+    def detect():
+        get_cross_package_violations(cpu)
+        get_shared_core_violations(cpu)
+
+    return [
+        ("get_cpu", lambda: get_cpu(*topology)),
+        ("get_threads", cpu.get_threads),
+        ("claim_free", claim_free),
+        ("deepcopy", lambda: copy.deepcopy(cpu)),
+        ("fork", cpu.fork),
+        ("to_dict", cpu.to_dict),
+        ("parse_cpu", lambda: parse_cpu(cpu_dict)),
+        ("encode_cpu", lambda: encode_cpu(cpu)),
+        ("decode_cpu", lambda: decode_cpu(packed_cpu)),
+        ("get_workload_allocations", lambda: get_workload_allocations(cpu, workloads)),
+        ("detect_violations", detect),
+        ("visualize_cpu_comparison", lambda: visualize_cpu_comparison(cpu, other_cpu)),
+    ]
+
+
+def time_case(func, repeat: int):
+    timer = timeit.Timer(func)
+    number, elapsed = timer.autorange()
+    if elapsed < MIN_REPEAT_SECONDS:
+        number = max(number, int(number * MIN_REPEAT_SECONDS / max(elapsed, 1e-9)))
+    times = sorted(t / number * 1e6 for t in timer.repeat(repeat=repeat, number=number))
+    return number, times[0], times[len(times) // 2]
+
+
+def run(seed: int, quick: bool, name_filter: str = None):
+    topologies = TOPOLOGIES[:1] + TOPOLOGIES[-1:] if quick else TOPOLOGIES
+    repeat = QUICK_REPEAT if quick else REPEAT
+
+    results = []
+    for topology in topologies:
+        for workload_count in WORKLOAD_COUNTS:
+            for name, func in get_cases(topology, workload_count, seed):
+                if name_filter is not None and name_filter not in name:
+                    continue
+                number, min_us, median_us = time_case(func, repeat)
+                results.append({
+                    "name": name,
+                    "topology": "{}x{}x{}".format(*topology),
+                    "threads": topology[0] * topology[1] * topology[2],
+                    "workloads": workload_count,
+                    "number": number,
+                    "repeat": repeat,
+                    "min_us": round(min_us, 3),
+                    "median_us": round(median_us, 3)
+                })
+                print("{:<26} {:>8} {:>5} workloads  median: {:12.2f}us  min: {:12.2f}us".format(
+                    name, results[-1]["topology"], workload_count, median_us, min_us), file=sys.stderr)
+
+    return {
+        "schema": SCHEMA_VERSION,
+        "seed": seed,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results
+    }
+
+
+def get_regressions(report: dict, baseline: dict, threshold: float):
+    def key(r):
+        return r["name"], r["topology"], r["workloads"]
+
+    baseline_results = {key(r): r for r in baseline["results"]}
+    regressions = []
+    for result in report["results"]:
+        previous = baseline_results.get(key(result))
+        if previous is None or previous["median_us"] <= 0:
+            continue
+        ratio = result["median_us"] / previous["median_us"]
+        if ratio > threshold:
+            regressions.append(dict(result, baseline_median_us=previous["median_us"], ratio=round(ratio, 3)))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the processor model hot paths.")
+    parser.add_argument("--output", help="write the JSON report to this path instead of stdout")
+    parser.add_argument("--baseline", help="a previous JSON report to compare against")
+    parser.add_argument("--threshold", type=float, default=1.25, help="allowed slowdown ratio against the baseline")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--filter", help="only run benchmarks whose name contains this string")
+    parser.add_argument("--quick", action="store_true", help="smallest and largest topologies, fewer repeats")
+    args = parser.parse_args(argv)
+
+    report = run(args.seed, args.quick, args.filter)
+
+    exit_code = 0
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            report["regressions"] = get_regressions(report, json.load(f), args.threshold)
+        for r in report["regressions"]:
+            print("REGRESSION {} {} {} workloads: {:.2f}us -> {:.2f}us ({:.2f}x)".format(
+                r["name"], r["topology"], r["workloads"], r["baseline_median_us"], r["median_us"], r["ratio"]),
+                file=sys.stderr)
+        exit_code = 1 if len(report["regressions"]) > 0 else 0
+
+    if args.output is None:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    return exit_code
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,46 @@
+"""
+Compares the precomputed topology index against rebuilding the flattened thread/core lists on every call.
+
+    python -m benchmarks.bench_topology
+"""
+import timeit
+from functools import reduce
+
+from titus_isolate.model.processor.config import get_cpu
+
+TOPOLOGIES = [(2, 48, 2), (4, 28, 2)]
+ITERATIONS = 2000
+
+
+def rebuild_threads(cpu):
+    return reduce(list.__add__, [list(p.get_threads()) for p in cpu.get_packages()])
+
+
+def rebuild_cores(cpu):
+    return reduce(list.__add__, [list(p.get_cores()) for p in cpu.get_packages()])
+
+
+def rebuild_natural_indexing(cpu):
+    return {i: t.get_id() for i, t in enumerate(rebuild_threads(cpu))}
+
+
+def main():
+    for package_count, cores_per_package, threads_per_core in TOPOLOGIES:
+        cpu = get_cpu(package_count, cores_per_package, threads_per_core)
+        cases = [
+            ("get_threads", lambda: rebuild_threads(cpu), cpu.get_threads),
+            ("get_cores", lambda: rebuild_cores(cpu), cpu.get_cores),
+            ("natural_indexing", lambda: rebuild_natural_indexing(cpu), cpu.get_natural_indexing_2_original_indexing)
+        ]
+
+        print("{}x{}x{} ({} threads)".format(
+            package_count, cores_per_package, threads_per_core, len(cpu.get_threads())))
+        for name, rebuilt, indexed in cases:
+            rebuilt_us = timeit.timeit(rebuilt, number=ITERATIONS) / ITERATIONS * 1e6
+            indexed_us = timeit.timeit(indexed, number=ITERATIONS) / ITERATIONS * 1e6
+            print("  {:<18} rebuilt: {:8.2f}us  indexed: {:8.2f}us  speedup: {:6.1f}x".format(
+                name, rebuilt_us, indexed_us, rebuilt_us / indexed_us))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,9 @@
+import time
+
 from titus_isolate.allocate.allocate_request import AllocateRequest
 from titus_isolate.allocate.allocate_response import AllocateResponse
 from titus_isolate.allocate.allocate_threads_request import AllocateThreadsRequest
+from titus_isolate.allocate.cpu_allocate_exception import SolverOverloadedException
 from titus_isolate.allocate.cpu_allocator import CpuAllocator
 from titus_isolate.model.processor.cpu import Cpu
 
@@ -45,3 +48,60 @@ class CrashingAssignAllocator(CpuAllocator):
 
     def report_metrics(self, tags):
         pass
+
+
+class DelayedAllocator(CpuAllocator):
+
+    def __init__(self, allocator: CpuAllocator, delay_secs: float = 0):
+        self.__allocator = allocator
+        self.delay_secs = delay_secs
+
+    def assign_threads(self, request: AllocateThreadsRequest) -> AllocateResponse:
+        time.sleep(self.delay_secs)
+        return self.__allocator.assign_threads(request)
+
+    def free_threads(self, request: AllocateThreadsRequest) -> AllocateResponse:
+        time.sleep(self.delay_secs)
+        return self.__allocator.free_threads(request)
+
+    def rebalance(self, request: AllocateRequest) -> AllocateResponse:
+        time.sleep(self.delay_secs)
+        return self.__allocator.rebalance(request)
+
+    def get_name(self) -> str:
+        return self.__class__.__name__
+
+    def set_registry(self, registry, tags):
+        pass
+
+    def report_metrics(self, tags):
+        pass
+
+
+class OverloadedAllocator(CpuAllocator):
+
+    def __init__(self, retry_after_secs: float = 0):
+        self.retry_after_secs = retry_after_secs
+        self.call_count = 0
+
+    def assign_threads(self, request: AllocateThreadsRequest) -> AllocateResponse:
+        return self.__shed()
+
+    def free_threads(self, request: AllocateThreadsRequest) -> AllocateResponse:
+        return self.__shed()
+
+    def rebalance(self, request: AllocateRequest) -> AllocateResponse:
+        return self.__shed()
+
+    def __shed(self):
+        self.call_count += 1
+        raise SolverOverloadedException("overloaded", self.retry_after_secs)
+
+    def get_name(self) -> str:
+        return self.__class__.__name__
+
+    def set_registry(self, registry, tags):
+        pass
+
+    def report_metrics(self, tags):
+        pass
@@ -6,19 +6,23 @@ import unittest
 import uuid
 
 from kubernetes.client import V1Pod
+from spectator import Registry
 
 from tests.config.test_property_provider import TestPropertyProvider
 from tests.utils import config_logs, get_test_workload, get_threads_with_workload, get_no_usage_threads_request, \
-    get_no_usage_rebalance_request, TestCpuUsagePredictorManager, TestPredictor, TestCpuUsagePredictor
+    get_no_usage_rebalance_request, TestCpuUsagePredictorManager, TestPredictor, TestCpuUsagePredictor, \
+    gauge_value_equals, get_no_usage_threads_batch_request
 from titus_isolate import log
-from titus_isolate.allocate.forecast_ip_cpu_allocator import ForecastIPCpuAllocator
+from titus_isolate.allocate.forecast_ip_cpu_allocator import ForecastIPCpuAllocator, Incumbent
 from titus_isolate.allocate.greedy_cpu_allocator import GreedyCpuAllocator
 from titus_isolate.allocate.integer_program_cpu_allocator import IntegerProgramCpuAllocator
+from titus_isolate.allocate.local_search_cpu_allocator import LocalSearchCpuAllocator
 from titus_isolate.allocate.naive_cpu_allocator import NaiveCpuAllocator
 from titus_isolate.event.constants import BURST
 from titus_isolate.config.config_manager import ConfigManager
-from titus_isolate.config.constants import BURST_CORE_COLLOC_USAGE_THRESH
+from titus_isolate.config.constants import BURST_CORE_COLLOC_USAGE_THRESH, WARM_START_USAGE_TOLERANCE
 from titus_isolate.event.constants import STATIC
+from titus_isolate.metrics.constants import FORECAST_SOLVE_COUNT, FORECAST_WARM_START_COUNT
 from titus_isolate.model.processor.config import get_cpu
 from titus_isolate.model.processor.utils import DEFAULT_TOTAL_THREAD_COUNT
 from titus_isolate.model.workload_interface import Workload
@@ -52,7 +56,8 @@ forecast_ip_alloc_simple = ForecastIPCpuAllocator(
     ConfigManager(TestPropertyProvider({})),
     OversubscribeFreeThreadProvider(0.1))
 
-ALLOCATORS = [NaiveCpuAllocator(), IntegerProgramCpuAllocator(), GreedyCpuAllocator(), forecast_ip_alloc_simple]
+ALLOCATORS = [NaiveCpuAllocator(), IntegerProgramCpuAllocator(), GreedyCpuAllocator(), forecast_ip_alloc_simple,
+              LocalSearchCpuAllocator()]
 OVER_ALLOCATORS = [NaiveCpuAllocator(), forecast_ip_alloc_simple]
 
 set_workload_monitor_manager(TestWorkloadMonitorManager())
@@ -115,7 +120,7 @@ class TestCpu(unittest.TestCase):
         Workload 0: 2 threads --> (p:0 c:0 t:0) (p:0 c:1 t:0)
         Workload 1: 1 thread  --> (p:1 c:0 t:0)
         """
-        for allocator in [IntegerProgramCpuAllocator(), forecast_ip_alloc_simple]:
+        for allocator in [IntegerProgramCpuAllocator(), forecast_ip_alloc_simple, LocalSearchCpuAllocator()]:
             cpu = get_cpu()
             w0 = get_test_workload(uuid.uuid4(), 2, STATIC)
             w1 = get_test_workload(uuid.uuid4(), 1, STATIC)
@@ -189,7 +194,7 @@ class TestCpu(unittest.TestCase):
         | 1 | 1 | 1 | 1 |
         |   |   |   |   |
         """
-        for allocator in [IntegerProgramCpuAllocator(), forecast_ip_alloc_simple]:
+        for allocator in [IntegerProgramCpuAllocator(), forecast_ip_alloc_simple, LocalSearchCpuAllocator()]:
             cpu = get_cpu()
             w = get_test_workload(uuid.uuid4(), 10, STATIC)
 
@@ -349,7 +354,7 @@ class TestCpu(unittest.TestCase):
         (state=[2,2], req=[2,0])
         [cache hit]
         [cache hit]
-        (state=[2,2], req=[2,2]) but different layout
+        [cache hit] (state=[2,2], req=[2,2]) with a different layout, which is the same problem once canonicalized
         """
         cpu = get_cpu()
         allocator = IntegerProgramCpuAllocator()
@@ -385,7 +390,7 @@ class TestCpu(unittest.TestCase):
         workloads = [w_c, w_d]
         request = get_no_usage_threads_request(cpu, workloads)
         allocator.assign_threads(request).get_cpu()
-        self.assertEqual(5, len(allocator._IntegerProgramCpuAllocator__cache))
+        self.assertEqual(4, len(allocator._IntegerProgramCpuAllocator__cache))
 
     def test_balance_forecast_ip(self):
         allocator = forecast_ip_alloc_simple
@@ -574,3 +579,98 @@ class TestCpu(unittest.TestCase):
             if len(c.get_empty_threads()) == 0:
                 self.assertEqual(c.get_threads()[0].get_workload_ids(), c.get_threads()[1].get_workload_ids())
                 self.assertEqual([w1.get_id()], c.get_threads()[1].get_workload_ids())
+
+    def test_forecast_warm_start(self):
+        allocator = ForecastIPCpuAllocator(
+            TestCpuUsagePredictorManager(),
+            ConfigManager(TestPropertyProvider({})),
+            OversubscribeFreeThreadProvider(0.1))
+        registry = Registry()
+        allocator.set_registry(registry, {})
+
+        workloads = [
+            get_test_workload("a", 4, STATIC),
+            get_test_workload("b", 2, STATIC),
+            get_test_workload("c", 2, BURST)]
+        cpu = get_cpu()
+        for i in range(len(workloads)):
+            cpu = allocator.assign_threads(get_no_usage_threads_request(cpu, workloads[:i + 1])).get_cpu()
+
+        # Nothing changed since the last solve, so its solution is reused
+        for _ in range(2):
+            response = allocator.rebalance(get_no_usage_rebalance_request(cpu, workloads))
+            self.assertEqual(1, response.get_metadata()['ip_warm_start'])
+            self.assertEqual(cpu, response.get_cpu())
+
+        # A moved workload invalidates the incumbent
+        moved = cpu.fork()
+        moved.free("a")
+        for t in moved.get_empty_threads()[:4]:
+            t.claim("a")
+        response = allocator.rebalance(get_no_usage_rebalance_request(moved, workloads))
+        self.assertEqual(0, response.get_metadata()['ip_warm_start'])
+
+        allocator.report_metrics({})
+        self.assertTrue(gauge_value_equals(registry, FORECAST_SOLVE_COUNT, 4))
+        self.assertTrue(gauge_value_equals(registry, FORECAST_WARM_START_COUNT, 2))
+
+    def test_incumbent_usage_tolerance(self):
+        cpu = get_cpu(1, 2, 2)
+        cpu.get_threads()[0].claim("a")
+        cpu.get_threads()[1].claim("b")
+        incumbent = Incumbent(["a", "b"], [1, 1], [1.0, 0.5], [[1, 0, 0, 0], [0, 1, 0, 0]])
+        incumbent.set_result(cpu)
+        current = [[1, 0, 0, 0], [0, 1, 0, 0]]
+
+        self.assertTrue(incumbent.is_current(["a", "b"], [1, 1], [1.05, 0.5], current, 0.1))
+        self.assertFalse(incumbent.is_current(["a", "b"], [1, 1], [1.0, 0.6], current, 0.1))
+        self.assertFalse(incumbent.is_current(["a", "b"], [1, 1], None, current, 0.1))
+        self.assertFalse(incumbent.is_current(["a", "b"], [1, 2], [1.0, 0.5], current, 0.1))
+        self.assertFalse(incumbent.is_current(["b", "a"], [1, 1], [1.0, 0.5], current, 0.1))
+        self.assertFalse(incumbent.is_current(["a", "b"], [1, 1], [1.0, 0.5], [[0, 0, 1, 0], [0, 1, 0, 0]], 0.1))
+        self.assertFalse(incumbent.is_current(["a", "b"], [1, 1], [1.0, 0.5], current, -1))
+
+    def test_forecast_warm_start_disabled(self):
+        allocator = ForecastIPCpuAllocator(
+            TestCpuUsagePredictorManager(),
+            ConfigManager(TestPropertyProvider({WARM_START_USAGE_TOLERANCE: -1})),
+            OversubscribeFreeThreadProvider(0.1))
+
+        w = get_test_workload("a", 4, STATIC)
+        cpu = allocator.assign_threads(get_no_usage_threads_request(get_cpu(), [w])).get_cpu()
+        response = allocator.rebalance(get_no_usage_rebalance_request(cpu, [w]))
+        self.assertEqual(0, response.get_metadata()['ip_warm_start'])
+
+    def test_assign_threads_batch(self):
+        for allocator in ALLOCATORS:
+            running = get_test_workload(str(uuid.uuid4()), 4, STATIC)
+            cpu = allocator.assign_threads(get_no_usage_threads_request(get_cpu(), [running])).get_cpu()
+
+            new_workloads = [get_test_workload(str(uuid.uuid4()), c, STATIC) for c in [2, 3, 5]]
+            request = get_no_usage_threads_batch_request(cpu, [running], new_workloads)
+            cpu = allocator.assign_threads_batch(request).get_cpu()
+
+            log.info(cpu)
+            self.assertEqual(14, len(cpu.get_claimed_threads()))
+            for w in [running] + new_workloads:
+                self.assertEqual(w.get_thread_count(), len(get_threads_with_workload(cpu, w.get_id())))
+
+    def test_assign_threads_batch_with_burst(self):
+        for allocator in [IntegerProgramCpuAllocator(), GreedyCpuAllocator()]:
+            w_static = get_test_workload(str(uuid.uuid4()), 4, STATIC)
+            w_burst = get_test_workload(str(uuid.uuid4()), 2, BURST)
+            request = get_no_usage_threads_batch_request(get_cpu(), [], [w_burst, w_static])
+            cpu = allocator.assign_threads_batch(request).get_cpu()
+
+            self.assertEqual(4, len(get_threads_with_workload(cpu, w_static.get_id())))
+            self.assertEqual(DEFAULT_TOTAL_THREAD_COUNT - 4, len(get_threads_with_workload(cpu, w_burst.get_id())))
+
+    def test_assign_threads_batch_ip_single_solve(self):
+        allocator = IntegerProgramCpuAllocator()
+        new_workloads = [get_test_workload(str(uuid.uuid4()), c, STATIC) for c in [2, 4, 6]]
+        request = get_no_usage_threads_batch_request(get_cpu(), [], new_workloads)
+        cpu = allocator.assign_threads_batch(request).get_cpu()
+
+        self.assertEqual(12, len(cpu.get_claimed_threads()))
+        self.assertEqual(1, allocator.get_solution_cache().get_miss_count())
+        self.assertEqual(0, len(cpu.get_cross_package_violations()))
@@ -0,0 +1,147 @@
+import logging
+import unittest
+
+from spectator import Registry
+
+from tests.allocate.crashing_allocators import CrashingAllocator
+from tests.allocate.test_allocate import TestWorkloadMonitorManager
+from tests.cgroup.mock_cgroup_manager import MockCgroupManager
+from tests.config.test_property_provider import TestPropertyProvider
+from tests.utils import config_logs, get_test_workload, get_no_usage_threads_request, gauge_value_equals
+from titus_isolate.allocate.allocate_request import AllocateRequest
+from titus_isolate.allocate.allocate_response import AllocateResponse, get_workload_allocations
+from titus_isolate.allocate.allocate_threads_request import AllocateThreadsRequest
+from titus_isolate.allocate.anytime_cpu_allocator import AnytimeCpuAllocator
+from titus_isolate.allocate.cpu_allocator import CpuAllocator
+from titus_isolate.allocate.fall_back_cpu_allocator import FallbackCpuAllocator
+from titus_isolate.allocate.greedy_cpu_allocator import GreedyCpuAllocator
+from titus_isolate.allocate.integer_program_cpu_allocator import IntegerProgramCpuAllocator
+from titus_isolate.config.config_manager import ConfigManager
+from titus_isolate.config.constants import CPU_ALLOCATOR, ANYTIME, ANYTIME_BACKGROUND_ALLOCATOR, GREEDY
+from titus_isolate.event.constants import STATIC
+from titus_isolate.isolate.detect import get_cross_package_violation_count
+from titus_isolate.isolate.utils import get_allocator
+from titus_isolate.isolate.workload_manager import WorkloadManager
+from titus_isolate.metrics.constants import ANYTIME_IMPROVED_COUNT, ANYTIME_DISCARDED_COUNT, \
+    ANYTIME_REJECTED_COUNT, ANYTIME_SUPERSEDED_COUNT
+from titus_isolate.model.processor.config import get_cpu
+from titus_isolate.utils import set_config_manager, set_workload_monitor_manager
+
+config_logs(logging.DEBUG)
+set_config_manager(ConfigManager(TestPropertyProvider({})))
+set_workload_monitor_manager(TestWorkloadMonitorManager())
+
+
+class ScatteringAllocator(CpuAllocator):
+    """
+    Claims one thread per package in turn, so every multi-threaded workload crosses packages.
+    """
+
+    def assign_threads(self, request: AllocateThreadsRequest) -> AllocateResponse:
+        cpu = request.get_cpu()
+        workload = request.get_workloads()[request.get_workload_id()]
+        remaining = workload.get_thread_count()
+        while remaining > 0:
+            for p in cpu.get_packages():
+                if remaining > 0 and len(p.get_empty_threads()) > 0:
+                    p.get_empty_threads()[0].claim(workload.get_id())
+                    remaining -= 1
+        return AllocateResponse(cpu, get_workload_allocations(cpu, request.get_workloads().values()), self.get_name())
+
+    def free_threads(self, request: AllocateThreadsRequest) -> AllocateResponse:
+        cpu = request.get_cpu()
+        cpu.free(request.get_workload_id())
+        return AllocateResponse(cpu, get_workload_allocations(cpu, request.get_workloads().values()), self.get_name())
+
+    def rebalance(self, request: AllocateRequest) -> AllocateResponse:
+        cpu = request.get_cpu()
+        return AllocateResponse(cpu, get_workload_allocations(cpu, request.get_workloads().values()), self.get_name())
+
+    def get_name(self) -> str:
+        return self.__class__.__name__
+
+    def set_registry(self, registry, tags):
+        pass
+
+    def report_metrics(self, tags):
+        pass
+
+
+class TestAnytimeCpuAllocator(unittest.TestCase):
+
+    def test_without_listener_is_fast_allocator(self):
+        allocator = AnytimeCpuAllocator(ScatteringAllocator(), CrashingAllocator())
+        w = get_test_workload("a", 4, STATIC)
+
+        cpu = allocator.assign_threads(get_no_usage_threads_request(get_cpu(), [w])).get_cpu()
+        self.assertTrue(allocator.wait(timeout=0))
+        self.assertEqual(1, get_cross_package_violation_count(cpu))
+
+    def test_applies_improvement(self):
+        allocator = AnytimeCpuAllocator(ScatteringAllocator(), IntegerProgramCpuAllocator())
+        registry = Registry()
+        allocator.set_registry(registry, {})
+        workload_manager = WorkloadManager(get_cpu(), MockCgroupManager(), allocator)
+
+        w = get_test_workload("a", 4, STATIC)
+        workload_manager.add_workload(w)
+        self.assertTrue(allocator.wait(timeout=30))
+
+        cpu = workload_manager.get_cpu()
+        self.assertEqual(4, len(cpu.get_workload_thread_ids(w.get_id())))
+        self.assertEqual(0, get_cross_package_violation_count(cpu))
+
+        allocator.report_metrics({})
+        self.assertTrue(gauge_value_equals(registry, ANYTIME_IMPROVED_COUNT, 1))
+
+    def test_discards_worse_placement(self):
+        allocator = AnytimeCpuAllocator(GreedyCpuAllocator(), ScatteringAllocator())
+        registry = Registry()
+        allocator.set_registry(registry, {})
+        fallback_allocator = FallbackCpuAllocator(allocator, GreedyCpuAllocator())
+        workload_manager = WorkloadManager(get_cpu(), MockCgroupManager(), fallback_allocator)
+
+        w = get_test_workload("a", 4, STATIC)
+        workload_manager.add_workload(w)
+        self.assertTrue(allocator.wait(timeout=30))
+        self.assertEqual(0, get_cross_package_violation_count(workload_manager.get_cpu()))
+
+        allocator.report_metrics({})
+        self.assertTrue(gauge_value_equals(registry, ANYTIME_DISCARDED_COUNT, 1))
+
+    def test_counts_rejected_improvements(self):
+        allocator = AnytimeCpuAllocator(ScatteringAllocator(), IntegerProgramCpuAllocator())
+        registry = Registry()
+        allocator.set_registry(registry, {})
+        allocator.set_improvement_listener(lambda fast_cpu, response, workloads: False)
+
+        w = get_test_workload("a", 4, STATIC)
+        allocator.assign_threads(get_no_usage_threads_request(get_cpu(), [w]))
+        self.assertTrue(allocator.wait(timeout=30))
+
+        allocator.report_metrics({})
+        self.assertTrue(gauge_value_equals(registry, ANYTIME_REJECTED_COUNT, 1))
+        self.assertTrue(gauge_value_equals(registry, ANYTIME_SUPERSEDED_COUNT, 0))
+        self.assertTrue(gauge_value_equals(registry, ANYTIME_IMPROVED_COUNT, 0))
+
+    def test_stale_improvement_is_not_applied(self):
+        allocator = AnytimeCpuAllocator(ScatteringAllocator(), IntegerProgramCpuAllocator())
+        workload_manager = WorkloadManager(get_cpu(), MockCgroupManager(), allocator)
+        w_a = get_test_workload("a", 4, STATIC)
+        w_b = get_test_workload("b", 2, STATIC)
+        workload_manager.add_workload(w_a)
+        self.assertTrue(allocator.wait(timeout=30))
+
+        fast_cpu = workload_manager.get_cpu()
+        request = get_no_usage_threads_request(fast_cpu, [w_a, w_b])
+        improved = IntegerProgramCpuAllocator().assign_threads(request)
+        self.assertFalse(
+            workload_manager._WorkloadManager__apply_improvement(fast_cpu, improved, request.get_workloads()))
+        self.assertEqual(fast_cpu, workload_manager.get_cpu())
+
+    def test_get_allocator(self):
+        config_manager = ConfigManager(TestPropertyProvider({
+            CPU_ALLOCATOR: ANYTIME,
+            ANYTIME_BACKGROUND_ALLOCATOR: GREEDY}))
+        allocator = get_allocator(ANYTIME, config_manager)
+        self.assertEqual("AnytimeCpuAllocator(GreedyCpuAllocator,GreedyCpuAllocator)", allocator.get_name())
@@ -0,0 +1,83 @@
+import logging
+import random
+import unittest
+import uuid
+
+from tests.utils import config_logs, get_test_workload, get_no_usage_threads_request
+from titus_isolate.allocate.canonical import get_canonical_placement
+from titus_isolate.allocate.integer_program_cpu_allocator import IntegerProgramCpuAllocator
+from titus_isolate.allocate.solution_cache import SolutionCache
+from titus_isolate.event.constants import STATIC
+from titus_isolate.model.processor.config import get_cpu
+from titus_isolate.model.processor.utils import get_placement_vector
+
+config_logs(logging.DEBUG)
+
+
+def get_relabeled_placement(placement, package_count, cores_per_package, threads_per_core, rng):
+    """
+    Applies a random permutation of packages, of the cores of each package and of the threads of each core.
+    """
+    packages = []
+    for p in rng.sample(range(package_count), package_count):
+        cores = []
+        for c in rng.sample(range(cores_per_package), cores_per_package):
+            first = (p * cores_per_package + c) * threads_per_core
+            cores.append([first + t for t in rng.sample(range(threads_per_core), threads_per_core)])
+        packages.append(cores)
+    permutation = [i for cores in packages for threads in cores for i in threads]
+    return [[v[i] for i in permutation] for v in placement]
+
+
+class TestCanonical(unittest.TestCase):
+
+    def test_relabeled_placements_share_a_canonical_form(self):
+        rng = random.Random(5)
+        cpu = get_cpu(2, 4, 2)
+        for _ in range(20):
+            placement = [[0] * 16 for _ in range(3)]
+            for t in rng.sample(range(16), 9):
+                placement[rng.randrange(3)][t] = 1
+
+            canonical = get_canonical_placement(cpu, placement).to_canonical(placement)
+            for _ in range(5):
+                relabeled = get_relabeled_placement(placement, 2, 4, 2, rng)
+                self.assertEqual(canonical, get_canonical_placement(cpu, relabeled).to_canonical(relabeled))
+
+    def test_round_trip(self):
+        cpu = get_cpu(2, 4, 2)
+        placement = [[0, 0, 0, 0, 0, 0, 0, 0, 0, 1, 0, 0, 0, 0, 1, 1], [0, 0, 1, 0, 0, 0, 0, 0, 1, 0, 0, 0, 0, 0, 0, 0]]
+        canonical = get_canonical_placement(cpu, placement)
+
+        self.assertFalse(canonical.is_identity())
+        self.assertEqual(placement, canonical.from_canonical(canonical.to_canonical(placement)))
+        self.assertEqual([1, 1, 1, 0] + [0] * 12, canonical.to_canonical(placement)[0])
+        self.assertIsNone(canonical.to_canonical(None))
+
+    def test_identity(self):
+        cpu = get_cpu(2, 4, 2)
+        self.assertTrue(get_canonical_placement(cpu, None).is_identity())
+        self.assertTrue(get_canonical_placement(cpu, [[0] * 16]).is_identity())
+        self.assertTrue(get_canonical_placement(cpu, [[1, 1] + [0] * 14, [0, 0, 1] + [0] * 13]).is_identity())
+
+    def test_allocator_shares_solutions_across_relabelings(self):
+        cache = SolutionCache(10, 1024 * 1024)
+        allocator = IntegerProgramCpuAllocator(solution_cache=cache)
+        w_a = get_test_workload(str(uuid.uuid4()), 2, STATIC)
+        w_b = get_test_workload(str(uuid.uuid4()), 4, STATIC)
+
+        # The same state, with w_a on the first core of either package
+        for thread_ids in [[0, 8], [4, 12]]:
+            cpu = get_cpu()
+            for t_id in thread_ids:
+                cpu.get_thread(t_id).claim(w_a.get_id())
+
+            cpu = allocator.assign_threads(get_no_usage_threads_request(cpu, [w_a, w_b])).get_cpu()
+            self.assertEqual(thread_ids, sorted(cpu.get_workload_thread_ids(w_a.get_id())))
+            self.assertEqual(4, len(cpu.get_workload_thread_ids(w_b.get_id())))
+            b_vector = get_placement_vector(cpu, cpu.get_workload_thread_ids(w_b.get_id()))
+            a_vector = get_placement_vector(cpu, cpu.get_workload_thread_ids(w_a.get_id()))
+            self.assertEqual(0, sum(a * b for a, b in zip(a_vector, b_vector)))
+
+        self.assertEqual(1, cache.get_miss_count())
+        self.assertEqual(1, cache.get_hit_count())
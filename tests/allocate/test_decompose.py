@@ -0,0 +1,110 @@
+import logging
+import unittest
+import uuid
+
+from spectator import Registry
+
+from tests.config.test_property_provider import TestPropertyProvider
+from tests.utils import config_logs, get_test_workload, get_no_usage_threads_request, gauge_value_equals
+from titus_isolate.allocate.decompose import get_package_problems, merge_package_solutions
+from titus_isolate.allocate.integer_program_cpu_allocator import IntegerProgramCpuAllocator
+from titus_isolate.config.config_manager import ConfigManager
+from titus_isolate.config.constants import IP_PACKAGE_DECOMPOSITION, IP_DECOMPOSITION_WORKERS
+from titus_isolate.event.constants import STATIC
+from titus_isolate.isolate.detect import get_cross_package_violation_count
+from titus_isolate.metrics.constants import IP_ALLOCATOR_DECOMPOSED_COUNT
+from titus_isolate.model.processor.config import get_cpu
+from titus_isolate.utils import set_config_manager
+
+config_logs(logging.DEBUG)
+set_config_manager(ConfigManager(TestPropertyProvider({})))
+
+
+def get_vector(thread_indices, thread_count=16):
+    return [1 if i in thread_indices else 0 for i in range(thread_count)]
+
+
+class TestDecompose(unittest.TestCase):
+
+    def test_new_workloads_are_packed_largest_first(self):
+        cpu = get_cpu(2, 4, 2)
+        problems = get_package_problems(cpu, [get_vector([0, 1])], [2, 4, 6])
+
+        self.assertEqual(2, len(problems))
+        self.assertEqual([0, 1], problems[0].get_workload_indices())
+        self.assertEqual([2, 4], problems[0].get_requested_units())
+        self.assertEqual([[1, 1, 0, 0, 0, 0, 0, 0], [0] * 8], problems[0].get_current_placement())
+        self.assertEqual([2], problems[1].get_workload_indices())
+        self.assertEqual(list(range(8, 16)), problems[1].get_thread_indices())
+        self.assertIsNone(problems[1].get_current_placement())
+
+    def test_does_not_decompose(self):
+        # A single package
+        self.assertIsNone(get_package_problems(get_cpu(1, 8, 2), None, [2]))
+        # A workload larger than a package
+        self.assertIsNone(get_package_problems(get_cpu(2, 4, 2), None, [10]))
+        # A workload placed across packages
+        self.assertIsNone(get_package_problems(get_cpu(2, 4, 2), [get_vector([0, 8])], [2, 2]))
+        # Workloads which only fit by spanning packages
+        self.assertIsNone(get_package_problems(get_cpu(2, 4, 2), None, [6, 6, 4]))
+
+    def test_merge(self):
+        cpu = get_cpu(2, 4, 2)
+        problems = get_package_problems(cpu, None, [4, 2, 2])
+        placements = []
+        for problem in problems:
+            placement, first = [], 0
+            for u in problem.get_requested_units():
+                placement.append([1 if first <= i < first + u else 0 for i in range(8)])
+                first += u
+            placements.append(placement)
+
+        merged = merge_package_solutions(16, 3, problems, placements)
+        self.assertEqual([get_vector([0, 1, 2, 3]), get_vector([8, 9]), get_vector([10, 11])], merged)
+
+    def test_allocator_decomposes_in_parallel(self):
+        set_config_manager(ConfigManager(TestPropertyProvider({IP_DECOMPOSITION_WORKERS: 2})))
+        try:
+            allocator = IntegerProgramCpuAllocator(decompose_packages=True)
+        finally:
+            set_config_manager(ConfigManager(TestPropertyProvider({})))
+        registry = Registry()
+        allocator.set_registry(registry, {})
+
+        cpu = get_cpu(4, 4, 2)
+        workloads = []
+        for thread_count in [6, 4, 4, 8, 2]:
+            workloads.append(get_test_workload(str(uuid.uuid4()), thread_count, STATIC))
+            cpu = allocator.assign_threads(get_no_usage_threads_request(cpu, workloads)).get_cpu()
+
+        for w in workloads:
+            self.assertEqual(w.get_thread_count(), len(cpu.get_workload_thread_ids(w.get_id())))
+        self.assertEqual(0, get_cross_package_violation_count(cpu))
+
+        request = get_no_usage_threads_request(cpu, workloads[1:] + workloads[:1])
+        cpu = allocator.free_threads(request).get_cpu()
+        self.assertEqual(0, len(cpu.get_workload_thread_ids(workloads[0].get_id())))
+        self.assertEqual(18, len(cpu.get_claimed_threads()))
+
+        allocator.report_metrics({})
+        self.assertTrue(gauge_value_equals(registry, IP_ALLOCATOR_DECOMPOSED_COUNT, 6))
+
+        # Closing shuts the workers down, later solves start new ones
+        allocator.close()
+        w = get_test_workload(str(uuid.uuid4()), 6, STATIC)
+        cpu = allocator.assign_threads(get_no_usage_threads_request(cpu, workloads[1:] + [w])).get_cpu()
+        self.assertEqual(6, len(cpu.get_workload_thread_ids(w.get_id())))
+        self.assertEqual(7, allocator.get_decomposed_call_count())
+        allocator.close()
+
+    def test_allocator_falls_back_to_global_solve(self):
+        set_config_manager(ConfigManager(TestPropertyProvider({IP_PACKAGE_DECOMPOSITION: True})))
+        try:
+            allocator = IntegerProgramCpuAllocator()
+        finally:
+            set_config_manager(ConfigManager(TestPropertyProvider({})))
+
+        w = get_test_workload(str(uuid.uuid4()), 12, STATIC)
+        cpu = allocator.assign_threads(get_no_usage_threads_request(get_cpu(), [w])).get_cpu()
+        self.assertEqual(12, len(cpu.get_workload_thread_ids(w.get_id())))
+        self.assertEqual(0, allocator.get_decomposed_call_count())
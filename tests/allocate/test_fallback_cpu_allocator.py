@@ -1,12 +1,19 @@
+import time
 import unittest
 
-from tests.allocate.crashing_allocators import CrashingAllocator
-from tests.utils import get_test_workload, DEFAULT_TEST_REQUEST_METADATA, get_no_usage_threads_request
+from spectator import Registry
+
+from tests.allocate.crashing_allocators import CrashingAllocator, DelayedAllocator, OverloadedAllocator
+from tests.utils import get_test_workload, DEFAULT_TEST_REQUEST_METADATA, get_no_usage_threads_request, \
+    counter_value_equals
 from titus_isolate.allocate.allocate_threads_request import AllocateThreadsRequest
-from titus_isolate.allocate.fall_back_cpu_allocator import FallbackCpuAllocator
+from titus_isolate.allocate.fall_back_cpu_allocator import FallbackCpuAllocator, HEDGE_MIN_SAMPLES, HEDGE_WORKERS, \
+    PRIMARY, SECONDARY
 from titus_isolate.allocate.greedy_cpu_allocator import GreedyCpuAllocator
 from titus_isolate.allocate.integer_program_cpu_allocator import IntegerProgramCpuAllocator
 from titus_isolate.event.constants import STATIC
+from titus_isolate.metrics.constants import PRIMARY_WIN_COUNT, FALLBACK_WIN_COUNT, HEDGED_COUNT, PRIMARY_ASSIGN_COUNT, \
+    FALLBACK_ASSIGN_COUNT, PRIMARY_OVERLOADED_COUNT, PRIMARY_SKIPPED_COUNT
 from titus_isolate.model.processor.config import get_cpu
 
 
@@ -53,3 +60,108 @@ class TestFallbackCpuAllocator(unittest.TestCase):
 
         with self.assertRaises(ValueError):
             FallbackCpuAllocator(None, None)
+
+    def test_hedge_slow_primary(self):
+        primary = DelayedAllocator(GreedyCpuAllocator())
+        allocator = FallbackCpuAllocator(primary, GreedyCpuAllocator(), hedge_percentile=90)
+        w = get_test_workload("a", 2, STATIC)
+
+        # Learn the primary's usual latency
+        for _ in range(HEDGE_MIN_SAMPLES):
+            cpu = allocator.assign_threads(get_no_usage_threads_request(get_cpu(), [w])).get_cpu()
+            self.assertEqual(2, len(cpu.get_claimed_threads()))
+        self.assertEqual(0, allocator.get_hedged_count())
+
+        primary.delay_secs = 1
+        cpu = allocator.assign_threads(get_no_usage_threads_request(get_cpu(), [w])).get_cpu()
+        self.assertEqual(2, len(cpu.get_claimed_threads()))
+        self.assertEqual(1, allocator.get_hedged_count())
+        self.assertEqual(1, allocator.get_fallback_allocator_calls_count())
+        self.assertEqual({PRIMARY: HEDGE_MIN_SAMPLES, SECONDARY: 1}, allocator.get_win_counts())
+
+    def test_primaries_in_flight_are_capped(self):
+        primary = DelayedAllocator(GreedyCpuAllocator())
+        allocator = FallbackCpuAllocator(primary, GreedyCpuAllocator(), hedge_percentile=90)
+        w = get_test_workload("a", 2, STATIC)
+        for _ in range(HEDGE_MIN_SAMPLES):
+            allocator.assign_threads(get_no_usage_threads_request(get_cpu(), [w]))
+
+        # Primaries which lost the race hold their worker threads, once all are held the primary is skipped
+        primary.delay_secs = 1
+        for _ in range(HEDGE_WORKERS + 1):
+            cpu = allocator.assign_threads(get_no_usage_threads_request(get_cpu(), [w])).get_cpu()
+            self.assertEqual(2, len(cpu.get_claimed_threads()))
+        self.assertEqual(HEDGE_WORKERS, allocator.get_hedged_count())
+        self.assertEqual(1, allocator.get_skipped_count())
+        self.assertEqual(HEDGE_WORKERS, allocator.get_primaries_in_flight())
+        self.assertEqual({PRIMARY: HEDGE_MIN_SAMPLES, SECONDARY: HEDGE_WORKERS + 1}, allocator.get_win_counts())
+
+        deadline = time.time() + 5
+        while allocator.get_primaries_in_flight() > 0 and time.time() < deadline:
+            time.sleep(0.05)
+        self.assertEqual(0, allocator.get_primaries_in_flight())
+
+    def test_hedge_failing_primary(self):
+        allocator = FallbackCpuAllocator(CrashingAllocator(), GreedyCpuAllocator(), hedge_percentile=90)
+        w = get_test_workload("a", 2, STATIC)
+
+        cpu = allocator.assign_threads(get_no_usage_threads_request(get_cpu(), [w])).get_cpu()
+        self.assertEqual(2, len(cpu.get_claimed_threads()))
+        self.assertEqual(0, allocator.get_hedged_count())
+        self.assertEqual({PRIMARY: 0, SECONDARY: 1}, allocator.get_win_counts())
+
+    def test_both_allocators_fail(self):
+        w = get_test_workload("a", 2, STATIC)
+        for hedge_percentile in [0, 90]:
+            allocator = FallbackCpuAllocator(CrashingAllocator(), CrashingAllocator(), hedge_percentile)
+            with self.assertRaises(Exception):
+                allocator.assign_threads(get_no_usage_threads_request(get_cpu(), [w]))
+
+    def test_report_win_metrics(self):
+        registry = Registry()
+        allocator = FallbackCpuAllocator(CrashingAllocator(), GreedyCpuAllocator())
+        allocator.set_registry(registry, {})
+        w = get_test_workload("a", 2, STATIC)
+
+        allocator.assign_threads(get_no_usage_threads_request(get_cpu(), [w]))
+        allocator.report_metrics({})
+
+        self.assertTrue(counter_value_equals(registry, PRIMARY_ASSIGN_COUNT, 1))
+        self.assertTrue(counter_value_equals(registry, FALLBACK_ASSIGN_COUNT, 1))
+        self.assertTrue(counter_value_equals(registry, PRIMARY_WIN_COUNT, 0))
+        self.assertTrue(counter_value_equals(registry, FALLBACK_WIN_COUNT, 1))
+        self.assertTrue(counter_value_equals(registry, HEDGED_COUNT, 0))
+        self.assertEqual({PRIMARY: 0, SECONDARY: 0}, allocator.get_win_counts())
+
+    def test_overloaded_primary_is_skipped(self):
+        w = get_test_workload("a", 2, STATIC)
+        for hedge_percentile in [0, 90]:
+            registry = Registry()
+            primary = OverloadedAllocator(retry_after_secs=60)
+            allocator = FallbackCpuAllocator(primary, GreedyCpuAllocator(), hedge_percentile)
+            allocator.set_registry(registry, {})
+
+            for _ in range(3):
+                cpu = allocator.assign_threads(get_no_usage_threads_request(get_cpu(), [w])).get_cpu()
+                self.assertEqual(2, len(cpu.get_claimed_threads()))
+
+            # The primary asked not to be called again for a while
+            self.assertEqual(1, primary.call_count)
+            self.assertEqual(1, allocator.get_overloaded_count())
+            self.assertEqual(2, allocator.get_skipped_count())
+            self.assertEqual({PRIMARY: 0, SECONDARY: 3}, allocator.get_win_counts())
+
+            allocator.report_metrics({})
+            self.assertTrue(counter_value_equals(registry, PRIMARY_ASSIGN_COUNT, 1))
+            self.assertTrue(counter_value_equals(registry, PRIMARY_OVERLOADED_COUNT, 1))
+            self.assertTrue(counter_value_equals(registry, PRIMARY_SKIPPED_COUNT, 2))
+
+    def test_shed_request_without_retry_after(self):
+        primary = OverloadedAllocator()
+        allocator = FallbackCpuAllocator(primary, GreedyCpuAllocator())
+        w = get_test_workload("a", 2, STATIC)
+
+        for _ in range(2):
+            allocator.assign_threads(get_no_usage_threads_request(get_cpu(), [w]))
+        self.assertEqual(2, primary.call_count)
+        self.assertEqual(0, allocator.get_skipped_count())
@@ -0,0 +1,105 @@
+import logging
+import unittest
+import uuid
+
+import numpy as np
+from spectator import Registry
+
+from tests.config.test_property_provider import TestPropertyProvider
+from tests.utils import config_logs, get_test_workload, get_no_usage_threads_request, gauge_value_equals
+from titus_isolate.allocate.local_search import PlacementObjective, get_initial_assignment, get_assignment, FREE
+from titus_isolate.allocate.local_search_cpu_allocator import LocalSearchCpuAllocator
+from titus_isolate.config.config_manager import ConfigManager
+from titus_isolate.config.constants import LOCAL_SEARCH
+from titus_isolate.event.constants import STATIC
+from titus_isolate.isolate.utils import get_allocator
+from titus_isolate.metrics.constants import LOCAL_SEARCH_TIMEBOUND_COUNT
+from titus_isolate.model.processor.config import get_cpu
+from titus_isolate.utils import set_config_manager
+
+config_logs(logging.DEBUG)
+set_config_manager(ConfigManager(TestPropertyProvider({})))
+
+WEIGHTS = {"alpha_nu": 1000.0, "alpha_llc": 10.0, "alpha_l12": 250.0, "alpha_order": 1.0, "alpha_prev": 10.0}
+
+
+class TestLocalSearch(unittest.TestCase):
+
+    def test_objective(self):
+        cpu = get_cpu(2, 4, 2)
+        objective = PlacementObjective(cpu, [4, 2], None, **WEIGHTS)
+
+        # Both workloads on their own package, on separate cores
+        isolated = np.full(16, FREE)
+        isolated[[0, 2, 4, 6]] = 0
+        isolated[[8, 10]] = 1
+        # The first workload spans packages
+        spanning = np.full(16, FREE)
+        spanning[[0, 2, 8, 12]] = 0
+        spanning[[10, 14]] = 1
+        # The first workload fills two cores
+        packed = np.full(16, FREE)
+        packed[[0, 1, 2, 3]] = 0
+        packed[[8, 10]] = 1
+
+        costs = objective.get_costs(np.stack([isolated, spanning, packed]))
+        self.assertLess(costs[0], costs[1])
+        self.assertLess(costs[0], costs[2])
+        self.assertAlmostEqual(costs[1], objective.get_cost(spanning))
+
+    def test_initial_assignment(self):
+        cpu = get_cpu(2, 4, 2)
+        previous = get_assignment([[1, 0, 1, 0] + [0] * 4 + [1, 0, 1, 0] + [0] * 4], 16)
+
+        assignment = get_initial_assignment(cpu, [2, 3], previous)
+        self.assertEqual(2, (assignment == 0).sum())
+        self.assertEqual(3, (assignment == 1).sum())
+        # The new workload goes onto empty cores of a single package
+        new_threads = np.flatnonzero(assignment == 1)
+        self.assertEqual(1, len({t // 8 for t in new_threads}))
+        self.assertEqual(3, len({t // 2 for t in new_threads}))
+
+    def test_consolidates_fragmented_workload(self):
+        cpu = get_cpu()
+        allocator = LocalSearchCpuAllocator(max_runtime_ms=10000)
+
+        wa = get_test_workload(str(uuid.uuid4()), 8, STATIC)
+        for t_id in [0, 9, 2, 11, 4, 13, 6, 15]:
+            cpu.get_thread(t_id).claim(wa.get_id())
+
+        workloads = [wa]
+        for thread_count in [2, 3, 1, 2]:
+            workloads.append(get_test_workload(str(uuid.uuid4()), thread_count, STATIC))
+            cpu = allocator.assign_threads(get_no_usage_threads_request(cpu, workloads)).get_cpu()
+
+        self.assertEqual(0, len(cpu.get_empty_threads()))
+        packages = {cpu.get_thread_package(t_id).get_id() for t_id in cpu.get_workload_thread_ids(wa.get_id())}
+        self.assertEqual(1, len(packages))
+
+    def test_deterministic(self):
+        allocator = LocalSearchCpuAllocator(max_runtime_ms=10000)
+        workloads = [get_test_workload(str(uuid.uuid4()), c, STATIC) for c in [3, 5, 2]]
+
+        results = []
+        for _ in range(2):
+            cpu = get_cpu()
+            for i in range(len(workloads)):
+                cpu = allocator.assign_threads(get_no_usage_threads_request(cpu, workloads[:i + 1])).get_cpu()
+            results.append(cpu)
+        self.assertEqual(results[0], results[1])
+
+    def test_time_bound(self):
+        allocator = LocalSearchCpuAllocator(max_runtime_ms=0)
+        registry = Registry()
+        allocator.set_registry(registry, {})
+
+        w = get_test_workload(str(uuid.uuid4()), 6, STATIC)
+        cpu = allocator.assign_threads(get_no_usage_threads_request(get_cpu(), [w])).get_cpu()
+        self.assertEqual(6, len(cpu.get_workload_thread_ids(w.get_id())))
+
+        allocator.report_metrics({})
+        self.assertTrue(gauge_value_equals(registry, LOCAL_SEARCH_TIMEBOUND_COUNT, 1))
+
+    def test_get_allocator(self):
+        allocator = get_allocator(LOCAL_SEARCH, ConfigManager(TestPropertyProvider({})))
+        self.assertEqual(LocalSearchCpuAllocator.__name__, allocator.get_name())
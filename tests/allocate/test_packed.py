@@ -0,0 +1,173 @@
+import json
+import logging
+import random
+import struct
+import unittest
+import uuid
+
+from tests.utils import config_logs, get_test_workload, get_no_usage_threads_request, get_no_usage_rebalance_request, \
+    DEFAULT_TEST_REQUEST_METADATA
+from titus_isolate.allocate.allocate_request import AllocateRequest, deserialize_allocate_request
+from titus_isolate.allocate.allocate_response import deserialize_response
+from titus_isolate.allocate.allocate_threads_batch_request import AllocateThreadsBatchRequest, \
+    deserialize_allocate_threads_batch_request
+from titus_isolate.allocate.allocate_threads_request import AllocateThreadsRequest, \
+    deserialize_allocate_threads_request
+from titus_isolate.allocate.constants import TITUS_ISOLATE_CELL_HEADER, CPU_USAGE, MEM_USAGE, NET_RECV_USAGE, \
+    NET_TRANS_USAGE, DISK_USAGE, CPU_ALLOCATOR
+from titus_isolate.allocate.greedy_cpu_allocator import GreedyCpuAllocator
+from titus_isolate.allocate.packed import encode_cpu, decode_cpu, encode_allocate_request, decode_allocate_request, \
+    encode_response, decode_response, decode_request_problem, decode_response_claims, MAGIC, VERSION, CPU_KIND, \
+    USAGE_REL_TOLERANCE
+from titus_isolate.allocate.utils import parse_cpu
+from titus_isolate.event.constants import STATIC, BURST
+from titus_isolate.model.processor.config import get_cpu
+
+config_logs(logging.DEBUG)
+
+USAGE_KEYS = [CPU_USAGE, MEM_USAGE, NET_RECV_USAGE, NET_TRANS_USAGE, DISK_USAGE]
+
+
+def get_shared_cpu():
+    random.seed(3)
+    cpu = get_cpu(2, 4, 2)
+    workload_ids = [str(uuid.uuid4()) for _ in range(4)]
+    for t in cpu.get_threads():
+        for w_id in random.sample(workload_ids, random.randint(0, 3)):
+            t.claim(w_id)
+    return cpu
+
+
+def get_usage(workload_ids, max_value):
+    rand = random.Random(7)
+    return {w_id: [rand.uniform(0, max_value) for _ in range(60)] for w_id in workload_ids}
+
+
+def get_usage_request(cpu, workloads, workload_id=None):
+    w_ids = [w.get_id() for w in workloads]
+    kwargs = dict(
+        cpu=cpu,
+        workloads={w.get_id(): w for w in workloads},
+        cpu_usage=get_usage(w_ids, 16),
+        mem_usage=get_usage(w_ids[:1], 64 * 1024),
+        net_recv_usage={},
+        net_trans_usage=get_usage(w_ids, 1e9),
+        disk_usage={},
+        metadata=DEFAULT_TEST_REQUEST_METADATA)
+    if workload_id is None:
+        return AllocateRequest(**kwargs)
+    return AllocateThreadsRequest(workload_id=workload_id, **kwargs)
+
+
+class TestPacked(unittest.TestCase):
+
+    def assert_same_usage(self, expected: dict, actual: dict):
+        self.assertEqual(expected.keys(), actual.keys())
+        for workload_id, series in expected.items():
+            self.assertEqual(len(series), len(actual[workload_id]))
+            for e, a in zip(series, actual[workload_id]):
+                self.assertLessEqual(abs(float(e) - float(a)), abs(float(e)) * USAGE_REL_TOLERANCE)
+
+    def assert_same_request(self, expected: dict, actual: dict):
+        """
+        Usage only round trips within the tolerance of its float32 encoding, everything else exactly.
+        """
+        expected, actual = dict(expected), dict(actual)
+        for key in USAGE_KEYS:
+            self.assert_same_usage(expected.pop(key), actual.pop(key))
+        self.assertEqual(expected, actual)
+
+    def test_cpu_round_trip(self):
+        for cpu in [get_cpu(), get_shared_cpu()]:
+            decoded = decode_cpu(encode_cpu(cpu))
+            self.assertEqual(cpu.to_dict(), decoded.to_dict())
+            self.assertEqual(cpu, decoded)
+            self.assertEqual(cpu.to_dict(), parse_cpu(cpu.to_dict()).to_dict())
+
+    def test_threads_request_round_trip(self):
+        w_a = get_test_workload(str(uuid.uuid4()), 2, STATIC)
+        w_b = get_test_workload(str(uuid.uuid4()), 0, BURST)
+        request = get_usage_request(get_shared_cpu(), [w_a, w_b], w_a.get_id())
+
+        decoded = decode_allocate_request(encode_allocate_request(request))
+        self.assertTrue(isinstance(decoded, AllocateThreadsRequest))
+        self.assert_same_request(request.to_dict(), decoded.to_dict())
+
+        from_json = deserialize_allocate_threads_request(request.to_dict())
+        self.assert_same_request(from_json.to_dict(), decoded.to_dict())
+
+    def test_threads_batch_request_round_trip(self):
+        w_a = get_test_workload(str(uuid.uuid4()), 2, STATIC)
+        w_b = get_test_workload(str(uuid.uuid4()), 3, STATIC)
+        w_c = get_test_workload(str(uuid.uuid4()), 0, BURST)
+        request = get_usage_request(get_shared_cpu(), [w_a, w_b, w_c])
+        request = AllocateThreadsBatchRequest(
+            cpu=request.get_cpu(),
+            workload_ids=[w_b.get_id(), w_a.get_id()],
+            workloads=request.get_workloads(),
+            cpu_usage=request.get_cpu_usage(),
+            mem_usage=request.get_mem_usage(),
+            net_recv_usage=request.get_net_recv_usage(),
+            net_trans_usage=request.get_net_trans_usage(),
+            disk_usage=request.get_disk_usage(),
+            metadata=request.get_metadata())
+
+        decoded = decode_allocate_request(encode_allocate_request(request))
+        self.assertTrue(isinstance(decoded, AllocateThreadsBatchRequest))
+        self.assertEqual([w_b.get_id(), w_a.get_id()], decoded.get_workload_ids())
+        self.assert_same_request(request.to_dict(), decoded.to_dict())
+
+        from_json = deserialize_allocate_threads_batch_request(request.to_dict())
+        self.assert_same_request(from_json.to_dict(), decoded.to_dict())
+
+    def test_rebalance_request_round_trip(self):
+        w = get_test_workload(str(uuid.uuid4()), 4, STATIC)
+        for request in [get_usage_request(get_shared_cpu(), [w]), get_no_usage_rebalance_request(get_cpu(), [w])]:
+            decoded = decode_allocate_request(encode_allocate_request(request))
+            self.assertFalse(isinstance(decoded, AllocateThreadsRequest))
+            self.assert_same_request(request.to_dict(), decoded.to_dict())
+            self.assert_same_request(deserialize_allocate_request(request.to_dict()).to_dict(), decoded.to_dict())
+
+    def test_response_round_trip(self):
+        w = get_test_workload(str(uuid.uuid4()), 3, STATIC)
+        response = GreedyCpuAllocator().assign_threads(get_no_usage_threads_request(get_cpu(), [w]))
+        headers = {TITUS_ISOLATE_CELL_HEADER: "cell_a"}
+
+        decoded = decode_response(headers, encode_response(response))
+        from_json = deserialize_response(headers, response.to_dict())
+        self.assertEqual(from_json.to_dict(), decoded.to_dict())
+        self.assertEqual("cell_a", decoded.get_metadata()["cell"])
+
+    def test_read_claims_without_decoding(self):
+        cpu = get_shared_cpu()
+        claims = {w_id: sorted(cpu.get_workload_thread_ids(w_id)) for w_id in cpu.get_workload_ids()}
+        topology = [[[t.get_id() for t in c.get_threads()] for c in p.get_cores()] for p in cpu.get_packages()]
+
+        w = get_test_workload(str(uuid.uuid4()), 2, BURST)
+        request = get_usage_request(cpu, [w], w.get_id())
+        problem = decode_request_problem(encode_allocate_request(request))
+        self.assertEqual((topology, claims), (problem[0], {w_id: sorted(t) for w_id, t in problem[1].items()}))
+        self.assertEqual({w.get_id(): w.to_dict()}, problem[2])
+        self.assert_same_usage(request.get_cpu_usage(), problem[3])
+        self.assertEqual([w.get_id()], problem[4])
+
+        response = GreedyCpuAllocator().assign_threads(request)
+        metadata, claims = decode_response_claims(encode_response(response))
+        self.assertEqual(GreedyCpuAllocator().get_name(), metadata[CPU_ALLOCATOR])
+        self.assertEqual(sorted(response.get_cpu().get_workload_thread_ids(w.get_id())), sorted(claims[w.get_id()]))
+
+    def test_packed_is_smaller(self):
+        w = get_test_workload(str(uuid.uuid4()), 4, STATIC)
+        request = get_usage_request(get_shared_cpu(), [w], w.get_id())
+        self.assertLess(len(encode_allocate_request(request)), len(json.dumps(request.to_dict())) / 2)
+
+    def test_rejects_unknown_schema(self):
+        data = encode_cpu(get_cpu())
+        with self.assertRaises(ValueError):
+            decode_cpu(b'XXXX' + data[4:])
+        with self.assertRaises(ValueError):
+            decode_cpu(struct.pack('<4sHB', MAGIC, VERSION + 1, CPU_KIND) + data[7:])
+        with self.assertRaises(ValueError):
+            decode_allocate_request(data)
+        with self.assertRaises(ValueError):
+            decode_cpu(data[:3])
@@ -0,0 +1,92 @@
+import logging
+import os
+import tempfile
+import unittest
+import uuid
+
+from tests.config.test_property_provider import TestPropertyProvider
+from tests.utils import config_logs, get_test_workload, get_no_usage_threads_request
+from titus_isolate.allocate.build_placement_atlas import get_atlas_entries, main
+from titus_isolate.allocate.integer_program_cpu_allocator import IntegerProgramCpuAllocator
+from titus_isolate.allocate.placement_atlas import PlacementAtlas, encode_placement_atlas, load_placement_atlas
+from titus_isolate.allocate.solution_cache import SolutionCache
+from titus_isolate.config.config_manager import ConfigManager
+from titus_isolate.config.constants import IP_PLACEMENT_ATLAS
+from titus_isolate.event.constants import STATIC
+from titus_isolate.model.processor.config import get_cpu
+from titus_isolate.utils import set_config_manager
+
+config_logs(logging.DEBUG)
+set_config_manager(ConfigManager(TestPropertyProvider({})))
+
+TOPOLOGY = (2, 2, 2)
+
+
+class TestPlacementAtlas(unittest.TestCase):
+
+    def test_encode_and_lookup(self):
+        # The first key ends in a zero byte
+        entries = [(bytes(16), [[1, 0, 1], [0, 1, 0]]), (b'\xff' * 16, [[1] * 20])]
+        atlas = PlacementAtlas(encode_placement_atlas(entries))
+
+        self.assertEqual(2, len(atlas))
+        self.assertEqual([[1, 0, 1], [0, 1, 0]], atlas.get(bytes(16)))
+        self.assertEqual([[1] * 20], atlas.get(b'\xff' * 16))
+        self.assertIsNone(atlas.get(b'\x01' * 16))
+        self.assertEqual(0, len(PlacementAtlas(encode_placement_atlas([]))))
+
+    def test_rejects_other_files(self):
+        with self.assertRaises(ValueError):
+            PlacementAtlas(b'{"not": "an atlas"}')
+
+    def test_allocator_uses_atlas(self):
+        atlas = PlacementAtlas(encode_placement_atlas(get_atlas_entries(TOPOLOGY, [1, 2], max_workloads=3)))
+        self.assertLess(0, len(atlas))
+
+        cache = SolutionCache(100, 1024 * 1024)
+        allocator = IntegerProgramCpuAllocator(solution_cache=cache, placement_atlas=atlas)
+        reference = IntegerProgramCpuAllocator(solution_cache=SolutionCache(100, 1024 * 1024))
+
+        workloads = [get_test_workload(str(uuid.uuid4()), c, STATIC) for c in [2, 1, 2]]
+        cpu = get_cpu(*TOPOLOGY)
+        expected = get_cpu(*TOPOLOGY)
+        for i in range(len(workloads)):
+            cpu = allocator.assign_threads(get_no_usage_threads_request(cpu, workloads[:i + 1])).get_cpu()
+            expected = reference.assign_threads(get_no_usage_threads_request(expected, workloads[:i + 1])).get_cpu()
+            self.assertEqual(expected, cpu)
+
+        request = get_no_usage_threads_request(cpu, workloads[1:] + workloads[:1])
+        cpu = allocator.free_threads(request).get_cpu()
+        self.assertEqual(3, len(cpu.get_claimed_threads()))
+
+        self.assertEqual(4, allocator.get_atlas_hit_count())
+        self.assertEqual(0, cache.get_miss_count())
+
+    def test_build_and_load(self):
+        with tempfile.TemporaryDirectory() as atlas_dir:
+            path = os.path.join(atlas_dir, 'atlas.bin')
+            args = ['--topology', '2x2x2', '--shapes', '1,2', '--max-workloads', '2', '--output', path]
+            self.assertEqual(0, main(args))
+            self.assertLess(0, len(load_placement_atlas(path)))
+
+            set_config_manager(ConfigManager(TestPropertyProvider({IP_PLACEMENT_ATLAS: path})))
+            try:
+                allocator = IntegerProgramCpuAllocator()
+            finally:
+                set_config_manager(ConfigManager(TestPropertyProvider({})))
+
+            w = get_test_workload(str(uuid.uuid4()), 2, STATIC)
+            allocator.assign_threads(get_no_usage_threads_request(get_cpu(*TOPOLOGY), [w]))
+            self.assertEqual(1, allocator.get_atlas_hit_count())
+
+    def test_missing_atlas_is_ignored(self):
+        set_config_manager(ConfigManager(TestPropertyProvider({IP_PLACEMENT_ATLAS: '/does/not/exist'})))
+        try:
+            allocator = IntegerProgramCpuAllocator()
+        finally:
+            set_config_manager(ConfigManager(TestPropertyProvider({})))
+
+        w = get_test_workload(str(uuid.uuid4()), 2, STATIC)
+        cpu = allocator.assign_threads(get_no_usage_threads_request(get_cpu(*TOPOLOGY), [w])).get_cpu()
+        self.assertEqual(2, len(cpu.get_claimed_threads()))
+        self.assertEqual(0, allocator.get_atlas_hit_count())
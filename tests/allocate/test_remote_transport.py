@@ -0,0 +1,201 @@
+import json
+import logging
+import socket
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+from spectator import Registry
+from werkzeug.serving import make_server
+
+from titus_isolate.api.testing import set_testing
+
+set_testing()
+
+from tests.config.test_property_provider import TestPropertyProvider
+from tests.utils import config_logs, get_test_workload, get_no_usage_threads_request, counter_value_equals
+from titus_isolate.allocate.constants import TITUS_ISOLATE_DEADLINE_HEADER
+from titus_isolate.allocate.content_encoding import GZIP, IDENTITY, compress, decompress, choose_encoding, \
+    parse_accept_encoding
+from titus_isolate.allocate.cpu_allocate_exception import SolverOverloadedException
+from titus_isolate.allocate.greedy_cpu_allocator import GreedyCpuAllocator
+from titus_isolate.allocate.remote_cpu_allocator import RemoteCpuAllocator
+from titus_isolate.allocate.remote_transport import RemoteSolverTransport
+from titus_isolate.allocate.server_timing import format_server_timing, parse_server_timing
+from titus_isolate.api.solve import app, set_cpu_allocators
+from titus_isolate.config.config_manager import ConfigManager
+from titus_isolate.config.constants import REMOTE_ALLOCATOR_URL, REMOTE_ALLOCATOR_PACKED_ENCODING, MAX_SOLVER_RUNTIME
+from titus_isolate.event.constants import STATIC
+from titus_isolate.metrics.constants import REMOTE_ALLOCATOR_CONNECTION_COUNT, REMOTE_ALLOCATOR_RETRY_COUNT, \
+    REMOTE_ALLOCATOR_SERVER_LATENCY
+from titus_isolate.model.processor.config import get_cpu
+from titus_isolate.utils import set_config_manager
+
+config_logs(logging.DEBUG)
+set_config_manager(ConfigManager(TestPropertyProvider({})))
+
+
+def get_unused_port() -> int:
+    with socket.socket() as s:
+        s.bind(("localhost", 0))
+        return s.getsockname()[1]
+
+
+class FlakyHandler(BaseHTTPRequestHandler):
+    """
+    Keeps connections alive and answers every other request with a 503.
+    """
+    protocol_version = "HTTP/1.1"
+    request_count = 0
+
+    def do_PUT(self):
+        self.rfile.read(int(self.headers['Content-Length']))
+        FlakyHandler.request_count += 1
+        body = b'ok'
+        self.send_response(503 if FlakyHandler.request_count % 2 == 1 else 200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class OverloadedHandler(BaseHTTPRequestHandler):
+    """
+    Sheds every request and remembers the deadline it was sent with.
+    """
+    protocol_version = "HTTP/1.1"
+    deadlines = []
+
+    def do_PUT(self):
+        self.rfile.read(int(self.headers['Content-Length']))
+        OverloadedHandler.deadlines.append(float(self.headers[TITUS_ISOLATE_DEADLINE_HEADER]))
+        body = b'overloaded'
+        self.send_response(429)
+        self.send_header("Retry-After", "2")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestRemoteTransport(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = make_server("localhost", 0, app, threaded=True)
+        cls.url = "http://localhost:{}".format(cls.server.server_port)
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+
+    def setUp(self):
+        allocator = GreedyCpuAllocator()
+        set_cpu_allocators(allocator, allocator, allocator)
+
+    def tearDown(self):
+        set_config_manager(ConfigManager(TestPropertyProvider({})))
+
+    def test_encoding_helpers(self):
+        data = b'{"a": 1}' * 100
+        self.assertEqual(data, decompress(compress(data, GZIP), GZIP))
+        self.assertEqual(data, decompress(compress(data, IDENTITY), IDENTITY))
+        with self.assertRaises(ValueError):
+            compress(data, "br")
+
+        self.assertEqual(["gzip", "br"], parse_accept_encoding("gzip;q=1.0, deflate;q=0, br"))
+        self.assertEqual(GZIP, choose_encoding("br, gzip"))
+        self.assertEqual(IDENTITY, choose_encoding("br"))
+        self.assertEqual(IDENTITY, choose_encoding(None))
+
+        header = format_server_timing({"total": 0.0123, "solve": 0.01})
+        self.assertEqual("total;dur=12.300, solve;dur=10.000", header)
+        durations = parse_server_timing(header)
+        self.assertEqual({"total": 0.0123, "solve": 0.01}, {k: round(v, 6) for k, v in durations.items()})
+        self.assertEqual({}, parse_server_timing("cache;desc=hit"))
+
+    def test_remote_allocator(self):
+        w = get_test_workload("a", 2, STATIC)
+        expected = GreedyCpuAllocator().assign_threads(get_no_usage_threads_request(get_cpu(), [w])).get_cpu()
+
+        for packed in [False, True]:
+            set_config_manager(ConfigManager(TestPropertyProvider({
+                REMOTE_ALLOCATOR_URL: self.url,
+                REMOTE_ALLOCATOR_PACKED_ENCODING: packed})))
+            allocator = RemoteCpuAllocator(None)
+            registry = Registry()
+            allocator.set_registry(registry, {})
+
+            for _ in range(3):
+                cpu = allocator.assign_threads(get_no_usage_threads_request(get_cpu(), [w])).get_cpu()
+                self.assertEqual(expected.to_dict(), cpu.to_dict())
+
+            allocator.report_metrics({})
+            self.assertTrue(counter_value_equals(registry, REMOTE_ALLOCATOR_RETRY_COUNT, 0))
+            self.assertEqual(3, registry.distribution_summary(REMOTE_ALLOCATOR_SERVER_LATENCY, {}).count())
+
+    def test_compressed_round_trip(self):
+        transport = RemoteSolverTransport(self.url, (1, 5), encoding=GZIP)
+        request = get_no_usage_threads_request(get_cpu(2, 16, 2), [get_test_workload("a", 2, STATIC)])
+        body = json.dumps(request.to_dict()).encode("utf-8")
+
+        response = transport.put("/assign_threads", body, "application/json")
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(GZIP, response.headers.get("Content-Encoding"))
+        self.assertIn("cpu", response.json())
+        self.assertIn("total", parse_server_timing(response.headers.get("Server-Timing")))
+
+    def test_retries_are_bounded(self):
+        transport = RemoteSolverTransport(
+            "http://localhost:{}".format(get_unused_port()), (1, 5), max_retries=2, retry_backoff_secs=0.01)
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            transport.get("/cpu_allocator")
+        self.assertEqual(2, transport.get_retry_count())
+
+    def test_keep_alive_and_retry(self):
+        server = ThreadingHTTPServer(("localhost", 0), FlakyHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            transport = RemoteSolverTransport(
+                "http://localhost:{}".format(server.server_port), (1, 5), max_retries=1, retry_backoff_secs=0.01)
+            registry = Registry()
+            transport.set_registry(registry, {})
+
+            for _ in range(3):
+                self.assertEqual(200, transport.put("/assign_threads", b'{}', "application/json").status_code)
+
+            transport.report_metrics({})
+            self.assertTrue(counter_value_equals(registry, REMOTE_ALLOCATOR_CONNECTION_COUNT, 1))
+            self.assertTrue(counter_value_equals(registry, REMOTE_ALLOCATOR_RETRY_COUNT, 3))
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def test_deadline_and_overload(self):
+        server = ThreadingHTTPServer(("localhost", 0), OverloadedHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            set_config_manager(ConfigManager(TestPropertyProvider({
+                REMOTE_ALLOCATOR_URL: "http://localhost:{}".format(server.server_port),
+                MAX_SOLVER_RUNTIME: 3})))
+            allocator = RemoteCpuAllocator(None)
+
+            start_time = time.time()
+            with self.assertRaises(SolverOverloadedException) as context:
+                allocator.assign_threads(get_no_usage_threads_request(get_cpu(), [get_test_workload("a", 2, STATIC)]))
+            self.assertEqual(2, context.exception.retry_after_secs)
+
+            # Shed requests are not retried
+            self.assertEqual(1, len(OverloadedHandler.deadlines))
+            self.assertAlmostEqual(start_time + 3, OverloadedHandler.deadlines[0], delta=0.5)
+        finally:
+            server.shutdown()
+            server.server_close()
@@ -0,0 +1,221 @@
+import json
+import logging
+import threading
+import unittest
+
+import requests
+from werkzeug.serving import make_server
+
+from titus_isolate.api.testing import set_testing
+
+set_testing()
+
+from tests.utils import config_logs, get_test_workload, DEFAULT_TEST_REQUEST_METADATA
+from titus_isolate.allocate.allocate_response import deserialize_response
+from titus_isolate.allocate.allocate_threads_request import AllocateThreadsRequest
+from titus_isolate.allocate.constants import SESSION, CPU_USAGE, MEM_USAGE, WORKLOADS, CPU
+from titus_isolate.allocate.greedy_cpu_allocator import GreedyCpuAllocator
+from titus_isolate.allocate.session import SessionClient, SessionStore, SessionResyncException, get_state, \
+    get_state_hash, encode_delta, apply_delta, STATE_HASH, BASE_HASH, DELTA, SESSION_OVERHEAD_BYTES
+from titus_isolate.api import solve
+from titus_isolate.api.solve import app, set_cpu_allocators
+from titus_isolate.event.constants import STATIC
+from titus_isolate.model.processor.config import get_cpu
+
+config_logs(logging.DEBUG)
+
+
+def get_request(cpu, workloads, cpu_usage=None, mem_usage=None, metadata=DEFAULT_TEST_REQUEST_METADATA):
+    return AllocateThreadsRequest(
+        cpu=cpu,
+        workload_id=workloads[-1].get_id(),
+        workloads={w.get_id(): w for w in workloads},
+        cpu_usage={} if cpu_usage is None else cpu_usage,
+        mem_usage={} if mem_usage is None else mem_usage,
+        net_recv_usage={},
+        net_trans_usage={},
+        disk_usage={},
+        metadata=metadata)
+
+
+def get_series(start, length=60):
+    return [float(i) for i in range(start, start + length)]
+
+
+class TestSession(unittest.TestCase):
+
+    def test_delta_round_trip(self):
+        allocator = GreedyCpuAllocator()
+        w_a = get_test_workload("a", 2, STATIC)
+        w_b = get_test_workload("b", 4, STATIC)
+        w_c = get_test_workload("c", 1, STATIC)
+
+        cpu = allocator.assign_threads(get_request(get_cpu(), [w_a])).get_cpu()
+        base = get_state(get_request(cpu, [w_a, w_b], {"a": get_series(0)}, {"b": get_series(0)}).to_dict())
+
+        # A claims change, an added and a removed workload, a slid, a new and a removed series
+        cpu = allocator.assign_threads(get_request(cpu, [w_a, w_c])).get_cpu()
+        state = get_state(get_request(cpu, [w_a, w_c], {"a": get_series(2), "c": get_series(0, 3)}).to_dict())
+
+        delta = encode_delta(base, state)
+        self.assertEqual(1, len(delta["cpu_claims"]))
+        self.assertEqual(["c"], list(delta["workloads_set"].keys()))
+        self.assertEqual(["b"], delta["workloads_removed"])
+        self.assertEqual({"drop": 2, "append": [str(60.0), str(61.0)]}, delta["usage"][CPU_USAGE]["a"])
+        self.assertEqual({"set": [str(0.0), str(1.0), str(2.0)]}, delta["usage"][CPU_USAGE]["c"])
+        self.assertEqual(["b"], delta["usage_removed"][MEM_USAGE])
+
+        base_json = json.dumps(base, sort_keys=True)
+        self.assertEqual(get_state_hash(state), get_state_hash(apply_delta(base, delta)))
+        self.assertEqual(base_json, json.dumps(base, sort_keys=True))
+
+        # A different topology replaces the cpu
+        other = dict(state)
+        other[CPU] = get_cpu(2, 4, 2).to_dict()
+        self.assertEqual(get_state_hash(other), get_state_hash(apply_delta(base, encode_delta(base, other))))
+
+        # In steady state only the new samples are sent
+        usage = {"a": get_series(3), "c": get_series(0, 4)}
+        steady = get_state(get_request(cpu, [w_a, w_c], usage).to_dict())
+        delta = encode_delta(state, steady)
+        self.assertEqual(["usage"], list(delta.keys()))
+        self.assertLess(len(json.dumps(delta)), len(json.dumps(steady)) / 10)
+        self.assertEqual(get_state_hash(steady), get_state_hash(apply_delta(state, delta)))
+
+    def test_store(self):
+        store = SessionStore(2, 1024 * 1024)
+        w = get_test_workload("a", 2, STATIC)
+        body = get_request(get_cpu(), [w], {"a": get_series(0)}).to_dict()
+        state = get_state(body)
+
+        full = dict(body)
+        full[SESSION] = {STATE_HASH: get_state_hash(state)}
+        self.assertEqual(body, store.resolve(full))
+        self.assertEqual(1, store.get_session_count())
+
+        next_body = get_request(get_cpu(), [w], {"a": get_series(1)}).to_dict()
+        next_state = get_state(next_body)
+        session = {BASE_HASH: get_state_hash(state), STATE_HASH: get_state_hash(next_state), DELTA: None}
+        session[DELTA] = encode_delta(state, next_state)
+        resolved = store.resolve({"metadata": body["metadata"], "workload_id": "a", SESSION: session})
+        for k in [CPU, WORKLOADS, CPU_USAGE, "metadata", "workload_id"]:
+            self.assertEqual(next_body[k], resolved[k])
+
+        # The base state is gone now
+        with self.assertRaises(SessionResyncException):
+            store.resolve({"metadata": body["metadata"], "workload_id": "a", SESSION: session})
+        self.assertEqual(0, store.get_session_count())
+        self.assertEqual(1, store.get_resync_count())
+
+        # Least recently used instances are evicted
+        for instance_id in ["i-1", "i-2", "i-3"]:
+            full = get_request(get_cpu(), [w], metadata={"instance_id": instance_id}).to_dict()
+            full[SESSION] = {STATE_HASH: get_state_hash(get_state(full))}
+            store.resolve(full)
+        self.assertEqual(2, store.get_session_count())
+
+    def test_store_byte_bound(self):
+        w = get_test_workload("a", 2, STATIC)
+
+        def resolve(store, instance_id):
+            full = get_request(get_cpu(), [w], {"a": get_series(0)}, metadata={"instance_id": instance_id}).to_dict()
+            full[SESSION] = {STATE_HASH: get_state_hash(get_state(full))}
+            store.resolve(full)
+
+        store = SessionStore(10, 1024 * 1024)
+        resolve(store, "i-1")
+        session_bytes = store.get_bytes()
+        self.assertGreater(session_bytes, SESSION_OVERHEAD_BYTES)
+
+        # Resolving an instance again replaces its state
+        resolve(store, "i-1")
+        self.assertEqual(session_bytes, store.get_bytes())
+
+        # Least recently used instances are evicted once the states exceed the byte bound
+        store = SessionStore(10, session_bytes * 2)
+        for instance_id in ["i-1", "i-2", "i-3"]:
+            resolve(store, instance_id)
+        self.assertEqual(2, store.get_session_count())
+        self.assertEqual(session_bytes * 2, store.get_bytes())
+
+        # A state larger than the bound is not kept
+        store = SessionStore(10, session_bytes - 1)
+        resolve(store, "i-1")
+        self.assertEqual(0, store.get_session_count())
+        self.assertEqual(0, store.get_bytes())
+
+    def test_client_against_solver(self):
+        allocator = GreedyCpuAllocator()
+        set_cpu_allocators(allocator, allocator, allocator)
+        solve.session_store = SessionStore(10, 1024 * 1024)
+        http_client = app.test_client()
+
+        def send(path):
+            return lambda b: http_client.put(path, data=json.dumps(b), content_type="application/json")
+
+        client = SessionClient()
+        workloads = [get_test_workload(w_id, 2, STATIC) for w_id in ["a", "b", "c"]]
+        cpu = get_cpu()
+        expected = get_cpu()
+        for i in range(len(workloads)):
+            usage = {w.get_id(): get_series(i) for w in workloads[:i + 1]}
+            response = client.put(get_request(cpu, workloads[:i + 1], usage).to_dict(), send("/assign_threads"))
+            self.assertEqual(200, response.status_code)
+            cpu = deserialize_response(response.headers, response.json).get_cpu()
+            expected = allocator.assign_threads(get_request(expected, workloads[:i + 1])).get_cpu()
+            self.assertEqual(expected.to_dict(), cpu.to_dict())
+
+        self.assertEqual(1, client.get_full_count())
+        self.assertEqual(2, client.get_delta_count())
+        self.assertEqual(2, solve.session_store.get_delta_count())
+
+        # The solver restarted and lost the session
+        solve.session_store = SessionStore(10, 1024 * 1024)
+        response = client.put(get_request(cpu, workloads[1:] + workloads[:1]).to_dict(), send("/free_threads"))
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(4, len(deserialize_response(response.headers, response.json).get_cpu().get_claimed_threads()))
+        self.assertEqual(1, client.get_resync_count())
+        self.assertEqual(1, solve.session_store.get_session_count())
+
+    def test_concurrent_instances_keep_their_sessions(self):
+        allocator = GreedyCpuAllocator()
+        set_cpu_allocators(allocator, allocator, allocator)
+        solve.session_store = SessionStore(10, 1024 * 1024)
+        server = make_server("127.0.0.1", 0, app, threaded=True)
+        serving = threading.Thread(target=server.serve_forever)
+        serving.start()
+
+        url = "http://127.0.0.1:{}/assign_threads".format(server.server_port)
+        workloads = [get_test_workload(w_id, 2, STATIC) for w_id in ["a", "b", "c"]]
+        failures = []
+
+        def send(body):
+            return requests.put(url, data=json.dumps(body), headers={"Content-Type": "application/json"}, timeout=10)
+
+        def run_instance(instance_id):
+            client = SessionClient()
+            cpu = get_cpu()
+            for i in range(len(workloads)):
+                usage = {w.get_id(): get_series(i) for w in workloads[:i + 1]}
+                request = get_request(cpu, workloads[:i + 1], usage, metadata={"instance_id": instance_id})
+                response = client.put(request.to_dict(), send)
+                if response.status_code != 200:
+                    failures.append((instance_id, response.status_code))
+                    return
+                cpu = deserialize_response(response.headers, response.json()).get_cpu()
+
+        try:
+            threads = [threading.Thread(target=run_instance, args=("i-{}".format(i),)) for i in range(4)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        finally:
+            server.shutdown()
+            serving.join()
+
+        self.assertEqual([], failures)
+        self.assertEqual(4, solve.session_store.get_session_count())
+        self.assertEqual(4, solve.session_store.get_full_count())
+        self.assertEqual(8, solve.session_store.get_delta_count())
+        self.assertEqual(0, solve.session_store.get_resync_count())
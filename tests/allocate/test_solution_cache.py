@@ -0,0 +1,169 @@
+import logging
+import os
+import tempfile
+import unittest
+import uuid
+from unittest.mock import patch
+
+import numpy as np
+from titus_optimize.compute import IP_SOLUTION_OPTIMAL, IP_SOLUTION_TIME_BOUND
+
+from tests.utils import config_logs, get_test_workload, get_no_usage_threads_request
+from titus_isolate.allocate.integer_program_cpu_allocator import IntegerProgramCpuAllocator
+from titus_isolate.allocate.solution_cache import SolutionCache, DiskSolutionStore, get_solution_key, \
+    ENTRY_OVERHEAD_BYTES
+from titus_isolate.event.constants import STATIC
+from titus_isolate.model.processor.config import get_cpu
+
+config_logs(logging.DEBUG)
+
+PLACEMENT = [[1, 1, 0, 0], [0, 0, 1, 0]]
+
+
+class TestSolutionCache(unittest.TestCase):
+
+    def test_key_is_canonical(self):
+        key = get_solution_key(4, 1, [2, 1], PLACEMENT)
+        self.assertEqual(16, len(key))
+        self.assertEqual(key, get_solution_key(4, 1, np.array([2, 1]), np.array(PLACEMENT, dtype=bool)))
+        self.assertEqual(key, get_solution_key(4, 1, (2, 1), [[True, True, False, False], [0, 0, 1, 0]]))
+
+        self.assertNotEqual(key, get_solution_key(4, 2, [2, 1], PLACEMENT))
+        self.assertNotEqual(key, get_solution_key(4, 1, [2, 2], PLACEMENT))
+        self.assertNotEqual(key, get_solution_key(4, 1, [2, 1], None))
+        self.assertNotEqual(key, get_solution_key(4, 1, [2, 1], [[1, 1, 0, 0], [0, 0, 0, 1]]))
+
+    def test_lru_entry_bound(self):
+        cache = SolutionCache(max_entries=2, max_bytes=1024 * 1024)
+        keys = [get_solution_key(4, 1, [i], None) for i in range(3)]
+
+        cache.put(keys[0], PLACEMENT, IP_SOLUTION_OPTIMAL)
+        cache.put(keys[1], PLACEMENT, IP_SOLUTION_OPTIMAL)
+        self.assertIsNotNone(cache.get(keys[0]))
+        cache.put(keys[2], PLACEMENT, IP_SOLUTION_OPTIMAL)
+
+        self.assertEqual(2, cache.get_size())
+        self.assertEqual(1, cache.get_eviction_count())
+        self.assertIsNone(cache.get(keys[1]))
+        self.assertIsNotNone(cache.get(keys[0]))
+        self.assertIsNotNone(cache.get(keys[2]))
+        self.assertEqual(3, cache.get_hit_count())
+        self.assertEqual(1, cache.get_miss_count())
+
+    def test_lru_byte_bound(self):
+        key = get_solution_key(4, 1, [0], None)
+        entry_bytes = ENTRY_OVERHEAD_BYTES + len(key) + 8
+        cache = SolutionCache(max_entries=100, max_bytes=3 * entry_bytes)
+
+        for i in range(5):
+            cache.put(get_solution_key(4, 1, [i], None), PLACEMENT, IP_SOLUTION_OPTIMAL)
+            self.assertLessEqual(cache.get_bytes(), 3 * entry_bytes)
+
+        self.assertEqual(3, cache.get_size())
+        self.assertEqual(3 * entry_bytes, cache.get_bytes())
+        self.assertEqual(2, cache.get_eviction_count())
+
+        cache.clear()
+        self.assertEqual(0, cache.get_size())
+        self.assertEqual(0, cache.get_bytes())
+
+    def test_returns_copies(self):
+        cache = SolutionCache(max_entries=10, max_bytes=1024 * 1024)
+        key = get_solution_key(4, 1, [2, 1], None)
+        placement = [list(v) for v in PLACEMENT]
+        cache.put(key, placement, IP_SOLUTION_OPTIMAL)
+
+        placement[0][0] = 0
+        cached, status = cache.get(key)
+        self.assertEqual(PLACEMENT, cached)
+        self.assertEqual(IP_SOLUTION_OPTIMAL, status)
+
+        cached[0][0] = 0
+        self.assertEqual(PLACEMENT, cache.get(key)[0])
+
+    def test_disk_store(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            optimal_key = get_solution_key(4, 1, [2, 1], None)
+            time_bound_key = get_solution_key(4, 1, [1, 1], None)
+
+            cache = SolutionCache(10, 1024 * 1024, DiskSolutionStore(cache_dir, 1024 * 1024), (IP_SOLUTION_OPTIMAL,))
+            cache.put(optimal_key, PLACEMENT, IP_SOLUTION_OPTIMAL)
+            cache.put(time_bound_key, PLACEMENT, IP_SOLUTION_TIME_BOUND)
+            self.assertEqual(1, len(os.listdir(cache_dir)))
+
+            # A new cache, e.g. after a restart, reads through to the store
+            restarted_store = DiskSolutionStore(cache_dir, 1024 * 1024)
+            restarted = SolutionCache(10, 1024 * 1024, restarted_store, (IP_SOLUTION_OPTIMAL,))
+            self.assertEqual((PLACEMENT, IP_SOLUTION_OPTIMAL), restarted.get(optimal_key))
+            self.assertIsNone(restarted.get(time_bound_key))
+            self.assertEqual(1, restarted.get_disk_hit_count())
+            self.assertEqual(1, restarted.get_miss_count())
+
+            self.assertEqual((PLACEMENT, IP_SOLUTION_OPTIMAL), restarted.get(optimal_key))
+            self.assertEqual(1, restarted.get_hit_count())
+
+    def test_disk_store_is_pruned_by_age(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            keys = [get_solution_key(4, 1, [i, 1], None) for i in range(10)]
+            store = DiskSolutionStore(cache_dir, 1024 * 1024)
+            store.put(keys[0], PLACEMENT, IP_SOLUTION_OPTIMAL)
+            file_bytes = store.get_bytes()
+
+            # Room for four files, pruning down to three
+            store = DiskSolutionStore(cache_dir, file_bytes * 4)
+            self.assertEqual(file_bytes, store.get_bytes())
+            for i, key in enumerate(keys[1:4]):
+                store.put(key, PLACEMENT, IP_SOLUTION_OPTIMAL)
+                os.utime(os.path.join(cache_dir, key.hex() + '.json'), (i + 1, i + 1))
+            os.utime(os.path.join(cache_dir, keys[0].hex() + '.json'), (0, 0))
+
+            # Reading the oldest file makes it the most recently used
+            self.assertIsNotNone(store.get(keys[0]))
+            store.put(keys[4], PLACEMENT, IP_SOLUTION_OPTIMAL)
+
+            self.assertEqual(2, store.get_pruned_count())
+            self.assertEqual(file_bytes * 3, store.get_bytes())
+            self.assertEqual(3, len(os.listdir(cache_dir)))
+            self.assertIsNotNone(store.get(keys[0]))
+            self.assertIsNone(store.get(keys[1]))
+            self.assertIsNone(store.get(keys[2]))
+            self.assertIsNotNone(store.get(keys[3]))
+            self.assertIsNotNone(store.get(keys[4]))
+
+    def test_failed_disk_write_leaves_no_file(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            store = DiskSolutionStore(cache_dir, 1024 * 1024)
+            key = get_solution_key(4, 1, [2, 1], None)
+            with patch('os.replace', side_effect=OSError("disk full")):
+                store.put(key, PLACEMENT, IP_SOLUTION_OPTIMAL)
+
+            self.assertEqual([], os.listdir(cache_dir))
+            self.assertEqual(0, store.get_bytes())
+            self.assertIsNone(store.get(key))
+
+    def test_corrupt_disk_entry_is_a_miss(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            key = get_solution_key(4, 1, [2, 1], None)
+            with open(os.path.join(cache_dir, key.hex() + '.json'), 'w') as f:
+                f.write("{not json")
+
+            cache = SolutionCache(10, 1024 * 1024, DiskSolutionStore(cache_dir, 1024 * 1024))
+            self.assertIsNone(cache.get(key))
+            self.assertEqual(1, cache.get_miss_count())
+
+    def test_allocator_reuses_solutions(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            w = get_test_workload(str(uuid.uuid4()), 4, STATIC)
+
+            cache = SolutionCache(10, 1024 * 1024, DiskSolutionStore(cache_dir, 1024 * 1024))
+            allocator = IntegerProgramCpuAllocator(solution_cache=cache)
+            expected = allocator.assign_threads(get_no_usage_threads_request(get_cpu(), [w])).get_cpu()
+            allocator.assign_threads(get_no_usage_threads_request(get_cpu(), [w]))
+            self.assertEqual(1, cache.get_miss_count())
+            self.assertEqual(1, cache.get_hit_count())
+
+            restarted_cache = SolutionCache(10, 1024 * 1024, DiskSolutionStore(cache_dir, 1024 * 1024))
+            restarted = IntegerProgramCpuAllocator(solution_cache=restarted_cache)
+            actual = restarted.assign_threads(get_no_usage_threads_request(get_cpu(), [w])).get_cpu()
+            self.assertEqual(expected, actual)
+            self.assertEqual(1, restarted_cache.get_disk_hit_count())
@@ -0,0 +1,112 @@
+import logging
+import time
+import unittest
+import uuid
+
+from spectator import Registry
+
+from tests.config.test_property_provider import TestPropertyProvider
+from tests.utils import config_logs, get_test_workload, get_no_usage_threads_request, gauge_value_equals
+from titus_isolate.allocate.integer_program_cpu_allocator import IntegerProgramCpuAllocator
+from titus_isolate.allocate.solution_cache import SolutionCache
+from titus_isolate.allocate.solver_budget import SolverBudgetController, SolverBudget, ASSIGN, FREE, REBALANCE, \
+    MIN_SAMPLES, MIN_RUNTIME_SECS, get_size_bucket, solve_deadline, is_time_limited
+from titus_isolate.config.config_manager import ConfigManager
+from titus_isolate.config.constants import SOLVER_BUDGET_ADAPTIVE, ASSIGN_SOLVER_LATENCY_SLO, MAX_SOLVER_RUNTIME, \
+    RELATIVE_MIP_GAP_STOP, MAX_RELATIVE_MIP_GAP_STOP
+from titus_isolate.event.constants import STATIC
+from titus_isolate.metrics.constants import SOLVER_BUDGET_RUNTIME, SOLVER_DURATION_SAMPLE_COUNT
+from titus_isolate.model.processor.config import get_cpu
+from titus_isolate.utils import set_config_manager
+
+config_logs(logging.DEBUG)
+set_config_manager(ConfigManager(TestPropertyProvider({})))
+
+
+def get_controller(properties: dict) -> SolverBudgetController:
+    return SolverBudgetController(ConfigManager(TestPropertyProvider(properties)))
+
+
+class TestSolverBudget(unittest.TestCase):
+
+    def test_static_budget(self):
+        controller = get_controller({MAX_SOLVER_RUNTIME: 3, RELATIVE_MIP_GAP_STOP: 0.1})
+        self.assertEqual(SolverBudget(3, 0.1), controller.get_budget(ASSIGN, 32, 4))
+
+        for _ in range(MIN_SAMPLES * 2):
+            controller.record(ASSIGN, 32, 4, 100)
+        self.assertEqual(SolverBudget(3, 0.1), controller.get_budget(ASSIGN, 32, 4))
+
+    def test_deadline_cuts_runtime(self):
+        controller = get_controller({MAX_SOLVER_RUNTIME: 3, RELATIVE_MIP_GAP_STOP: 0.1})
+
+        with solve_deadline(time.time() + 1):
+            self.assertFalse(is_time_limited())
+            budget = controller.get_budget(ASSIGN, 32, 4)
+            self.assertLess(budget.runtime_secs, 1)
+            self.assertGreater(budget.runtime_secs, 0.5)
+            self.assertEqual(0.1, budget.mip_gap)
+            self.assertTrue(is_time_limited())
+
+            with solve_deadline(time.time() - 1):
+                self.assertEqual(MIN_RUNTIME_SECS, controller.get_budget(ASSIGN, 32, 4).runtime_secs)
+
+        # A distant deadline, or none at all, leaves the budget as is
+        with solve_deadline(time.time() + 60):
+            self.assertEqual(SolverBudget(3, 0.1), controller.get_budget(ASSIGN, 32, 4))
+            self.assertFalse(is_time_limited())
+        self.assertEqual(SolverBudget(3, 0.1), controller.get_budget(ASSIGN, 32, 4))
+
+    def test_budget_per_operation(self):
+        controller = get_controller(
+            {SOLVER_BUDGET_ADAPTIVE: True, MAX_SOLVER_RUNTIME: 5, ASSIGN_SOLVER_LATENCY_SLO: 0.5})
+        self.assertEqual(0.5, controller.get_budget(ASSIGN, 32, 4).runtime_secs)
+        self.assertEqual(2.0, controller.get_budget(FREE, 32, 4).runtime_secs)
+        self.assertEqual(5, controller.get_budget(REBALANCE, 32, 4).runtime_secs)
+
+    def test_adapts_to_observed_durations(self):
+        controller = get_controller({
+            SOLVER_BUDGET_ADAPTIVE: True,
+            MAX_SOLVER_RUNTIME: 5,
+            ASSIGN_SOLVER_LATENCY_SLO: 1.0,
+            RELATIVE_MIP_GAP_STOP: 0.05,
+            MAX_RELATIVE_MIP_GAP_STOP: 0.2})
+
+        # Solves overrun the objective: less runtime, a wider gap
+        for _ in range(MIN_SAMPLES * 4):
+            budget = controller.get_budget(ASSIGN, 96, 10)
+            controller.record(ASSIGN, 96, 10, budget.runtime_secs + 0.5)
+        tight = controller.get_budget(ASSIGN, 96, 10)
+        self.assertLessEqual(tight.runtime_secs, 0.5)
+        self.assertLess(0.05, tight.mip_gap)
+        self.assertLessEqual(tight.mip_gap, 0.2)
+
+        # Other problem sizes and operations are unaffected
+        self.assertEqual(SolverBudget(1.0, 0.05), controller.get_budget(ASSIGN, 96, 2))
+        self.assertEqual(SolverBudget(2.0, 0.05), controller.get_budget(FREE, 96, 10))
+
+        # Fast solves relax the budget back to the objective
+        for _ in range(200):
+            controller.record(ASSIGN, 96, 10, 0.1)
+        self.assertEqual(SolverBudget(1.0, 0.05), controller.get_budget(ASSIGN, 96, 10))
+
+    def test_size_bucket(self):
+        self.assertEqual([1, 1, 2, 4, 4, 8, 16], [get_size_bucket(c) for c in [0, 1, 2, 3, 4, 5, 9]])
+
+    def test_ip_allocator_records_solves(self):
+        controller = get_controller({SOLVER_BUDGET_ADAPTIVE: True})
+        allocator = IntegerProgramCpuAllocator(
+            solution_cache=SolutionCache(100, 1024 * 1024), budget_controller=controller)
+        registry = Registry()
+        allocator.set_registry(registry, {})
+
+        w = get_test_workload(str(uuid.uuid4()), 2, STATIC)
+        cpu = allocator.assign_threads(get_no_usage_threads_request(get_cpu(), [w])).get_cpu()
+        allocator.free_threads(get_no_usage_threads_request(cpu, [w]))
+
+        allocator.report_metrics({})
+        tags = {"operation": ASSIGN, "threads": "16", "workloads": "2"}
+        self.assertTrue(gauge_value_equals(registry, SOLVER_DURATION_SAMPLE_COUNT, 1, tags))
+        self.assertTrue(gauge_value_equals(registry, SOLVER_BUDGET_RUNTIME, 1.0, tags))
+        tags = {"operation": FREE, "threads": "16", "workloads": "1"}
+        self.assertTrue(gauge_value_equals(registry, SOLVER_DURATION_SAMPLE_COUNT, 1, tags))
@@ -0,0 +1,88 @@
+import logging
+import os
+import signal
+import time
+import unittest
+from concurrent.futures.process import BrokenProcessPool
+
+from tests.utils import config_logs
+from titus_isolate.allocate.spawn_pool import SpawnPool
+
+config_logs(logging.DEBUG)
+
+
+def get_pid() -> int:
+    return os.getpid()
+
+
+def square(x: int) -> int:
+    return x * x
+
+
+def divide(x: int, y: int) -> float:
+    return x / y
+
+
+def sleep(secs: float) -> int:
+    time.sleep(secs)
+    return os.getpid()
+
+
+def fail():
+    raise RuntimeError("Failed to start")
+
+
+class TestSpawnPool(unittest.TestCase):
+
+    def test_map(self):
+        pool = SpawnPool(2)
+        try:
+            self.assertEqual([x * x for x in range(5)], pool.map(square, [(x,) for x in range(5)]))
+            with self.assertRaises(ZeroDivisionError):
+                pool.map(divide, [(1, 1), (1, 0), (2, 1)])
+            self.assertEqual(2.0, pool.submit(divide, 2, 1).result())
+            self.assertFalse(os.getpid() in pool.get_pids())
+        finally:
+            pool.shutdown()
+
+    def test_dead_worker_only_fails_its_task(self):
+        pool = SpawnPool(2)
+        try:
+            pids = pool.get_pids()
+            self.assertEqual(pids, set(pool.map(get_pid, [(), ()])))
+            killed = pool.submit(sleep, 5)
+            running = pool.submit(sleep, 0.5)
+            time.sleep(0.2)
+            os.kill(min(pids), signal.SIGKILL)
+
+            results = []
+            for pending in [killed, running]:
+                try:
+                    results.append(pending.result())
+                except BrokenProcessPool:
+                    results.append(None)
+            self.assertEqual(1, results.count(None))
+            self.assertIn(max(pids), results)
+
+            # The dead worker was replaced
+            self.assertEqual(2, len(pool.get_pids()))
+            self.assertEqual(1, len(pool.get_pids() & pids))
+            self.assertFalse(pool.is_broken())
+            self.assertEqual([4, 9], pool.map(square, [(2,), (3,)]))
+        finally:
+            pool.shutdown(wait=False)
+
+    def test_failing_initializer_breaks_the_pool(self):
+        pool = SpawnPool(1, fail)
+        try:
+            with self.assertRaises(BrokenProcessPool):
+                pool.submit(get_pid).result()
+            self.assertTrue(pool.is_broken())
+        finally:
+            pool.shutdown(wait=False)
+
+    def test_no_tasks_after_shutdown(self):
+        pool = SpawnPool(1)
+        pool.shutdown()
+        with self.assertRaises(RuntimeError):
+            pool.submit(get_pid)
@@ -0,0 +1,208 @@
+import json
+import logging
+import threading
+import time
+import unittest
+
+from titus_isolate.api.testing import set_testing
+
+set_testing()
+
+from tests.config.test_property_provider import TestPropertyProvider
+from tests.utils import config_logs, get_test_workload, get_no_usage_threads_request
+from titus_isolate.allocate.allocate_response import deserialize_response
+from titus_isolate.allocate.allocate_threads_request import AllocateThreadsRequest
+from titus_isolate.allocate.constants import TIME_LIMITED
+from titus_isolate.allocate.greedy_cpu_allocator import GreedyCpuAllocator
+from titus_isolate.allocate.packed import PACKED_CONTENT_TYPE, encode_allocate_request, decode_response
+from titus_isolate.api import solve
+from titus_isolate.api.result_cache import ResultCache, RESULT_CACHE, HIT, MISS, COALESCED, \
+    get_problem_key, get_problem
+from titus_isolate.api.solve import app, set_cpu_allocators
+from titus_isolate.api.solver_pool import ASSIGN_THREADS, FREE_THREADS, DeadlineExceededException, solve_request
+from titus_isolate.config.config_manager import ConfigManager
+from titus_isolate.event.constants import STATIC, BURST
+from titus_isolate.model.processor.config import get_cpu
+from titus_isolate.utils import set_config_manager
+
+config_logs(logging.DEBUG)
+set_config_manager(ConfigManager(TestPropertyProvider({})))
+
+
+def get_request(cpu, workloads, cpu_usage=None) -> AllocateThreadsRequest:
+    return AllocateThreadsRequest(
+        cpu=cpu,
+        workload_id=workloads[-1].get_id(),
+        workloads={w.get_id(): w for w in workloads},
+        cpu_usage={} if cpu_usage is None else cpu_usage,
+        mem_usage={},
+        net_recv_usage={},
+        net_trans_usage={},
+        disk_usage={},
+        metadata={})
+
+
+def get_placed_request(ids, thread_counts):
+    """
+    Returns a request adding the last workload, with the others already placed.
+    """
+    allocator = GreedyCpuAllocator()
+    workloads = [get_test_workload(w_id, count, STATIC) for w_id, count in zip(ids, thread_counts)]
+    cpu = get_cpu()
+    for i in range(len(workloads) - 1):
+        cpu = allocator.assign_threads(get_no_usage_threads_request(cpu, workloads[:i + 1])).get_cpu()
+    return get_no_usage_threads_request(cpu, workloads)
+
+
+class TestResultCache(unittest.TestCase):
+
+    def test_problem_key(self):
+        def get_key(request, operation=ASSIGN_THREADS):
+            return get_problem_key(operation, "greedy", get_problem(operation, request.to_dict(), False), 0.5)[0]
+
+        request = get_placed_request(["a", "b"], [2, 4])
+        json_problem = get_problem(ASSIGN_THREADS, request.to_dict(), False)
+        key, labels = get_problem_key(ASSIGN_THREADS, "greedy", json_problem, 0.5)
+        self.assertEqual(["a", "b"], labels)
+
+        # Packed requests have the same key as JSON requests
+        packed_problem = get_problem(ASSIGN_THREADS, encode_allocate_request(request), True)
+        self.assertEqual((key, labels), get_problem_key(ASSIGN_THREADS, "greedy", packed_problem, 0.5))
+
+        # Only the ids differ
+        self.assertEqual(key, get_key(get_placed_request(["x", "y"], [2, 4])))
+        self.assertNotEqual(key, get_key(get_placed_request(["a", "b"], [2, 3])))
+        self.assertNotEqual(key, get_key(get_placed_request(["a", "b"], [2, 4]), FREE_THREADS))
+
+        # Usage is compared in buckets
+        w = get_test_workload("a", 2, BURST)
+        key = get_key(get_request(get_cpu(), [w], {"a": [0.1, 0.9]}))
+        self.assertEqual(key, get_key(get_request(get_cpu(), [w], {"a": [0.7, float("nan")]})))
+        self.assertNotEqual(key, get_key(get_request(get_cpu(), [w], {"a": [1.1]})))
+        self.assertNotEqual(key, get_key(get_request(get_cpu(), [w])))
+
+    def test_hits_are_mapped_onto_request_ids(self):
+        allocator = GreedyCpuAllocator()
+        set_cpu_allocators(allocator, allocator, allocator)
+        solve.result_cache = ResultCache(16, 0.5)
+        client = app.test_client()
+        try:
+            request = get_placed_request(["a", "b"], [2, 4])
+            response = client.put(
+                "/assign_threads", data=json.dumps(request.to_dict()), content_type="application/json")
+            self.assertEqual(200, response.status_code)
+            self.assertNotIn(RESULT_CACHE, response.json["metadata"])
+
+            request = get_placed_request(["x", "y"], [2, 4])
+            expected = allocator.assign_threads(request.copy())
+            response = client.put(
+                "/assign_threads", data=json.dumps(request.to_dict()), content_type="application/json")
+            self.assertEqual(200, response.status_code)
+            response = deserialize_response(response.headers, response.json)
+            self.assertEqual(HIT, response.get_metadata()[RESULT_CACHE])
+            self.assertEqual(allocator.get_name(), response.get_metadata()["cpu_allocator"])
+            self.assertEqual(expected.get_cpu().to_dict(), response.get_cpu().to_dict())
+            self.assertEqual(
+                [w.to_dict() for w in expected.get_workload_allocations()],
+                [w.to_dict() for w in response.get_workload_allocations()])
+
+            # Packed requests share the results of JSON requests
+            request = get_placed_request(["m", "n"], [2, 4])
+            response = client.put(
+                "/assign_threads", data=encode_allocate_request(request), content_type=PACKED_CONTENT_TYPE)
+            self.assertEqual(200, response.status_code)
+            response = decode_response(response.headers, response.get_data())
+            self.assertEqual(HIT, response.get_metadata()[RESULT_CACHE])
+            self.assertEqual(6, len(response.get_cpu().get_claimed_threads()))
+            self.assertEqual(4, len(response.get_cpu().get_workload_thread_ids("n")))
+
+            self.assertEqual(2, solve.result_cache.get_hit_count())
+            self.assertEqual(1, solve.result_cache.get_miss_count())
+            self.assertEqual(1, solve.result_cache.get_size())
+        finally:
+            solve.result_cache = None
+
+    def test_identical_problems_are_solved_once(self):
+        allocator = GreedyCpuAllocator()
+        cache = ResultCache(16, 0.5)
+        solve_count = []
+
+        def solve_slowly(body):
+            solve_count.append(1)
+            time.sleep(0.2)
+            return solve_request(allocator, ASSIGN_THREADS, body, False)
+
+        results = []
+
+        def solve_cached(ids):
+            body = get_placed_request(ids, [2, 4]).to_dict()
+            result = cache.solve(ASSIGN_THREADS, allocator.get_name(), body, False, lambda: solve_slowly(body))
+            results.append((ids, result))
+
+        threads = [threading.Thread(target=solve_cached, args=([str(i), "w" + str(i)],)) for i in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(1, len(solve_count))
+        self.assertEqual(1, cache.get_miss_count())
+        self.assertEqual(3, cache.get_coalesced_count())
+        for ids, result in results:
+            cpu = deserialize_response({}, result).get_cpu()
+            self.assertEqual(4, len(cpu.get_workload_thread_ids(ids[1])))
+            self.assertIn(result["metadata"].get(RESULT_CACHE, MISS), [MISS, COALESCED])
+
+    def test_time_limited_solves_are_not_cached(self):
+        allocator = GreedyCpuAllocator()
+        cache = ResultCache(16, 0.5)
+        solve_count = []
+
+        def solve_time_limited(body):
+            solve_count.append(1)
+            time.sleep(0.2)
+            result = solve_request(allocator, ASSIGN_THREADS, body, False)
+            result["metadata"][TIME_LIMITED] = True
+            return result
+
+        def solve_cached(ids):
+            body = get_placed_request(ids, [2, 4]).to_dict()
+            return cache.solve(ASSIGN_THREADS, allocator.get_name(), body, False, lambda: solve_time_limited(body))
+
+        # Identical requests in flight still share the solve
+        threads = [threading.Thread(target=solve_cached, args=([str(i), "w" + str(i)],)) for i in range(3)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(1, len(solve_count))
+        self.assertEqual(2, cache.get_coalesced_count())
+        self.assertEqual(0, cache.get_size())
+
+        result = solve_cached(["a", "b"])
+        self.assertTrue(result["metadata"][TIME_LIMITED])
+        self.assertEqual(2, len(solve_count))
+        self.assertEqual(0, cache.get_hit_count())
+        self.assertEqual(0, cache.get_size())
+
+    def test_waiting_ends_at_the_deadline(self):
+        allocator = GreedyCpuAllocator()
+        cache = ResultCache(16, 0.5)
+        body = get_placed_request(["a", "b"], [2, 4]).to_dict()
+
+        def solve_slowly():
+            time.sleep(0.5)
+            return solve_request(allocator, ASSIGN_THREADS, body, False)
+
+        leading = threading.Thread(target=lambda: cache.solve(ASSIGN_THREADS, allocator.get_name(), body, False,
+                                                              solve_slowly))
+        leading.start()
+        while cache.get_miss_count() == 0:
+            time.sleep(0.01)
+
+        start_time = time.time()
+        with self.assertRaises(DeadlineExceededException):
+            cache.solve(ASSIGN_THREADS, allocator.get_name(), body, False, solve_slowly, time.time() + 0.2)
+        self.assertLess(time.time() - start_time, 0.4)
+        leading.join()
+        self.assertEqual(0, cache.get_coalesced_count())
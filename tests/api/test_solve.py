@@ -8,6 +8,8 @@ import unittest
 import pytest
 
 from titus_isolate.allocate.allocate_response import deserialize_response
+from titus_isolate.allocate.content_encoding import GZIP, compress, decompress
+from titus_isolate.allocate.packed import PACKED_CONTENT_TYPE, encode_allocate_request, decode_response
 from titus_isolate.allocate.utils import parse_cpu
 from titus_isolate.api.testing import set_testing
 from titus_isolate.model.legacy_workload import deserialize_legacy_workload
@@ -15,7 +17,8 @@ from titus_isolate.model.legacy_workload import deserialize_legacy_workload
 set_testing()
 
 from tests.allocate.crashing_allocators import CrashingAllocator
-from tests.utils import get_test_workload, config_logs, get_no_usage_threads_request
+from tests.utils import get_test_workload, config_logs, get_no_usage_threads_request, \
+    get_no_usage_threads_batch_request
 from titus_isolate import log
 from titus_isolate.allocate.greedy_cpu_allocator import GreedyCpuAllocator
 from titus_isolate.api.solve import app, set_cpu_allocators
@@ -119,6 +122,80 @@ class TestStatus(unittest.TestCase):
         log.info("cpu_out_1: {}".format(cpu_out_1))
         self.assertEqual(cpu_out_0.to_dict(), cpu_out_1.to_dict())
 
+    def test_packed_assign_threads(self):
+        workload = get_test_workload("a", 2, STATIC)
+        cpu_allocator = GreedyCpuAllocator()
+        self.__set_cpu_allocator(cpu_allocator)
+
+        cpu_out_0 = cpu_allocator.assign_threads(get_no_usage_threads_request(get_cpu(), [workload])).get_cpu()
+
+        request = get_no_usage_threads_request(get_cpu(), [workload])
+        response = self.client.put(
+            "/assign_threads",
+            data=encode_allocate_request(request),
+            content_type=PACKED_CONTENT_TYPE)
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(PACKED_CONTENT_TYPE, response.mimetype)
+
+        cpu_out_1 = decode_response(response.headers, response.data).get_cpu()
+        self.assertEqual(cpu_out_0.to_dict(), cpu_out_1.to_dict())
+
+    def test_assign_threads_batch(self):
+        workloads = [get_test_workload("a", 2, STATIC), get_test_workload("b", 3, STATIC)]
+        cpu_allocator = GreedyCpuAllocator()
+        self.__set_cpu_allocator(cpu_allocator)
+
+        request = get_no_usage_threads_batch_request(get_cpu(), [], workloads)
+        cpu_out_0 = cpu_allocator.assign_threads_batch(request).get_cpu()
+
+        request = get_no_usage_threads_batch_request(get_cpu(), [], workloads)
+        for data, content_type in [(json.dumps(request.to_dict()), 'application/json'),
+                                   (encode_allocate_request(request), PACKED_CONTENT_TYPE)]:
+            response = self.client.put("/assign_threads_batch", data=data, content_type=content_type)
+            self.assertEqual(200, response.status_code)
+
+            if content_type == PACKED_CONTENT_TYPE:
+                cpu_out_1 = decode_response(response.headers, response.data).get_cpu()
+            else:
+                cpu_out_1 = deserialize_response(response.headers, response.json).get_cpu()
+            self.assertEqual(cpu_out_0.to_dict(), cpu_out_1.to_dict())
+            self.assertEqual(5, len(cpu_out_1.get_claimed_threads()))
+
+        self.__set_cpu_allocator(CrashingAllocator())
+        response = self.client.put("/assign_threads_batch")
+        self.assertEqual(500, response.status_code)
+
+    def test_compressed_assign_threads(self):
+        workload = get_test_workload("a", 2, STATIC)
+        cpu_allocator = GreedyCpuAllocator()
+        self.__set_cpu_allocator(cpu_allocator)
+
+        cpu = get_cpu(2, 16, 2)
+        cpu_out_0 = cpu_allocator.assign_threads(get_no_usage_threads_request(copy.deepcopy(cpu), [workload])).get_cpu()
+
+        request = get_no_usage_threads_request(copy.deepcopy(cpu), [workload])
+        data = compress(json.dumps(request.to_dict()).encode("utf-8"), GZIP)
+        response = self.client.put(
+            "/assign_threads",
+            data=data,
+            content_type='application/json',
+            headers={"Content-Encoding": GZIP, "Accept-Encoding": "gzip"})
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(GZIP, response.headers.get("Content-Encoding"))
+        self.assertIn("total;dur=", response.headers.get("Server-Timing"))
+
+        body = json.loads(decompress(response.data, GZIP))
+        cpu_out_1 = deserialize_response(response.headers, body).get_cpu()
+        self.assertEqual(cpu_out_0.to_dict(), cpu_out_1.to_dict())
+
+        response = self.client.put(
+            "/assign_threads",
+            data=data,
+            content_type='application/json',
+            headers={"Content-Encoding": "br"})
+        self.assertEqual(415, response.status_code)
+        self.assertIn(GZIP, response.headers.get("Accept-Encoding"))
+
     @staticmethod
     def __set_cpu_allocator(allocator):
         set_cpu_allocators(allocator, allocator, allocator)
@@ -0,0 +1,302 @@
+import json
+import logging
+import os
+import signal
+import threading
+import time
+import unittest
+from concurrent.futures.process import BrokenProcessPool
+
+import requests
+from spectator import Registry
+from werkzeug.serving import make_server
+
+from titus_isolate.api.testing import set_testing
+
+set_testing()
+
+from tests.allocate.crashing_allocators import DelayedAllocator
+from tests.config.test_property_provider import TestPropertyProvider
+from tests.utils import config_logs, get_test_workload, get_no_usage_threads_request, \
+    get_no_usage_threads_batch_request, gauge_value_equals, counter_value_equals
+from titus_isolate.allocate.allocate_response import deserialize_response
+from titus_isolate.allocate.constants import TITUS_ISOLATE_DEADLINE_HEADER, RETRY_AFTER_HEADER
+from titus_isolate.allocate.fall_back_cpu_allocator import FallbackCpuAllocator
+from titus_isolate.allocate.greedy_cpu_allocator import GreedyCpuAllocator
+from titus_isolate.allocate.packed import PACKED_CONTENT_TYPE, encode_allocate_request, decode_response
+from titus_isolate.allocate.server_timing import SERVER_TIMING_HEADER, TOTAL, PARSE, DESERIALIZE, QUEUE, ALLOCATE, \
+    SERIALIZE, JSONIFY, parse_server_timing
+from titus_isolate.api import solve
+from titus_isolate.api.solve import app, set_cpu_allocators, SolverMetricsReporter
+from titus_isolate.api.solver_pool import SolverPool, SolverPoolOverloadedException, DeadlineExceededException, \
+    ASSIGN_THREADS, ASSIGN_THREADS_BATCH, FREE_THREADS, solve_request, WorkerMetricsReporter
+from titus_isolate.config.config_manager import ConfigManager
+from titus_isolate.event.constants import STATIC
+from titus_isolate.metrics.constants import SOLVER_POOL_REJECTED_COUNT, SOLVER_POOL_SOLVE_DURATION, \
+    SOLVER_ASSIGN_THREADS_DURATION, PRIMARY_ASSIGN_COUNT
+from titus_isolate.model.processor.config import get_cpu
+from titus_isolate.utils import set_config_manager
+
+config_logs(logging.DEBUG)
+set_config_manager(ConfigManager(TestPropertyProvider({})))
+
+
+def get_greedy_allocators():
+    allocator = GreedyCpuAllocator()
+    return allocator, allocator, allocator
+
+
+def get_slow_allocators():
+    allocator = DelayedAllocator(GreedyCpuAllocator(), 0.5)
+    return allocator, allocator, allocator
+
+
+class TestSolverPool(unittest.TestCase):
+
+    def test_solve_matches_in_process(self):
+        pool = SolverPool(2, 4, get_greedy_allocators)
+        registry = Registry()
+        pool.set_registry(registry, {})
+
+        w_a = get_test_workload("a", 2, STATIC)
+        w_b = get_test_workload("b", 4, STATIC)
+        allocator = GreedyCpuAllocator()
+        try:
+            request = get_no_usage_threads_request(get_cpu(), [w_a])
+            expected = solve_request(allocator, ASSIGN_THREADS, request.to_dict(), False)
+            self.assertEqual(expected, pool.solve(ASSIGN_THREADS, request.to_dict(), False))
+
+            packed = encode_allocate_request(request)
+            expected = solve_request(allocator, ASSIGN_THREADS, packed, True)
+            self.assertEqual(expected, pool.solve(ASSIGN_THREADS, packed, True))
+
+            cpu = allocator.assign_threads(request).get_cpu()
+            request = get_no_usage_threads_batch_request(cpu, [w_a], [w_b])
+            expected = solve_request(allocator, ASSIGN_THREADS_BATCH, request.to_dict(), False)
+            self.assertEqual(expected, pool.solve(ASSIGN_THREADS_BATCH, request.to_dict(), False))
+
+            request = get_no_usage_threads_request(cpu, [w_a])
+            result = pool.solve(FREE_THREADS, request.to_dict(), False)
+            self.assertEqual(0, len(deserialize_response({}, result).get_cpu().get_claimed_threads()))
+
+            self.assertEqual(0, pool.get_in_flight())
+            self.assertEqual(4, registry.distribution_summary(
+                SOLVER_POOL_SOLVE_DURATION, {"operation": ASSIGN_THREADS}).count() +
+                registry.distribution_summary(SOLVER_POOL_SOLVE_DURATION, {"operation": FREE_THREADS}).count() +
+                registry.distribution_summary(
+                    SOLVER_POOL_SOLVE_DURATION, {"operation": ASSIGN_THREADS_BATCH}).count())
+        finally:
+            self.assertTrue(pool.drain(5))
+
+    def test_overload_and_drain(self):
+        pool = SolverPool(1, 0, get_slow_allocators)
+        registry = Registry()
+        pool.set_registry(registry, {})
+
+        body = get_no_usage_threads_request(get_cpu(), [get_test_workload("a", 2, STATIC)]).to_dict()
+        results = []
+        solving = threading.Thread(target=lambda: results.append(pool.solve(ASSIGN_THREADS, body, False)))
+        solving.start()
+        while pool.get_in_flight() == 0:
+            time.sleep(0.01)
+
+        # The only worker is busy and there is no queue
+        with self.assertRaises(SolverPoolOverloadedException):
+            pool.solve(ASSIGN_THREADS, body, False)
+
+        # Draining waits for the request in flight and rejects new ones
+        self.assertTrue(pool.drain(5))
+        solving.join()
+        self.assertEqual(1, len(results))
+        self.assertTrue(pool.is_draining())
+        with self.assertRaises(SolverPoolOverloadedException):
+            pool.solve(ASSIGN_THREADS, body, False)
+
+        pool.report_metrics({})
+        self.assertEqual(2, pool.get_rejected_count())
+        self.assertTrue(gauge_value_equals(registry, SOLVER_POOL_REJECTED_COUNT, 2))
+
+    def test_dead_worker_is_replaced(self):
+        allocator = GreedyCpuAllocator()
+        set_cpu_allocators(allocator, allocator, allocator)
+        pool = SolverPool(1, 1, get_slow_allocators)
+        solve.solver_pool = pool
+        client = app.test_client()
+
+        body = get_no_usage_threads_request(get_cpu(), [get_test_workload("a", 2, STATIC)]).to_dict()
+        errors = []
+
+        def solve_and_fail():
+            try:
+                pool.solve(ASSIGN_THREADS, body, False)
+            except BrokenProcessPool as e:
+                errors.append(e)
+
+        try:
+            # Requests in flight fail when their worker dies
+            solving = threading.Thread(target=solve_and_fail)
+            solving.start()
+            while pool.get_in_flight() == 0:
+                time.sleep(0.01)
+            time.sleep(0.1)
+            pid = pool.get_worker_pids().pop()
+            os.kill(pid, signal.SIGKILL)
+            solving.join()
+            self.assertEqual(1, len(errors))
+            self.assertEqual(1, pool.get_worker_exit_count())
+            self.assertNotIn(pid, pool.get_worker_pids())
+            self.assertTrue(pool.is_healthy())
+            self.assertEqual(200, client.get('/').status_code)
+
+            # A worker dying while idle is replaced before it is handed the next request
+            self.assertIsNotNone(pool.solve(ASSIGN_THREADS, body, False))
+            pid = pool.get_worker_pids().pop()
+            os.kill(pid, signal.SIGKILL)
+            time.sleep(0.1)
+            self.assertIsNotNone(pool.solve(ASSIGN_THREADS, body, False))
+            self.assertNotIn(pid, pool.get_worker_pids())
+            self.assertEqual(1, pool.get_worker_exit_count())
+        finally:
+            solve.solver_pool = None
+            pool.drain(5)
+
+    def test_solve_service_with_pool(self):
+        allocator = GreedyCpuAllocator()
+        set_cpu_allocators(allocator, allocator, allocator)
+        solve.solver_pool = SolverPool(2, 0, get_greedy_allocators)
+        client = app.test_client()
+
+        request = get_no_usage_threads_request(get_cpu(), [get_test_workload("a", 2, STATIC)])
+        expected = allocator.assign_threads(request.copy()).get_cpu()
+        try:
+            response = client.put(
+                "/assign_threads", data=json.dumps(request.to_dict()), content_type="application/json")
+            self.assertEqual(200, response.status_code)
+            cpu = deserialize_response(response.headers, response.json).get_cpu()
+            self.assertEqual(expected.to_dict(), cpu.to_dict())
+
+            response = client.put(
+                "/assign_threads", data=encode_allocate_request(request), content_type=PACKED_CONTENT_TYPE)
+            self.assertEqual(200, response.status_code)
+            cpu = decode_response(response.headers, response.get_data()).get_cpu()
+            self.assertEqual(expected.to_dict(), cpu.to_dict())
+
+            self.assertEqual(200, client.get("/").status_code)
+            solve.solver_pool.drain(5)
+            self.assertEqual(503, client.get("/").status_code)
+            response = client.put(
+                "/assign_threads", data=json.dumps(request.to_dict()), content_type="application/json")
+            self.assertEqual(429, response.status_code)
+        finally:
+            solve.solver_pool = None
+
+    def test_deadline(self):
+        allocator = GreedyCpuAllocator()
+        set_cpu_allocators(allocator, allocator, allocator)
+        client = app.test_client()
+        body = json.dumps(get_no_usage_threads_request(get_cpu(), [get_test_workload("a", 2, STATIC)]).to_dict())
+
+        with self.assertRaises(DeadlineExceededException):
+            solve_request(allocator, ASSIGN_THREADS, json.loads(body), False, time.time())
+
+        def put(deadline):
+            headers = {TITUS_ISOLATE_DEADLINE_HEADER: str(deadline)}
+            return client.put("/assign_threads", data=body, content_type="application/json", headers=headers)
+
+        self.assertEqual(200, put(time.time() + 5).status_code)
+
+        # The caller has given up, and is not asked to back off
+        response = put(time.time() + 0.01)
+        self.assertEqual(429, response.status_code)
+        self.assertNotIn(RETRY_AFTER_HEADER, response.headers)
+        self.assertEqual(1, solve.deadline_dropped_count)
+
+        # An overloaded pool asks callers to back off
+        solve.solver_pool = SolverPool(1, 0, get_greedy_allocators)
+        try:
+            solve.solver_pool.drain(5)
+            response = put(time.time() + 5)
+            self.assertEqual(429, response.status_code)
+            self.assertEqual(str(solve.overload_retry_after_secs), response.headers[RETRY_AFTER_HEADER])
+        finally:
+            solve.solver_pool = None
+
+    def test_concurrent_requests_are_shed(self):
+        allocator = GreedyCpuAllocator()
+        set_cpu_allocators(allocator, allocator, allocator)
+        solve.solver_pool = SolverPool(1, 1, get_slow_allocators)
+        server = make_server("127.0.0.1", 0, app, threaded=True)
+        serving = threading.Thread(target=server.serve_forever)
+        serving.start()
+
+        url = "http://127.0.0.1:{}/assign_threads".format(server.server_port)
+        body = json.dumps(get_no_usage_threads_request(get_cpu(), [get_test_workload("a", 2, STATIC)]).to_dict())
+        status_codes = []
+
+        def put():
+            response = requests.put(url, data=body, headers={"Content-Type": "application/json"}, timeout=10)
+            status_codes.append(response.status_code)
+
+        try:
+            # One request is solved, one waits in the queue and the others are rejected right away
+            threads = [threading.Thread(target=put) for _ in range(4)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            self.assertEqual([200, 200, 429, 429], sorted(status_codes))
+        finally:
+            server.shutdown()
+            serving.join()
+            solve.solver_pool.drain(5)
+            solve.solver_pool = None
+
+    def test_worker_metrics_are_tagged_with_pid(self):
+        registry = Registry()
+        allocator = FallbackCpuAllocator(GreedyCpuAllocator(), GreedyCpuAllocator())
+        reporter = WorkerMetricsReporter((allocator, allocator, allocator))
+        reporter.set_registry(registry, {})
+
+        w = get_test_workload("a", 2, STATIC)
+        allocator.assign_threads(get_no_usage_threads_request(get_cpu(), [w]))
+        reporter.report_metrics({})
+
+        self.assertTrue(counter_value_equals(registry, PRIMARY_ASSIGN_COUNT, 1, {"pid": str(os.getpid())}))
+        self.assertTrue(counter_value_equals(registry, PRIMARY_ASSIGN_COUNT, 0))
+
+    def test_stage_timings(self):
+        allocator = GreedyCpuAllocator()
+        set_cpu_allocators(allocator, allocator, allocator)
+        client = app.test_client()
+        body = json.dumps(get_no_usage_threads_request(get_cpu(), [get_test_workload("a", 2, STATIC)]).to_dict())
+        solve.stage_durations.clear()
+
+        def put():
+            response = client.put("/assign_threads", data=body, content_type="application/json")
+            self.assertEqual(200, response.status_code)
+            return parse_server_timing(response.headers[SERVER_TIMING_HEADER])
+
+        timings = put()
+        self.assertEqual([TOTAL, PARSE, DESERIALIZE, ALLOCATE, SERIALIZE, JSONIFY], list(timings.keys()))
+        self.assertTrue(timings[TOTAL] >= timings[ALLOCATE])
+
+        solve.solver_pool = SolverPool(1, 0, get_greedy_allocators)
+        try:
+            self.assertIn(QUEUE, put())
+        finally:
+            solve.solver_pool.drain(5)
+            solve.solver_pool = None
+
+        solve.server_timing_stages = False
+        try:
+            self.assertEqual([TOTAL], list(put().keys()))
+        finally:
+            solve.server_timing_stages = True
+
+        registry = Registry()
+        reporter = SolverMetricsReporter()
+        reporter.set_registry(registry, {})
+        reporter.report_metrics({})
+        tags = {"pid": str(os.getpid()), "operation": ASSIGN_THREADS, "stage": ALLOCATE}
+        self.assertEqual(3, registry.distribution_summary(SOLVER_ASSIGN_THREADS_DURATION, tags).count())
+        self.assertEqual(0, len(solve.stage_durations))
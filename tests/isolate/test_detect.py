@@ -1,4 +1,5 @@
 import logging
+import random
 import unittest
 import uuid
 
@@ -8,12 +9,33 @@ from titus_isolate.allocate.allocate_threads_request import AllocateThreadsReque
 from titus_isolate.allocate.greedy_cpu_allocator import GreedyCpuAllocator
 from titus_isolate.event.constants import STATIC
 from titus_isolate.allocate.integer_program_cpu_allocator import IntegerProgramCpuAllocator
-from titus_isolate.isolate.detect import get_cross_package_violations, get_shared_core_violations
+from titus_isolate.isolate.detect import get_cross_package_violations, get_shared_core_violations, \
+    get_cross_package_violation_count, get_shared_core_violation_count
 from titus_isolate.model.processor.config import get_cpu
+from titus_isolate.model.processor.utils import get_packages_with_workload
 
 config_logs(logging.DEBUG)
 
 
+def scan_cross_package_violations(cpu):
+    violations = {}
+    for workload_id in cpu.get_workload_ids():
+        packages = get_packages_with_workload(cpu, workload_id)
+        if len(packages) > 1:
+            violations[workload_id] = [p.get_id() for p in packages]
+    return violations
+
+
+def scan_shared_core_violations(cpu):
+    violations = {}
+    for package in cpu.get_packages():
+        for core in package.get_cores():
+            workload_ids = set(w_id for t in core.get_threads() for w_id in t.get_workload_ids())
+            if len(workload_ids) > 1:
+                violations[':'.join([str(package.get_id()), str(core.get_id())])] = workload_ids
+    return violations
+
+
 class TestDetect(unittest.TestCase):
 
     def test_no_cross_package_violation(self):
@@ -85,3 +107,43 @@ class TestDetect(unittest.TestCase):
         violations = get_shared_core_violations(cpu)
         log.info("shared core violations: {}".format(violations))
         self.assertEqual(2, len(violations))
+
+    def test_violations_match_scan(self):
+        random.seed(7)
+        cpu = get_cpu(2, 8, 2)
+        workload_ids = [str(uuid.uuid4()) for _ in range(6)]
+        snapshots = []
+
+        for step in range(500):
+            thread = random.choice(cpu.get_threads())
+            workload_id = random.choice(workload_ids)
+            action = random.random()
+            if action < 0.6:
+                thread.claim(workload_id)
+            elif action < 0.9:
+                thread.free(workload_id)
+            elif action < 0.98:
+                thread.clear()
+            else:
+                cpu.free(workload_id)
+
+            if step % 50 == 0:
+                snapshots.append((cpu.snapshot(), scan_cross_package_violations(cpu), scan_shared_core_violations(cpu)))
+            self.__assert_violations(cpu, scan_cross_package_violations(cpu), scan_shared_core_violations(cpu))
+
+        # Earlier snapshots keep the violations they had when taken
+        for snapshot, cross_package, shared_core in snapshots:
+            self.__assert_violations(snapshot, cross_package, shared_core)
+
+        cpu.clear()
+        self.assertEqual(0, get_cross_package_violation_count(cpu))
+        self.assertEqual(0, get_shared_core_violation_count(cpu))
+
+    def __assert_violations(self, cpu, cross_package, shared_core):
+        self.assertEqual(cross_package, get_cross_package_violations(cpu))
+        self.assertEqual(len(cross_package), get_cross_package_violation_count(cpu))
+
+        violations = get_shared_core_violations(cpu)
+        self.assertEqual(list(shared_core.keys()), list(violations.keys()))
+        self.assertEqual(shared_core, {k: set(v) for k, v in violations.items()})
+        self.assertEqual(len(shared_core), get_shared_core_violation_count(cpu))
@@ -0,0 +1,92 @@
+import logging
+import random
+import unittest
+import uuid
+
+import numpy as np
+
+from tests.utils import config_logs
+from titus_isolate.isolate import balance
+from titus_isolate.isolate.detect import get_cross_package_violation_count, get_shared_core_violation_count
+from titus_isolate.isolate.score import PlacementScorer, get_placement_matrix, is_better_isolated, \
+    get_best_candidate_index
+from titus_isolate.model.processor.config import get_cpu
+
+config_logs(logging.DEBUG)
+
+
+def get_random_cpu(workload_ids):
+    cpu = get_cpu(2, 8, 2)
+    for t in cpu.get_threads():
+        if random.random() < 0.8:
+            t.claim(random.choice(workload_ids))
+        if random.random() < 0.1:
+            t.claim(random.choice(workload_ids))
+    return cpu
+
+
+class TestScore(unittest.TestCase):
+
+    def test_scores_match_detect(self):
+        random.seed(11)
+        workload_ids = [str(uuid.uuid4()) for _ in range(5)]
+        cpus = [get_random_cpu(workload_ids) for _ in range(50)]
+
+        scorer = PlacementScorer(cpus[0])
+        candidates = np.stack([get_placement_matrix(cpu, workload_ids) for cpu in cpus])
+        scores = scorer.score(candidates, current=candidates[0])
+
+        self.assertEqual(50, len(scores))
+        self.assertEqual(0, scores.migration[0])
+        for i, cpu in enumerate(cpus):
+            self.assertEqual(get_cross_package_violation_count(cpu), scores.cross_package[i])
+            self.assertEqual(get_shared_core_violation_count(cpu), scores.shared_core[i])
+            self.assertEqual(
+                sum(len(set(cpu.get_workload_thread_ids(w_id)) ^ set(cpus[0].get_workload_thread_ids(w_id)))
+                    for w_id in workload_ids),
+                scores.migration[i])
+
+        better = is_better_isolated(scorer.score(candidates[0]), scores)
+        for i, cpu in enumerate(cpus):
+            self.assertEqual(balance.has_better_isolation(cpus[0], cpu), better[i])
+
+    def test_llc_spread(self):
+        cpu = get_cpu(2, 2, 2)
+        scorer = PlacementScorer(cpu)
+
+        # One workload per package, then one workload across both packages
+        local = np.zeros((8, 2))
+        local[0:4, 0] = 1
+        local[4:8, 1] = 1
+        spread = np.zeros((8, 2))
+        spread[[0, 4], 0] = 1
+
+        scores = scorer.score(np.stack([local, spread]))
+        self.assertEqual([0, 1], list(scores.llc_spread))
+        self.assertEqual([0, 1], list(scores.cross_package))
+        self.assertEqual([0, 0], list(scores.shared_core))
+        self.assertEqual([0, 0], list(scores.migration))
+
+    def test_best_candidate(self):
+        cpu = get_cpu(2, 2, 2)
+        scorer = PlacementScorer(cpu)
+
+        current = np.zeros((8, 2))
+        current[0:2, 0] = 1
+        shared = current.copy()
+        shared[0, 1] = 1
+        moved = np.zeros((8, 2))
+        moved[2:4, 0] = 1
+        moved[4:6, 1] = 1
+        kept = current.copy()
+        kept[4:6, 1] = 1
+
+        scores = scorer.score(np.stack([shared, moved, kept]), current=current)
+        self.assertEqual(2, get_best_candidate_index(scores))
+
+    def test_invalid_shape(self):
+        scorer = PlacementScorer(get_cpu(2, 2, 2))
+        with self.assertRaises(ValueError):
+            scorer.score(np.zeros((3, 7, 2)))
+        with self.assertRaises(ValueError):
+            scorer.score(np.zeros((3, 8, 2)), current=np.zeros((8, 3)))
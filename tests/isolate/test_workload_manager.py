@@ -247,6 +247,39 @@ class TestWorkloadManager(unittest.TestCase):
             workload_manager.add_workload(w1)
             self.assertEqual(error_count + 1, workload_manager.get_error_count())
 
+    def test_add_workloads(self):
+        for allocator in ALLOCATORS:
+            workloads = [
+                get_test_workload(uuid.uuid4(), 2, STATIC),
+                get_test_workload(uuid.uuid4(), 4, STATIC),
+                get_test_workload(uuid.uuid4(), 1, BURST)]
+
+            cgroup_manager = MockCgroupManager()
+            workload_manager = WorkloadManager(get_cpu(), cgroup_manager, allocator)
+            workload_manager.add_workloads(workloads)
+
+            self.assertEqual(3, workload_manager.get_added_count())
+            self.assertEqual(3, len(workload_manager.get_workloads()))
+            self.__assert_cpu_thread_count(workload_manager.get_cpu(), workloads)
+            self.__assert_container_thread_count(workload_manager.get_cpu(), cgroup_manager, workloads)
+
+            # A single isolation pass
+            for w in workloads:
+                self.assertEqual(1, cgroup_manager.container_update_counts[w.get_id()])
+
+    def test_add_workloads_falls_back_to_single_adds(self):
+        for allocator in LEGACY_ALLOCATORS:
+            w_big = get_test_workload(uuid.uuid4(), DEFAULT_TOTAL_THREAD_COUNT - 2, STATIC)
+            w_small = get_test_workload(uuid.uuid4(), 2, STATIC)
+            w_too_big = get_test_workload(uuid.uuid4(), 4, STATIC)
+
+            workload_manager = WorkloadManager(get_cpu(), MockCgroupManager(), allocator)
+            workload_manager.add_workloads([w_big, w_too_big, w_small])
+
+            self.assertEqual(2, workload_manager.get_added_count())
+            self.assertEqual({w_big.get_id(), w_small.get_id()}, {w.get_id() for w in workload_manager.get_workloads()})
+            self.assertTrue(is_cpu_full(workload_manager.get_cpu()))
+
     def test_is_isolated(self):
         real_allocators = [GreedyCpuAllocator(), IntegerProgramCpuAllocator()]
         for allocator in real_allocators:
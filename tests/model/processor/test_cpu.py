@@ -93,6 +93,114 @@ class TestCpu(unittest.TestCase):
         t_1_0.claim("b")
         self.assertEqual(cpu_x, cpu_y)
 
+    def test_workload_thread_queries(self):
+        cpu = get_cpu()
+        threads = cpu.get_threads()
+
+        threads[0].claim("a")
+        threads[3].claim("a")
+        threads[3].claim("b")
+
+        self.assertEqual({"a", "b"}, cpu.get_workload_ids())
+        self.assertEqual([threads[0].get_id(), threads[3].get_id()], cpu.get_workload_thread_ids("a"))
+        self.assertEqual([threads[3].get_id()], cpu.get_workload_thread_ids("b"))
+        self.assertEqual([], cpu.get_workload_thread_ids("unknown"))
+        self.assertEqual([threads[0], threads[3]], cpu.get_claimed_threads())
+        self.assertEqual(len(threads) - 2, len(cpu.get_empty_threads()))
+
+        w_to_t = cpu.get_workload_ids_to_thread_ids()
+        self.assertEqual([threads[0].get_id(), threads[3].get_id()], w_to_t["a"])
+        self.assertEqual([], w_to_t["unknown"])
+
+        cpu.free("a")
+        self.assertEqual({"b"}, cpu.get_workload_ids())
+        self.assertEqual([threads[3]], cpu.get_claimed_threads())
+
+        cpu.clear()
+        self.assertEqual(0, len(cpu.get_claimed_threads()))
+        self.assertEqual([], threads[3].get_workload_ids())
+
+    def test_claims_survive_construction(self):
+        t0 = Thread(0)
+        t1 = Thread(1)
+        t0.claim("a")
+
+        cpu = Cpu([Package(0, [Core(0, [t0, t1])])])
+        self.assertEqual(["a"], t0.get_workload_ids())
+        self.assertEqual([0], cpu.get_workload_thread_ids("a"))
+
+    def test_fork(self):
+        cpu = get_cpu()
+        cpu.get_threads()[0].claim("a")
+
+        fork = cpu.fork()
+        self.assertEqual(cpu, fork)
+
+        fork.get_threads()[1].claim("b")
+        cpu.free("a")
+        self.assertEqual(set(), cpu.get_workload_ids())
+        self.assertEqual({"a", "b"}, fork.get_workload_ids())
+        self.assertEqual(0, len(cpu.get_claimed_threads()))
+
+    def test_fork_threads_read_the_forked_claims(self):
+        # Sibling threads are numbered apart, as in sysfs, so thread ids and natural indices differ
+        packages = [Package(0, [Core(0, [Thread(0), Thread(2)]), Core(1, [Thread(1), Thread(3)])])]
+        cpu = Cpu(packages)
+        cpu.get_thread(2).claim("a")
+        cpu.get_thread(1).claim("b")
+
+        fork = cpu.fork()
+        self.assertEqual(["a"], fork.get_thread(2).get_workload_ids())
+        self.assertEqual(["b"], fork.get_thread(1).get_workload_ids())
+        self.assertEqual([], fork.get_thread(3).get_workload_ids())
+
+        fork.get_thread(3).claim("c")
+        fork.get_thread(2).free("a")
+        self.assertEqual(["c"], fork.get_thread(3).get_workload_ids())
+        self.assertEqual({"b", "c"}, fork.get_workload_ids())
+        self.assertEqual(["a"], cpu.get_thread(2).get_workload_ids())
+        self.assertEqual({"a", "b"}, cpu.get_workload_ids())
+
+    def test_snapshot(self):
+        cpu = get_cpu()
+        cpu.get_threads()[0].claim("a")
+
+        snapshot = cpu.snapshot()
+        self.assertTrue(snapshot.is_frozen())
+        self.assertFalse(cpu.is_frozen())
+        self.assertEqual(cpu, snapshot)
+        self.assertTrue(snapshot is cpu.snapshot())
+        self.assertTrue(snapshot is snapshot.snapshot())
+        self.assertRaises(ValueError, snapshot.get_threads()[1].claim, "a")
+
+        # Changes to the CPU invalidate the cached snapshot, but leave the old one untouched
+        cpu.get_threads()[1].claim("b")
+        self.assertEqual({"a"}, snapshot.get_workload_ids())
+        self.assertEqual({"a", "b"}, cpu.snapshot().get_workload_ids())
+        self.assertFalse(snapshot is cpu.snapshot())
+
+    def test_assign_placement(self):
+        cpu = get_cpu()
+        cpu.get_threads()[0].claim("stale")
+
+        natural_2_original = cpu.get_natural_indexing_2_original_indexing()
+        thread_count = len(cpu.get_threads())
+        a = [1 if i < 2 else 0 for i in range(thread_count)]
+        b = [1 if i in (1, 2) else 0 for i in range(thread_count)]
+        cpu.assign_placement(["a", "b"], [a, b])
+
+        self.assertEqual({"a", "b"}, cpu.get_workload_ids())
+        self.assertEqual([natural_2_original[0], natural_2_original[1]], cpu.get_workload_thread_ids("a"))
+        self.assertEqual(["a", "b"], cpu.get_thread(natural_2_original[1]).get_workload_ids())
+
+        expected = get_cpu()
+        for t in expected.get_threads()[:2]:
+            t.claim("a")
+        for t in expected.get_threads()[1:3]:
+            t.claim("b")
+        self.assertEqual(expected, cpu)
+        self.assertEqual(hash(expected), hash(cpu))
+
     def test_to_array(self):
         cpu = get_cpu()
         self.__assert_array_structure(cpu, 0)
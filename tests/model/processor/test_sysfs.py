@@ -0,0 +1,115 @@
+import logging
+import os
+import tempfile
+import unittest
+
+from tests.utils import config_logs
+from titus_isolate.model.processor.config import get_cpu
+from titus_isolate.model.processor.sysfs import get_cpu_from_sysfs
+
+config_logs(logging.DEBUG)
+
+
+def to_cpu_list(thread_ids):
+    return ','.join(str(t_id) for t_id in thread_ids)
+
+
+def write(path, value):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(value + '\n')
+
+
+def write_sysfs(root, package_count, cores_per_package, llc_per_package, offline=(), memory_only_node=False):
+    """
+    Writes a fixture sysfs tree whose SMT siblings are numbered adjacently (0-1, 2-3, ...), unlike the layout assumed
+    by config.get_cpu().
+    """
+    cpu_path = os.path.join(root, 'cpu')
+    node_path = os.path.join(root, 'node')
+    cores_per_llc = cores_per_package // llc_per_package
+    thread_count = package_count * cores_per_package * 2
+    online = [t_id for t_id in range(thread_count) if t_id not in offline]
+
+    write(os.path.join(cpu_path, 'online'), to_cpu_list(online))
+    for t_id in range(thread_count):
+        package_id = t_id // (cores_per_package * 2)
+        core_id = (t_id // 2) % cores_per_package
+        llc_start = (t_id // (cores_per_llc * 2)) * cores_per_llc * 2
+
+        thread_path = os.path.join(cpu_path, 'cpu{}'.format(t_id))
+        write(os.path.join(thread_path, 'topology', 'physical_package_id'), str(package_id))
+        write(os.path.join(thread_path, 'topology', 'core_id'), str(core_id))
+        write(os.path.join(thread_path, 'topology', 'thread_siblings_list'), '{}-{}'.format(t_id & ~1, t_id | 1))
+        write(os.path.join(thread_path, 'cache', 'index0', 'level'), '1')
+        write(os.path.join(thread_path, 'cache', 'index0', 'shared_cpu_list'), '{}-{}'.format(t_id & ~1, t_id | 1))
+        write(os.path.join(thread_path, 'cache', 'index3', 'level'), '3')
+        write(os.path.join(thread_path, 'cache', 'index3', 'shared_cpu_list'),
+              '{}-{}'.format(llc_start, llc_start + cores_per_llc * 2 - 1))
+
+    for p_id in range(package_count):
+        start = p_id * cores_per_package * 2
+        write(os.path.join(node_path, 'node{}'.format(p_id), 'cpulist'),
+              '{}-{}'.format(start, start + cores_per_package * 2 - 1))
+    if memory_only_node:
+        write(os.path.join(node_path, 'node{}'.format(package_count), 'cpulist'), '')
+
+    return cpu_path, node_path
+
+
+class TestSysfs(unittest.TestCase):
+
+    def test_real_siblings(self):
+        with tempfile.TemporaryDirectory() as root:
+            cpu = get_cpu_from_sysfs(*write_sysfs(root, 2, 4, 2))
+
+        self.assertEqual(2, len(cpu.get_packages()))
+        self.assertEqual(8, len(cpu.get_cores()))
+        self.assertEqual(16, len(cpu.get_threads()))
+        for core in cpu.get_cores():
+            t0, t1 = [t.get_id() for t in core.get_threads()]
+            self.assertEqual(t0 + 1, t1)
+            self.assertEqual(0, t0 % 2)
+
+        self.assertEqual([0, 1, 2, 3, 4, 5, 6, 7], [t.get_id() for t in cpu.get_packages()[0].get_threads()])
+        self.assertEqual(list(range(16)), [t.get_id() for t in cpu.get_threads()])
+
+    def test_llc_groups_and_numa_nodes(self):
+        with tempfile.TemporaryDirectory() as root:
+            cpu = get_cpu_from_sysfs(*write_sysfs(root, 2, 4, 2, memory_only_node=True))
+
+        self.assertEqual(((0, 1, 2, 3), (4, 5, 6, 7), (8, 9, 10, 11), (12, 13, 14, 15)), cpu.get_llc_groups())
+        self.assertEqual({0: tuple(range(8)), 1: tuple(range(8, 16))}, dict(cpu.get_numa_nodes()))
+
+        # Forks carry the cache topology
+        self.assertEqual(cpu.get_llc_groups(), cpu.fork().get_llc_groups())
+
+    def test_offline_threads(self):
+        with tempfile.TemporaryDirectory() as root:
+            cpu = get_cpu_from_sysfs(*write_sysfs(root, 1, 2, 1, offline=(3,)))
+
+        self.assertEqual([0, 1, 2], [t.get_id() for t in cpu.get_threads()])
+        self.assertEqual([[0, 1], [2]], [[t.get_id() for t in c.get_threads()] for c in cpu.get_cores()])
+        self.assertEqual(((0, 1, 2),), cpu.get_llc_groups())
+
+    def test_missing_cache_and_node_information(self):
+        with tempfile.TemporaryDirectory() as root:
+            cpu_path, _ = write_sysfs(root, 2, 2, 1)
+            for t_id in range(8):
+                for index in ['index0', 'index3']:
+                    index_path = os.path.join(cpu_path, 'cpu{}'.format(t_id), 'cache', index)
+                    for name in os.listdir(index_path):
+                        os.remove(os.path.join(index_path, name))
+                    os.rmdir(index_path)
+            cpu = get_cpu_from_sysfs(cpu_path, os.path.join(root, 'does_not_exist'))
+
+        # Both default to one group per package
+        self.assertEqual(((0, 1, 2, 3), (4, 5, 6, 7)), cpu.get_llc_groups())
+        self.assertEqual({0: (0, 1, 2, 3), 1: (4, 5, 6, 7)}, dict(cpu.get_numa_nodes()))
+
+    def test_synthetic_cpu_defaults(self):
+        cpu = get_cpu()
+        self.assertEqual(len(cpu.get_packages()), len(cpu.get_llc_groups()))
+        self.assertEqual(
+            tuple(sorted(t.get_id() for t in cpu.get_packages()[0].get_threads())),
+            cpu.get_numa_nodes()[0])
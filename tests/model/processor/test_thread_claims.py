@@ -0,0 +1,131 @@
+import logging
+import unittest
+
+from tests.utils import config_logs
+from titus_isolate.model.processor.thread_claims import ThreadClaims, iter_bits
+from titus_isolate.model.processor.workload_ids import get_workload_id_registry
+
+config_logs(logging.DEBUG)
+
+
+class TestThreadClaims(unittest.TestCase):
+
+    def test_invalid_thread_count(self):
+        with self.assertRaises(ValueError):
+            ThreadClaims(0)
+
+    def test_iter_bits(self):
+        self.assertEqual([], list(iter_bits(0)))
+        self.assertEqual([0, 2, 5], list(iter_bits(0b100101)))
+        self.assertEqual([191], list(iter_bits(1 << 191)))
+
+    def test_claim_and_free(self):
+        claims = ThreadClaims(4)
+        claims.claim(1, "a")
+        claims.claim(1, "a")
+        claims.claim(1, "b")
+        claims.claim(3, "a")
+
+        self.assertEqual(["a", "b"], claims.get_workload_ids(1))
+        self.assertEqual(0b1010, claims.get_mask("a"))
+        self.assertEqual(0b0010, claims.get_mask("b"))
+        self.assertEqual(0b1010, claims.get_claimed_mask())
+        self.assertEqual(0b0101, claims.get_empty_mask())
+        self.assertTrue(claims.has_workload(3, "a"))
+        self.assertFalse(claims.has_workload(3, "b"))
+
+        claims.free(1, "a")
+        self.assertEqual(["b"], claims.get_workload_ids(1))
+        self.assertEqual(0b1000, claims.get_mask("a"))
+        self.assertTrue(claims.is_claimed(1))
+
+        claims.free(1, "b")
+        self.assertFalse(claims.is_claimed(1))
+        self.assertEqual(0, claims.get_mask("b"))
+        self.assertEqual({"a"}, claims.get_all_workload_ids())
+
+    def test_free_workload(self):
+        claims = ThreadClaims(8)
+        for i in [0, 2, 4]:
+            claims.claim(i, "a")
+        claims.claim(4, "b")
+
+        claims.free_workload("a")
+        self.assertEqual(0, claims.get_mask("a"))
+        self.assertEqual(["b"], claims.get_workload_ids(4))
+        self.assertEqual(0b10000, claims.get_claimed_mask())
+
+        claims.free_workload("unknown")
+        self.assertEqual(0b10000, claims.get_claimed_mask())
+
+    def test_clear(self):
+        claims = ThreadClaims(2)
+        claims.claim(0, "a")
+        claims.claim(0, "b")
+        claims.claim(1, "b")
+
+        claims.clear(0)
+        self.assertEqual([], claims.get_workload_ids(0))
+        self.assertEqual({"b": [1]}, dict(claims.get_workload_ids_to_indices()))
+
+        claims.clear_all()
+        self.assertEqual(0, claims.get_claimed_mask())
+        self.assertEqual(set(), claims.get_all_workload_ids())
+
+    def test_assign_matches_claims(self):
+        packages = [[0, 1, 2, 3], [4, 5, 6, 7]]
+        cores = [[0, 1], [2, 3], [4, 5], [6, 7]]
+        registry = get_workload_id_registry()
+        a, b, c = [registry.intern(w_id) for w_id in ["a", "b", "c"]]
+        handles_per_thread = [[a], [a, b, a], [], [c], [c], [], [b], []]
+
+        claimed = ThreadClaims(8, packages, cores)
+        for i, handles in enumerate(handles_per_thread):
+            for handle in handles:
+                claimed.claim_handle(i, handle)
+
+        # Existing claims are replaced, on a fork without touching the claims it was forked from
+        original = ThreadClaims(8, packages, cores)
+        original.claim(7, "d")
+        assigned = original.fork()
+        assigned.assign(handles_per_thread)
+
+        self.assertTrue(assigned.has_same_claims(claimed))
+        self.assertEqual(["a", "b"], assigned.get_workload_ids(1))
+        self.assertEqual(claimed.get_claimed_mask(), assigned.get_claimed_mask())
+        self.assertEqual(claimed.get_cross_package_handles(), assigned.get_cross_package_handles())
+        self.assertEqual({0}, assigned.get_shared_core_indices())
+        self.assertEqual({"d"}, original.get_all_workload_ids())
+
+        original.freeze()
+        self.assertRaises(ValueError, original.assign, handles_per_thread)
+
+    def test_fork_is_copy_on_write(self):
+        claims = ThreadClaims(4)
+        claims.claim(0, "a")
+
+        fork = claims.fork()
+        fork.claim(1, "b")
+        claims.free(0, "a")
+
+        self.assertEqual(0b0000, claims.get_claimed_mask())
+        self.assertEqual(set(), claims.get_all_workload_ids())
+        self.assertEqual(["a"], fork.get_workload_ids(0))
+        self.assertEqual(["b"], fork.get_workload_ids(1))
+        self.assertEqual(0b0011, fork.get_claimed_mask())
+
+    def test_frozen_claims_reject_writes(self):
+        claims = ThreadClaims(2)
+        claims.claim(0, "a")
+        claims.freeze()
+
+        self.assertRaises(ValueError, claims.claim, 1, "a")
+        self.assertRaises(ValueError, claims.free, 0, "a")
+        self.assertRaises(ValueError, claims.clear, 0)
+        self.assertRaises(ValueError, claims.clear_all)
+
+        # Forks of frozen claims are writable
+        fork = claims.fork()
+        fork.claim(1, "a")
+        self.assertEqual(0b11, fork.get_mask("a"))
+        self.assertEqual(0b01, claims.get_mask("a"))
@@ -0,0 +1,45 @@
+import logging
+import unittest
+
+from tests.utils import config_logs
+from titus_isolate.model.processor.config import get_cpu
+from titus_isolate.model.processor.utils import get_placement_vector
+
+config_logs(logging.DEBUG)
+
+
+class TestTopologyIndex(unittest.TestCase):
+
+    def test_threads_are_flattened_in_natural_order(self):
+        cpu = get_cpu(2, 3, 2)
+        expected = [t for p in cpu.get_packages() for c in p.get_cores() for t in c.get_threads()]
+        self.assertEqual(expected, list(cpu.get_threads()))
+        self.assertEqual([c for p in cpu.get_packages() for c in p.get_cores()], list(cpu.get_cores()))
+        self.assertIs(cpu.get_threads(), cpu.get_threads())
+
+    def test_thread_lookups(self):
+        cpu = get_cpu(2, 3, 2)
+        for p in cpu.get_packages():
+            for c in p.get_cores():
+                for t in c.get_threads():
+                    self.assertIs(t, cpu.get_thread(t.get_id()))
+                    self.assertIs(c, cpu.get_thread_core(t.get_id()))
+                    self.assertIs(p, cpu.get_thread_package(t.get_id()))
+
+    def test_natural_and_original_indexing(self):
+        cpu = get_cpu(2, 3, 2)
+        n2o = cpu.get_natural_indexing_2_original_indexing()
+        o2n = cpu.get_original_indexing_2_natural_indexing()
+
+        self.assertEqual({i: t.get_id() for i, t in enumerate(cpu.get_threads())}, dict(n2o))
+        for natural, original in n2o.items():
+            self.assertEqual(natural, o2n[original])
+
+        with self.assertRaises(TypeError):
+            n2o[0] = 42
+
+    def test_get_placement_vector(self):
+        cpu = get_cpu(2, 2, 2)
+        thread_ids = [cpu.get_threads()[1].get_id(), cpu.get_threads()[6].get_id()]
+        self.assertEqual([0, 1, 0, 0, 0, 0, 1, 0], get_placement_vector(cpu, thread_ids))
+        self.assertEqual([0] * 8, get_placement_vector(cpu, []))
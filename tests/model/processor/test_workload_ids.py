@@ -0,0 +1,87 @@
+import logging
+import pickle
+import unittest
+import uuid
+
+from tests.utils import config_logs
+from titus_isolate.model.processor.thread_claims import ThreadClaims
+from titus_isolate.model.processor.workload_ids import WorkloadIdRegistry, get_workload_id_registry, \
+    SWEEP_MIN_HANDLES
+
+config_logs(logging.DEBUG)
+
+
+class HandleStore:
+
+    def __init__(self, handles):
+        self.handles = handles
+
+    def get_handles(self):
+        return self.handles
+
+
+class TestWorkloadIds(unittest.TestCase):
+
+    def test_intern(self):
+        registry = WorkloadIdRegistry()
+        a = registry.intern("a")
+        b = registry.intern("b")
+
+        self.assertEqual(0, a)
+        self.assertEqual(1, b)
+        self.assertEqual(a, registry.intern("a"))
+        self.assertEqual("a", registry.resolve(a))
+        self.assertEqual(["b", "a"], registry.resolve_all([b, a]))
+        self.assertEqual(2, registry.size())
+
+    def test_lookup_does_not_intern(self):
+        registry = WorkloadIdRegistry()
+        self.assertIsNone(registry.lookup("a"))
+        self.assertEqual(0, registry.size())
+
+    def test_sweep_releases_handles_no_store_holds(self):
+        registry = WorkloadIdRegistry()
+        a = registry.intern("a")
+        b = registry.intern("b")
+        registry.intern("c")
+        store = HandleStore({a})
+        registry.track(store)
+
+        # Handles issued since the previous sweep are kept
+        self.assertEqual(0, registry.sweep())
+        registry.intern("b")
+        self.assertEqual(1, registry.sweep())
+
+        self.assertEqual("a", registry.resolve(a))
+        self.assertEqual(b, registry.lookup("b"))
+        self.assertIsNone(registry.lookup("c"))
+        self.assertEqual(3, registry.intern("c"))
+
+        del store
+        self.assertEqual(2, registry.sweep())
+        self.assertIsNone(registry.lookup("a"))
+        self.assertEqual(1, registry.size())
+
+    def test_sweep_runs_as_handles_are_issued(self):
+        registry = WorkloadIdRegistry()
+        store = HandleStore({registry.intern("held")})
+        registry.track(store)
+        for i in range(8 * SWEEP_MIN_HANDLES):
+            registry.intern(str(i))
+
+        self.assertLess(registry.size(), 3 * SWEEP_MIN_HANDLES)
+        self.assertEqual("held", registry.resolve(0))
+        self.assertEqual(8 * SWEEP_MIN_HANDLES + 1, registry.intern("next"))
+
+    def test_claims_pickle_workload_ids(self):
+        workload_id = str(uuid.uuid4())
+        claims = ThreadClaims(2)
+        claims.claim(1, workload_id)
+
+        state = claims.__getstate__()
+        self.assertEqual([[], [workload_id]], state['_ThreadClaims__workload_ids'])
+
+        copy = pickle.loads(pickle.dumps(claims))
+        self.assertTrue(copy.has_same_claims(claims))
+        self.assertEqual([workload_id], copy.get_workload_ids(1))
+        self.assertEqual(get_workload_id_registry().lookup(workload_id), copy.get_workload_handles(1)[0])
@@ -10,6 +10,7 @@ from tests.cgroup.mock_cgroup_manager import MockCgroupManager
 from tests.config.test_property_provider import TestPropertyProvider
 from titus_isolate import LOG_FMT_STRING, log
 from titus_isolate.allocate.allocate_request import AllocateRequest
+from titus_isolate.allocate.allocate_threads_batch_request import AllocateThreadsBatchRequest
 from titus_isolate.allocate.allocate_threads_request import AllocateThreadsRequest
 from titus_isolate.allocate.constants import INSTANCE_ID
 from titus_isolate.allocate.integer_program_cpu_allocator import IntegerProgramCpuAllocator
@@ -132,6 +133,19 @@ def get_no_usage_threads_request(cpu: Cpu, workloads: List[Workload]):
         metadata=DEFAULT_TEST_REQUEST_METADATA)
 
 
+def get_no_usage_threads_batch_request(cpu: Cpu, workloads: List[Workload], new_workloads: List[Workload]):
+    return AllocateThreadsBatchRequest(
+        cpu=cpu,
+        workload_ids=[w.get_id() for w in new_workloads],
+        workloads=__workloads_list_to_map(workloads + new_workloads),
+        cpu_usage={},
+        mem_usage={},
+        net_recv_usage={},
+        net_trans_usage={},
+        disk_usage={},
+        metadata=DEFAULT_TEST_REQUEST_METADATA)
+
+
 def get_no_usage_rebalance_request(cpu: Cpu, workloads: List[Workload]):
     return AllocateRequest(
         cpu=cpu,
@@ -1,4 +1,3 @@
-import copy
 from typing import List, Dict
 
 from titus_isolate.allocate.constants import CPU, CPU_USAGE, WORKLOADS, METADATA, CPU_ARRAY, MEM_USAGE, NET_RECV_USAGE, \
@@ -26,15 +25,19 @@ class AllocateRequest:
         :param workloads: A map of all relevant workloads including the workload to be assigned
                           The keys are workload ids, the objects are Workload objects
         :param cpu_usage: A map of cpu usage per workload
+
+        The request owns a copy-on-write fork of the cpu, which allocators are free to modify.  The maps are copied
+        shallowly: workloads and usage series are treated as immutable values, so only the maps themselves need to be
+        private to the request.
         """
-        self.__cpu = copy.deepcopy(cpu)
-        self.__workloads = copy.deepcopy(workloads)
-        self.__cpu_usage = copy.deepcopy(cpu_usage)
-        self.__mem_usage = copy.deepcopy(mem_usage)
-        self.__net_recv_usage = copy.deepcopy(net_recv_usage)
-        self.__net_trans_usage = copy.deepcopy(net_trans_usage)
-        self.__disk_usage = copy.deepcopy(disk_usage)
-        self.__metadata = copy.deepcopy(metadata)
+        self.__cpu = cpu.fork()
+        self.__workloads = dict(workloads)
+        self.__cpu_usage = dict(cpu_usage)
+        self.__mem_usage = dict(mem_usage)
+        self.__net_recv_usage = dict(net_recv_usage)
+        self.__net_trans_usage = dict(net_trans_usage)
+        self.__disk_usage = dict(disk_usage)
+        self.__metadata = dict(metadata)
 
     def get_cpu(self):
         return self.__cpu
@@ -60,6 +63,20 @@ class AllocateRequest:
     def get_metadata(self):
         return self.__metadata
 
+    def copy(self) -> 'AllocateRequest':
+        """
+        Returns an independent request for the same state, so it can be handed to another allocator.
+        """
+        return AllocateRequest(
+            cpu=self.get_cpu(),
+            workloads=self.get_workloads(),
+            cpu_usage=self.get_cpu_usage(),
+            mem_usage=self.get_mem_usage(),
+            net_recv_usage=self.get_net_recv_usage(),
+            net_trans_usage=self.get_net_trans_usage(),
+            disk_usage=self.get_disk_usage(),
+            metadata=self.get_metadata())
+
     def to_dict(self):
         return {
             CPU: self.get_cpu().to_dict(),
@@ -0,0 +1,97 @@
+from typing import List
+
+from titus_isolate.allocate.allocate_request import AllocateRequest, deserialize_allocate_request
+from titus_isolate.allocate.allocate_threads_request import AllocateThreadsRequest
+from titus_isolate.allocate.constants import WORKLOAD_IDS
+from titus_isolate.model.processor.cpu import Cpu
+
+
+class AllocateThreadsBatchRequest(AllocateRequest):
+
+    def __init__(self,
+                 cpu: Cpu,
+                 workload_ids: List[str],
+                 workloads: dict,
+                 cpu_usage: dict,
+                 mem_usage: dict,
+                 net_recv_usage: dict,
+                 net_trans_usage: dict,
+                 disk_usage: dict,
+                 metadata: dict):
+        """
+        A batch threads request encapsulates all information needed to assign threads to several workloads which are
+        being added at once.
+
+        :param cpu: An object indicating the state of the CPU before workload assignment
+        :param workload_ids: The ids of the workloads being added, in arrival order
+        :param workloads: A map of all relevant workloads including the workloads to be assigned
+                          The keys are workload ids, the objects are Workload objects
+        """
+        if len(workload_ids) == 0:
+            raise ValueError("A batch threads request must add at least one workload")
+
+        missing = [w_id for w_id in workload_ids if w_id not in workloads]
+        if len(missing) > 0:
+            raise ValueError("Workloads being added are missing from the workload map: {}".format(missing))
+
+        super().__init__(
+            cpu=cpu,
+            workloads=workloads,
+            cpu_usage=cpu_usage,
+            mem_usage=mem_usage,
+            net_recv_usage=net_recv_usage,
+            net_trans_usage=net_trans_usage,
+            disk_usage=disk_usage,
+            metadata=metadata)
+        self.__workload_ids = list(workload_ids)
+
+    def get_workload_ids(self) -> List[str]:
+        return self.__workload_ids
+
+    def get_threads_request(self, workload_id: str, cpu: Cpu) -> AllocateThreadsRequest:
+        """
+        Returns the single workload request for one step of the batch, on the given CPU.  Its workloads are the
+        workloads already running plus the batch workloads up to and including the given one.
+        """
+        pending = set(self.__workload_ids[self.__workload_ids.index(workload_id) + 1:])
+        return AllocateThreadsRequest(
+            cpu=cpu,
+            workload_id=workload_id,
+            workloads={w_id: w for w_id, w in self.get_workloads().items() if w_id not in pending},
+            cpu_usage=self.get_cpu_usage(),
+            mem_usage=self.get_mem_usage(),
+            net_recv_usage=self.get_net_recv_usage(),
+            net_trans_usage=self.get_net_trans_usage(),
+            disk_usage=self.get_disk_usage(),
+            metadata=self.get_metadata())
+
+    def copy(self) -> 'AllocateThreadsBatchRequest':
+        return AllocateThreadsBatchRequest(
+            cpu=self.get_cpu(),
+            workload_ids=self.get_workload_ids(),
+            workloads=self.get_workloads(),
+            cpu_usage=self.get_cpu_usage(),
+            mem_usage=self.get_mem_usage(),
+            net_recv_usage=self.get_net_recv_usage(),
+            net_trans_usage=self.get_net_trans_usage(),
+            disk_usage=self.get_disk_usage(),
+            metadata=self.get_metadata())
+
+    def to_dict(self):
+        d = super().to_dict()
+        d[WORKLOAD_IDS] = self.get_workload_ids()
+        return d
+
+
+def deserialize_allocate_threads_batch_request(serialized_request: dict) -> AllocateThreadsBatchRequest:
+    allocate_request = deserialize_allocate_request(serialized_request)
+    return AllocateThreadsBatchRequest(
+        cpu=allocate_request.get_cpu(),
+        workload_ids=serialized_request[WORKLOAD_IDS],
+        workloads=allocate_request.get_workloads(),
+        cpu_usage=allocate_request.get_cpu_usage(),
+        mem_usage=allocate_request.get_mem_usage(),
+        net_recv_usage=allocate_request.get_net_recv_usage(),
+        net_trans_usage=allocate_request.get_net_trans_usage(),
+        disk_usage=allocate_request.get_disk_usage(),
+        metadata=allocate_request.get_metadata())
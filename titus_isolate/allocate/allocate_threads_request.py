@@ -1,5 +1,3 @@
-import copy
-
 from titus_isolate.allocate.allocate_request import AllocateRequest, deserialize_allocate_request
 from titus_isolate.allocate.constants import WORKLOAD_ID
 from titus_isolate.model.processor.cpu import Cpu
@@ -35,11 +33,23 @@ class AllocateThreadsRequest(AllocateRequest):
             net_trans_usage=net_trans_usage,
             disk_usage=disk_usage,
             metadata=metadata)
-        self.__workload_id = copy.deepcopy(workload_id)
+        self.__workload_id = workload_id
 
     def get_workload_id(self):
         return self.__workload_id
 
+    def copy(self) -> 'AllocateThreadsRequest':
+        return AllocateThreadsRequest(
+            cpu=self.get_cpu(),
+            workload_id=self.get_workload_id(),
+            workloads=self.get_workloads(),
+            cpu_usage=self.get_cpu_usage(),
+            mem_usage=self.get_mem_usage(),
+            net_recv_usage=self.get_net_recv_usage(),
+            net_trans_usage=self.get_net_trans_usage(),
+            disk_usage=self.get_disk_usage(),
+            metadata=self.get_metadata())
+
     def to_dict(self):
         d = super().to_dict()
         d[WORKLOAD_ID] = self.get_workload_id()
@@ -0,0 +1,177 @@
+from threading import Condition, Thread
+
+from titus_isolate import log
+from titus_isolate.allocate.allocate_request import AllocateRequest
+from titus_isolate.allocate.allocate_response import AllocateResponse
+from titus_isolate.allocate.allocate_threads_batch_request import AllocateThreadsBatchRequest
+from titus_isolate.allocate.allocate_threads_request import AllocateThreadsRequest
+from titus_isolate.allocate.cpu_allocator import CpuAllocator
+from titus_isolate.isolate.balance import has_better_isolation
+from titus_isolate.metrics.constants import ANYTIME_IMPROVED_COUNT, ANYTIME_DISCARDED_COUNT, \
+    ANYTIME_SUPERSEDED_COUNT, ANYTIME_FAILED_COUNT, ANYTIME_REJECTED_COUNT
+
+
+class AnytimeCpuAllocator(CpuAllocator):
+    """
+    Answers every request with a fast allocator, then solves the same request again with a slower, better allocator on
+    a background thread.  An improved placement is offered to the improvement listener only if it has better isolation
+    than the fast answer.  The listener applies it only if nothing has changed since, and rejects it otherwise.
+
+    Only the latest request is improved, a newer request supersedes a pending or running one.  Without a listener
+    nothing is run in the background and this is just the fast allocator.
+    """
+
+    def __init__(self, fast_allocator: CpuAllocator, background_allocator: CpuAllocator):
+        self.__reg = None
+
+        self.__fast_allocator = fast_allocator
+        self.__background_allocator = background_allocator
+        self.__listener = None
+
+        self.__cond = Condition()
+        self.__generation = 0
+        self.__pending = None
+        self.__running = False
+        self.__worker = None
+
+        self.__improved_count = 0
+        self.__discarded_count = 0
+        self.__superseded_count = 0
+        self.__rejected_count = 0
+        self.__failed_count = 0
+
+    def assign_threads(self, request: AllocateThreadsRequest) -> AllocateResponse:
+        return self.__allocate(
+            request,
+            request.get_workloads(),
+            self.__fast_allocator.assign_threads,
+            self.__background_allocator.assign_threads)
+
+    def assign_threads_batch(self, request: AllocateThreadsBatchRequest) -> AllocateResponse:
+        return self.__allocate(
+            request,
+            request.get_workloads(),
+            self.__fast_allocator.assign_threads_batch,
+            self.__background_allocator.assign_threads_batch)
+
+    def free_threads(self, request: AllocateThreadsRequest) -> AllocateResponse:
+        workloads = dict(request.get_workloads())
+        workloads.pop(request.get_workload_id(), None)
+        return self.__allocate(
+            request,
+            workloads,
+            self.__fast_allocator.free_threads,
+            self.__background_allocator.free_threads)
+
+    def rebalance(self, request: AllocateRequest) -> AllocateResponse:
+        return self.__allocate(
+            request,
+            request.get_workloads(),
+            self.__fast_allocator.rebalance,
+            self.__background_allocator.rebalance)
+
+    def get_name(self) -> str:
+        return "{}({},{})".format(
+            self.__class__.__name__,
+            self.__fast_allocator.get_name(),
+            self.__background_allocator.get_name())
+
+    def get_fast_allocator(self) -> CpuAllocator:
+        return self.__fast_allocator
+
+    def get_background_allocator(self) -> CpuAllocator:
+        return self.__background_allocator
+
+    def set_improvement_listener(self, listener):
+        self.__listener = listener
+
+    def wait(self, timeout: float = None) -> bool:
+        """
+        Blocks until there is no pending or running background work.
+
+        :return: False if the timeout expired first
+        """
+        with self.__cond:
+            return self.__cond.wait_for(lambda: self.__pending is None and not self.__running, timeout)
+
+    def __allocate(self, request, workloads, fast_func, background_func) -> AllocateResponse:
+        background_request = None
+        if self.__listener is not None:
+            background_request = request.copy()
+            workloads = dict(workloads)
+
+        response = fast_func(request)
+
+        if background_request is not None:
+            self.__submit((background_func, background_request, response.get_cpu(), workloads))
+        return response
+
+    def __submit(self, job):
+        with self.__cond:
+            self.__generation += 1
+            if self.__pending is not None:
+                self.__superseded_count += 1
+            self.__pending = (self.__generation, job)
+
+            if self.__worker is None:
+                self.__worker = Thread(target=self.__process_jobs, daemon=True)
+                self.__worker.start()
+            self.__cond.notify_all()
+
+    def __process_jobs(self):
+        while True:
+            with self.__cond:
+                self.__cond.wait_for(lambda: self.__pending is not None)
+                generation, job = self.__pending
+                self.__pending = None
+                self.__running = True
+
+            try:
+                self.__improve(generation, *job)
+            except:
+                self.__failed_count += 1
+                log.exception("Failed to improve placement with background allocator: '{}'".format(
+                    self.__background_allocator.get_name()))
+            finally:
+                with self.__cond:
+                    self.__running = False
+                    self.__cond.notify_all()
+
+    def __improve(self, generation, background_func, request, fast_cpu, workloads):
+        response = background_func(request)
+
+        if generation != self.__generation:
+            self.__superseded_count += 1
+            return
+
+        if not has_better_isolation(fast_cpu, response.get_cpu()):
+            self.__discarded_count += 1
+            return
+
+        listener = self.__listener
+        if listener is not None and listener(fast_cpu, response, workloads):
+            log.info("Applied improved placement from background allocator: '{}'".format(
+                self.__background_allocator.get_name()))
+            self.__improved_count += 1
+        else:
+            self.__rejected_count += 1
+
+    def set_registry(self, registry, tags):
+        self.__reg = registry
+        self.__fast_allocator.set_registry(registry, tags)
+        self.__background_allocator.set_registry(registry, tags)
+
+    def report_metrics(self, tags):
+        self.__reg.gauge(ANYTIME_IMPROVED_COUNT, tags).set(self.__improved_count)
+        self.__reg.gauge(ANYTIME_DISCARDED_COUNT, tags).set(self.__discarded_count)
+        self.__reg.gauge(ANYTIME_SUPERSEDED_COUNT, tags).set(self.__superseded_count)
+        self.__reg.gauge(ANYTIME_REJECTED_COUNT, tags).set(self.__rejected_count)
+        self.__reg.gauge(ANYTIME_FAILED_COUNT, tags).set(self.__failed_count)
+
+        self.__fast_allocator.report_metrics(tags)
+        self.__background_allocator.report_metrics(tags)
+
+    def str(self):
+        return "AnytimeCpuAllocator(fast: {}, background: {})".format(
+            self.__fast_allocator,
+            self.__background_allocator)
@@ -0,0 +1,157 @@
+"""
+Precomputes optimal integer program placements for the common request shapes of a topology into a placement atlas.
+
+    python -m titus_isolate.allocate.build_placement_atlas --topology 2x24x2 --output atlas.bin
+    python -m titus_isolate.allocate.build_placement_atlas --topology 2x24x2 --topology 4x28x2 --shapes 1,2,4,8 \
+        --max-workloads 5 --workers 8 --output atlas.bin
+
+Starting from an empty CPU, every arrival of a workload of one of the shapes and every departure is replayed, in
+breadth first order and in canonical form, exactly as the IntegerProgramCpuAllocator would solve it.  Only optimal
+solutions are written.  Point TITUS_ISOLATE_IP_PLACEMENT_ATLAS at the output.
+"""
+import argparse
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Tuple
+
+from titus_optimize.compute import IP_SOLUTION_OPTIMAL, optimize_ip
+
+from titus_isolate.allocate.canonical import get_canonical_placement
+from titus_isolate.allocate.placement_atlas import encode_placement_atlas
+from titus_isolate.allocate.solution_cache import get_solution_key
+from titus_isolate.model.processor.config import get_cpu
+
+DEFAULT_SHAPES = [1, 2, 4, 8, 16]
+DEFAULT_MAX_WORKLOADS = 4
+DEFAULT_MAX_ENTRIES = 100000
+DEFAULT_MAX_RUNTIME_SECS = 60
+
+
+def get_atlas_entries(
+        topology: Tuple[int, int, int],
+        shapes: List[int],
+        max_workloads: int,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        max_runtime_secs: float = DEFAULT_MAX_RUNTIME_SECS,
+        workers: int = 1) -> List[Tuple[bytes, List[List[int]]]]:
+    """
+    Returns the (solution key, placement) pairs of every optimal solve reachable from an empty CPU of the given
+    (packages, cores per package, threads per core) topology through at most max_workloads workloads of the shapes.
+    """
+    cpu = get_cpu(*topology)
+    thread_count = len(cpu.get_threads())
+    package_count = len(cpu.get_packages())
+
+    entries = {}
+    solutions = {}
+    visited = set()
+    frontier = [((), None)]
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        while len(frontier) > 0 and len(entries) < max_entries:
+            # Every problem of this level, in canonical form: (key, requested units, current placement, dropped index)
+            problems = []
+            for requested_units, placement in frontier:
+                for request, request_placement, dropped in __get_requests(
+                        requested_units, placement, shapes, max_workloads, thread_count):
+                    canonical = get_canonical_placement(cpu, request_placement).to_canonical(request_placement)
+                    key = get_solution_key(thread_count, package_count, request, canonical)
+                    problems.append((key, request, canonical, dropped))
+
+            unsolved = {p[0]: p for p in problems if p[0] not in solutions}
+            args = [(list(p[1]), thread_count, package_count, p[2], max_runtime_secs) for p in unsolved.values()]
+            results = executor.map(__solve, args) if executor is not None else map(__solve, args)
+            for key, (solution, status) in zip(unsolved.keys(), results):
+                solutions[key] = solution
+                if status == IP_SOLUTION_OPTIMAL and len(entries) < max_entries:
+                    entries[key] = solution
+
+            frontier = []
+            for key, request, _, dropped in problems:
+                request = request[:dropped] + request[dropped + 1:]
+                solution = solutions[key]
+                solution = solution[:dropped] + solution[dropped + 1:]
+
+                if len(request) == 0:
+                    continue
+                canonical = get_canonical_placement(cpu, solution).to_canonical(solution)
+                state_key = get_solution_key(thread_count, package_count, request, canonical)
+                if state_key not in visited:
+                    visited.add(state_key)
+                    frontier.append((request, [list(row) for row in canonical]))
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    return list(entries.items())
+
+
+def __get_requests(requested_units, placement, shapes, max_workloads, thread_count):
+    """
+    Yields the requested units and current placement of every arrival and departure from a state, as built by the
+    IntegerProgramCpuAllocator, with the index of the row to drop from the solution.
+
+    On arrival the allocator lists the new workload twice, once among the placed workloads with an empty vector and no
+    threads, and once more at the end with its thread count.  The empty row is dropped.  On departure the departing
+    workload keeps its vector, requests no threads and its row is dropped.
+    """
+    if placement is None:
+        placement = []
+
+    if len(requested_units) < max_workloads:
+        arrival_placement = placement + [[0] * thread_count]
+        for shape in shapes:
+            if sum(requested_units) + shape <= thread_count:
+                yield requested_units + (0, shape), arrival_placement, len(requested_units)
+
+    for i in range(len(requested_units)):
+        yield requested_units[:i] + (0,) + requested_units[i + 1:], placement, i
+
+
+def __solve(args):
+    requested_units, thread_count, package_count, current_placement, max_runtime_secs = args
+    return optimize_ip(
+        requested_units,
+        thread_count,
+        package_count,
+        current_placement,
+        verbose=False,
+        max_runtime_secs=max_runtime_secs)
+
+
+def parse_topology(topology: str) -> Tuple[int, int, int]:
+    packages, cores, threads = (int(v) for v in topology.split('x'))
+    return packages, cores, threads
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build a placement atlas of optimal integer program placements.")
+    parser.add_argument("--topology", action="append", required=True, type=parse_topology,
+                        help="packages x cores per package x threads per core, e.g. 2x24x2, may be repeated")
+    parser.add_argument("--shapes", default=",".join(str(s) for s in DEFAULT_SHAPES),
+                        help="comma separated workload thread counts")
+    parser.add_argument("--max-workloads", type=int, default=DEFAULT_MAX_WORKLOADS)
+    parser.add_argument("--max-entries", type=int, default=DEFAULT_MAX_ENTRIES, help="per topology")
+    parser.add_argument("--max-runtime-secs", type=float, default=DEFAULT_MAX_RUNTIME_SECS, help="per solve")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--output", required=True)
+    args = parser.parse_args(argv)
+
+    shapes = [int(s) for s in args.shapes.split(",")]
+    entries = []
+    for topology in args.topology:
+        topology_entries = get_atlas_entries(
+            topology, shapes, args.max_workloads, args.max_entries, args.max_runtime_secs, args.workers)
+        print("{}x{}x{}: {} placements".format(*topology, len(topology_entries)), file=sys.stderr)
+        entries += topology_entries
+
+    data = encode_placement_atlas(entries)
+    with open(args.output, 'wb') as f:
+        f.write(data)
+    print("Wrote {} placements, {} bytes, to: {}".format(len(entries), len(data), args.output), file=sys.stderr)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,78 @@
+from typing import List, Optional
+
+import numpy as np
+
+from titus_isolate.model.processor.cpu import Cpu
+
+
+class CanonicalPlacement:
+    """
+    A permutation of the natural thread order which maps a placement problem onto its canonical form.
+
+    Packages are interchangeable, as are the cores of a package and the threads of a core, so any two current
+    placements which differ only by such a relabeling have the same canonical form.  Problems are solved, and their
+    solutions cached, in canonical form and the solution is mapped back to the natural order of the CPU.
+
+    permutation[i] is the natural index of the thread at canonical index i.
+    """
+
+    def __init__(self, permutation):
+        self.__permutation = np.asarray(permutation, dtype=np.int64)
+        self.__inverse = np.argsort(self.__permutation)
+
+    def get_permutation(self) -> List[int]:
+        return self.__permutation.tolist()
+
+    def is_identity(self) -> bool:
+        return bool(np.array_equal(self.__permutation, np.arange(len(self.__permutation))))
+
+    def to_canonical(self, vectors: Optional[List[List[int]]]) -> Optional[List[List[int]]]:
+        return self.__apply(vectors, self.__permutation)
+
+    def from_canonical(self, vectors: Optional[List[List[int]]]) -> Optional[List[List[int]]]:
+        return self.__apply(vectors, self.__inverse)
+
+    @staticmethod
+    def __apply(vectors, indices):
+        if vectors is None:
+            return None
+        if len(vectors) == 0:
+            return []
+        return np.asarray(vectors)[:, indices].tolist()
+
+
+def get_canonical_placement(cpu: Cpu, current_placement: Optional[List[List[int]]]) -> CanonicalPlacement:
+    """
+    Returns the canonicalization of the given current placement, a list of 0/1 vectors in natural thread order.
+
+    Threads are ordered within their core, cores within their package and finally packages, each by the workloads they
+    hold, most claimed (and lowest workload index) first.  Ties keep their natural order, so an empty CPU, or one whose
+    placement is already canonical, maps onto itself.  CPUs with packages or cores of differing sizes are not
+    symmetric and are left in natural order.
+    """
+    thread_count = len(cpu.get_threads())
+    identity = CanonicalPlacement(np.arange(thread_count))
+    if current_placement is None or len(current_placement) == 0:
+        return identity
+
+    packages = cpu.get_packages()
+    if len({len(p.get_cores()) for p in packages}) != 1 or len({len(c.get_threads()) for c in cpu.get_cores()}) != 1:
+        return identity
+
+    # One signature per thread: the bytes of its column of the placement, which compare in the order described above
+    columns = np.ascontiguousarray(np.asarray(current_placement, dtype=np.uint8).T)
+    signatures = [column.tobytes() for column in columns]
+
+    original_2_natural = cpu.get_original_indexing_2_natural_indexing()
+    canonical_packages = []
+    for package in packages:
+        canonical_cores = []
+        for core in package.get_cores():
+            thread_indices = [original_2_natural[t.get_id()] for t in core.get_threads()]
+            thread_indices.sort(key=lambda i: signatures[i], reverse=True)
+            canonical_cores.append((tuple(signatures[i] for i in thread_indices), thread_indices))
+        canonical_cores.sort(key=lambda c: c[0], reverse=True)
+        canonical_packages.append((tuple(c[0] for c in canonical_cores), [c[1] for c in canonical_cores]))
+    canonical_packages.sort(key=lambda p: p[0], reverse=True)
+
+    return CanonicalPlacement([i for _, cores in canonical_packages for indices in cores for i in indices])
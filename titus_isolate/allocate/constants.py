@@ -21,8 +21,12 @@ RESOURCE_USAGE_NAMES = [
 WORKLOAD_ALLOCATIONS = "workload_allocations"
 WORKLOADS = "workloads"
 WORKLOAD_ID = "workload_id"
+WORKLOAD_IDS = "workload_ids"
 
 TITUS_ISOLATE_CELL_HEADER = "X-Titus-Isolate-Cell"
+# The time, in seconds since the epoch, after which the caller no longer waits for the response
+TITUS_ISOLATE_DEADLINE_HEADER = "X-Titus-Isolate-Deadline"
+RETRY_AFTER_HEADER = "Retry-After"
 UNKNOWN_CELL = "unknown_cell"
 CELL = "cell"
 ALLOCATOR_SERVICE_TASK_ID = 'alloc_task_id'  # task id of the service which did run a given allocation
@@ -30,5 +34,8 @@ UNKNOWN_ALLOCATOR_SERVICE_TASK_ID = 'unknown_alloc_task_id'
 TITUS_TASK_ID = 'TITUS_TASK_ID'
 
 INSTANCE_ID = "instance_id"
+# Set in the metadata of responses whose solve was time bound, or had its budget cut to the request's deadline
+TIME_LIMITED = "time_limited"
+SESSION = "session"
 
 FREE_THREAD_IDS = "free_thread_ids"
@@ -0,0 +1,86 @@
+"""
+Compression of request and response bodies exchanged with the remote solver.
+
+gzip is always available, zstd only when the optional zstandard package is installed.  Both sides advertise the
+encodings they can decode in the Accept-Encoding header.
+"""
+import gzip
+from typing import List, Optional
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+IDENTITY = "identity"
+GZIP = "gzip"
+ZSTD = "zstd"
+
+CONTENT_ENCODING_HEADER = "Content-Encoding"
+ACCEPT_ENCODING_HEADER = "Accept-Encoding"
+
+# Smaller bodies are not worth the CPU
+MIN_COMPRESS_BYTES = 1024
+
+GZIP_LEVEL = 5
+ZSTD_LEVEL = 3
+
+
+def get_supported_encodings() -> List[str]:
+    """
+    Returns the encodings which can be compressed and decompressed, most preferred first.
+    """
+    if zstandard is not None:
+        return [ZSTD, GZIP]
+    return [GZIP]
+
+
+def is_supported_encoding(encoding: str) -> bool:
+    return encoding == IDENTITY or encoding in get_supported_encodings()
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    if encoding == IDENTITY:
+        return data
+    if encoding == GZIP:
+        return gzip.compress(data, compresslevel=GZIP_LEVEL)
+    if encoding == ZSTD and zstandard is not None:
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    raise ValueError("Unsupported content encoding: '{}'".format(encoding))
+
+
+def decompress(data: bytes, encoding: str) -> bytes:
+    if encoding == IDENTITY:
+        return data
+    if encoding == GZIP:
+        return gzip.decompress(data)
+    if encoding == ZSTD and zstandard is not None:
+        return zstandard.ZstdDecompressor().decompress(data)
+    raise ValueError("Unsupported content encoding: '{}'".format(encoding))
+
+
+def parse_accept_encoding(header: Optional[str]) -> List[str]:
+    """
+    Returns the encodings of an Accept-Encoding header, without the ones it explicitly refuses with a zero q-value.
+    """
+    if header is None:
+        return []
+
+    encodings = []
+    for entry in header.split(","):
+        parts = [p.strip() for p in entry.split(";")]
+        if len(parts[0]) == 0 or "q=0" in parts[1:] or "q=0.0" in parts[1:]:
+            continue
+        encodings.append(parts[0].lower())
+    return encodings
+
+
+def choose_encoding(accept_encoding: Optional[str]) -> str:
+    """
+    Returns the most preferred supported encoding the peer accepts, or identity.
+    """
+    accepted = parse_accept_encoding(accept_encoding)
+    for encoding in get_supported_encodings():
+        if encoding in accepted:
+            return encoding
+    return IDENTITY
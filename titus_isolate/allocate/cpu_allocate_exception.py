@@ -2,3 +2,13 @@ class CpuAllocationException(Exception):
 
     def __init__(self, msg):
         super().__init__(msg)
+
+
+class SolverOverloadedException(CpuAllocationException):
+    """
+    The solver shed the request, callers should fall back right away and skip it for retry_after_secs.
+    """
+
+    def __init__(self, msg, retry_after_secs: float = 0):
+        super().__init__(msg)
+        self.retry_after_secs = retry_after_secs
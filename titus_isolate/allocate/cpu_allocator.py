@@ -2,6 +2,7 @@ import abc
 
 from titus_isolate.allocate.allocate_response import AllocateResponse
 from titus_isolate.allocate.allocate_request import AllocateRequest
+from titus_isolate.allocate.allocate_threads_batch_request import AllocateThreadsBatchRequest
 from titus_isolate.allocate.allocate_threads_request import AllocateThreadsRequest
 from titus_isolate.metrics.metrics_reporter import MetricsReporter
 
@@ -15,6 +16,19 @@ class CpuAllocator(abc.ABC, MetricsReporter):
         """
         pass
 
+    def assign_threads_batch(self, request: AllocateThreadsBatchRequest) -> AllocateResponse:
+        """
+        Claims threads for several workloads arriving at once, answering with the placement after all of them have been
+        added.  By default the workloads are assigned one at a time, in order.  Allocators which can place them all in
+        a single solve should override this.
+        """
+        cpu = request.get_cpu()
+        response = None
+        for workload_id in request.get_workload_ids():
+            response = self.assign_threads(request.get_threads_request(workload_id, cpu))
+            cpu = response.get_cpu()
+        return response
+
     @abc.abstractmethod
     def free_threads(self, request: AllocateThreadsRequest) -> AllocateResponse:
         """
@@ -39,5 +53,15 @@ class CpuAllocator(abc.ABC, MetricsReporter):
         """
         pass
 
+    def set_improvement_listener(self, listener):
+        """
+        Allocators which keep improving a placement after answering a request offer the improvement to the listener:
+        listener(expected_cpu, response, workloads) -> bool.  The listener applies the response only if the current
+        CPU is still expected_cpu, the CPU it answered the request with, and returns whether it did.
+
+        Allocators which answer once ignore the listener.
+        """
+        pass
+
     def str(self):
         return self.__class__.__name__
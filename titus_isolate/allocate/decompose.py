@@ -0,0 +1,150 @@
+from typing import List, Optional
+
+import numpy as np
+from titus_optimize.compute import IP_SOLUTION_OPTIMAL, IP_SOLUTION_TIME_BOUND, optimize_ip
+
+from titus_isolate.model.processor.cpu import Cpu
+
+
+class PackageProblem:
+    """
+    The placement problem restricted to the threads of a single package and the workloads assigned to it.
+
+    The current placement and the solution are indexed by the natural index of the thread within the package.
+    """
+
+    def __init__(
+            self,
+            package_index: int,
+            thread_indices: List[int],
+            workload_indices: List[int],
+            requested_units: List[int],
+            current_placement: Optional[List[List[int]]]):
+        self.__package_index = package_index
+        self.__thread_indices = thread_indices
+        self.__workload_indices = workload_indices
+        self.__requested_units = requested_units
+        self.__current_placement = current_placement
+
+    def get_package_index(self) -> int:
+        return self.__package_index
+
+    def get_thread_indices(self) -> List[int]:
+        return self.__thread_indices
+
+    def get_workload_indices(self) -> List[int]:
+        return self.__workload_indices
+
+    def get_requested_units(self) -> List[int]:
+        return self.__requested_units
+
+    def get_current_placement(self) -> Optional[List[List[int]]]:
+        return self.__current_placement
+
+    def is_empty(self) -> bool:
+        return sum(self.__requested_units) == 0
+
+
+def get_package_problems(
+        cpu: Cpu,
+        current_placement: Optional[List[List[int]]],
+        requested_units: List[int]) -> Optional[List[PackageProblem]]:
+    """
+    Splits a placement problem into one independent problem per package, or returns None if it does not decompose.
+
+    A placed workload stays on the package it occupies, and workloads which are not yet placed are packed onto the
+    package with the most remaining capacity, largest first.  The problem does not decompose if the CPU has a single
+    package or packages of differing sizes, if a workload currently spans packages, or if a workload can not be packed
+    without spanning packages.
+
+    :param current_placement: a 0/1 vector per placed workload in natural thread order, or None
+    :param requested_units: the thread count requested by each workload, placed workloads first
+    """
+    package_thread_indices = [list(indices) for indices in cpu.get_package_thread_indices()]
+    if len(package_thread_indices) < 2 or len({len(indices) for indices in package_thread_indices}) != 1:
+        return None
+
+    package_size = len(package_thread_indices[0])
+    free_units = [package_size] * len(package_thread_indices)
+    workload_packages = [None] * len(requested_units)
+
+    if current_placement is not None and len(current_placement) > 0:
+        occupied = np.asarray(current_placement, dtype=np.int64).reshape(len(current_placement), -1, package_size)
+        for w_index, per_package in enumerate(occupied.sum(axis=2)):
+            packages = np.flatnonzero(per_package)
+            if len(packages) > 1:
+                return None
+            if len(packages) == 1:
+                workload_packages[w_index] = int(packages[0])
+                free_units[workload_packages[w_index]] -= requested_units[w_index]
+
+    unplaced = [i for i, p in enumerate(workload_packages) if p is None and requested_units[i] > 0]
+    for w_index in sorted(unplaced, key=lambda i: requested_units[i], reverse=True):
+        package_index = int(np.argmax(free_units))
+        workload_packages[w_index] = package_index
+        free_units[package_index] -= requested_units[w_index]
+
+    if min(free_units) < 0:
+        return None
+
+    problems = []
+    for package_index, thread_indices in enumerate(package_thread_indices):
+        workload_indices = [i for i, p in enumerate(workload_packages) if p == package_index]
+        problems.append(PackageProblem(
+            package_index,
+            thread_indices,
+            workload_indices,
+            [requested_units[i] for i in workload_indices],
+            __get_package_placement(current_placement, workload_indices, thread_indices)))
+
+    return problems
+
+
+def __get_package_placement(current_placement, workload_indices, thread_indices) -> Optional[List[List[int]]]:
+    if current_placement is None:
+        return None
+
+    placement = []
+    for w_index in workload_indices:
+        if w_index < len(current_placement):
+            placement.append([current_placement[w_index][t] for t in thread_indices])
+        else:
+            placement.append([0] * len(thread_indices))
+
+    if sum(sum(v) for v in placement) == 0:
+        return None
+    return placement
+
+
+def merge_package_solutions(
+        thread_count: int,
+        workload_count: int,
+        problems: List[PackageProblem],
+        placements: List[List[List[int]]]) -> List[List[int]]:
+    """
+    Merges the solutions of the package problems into a 0/1 vector per workload in natural thread order.
+    """
+    merged = np.zeros((workload_count, thread_count), dtype=np.int64)
+    for problem, placement in zip(problems, placements):
+        if len(problem.get_workload_indices()) > 0:
+            merged[np.ix_(problem.get_workload_indices(), problem.get_thread_indices())] = placement
+    return merged.tolist()
+
+
+def merge_statuses(statuses: List[str]) -> str:
+    if IP_SOLUTION_TIME_BOUND in statuses:
+        return IP_SOLUTION_TIME_BOUND
+    return IP_SOLUTION_OPTIMAL
+
+
+def solve_package_problem(requested_units, thread_count, current_placement, max_runtime_secs):
+    """
+    Solves a single package problem.  This is a module level function so that it can be run in a worker process.
+    """
+    return optimize_ip(
+        requested_units,
+        thread_count,
+        1,
+        current_placement,
+        verbose=False,
+        max_runtime_secs=max_runtime_secs)
@@ -1,15 +1,52 @@
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from threading import Lock
+from typing import Optional
+
+import numpy as np
+
 from titus_isolate import log
 from titus_isolate.allocate.allocate_request import AllocateRequest
 from titus_isolate.allocate.allocate_response import AllocateResponse
+from titus_isolate.allocate.allocate_threads_batch_request import AllocateThreadsBatchRequest
 from titus_isolate.allocate.allocate_threads_request import AllocateThreadsRequest
+from titus_isolate.allocate.cpu_allocate_exception import SolverOverloadedException
 from titus_isolate.allocate.cpu_allocator import CpuAllocator
 from titus_isolate.metrics.constants import FALLBACK_ASSIGN_COUNT, FALLBACK_FREE_COUNT, \
-    FALLBACK_REBALANCE_COUNT, PRIMARY_ASSIGN_COUNT, PRIMARY_FREE_COUNT, PRIMARY_REBALANCE_COUNT
+    FALLBACK_REBALANCE_COUNT, PRIMARY_ASSIGN_COUNT, PRIMARY_FREE_COUNT, PRIMARY_REBALANCE_COUNT, \
+    PRIMARY_WIN_COUNT, FALLBACK_WIN_COUNT, PRIMARY_LATENCY, FALLBACK_LATENCY, HEDGED_COUNT, PRIMARY_OVERLOADED_COUNT, \
+    PRIMARY_SKIPPED_COUNT, HEDGED_PRIMARIES_IN_FLIGHT
+
+ASSIGN = "assign"
+FREE = "free"
+REBALANCE = "rebalance"
+
+PRIMARY = "primary"
+SECONDARY = "secondary"
+
+HEDGE_WINDOW = 100
+HEDGE_MIN_SAMPLES = 10
+HEDGE_WORKERS = 4
 
 
 class FallbackCpuAllocator(CpuAllocator):
 
-    def __init__(self, primary_cpu_allocator: CpuAllocator, secondary_cpu_allocator: CpuAllocator):
+    def __init__(
+            self,
+            primary_cpu_allocator: CpuAllocator,
+            secondary_cpu_allocator: CpuAllocator,
+            hedge_percentile: float = 0):
+        """
+        :param hedge_percentile: when positive, a request is also sent to the secondary allocator once the primary has
+        taken longer than this percentile of its recent latencies, and the first successful response wins.  Otherwise
+        the secondary is only called after the primary has failed.
+
+        A primary which sheds a request as overloaded is not waited for, and is skipped for as long as it asks to be.
+        Primaries which lost the race keep running until they answer or time out, while as many as there are hedge
+        workers are in flight the primary is skipped, rather than queueing behind them.
+        """
         if primary_cpu_allocator is None:
             raise ValueError("Must be provided a primary cpu allocator.")
 
@@ -17,17 +54,24 @@ class FallbackCpuAllocator(CpuAllocator):
             raise ValueError("Must be provided a secondary cpu allocator.")
 
         self.__reg = None
+        self.__tags = None
 
         self.__primary_allocator = primary_cpu_allocator
         self.__secondary_allocator = secondary_cpu_allocator
 
-        self.__primary_assign_threads_call_count = 0
-        self.__primary_free_threads_call_count = 0
-        self.__primary_rebalance_call_count = 0
+        self.__primary_call_counts = {ASSIGN: 0, FREE: 0, REBALANCE: 0}
+        self.__secondary_call_counts = {ASSIGN: 0, FREE: 0, REBALANCE: 0}
+        self.__win_counts = {PRIMARY: 0, SECONDARY: 0}
+        self.__hedged_count = 0
+        self.__overloaded_count = 0
+        self.__skipped_count = 0
+        self.__skip_primary_until = 0
 
-        self.__secondary_assign_threads_call_count = 0
-        self.__secondary_free_threads_call_count = 0
-        self.__secondary_rebalance_call_count = 0
+        self.__hedge_percentile = hedge_percentile
+        self.__lock = Lock()
+        self.__primary_latencies = deque(maxlen=HEDGE_WINDOW)
+        self.__primaries_in_flight = 0
+        self.__executors = {}
 
         log.debug(
             "Created FallbackCpuAllocator with primary cpu allocator: '{}' and secondary cpu allocator: '{}'".format(
@@ -35,43 +79,36 @@ class FallbackCpuAllocator(CpuAllocator):
                 self.__secondary_allocator.__class__.__name__))
 
     def assign_threads(self, request: AllocateThreadsRequest) -> AllocateResponse:
-        try:
-            self.__primary_assign_threads_call_count += 1
-            return self.__primary_allocator.assign_threads(request)
-        except:
-            log.exception(
-                "Failed to assign threads to workload: '{}' with primary allocator: '{}', falling back to: '{}'".format(
-                    request.get_workload_id(),
-                    self.__primary_allocator.__class__.__name__,
-                    self.__secondary_allocator.__class__.__name__))
-            self.__secondary_assign_threads_call_count += 1
-            return self.__secondary_allocator.assign_threads(request)
+        return self.__allocate(
+            ASSIGN,
+            request,
+            self.__primary_allocator.assign_threads,
+            self.__secondary_allocator.assign_threads,
+            "assign threads to workload: '{}'".format(request.get_workload_id()))
+
+    def assign_threads_batch(self, request: AllocateThreadsBatchRequest) -> AllocateResponse:
+        return self.__allocate(
+            ASSIGN,
+            request,
+            self.__primary_allocator.assign_threads_batch,
+            self.__secondary_allocator.assign_threads_batch,
+            "assign threads to workloads: {}".format(request.get_workload_ids()))
 
     def free_threads(self, request: AllocateThreadsRequest) -> AllocateResponse:
-        try:
-            self.__primary_free_threads_call_count += 1
-            return self.__primary_allocator.free_threads(request)
-        except:
-            log.exception(
-                "Failed to free threads for workload: '{}' with primary allocator: '{}', falling back to: '{}'".format(
-                    request.get_workload_id(),
-                    self.__primary_allocator.__class__.__name__,
-                    self.__secondary_allocator.__class__.__name__))
-            self.__secondary_free_threads_call_count += 1
-            return self.__secondary_allocator.free_threads(request)
+        return self.__allocate(
+            FREE,
+            request,
+            self.__primary_allocator.free_threads,
+            self.__secondary_allocator.free_threads,
+            "free threads for workload: '{}'".format(request.get_workload_id()))
 
     def rebalance(self, request: AllocateRequest) -> AllocateResponse:
-        try:
-            self.__primary_rebalance_call_count += 1
-            return self.__primary_allocator.rebalance(request)
-        except:
-            log.exception(
-                "Failed to rebalance workloads: '{}' with primary allocator: '{}', falling back to: '{}'".format(
-                    [w.get_id() for w in request.get_workloads().values()],
-                    self.__primary_allocator.__class__.__name__,
-                    self.__secondary_allocator.__class__.__name__))
-            self.__secondary_rebalance_call_count += 1
-            return self.__secondary_allocator.rebalance(request)
+        return self.__allocate(
+            REBALANCE,
+            request,
+            self.__primary_allocator.rebalance,
+            self.__secondary_allocator.rebalance,
+            "rebalance workloads: '{}'".format([w.get_id() for w in request.get_workloads().values()]))
 
     def get_name(self) -> str:
         return "{}({},{})".format(
@@ -86,29 +123,200 @@ class FallbackCpuAllocator(CpuAllocator):
         return self.__secondary_allocator
 
     def get_fallback_allocator_calls_count(self):
-        return self.__secondary_assign_threads_call_count + \
-               self.__secondary_free_threads_call_count + \
-               self.__secondary_rebalance_call_count
+        return sum(self.__secondary_call_counts.values())
+
+    def get_win_counts(self) -> dict:
+        return dict(self.__win_counts)
+
+    def get_hedged_count(self) -> int:
+        return self.__hedged_count
+
+    def get_overloaded_count(self) -> int:
+        return self.__overloaded_count
+
+    def get_skipped_count(self) -> int:
+        return self.__skipped_count
+
+    def get_primaries_in_flight(self) -> int:
+        return self.__primaries_in_flight
+
+    def __allocate(self, operation, request, primary_func, secondary_func, description) -> AllocateResponse:
+        if time.time() < self.__skip_primary_until:
+            log.info("Primary allocator: '{}' is overloaded, using: '{}' to {}".format(
+                self.__primary_allocator.__class__.__name__,
+                self.__secondary_allocator.__class__.__name__,
+                description))
+            self.__skipped_count += 1
+            return self.__fall_back(operation, secondary_func, request)
+
+        if self.__hedge_percentile > 0:
+            if not self.__reserve_primary():
+                log.info("Primary allocator: '{}' has {} calls in flight, using: '{}' to {}".format(
+                    self.__primary_allocator.__class__.__name__,
+                    self.__primaries_in_flight,
+                    self.__secondary_allocator.__class__.__name__,
+                    description))
+                self.__skipped_count += 1
+                return self.__fall_back(operation, secondary_func, request)
+
+            self.__primary_call_counts[operation] += 1
+            return self.__hedge(operation, request, primary_func, secondary_func, description)
+
+        self.__primary_call_counts[operation] += 1
+
+        try:
+            response = self.__timed(PRIMARY, primary_func, request)
+        except SolverOverloadedException as e:
+            self.__on_overloaded(e, description)
+            return self.__fall_back(operation, secondary_func, request)
+        except:
+            log.exception("Failed to {} with primary allocator: '{}', falling back to: '{}'".format(
+                description,
+                self.__primary_allocator.__class__.__name__,
+                self.__secondary_allocator.__class__.__name__))
+            return self.__fall_back(operation, secondary_func, request)
+
+        self.__win_counts[PRIMARY] += 1
+        return response
+
+    def __fall_back(self, operation, secondary_func, request) -> AllocateResponse:
+        self.__secondary_call_counts[operation] += 1
+        response = self.__timed(SECONDARY, secondary_func, request)
+        self.__win_counts[SECONDARY] += 1
+        return response
+
+    def __hedge(self, operation, request, primary_func, secondary_func, description) -> AllocateResponse:
+        """
+        Runs the primary on a worker thread and starts the secondary, on its own copy of the request and its own worker
+        threads, if the primary fails or has not answered within the hedge delay.  The first successful response wins,
+        the other is discarded.
+        """
+        secondary_request = request.copy()
+        delay = self.__get_hedge_delay()
+
+        primary_future = self.__get_executor(PRIMARY).submit(self.__timed, PRIMARY, primary_func, request)
+        primary_future.add_done_callback(self.__release_primary)
+        try:
+            response = primary_future.result(timeout=delay)
+            self.__win_counts[PRIMARY] += 1
+            return response
+        except FutureTimeoutError:
+            log.info("Primary allocator: '{}' did not {} within: {:.3f}s, hedging with: '{}'".format(
+                self.__primary_allocator.__class__.__name__,
+                description,
+                delay,
+                self.__secondary_allocator.__class__.__name__))
+            self.__hedged_count += 1
+        except SolverOverloadedException as e:
+            self.__on_overloaded(e, description)
+        except:
+            log.exception("Failed to {} with primary allocator: '{}', falling back to: '{}'".format(
+                description,
+                self.__primary_allocator.__class__.__name__,
+                self.__secondary_allocator.__class__.__name__))
+
+        self.__secondary_call_counts[operation] += 1
+        secondary_future = self.__get_executor(SECONDARY).submit(
+            self.__timed, SECONDARY, secondary_func, secondary_request)
+        paths = {primary_future: PRIMARY, secondary_future: SECONDARY}
+
+        pending = set(paths.keys())
+        while len(pending) > 0:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    self.__win_counts[paths[future]] += 1
+                    return future.result()
+
+        # Neither path succeeded, surface the secondary's failure as the sequential fallback would
+        raise secondary_future.exception()
+
+    def __on_overloaded(self, e: SolverOverloadedException, description):
+        log.info("Primary allocator: '{}' is overloaded and did not {}, falling back to: '{}' for: {}s".format(
+            self.__primary_allocator.__class__.__name__,
+            description,
+            self.__secondary_allocator.__class__.__name__,
+            e.retry_after_secs))
+        self.__overloaded_count += 1
+        if e.retry_after_secs > 0:
+            self.__skip_primary_until = max(self.__skip_primary_until, time.time() + e.retry_after_secs)
+
+    def __timed(self, path, func, request) -> AllocateResponse:
+        start_time = time.time()
+        response = func(request)
+        duration = time.time() - start_time
+
+        if path == PRIMARY:
+            with self.__lock:
+                self.__primary_latencies.append(duration)
+
+        if self.__reg is not None:
+            latency_key = PRIMARY_LATENCY if path == PRIMARY else FALLBACK_LATENCY
+            self.__reg.distribution_summary(latency_key, self.__tags).record(duration)
+
+        return response
+
+    def __get_hedge_delay(self) -> Optional[float]:
+        """
+        Returns how long to wait for the primary before hedging, or None to wait for it until it answers or fails, as
+        long as too few of its latencies are known.
+        """
+        with self.__lock:
+            if len(self.__primary_latencies) < HEDGE_MIN_SAMPLES:
+                return None
+            return float(np.percentile(self.__primary_latencies, self.__hedge_percentile))
+
+    def __reserve_primary(self) -> bool:
+        """
+        Returns whether a worker thread is free for the primary, and if so holds it until the primary's call completes.
+        """
+        with self.__lock:
+            if self.__primaries_in_flight >= HEDGE_WORKERS:
+                return False
+            self.__primaries_in_flight += 1
+            return True
+
+    def __release_primary(self, future):
+        with self.__lock:
+            self.__primaries_in_flight -= 1
+
+    def __get_executor(self, path) -> ThreadPoolExecutor:
+        with self.__lock:
+            if path not in self.__executors:
+                self.__executors[path] = ThreadPoolExecutor(
+                    max_workers=HEDGE_WORKERS, thread_name_prefix="hedge-{}".format(path))
+            return self.__executors[path]
+
+    def set_improvement_listener(self, listener):
+        self.__primary_allocator.set_improvement_listener(listener)
+        self.__secondary_allocator.set_improvement_listener(listener)
 
     def set_registry(self, registry, tags):
         self.__reg = registry
+        self.__tags = tags
         self.__primary_allocator.set_registry(registry, tags)
         self.__secondary_allocator.set_registry(registry, tags)
 
     def report_metrics(self, tags):
-        self.__reg.counter(PRIMARY_ASSIGN_COUNT, tags).increment(self.__primary_assign_threads_call_count)
-        self.__reg.counter(PRIMARY_FREE_COUNT, tags).increment(self.__primary_free_threads_call_count)
-        self.__reg.counter(PRIMARY_REBALANCE_COUNT, tags).increment(self.__primary_rebalance_call_count)
-        self.__reg.counter(FALLBACK_ASSIGN_COUNT, tags).increment(self.__secondary_assign_threads_call_count)
-        self.__reg.counter(FALLBACK_FREE_COUNT, tags).increment(self.__secondary_free_threads_call_count)
-        self.__reg.counter(FALLBACK_REBALANCE_COUNT, tags).increment(self.__secondary_rebalance_call_count)
-
-        self.__primary_assign_threads_call_count = 0
-        self.__primary_free_threads_call_count = 0
-        self.__primary_rebalance_call_count = 0
-        self.__secondary_assign_threads_call_count = 0
-        self.__secondary_free_threads_call_count = 0
-        self.__secondary_rebalance_call_count = 0
+        self.__reg.counter(PRIMARY_ASSIGN_COUNT, tags).increment(self.__primary_call_counts[ASSIGN])
+        self.__reg.counter(PRIMARY_FREE_COUNT, tags).increment(self.__primary_call_counts[FREE])
+        self.__reg.counter(PRIMARY_REBALANCE_COUNT, tags).increment(self.__primary_call_counts[REBALANCE])
+        self.__reg.counter(FALLBACK_ASSIGN_COUNT, tags).increment(self.__secondary_call_counts[ASSIGN])
+        self.__reg.counter(FALLBACK_FREE_COUNT, tags).increment(self.__secondary_call_counts[FREE])
+        self.__reg.counter(FALLBACK_REBALANCE_COUNT, tags).increment(self.__secondary_call_counts[REBALANCE])
+        self.__reg.counter(PRIMARY_WIN_COUNT, tags).increment(self.__win_counts[PRIMARY])
+        self.__reg.counter(FALLBACK_WIN_COUNT, tags).increment(self.__win_counts[SECONDARY])
+        self.__reg.counter(HEDGED_COUNT, tags).increment(self.__hedged_count)
+        self.__reg.counter(PRIMARY_OVERLOADED_COUNT, tags).increment(self.__overloaded_count)
+        self.__reg.counter(PRIMARY_SKIPPED_COUNT, tags).increment(self.__skipped_count)
+        self.__reg.gauge(HEDGED_PRIMARIES_IN_FLIGHT, tags).set(self.__primaries_in_flight)
+
+        self.__primary_call_counts = {ASSIGN: 0, FREE: 0, REBALANCE: 0}
+        self.__secondary_call_counts = {ASSIGN: 0, FREE: 0, REBALANCE: 0}
+        self.__win_counts = {PRIMARY: 0, SECONDARY: 0}
+        self.__hedged_count = 0
+        self.__overloaded_count = 0
+        self.__skipped_count = 0
 
         self.__primary_allocator.report_metrics(tags)
         self.__secondary_allocator.report_metrics(tags)
@@ -1,24 +1,27 @@
 from datetime import datetime as dt
-from collections import defaultdict
 import time
-from typing import Optional
+from typing import List, Optional
 
 from titus_optimize.compute_v3 import IPSolverParameters, IP_SOLUTION_TIME_BOUND, PlacementSolver
 
 from titus_isolate import log
 from titus_isolate.allocate.allocate_request import AllocateRequest
 from titus_isolate.allocate.allocate_response import AllocateResponse, get_workload_allocations
+from titus_isolate.allocate.allocate_threads_batch_request import AllocateThreadsBatchRequest
 from titus_isolate.allocate.allocate_threads_request import AllocateThreadsRequest
+from titus_isolate.allocate.canonical import get_canonical_placement
 from titus_isolate.allocate.constants import FREE_THREAD_IDS
 from titus_isolate.allocate.cpu_allocator import CpuAllocator
+from titus_isolate.allocate.solver_budget import SolverBudgetController, ASSIGN, FREE, REBALANCE, mark_time_limited
 from titus_isolate.config.config_manager import ConfigManager
 from titus_isolate.config.constants import ALPHA_NU, DEFAULT_ALPHA_NU, ALPHA_LLC, DEFAULT_ALPHA_LLC, ALPHA_L12, \
-    DEFAULT_ALPHA_L12, ALPHA_PREV, DEFAULT_ALPHA_PREV, \
-    MAX_SOLVER_RUNTIME, DEFAULT_MAX_SOLVER_RUNTIME, \
-    RELATIVE_MIP_GAP_STOP, DEFAULT_RELATIVE_MIP_GAP_STOP, MIP_SOLVER, DEFAULT_MIP_SOLVER
-from titus_isolate.metrics.constants import IP_ALLOCATOR_TIMEBOUND_COUNT, FORECAST_REBALANCE_FAILURE_COUNT
+    DEFAULT_ALPHA_L12, ALPHA_PREV, DEFAULT_ALPHA_PREV, MIP_SOLVER, DEFAULT_MIP_SOLVER, \
+    WARM_START_USAGE_TOLERANCE, DEFAULT_WARM_START_USAGE_TOLERANCE
+from titus_isolate.metrics.constants import IP_ALLOCATOR_TIMEBOUND_COUNT, FORECAST_REBALANCE_FAILURE_COUNT, \
+    FORECAST_SOLVE_COUNT, FORECAST_WARM_START_COUNT, FORECAST_SOLVE_DURATION
 from titus_isolate.model.processor.cpu import Cpu
-from titus_isolate.model.utils import get_burst_workloads, release_all_threads
+from titus_isolate.model.processor.utils import get_placement_vector
+from titus_isolate.model.utils import get_burst_workloads
 from titus_isolate.model.utils import get_sorted_workloads
 from titus_isolate.monitor.free_thread_provider import FreeThreadProvider
 from titus_isolate.predict.cpu_usage_predictor import PredEnvironment, CpuUsagePredictor
@@ -40,6 +43,53 @@ class CUVector:
         return str(vars(self))
 
 
+class Incumbent:
+    """
+    The last solution computed for a topology, along with the problem it solved and the placement the CPU was left with
+    once burst workloads claimed their threads.
+    """
+
+    def __init__(
+            self,
+            workload_ids: List[str],
+            requested_units: List[int],
+            predicted_usage: Optional[List[float]],
+            placement: List[List[int]]):
+        self.workload_ids = list(workload_ids)
+        self.requested_units = [int(e) for e in requested_units]
+        self.predicted_usage = None if predicted_usage is None else list(predicted_usage)
+        self.placement = placement
+        self.result = None
+
+    def set_result(self, cpu: Cpu):
+        self.result = [get_placement_vector(cpu, cpu.get_workload_thread_ids(w_id)) for w_id in self.workload_ids]
+
+    def is_current(
+            self,
+            workload_ids: List[str],
+            requested_units: List[int],
+            predicted_usage: Optional[List[float]],
+            current_placement: Optional[List[List[int]]],
+            usage_tolerance: float) -> bool:
+        """
+        The incumbent is still current when the same workloads request the same units, they have not moved since it
+        was computed, and no workload's predicted usage changed by more than the given relative tolerance.
+        """
+        if usage_tolerance < 0:
+            return False
+        if self.workload_ids != list(workload_ids) or self.requested_units != [int(e) for e in requested_units]:
+            return False
+        if current_placement is None or self.result != [list(v) for v in current_placement]:
+            return False
+
+        if self.predicted_usage is None or predicted_usage is None:
+            return self.predicted_usage is None and predicted_usage is None
+        for previous, current in zip(self.predicted_usage, predicted_usage):
+            if abs(current - previous) > usage_tolerance * max(abs(previous), 1e-6):
+                return False
+        return True
+
+
 class ForecastIPCpuAllocator(CpuAllocator):
 
     def __init__(self,
@@ -55,9 +105,15 @@ class ForecastIPCpuAllocator(CpuAllocator):
             alpha_l12=config_manager.get_float(ALPHA_L12, DEFAULT_ALPHA_L12),
             alpha_prev=config_manager.get_float(ALPHA_PREV, DEFAULT_ALPHA_PREV))
 
-        self.__solver_max_runtime_secs = config_manager.get_float(MAX_SOLVER_RUNTIME, DEFAULT_MAX_SOLVER_RUNTIME)
+        self.__budget_controller = SolverBudgetController(config_manager)
         self.__solver_name = config_manager.get_str(MIP_SOLVER, DEFAULT_MIP_SOLVER)
-        self.__solver_mip_gap = config_manager.get_float(RELATIVE_MIP_GAP_STOP, DEFAULT_RELATIVE_MIP_GAP_STOP)
+        self.__warm_start_usage_tolerance = config_manager.get_float(
+            WARM_START_USAGE_TOLERANCE, DEFAULT_WARM_START_USAGE_TOLERANCE)
+        self.__solvers = {}
+        self.__incumbents = {}
+        self.__solve_count = 0
+        self.__warm_start_count = 0
+        self.__tags = None
         self.__cpu_usage_predictor_manager = cpu_usage_predictor_manager
         self.__config_manager = config_manager
         self.__free_thread_provider = free_thread_provider
@@ -78,6 +134,20 @@ class ForecastIPCpuAllocator(CpuAllocator):
             self.get_name(),
             self.__call_meta)
 
+    def assign_threads_batch(self, request: AllocateThreadsBatchRequest) -> AllocateResponse:
+        self.__call_meta = {}
+        cpu = request.get_cpu()
+        cpu_usage = request.get_cpu_usage()
+        workloads = request.get_workloads()
+        curr_ids_per_workload = cpu.get_workload_ids_to_thread_ids()
+        cu_vector = self.__get_batch_cu_vector(cpu, request.get_workload_ids(), workloads, curr_ids_per_workload)
+
+        return AllocateResponse(
+            self.__compute_allocation(cpu, None, workloads, curr_ids_per_workload, cpu_usage, True, cu_vector),
+            get_workload_allocations(cpu, list(workloads.values())),
+            self.get_name(),
+            self.__call_meta)
+
     def free_threads(self, request: AllocateThreadsRequest) -> AllocateResponse:
         self.__call_meta = {}
         cpu = request.get_cpu()
@@ -120,9 +190,11 @@ class ForecastIPCpuAllocator(CpuAllocator):
             self.get_name(),
             self.__call_meta)
 
-    def __compute_allocation(self, cpu, workload_id, workloads, curr_ids_per_workload, cpu_usage, is_add):
+    def __compute_allocation(
+            self, cpu, workload_id, workloads, curr_ids_per_workload, cpu_usage, is_add, cu_vector: CUVector = None):
         predicted_usage = self.__predict_usage(workloads, cpu_usage)
-        cpu = self.__place_threads(cpu, workload_id, workloads, curr_ids_per_workload, predicted_usage, is_add)
+        cpu = self.__place_threads(
+            cpu, workload_id, workloads, curr_ids_per_workload, predicted_usage, is_add, cu_vector)
 
         # Burst workload computation
         burst_workloads = get_burst_workloads(workloads.values())
@@ -137,6 +209,10 @@ class ForecastIPCpuAllocator(CpuAllocator):
                 t.claim(w_id)
 
         self.__call_meta[FREE_THREAD_IDS] = [t.get_id() for t in free_threads]
+
+        incumbent = self.__incumbents.get(self.__get_solver_key(len(cpu.get_threads()), len(cpu.get_packages())))
+        if incumbent is not None:
+            incumbent.set_result(cpu)
         return cpu
 
     def get_name(self) -> str:
@@ -174,9 +250,16 @@ class ForecastIPCpuAllocator(CpuAllocator):
             self.__call_meta['pred_cpu_usage'] = dict(res)
         return res
 
-    def __place_threads(self, cpu, workload_id, workloads, curr_ids_per_workload, predicted_cpu_usage, is_add) -> Cpu:
+    def __place_threads(
+            self, cpu, workload_id, workloads, curr_ids_per_workload, predicted_cpu_usage, is_add, cu_vector) -> Cpu:
         # this will predict against the new or deleted workload too if it's static
-        cu_vector = self.__get_requested_cu_vector(cpu, workload_id, workloads, curr_ids_per_workload, is_add)
+        if cu_vector is None:
+            cu_vector = self.__get_requested_cu_vector(cpu, workload_id, workloads, curr_ids_per_workload, is_add)
+
+        if is_add is None:
+            operation = REBALANCE
+        else:
+            operation = ASSIGN if is_add else FREE
 
         cpu = self.__compute_apply_placement(
             cpu,
@@ -184,15 +267,13 @@ class ForecastIPCpuAllocator(CpuAllocator):
             cu_vector.curr_placement_vectors_static,
             predicted_cpu_usage,
             workloads,
-            cu_vector.ordered_workload_ids)
+            cu_vector.ordered_workload_ids,
+            operation)
 
         return cpu
 
     @staticmethod
     def __get_requested_cu_vector(cpu, workload_id, workloads, curr_ids_per_workload, is_add) -> CUVector:
-        n_compute_units = len(cpu.get_threads())
-        tid_2order = cpu.get_natural_indexing_2_original_indexing()
-
         ordered_workload_ids = [w.get_id() for w in get_sorted_workloads(workloads.values())]
 
         changed_workload = workloads.get(workload_id, None)
@@ -201,9 +282,7 @@ class ForecastIPCpuAllocator(CpuAllocator):
         for wid in ordered_workload_ids:
             if (changed_workload is not None) and (wid == changed_workload.get_id()) and is_add:
                 continue
-            cids = curr_ids_per_workload[wid]
-            v = [1 if tid_2order[i] in cids else 0 for i in range(n_compute_units)]
-            curr_placement_vectors_static.append(v)
+            curr_placement_vectors_static.append(get_placement_vector(cpu, curr_ids_per_workload[wid]))
 
         is_remove = (not is_add) and workload_id in ordered_workload_ids
 
@@ -225,13 +304,25 @@ class ForecastIPCpuAllocator(CpuAllocator):
             ordered_workload_ids)
 
     @staticmethod
-    def __assign_new_mapping(cpu, thread_id2workload_ids):
-        cpu.clear()
-        for t in cpu.get_threads():
-            wids = thread_id2workload_ids.get(t.get_id(), None)
-            if wids is not None:
-                for wi in wids:
-                    t.claim(wi)
+    def __get_batch_cu_vector(cpu, workload_ids, workloads, curr_ids_per_workload) -> CUVector:
+        """
+        The workloads already running keep their current placement vectors, the new workloads follow them in arrival
+        order, so all of them are placed with a single solve.
+        """
+        new_workload_ids = set(workload_ids)
+        ordered_workload_ids = [
+            w.get_id() for w in get_sorted_workloads(workloads.values()) if w.get_id() not in new_workload_ids]
+
+        curr_placement_vectors_static = [
+            get_placement_vector(cpu, curr_ids_per_workload[wid]) for wid in ordered_workload_ids]
+
+        ordered_workload_ids += list(workload_ids)
+        requested_cus = [workloads[wid].get_thread_count() for wid in ordered_workload_ids]
+
+        return CUVector(
+            requested_cus,
+            curr_placement_vectors_static if len(curr_placement_vectors_static) > 0 else None,
+            ordered_workload_ids)
 
     def __compute_apply_placement(
             self,
@@ -240,7 +331,8 @@ class ForecastIPCpuAllocator(CpuAllocator):
             curr_placement_vectors_static,
             predicted_usage_static,
             workloads,
-            ordered_workload_ids_static):
+            ordered_workload_ids_static,
+            operation):
 
         predicted_usage_static_vector = None
         if len(predicted_usage_static) > 0:
@@ -248,33 +340,53 @@ class ForecastIPCpuAllocator(CpuAllocator):
 
         new_placement_vectors = self.__compute_new_placement(
             cpu,
+            ordered_workload_ids_static,
             requested_cus,
             curr_placement_vectors_static,
-            predicted_usage_static_vector)
+            predicted_usage_static_vector,
+            operation)
 
-        tid_2order = cpu.get_natural_indexing_2_original_indexing()
-        thread_id2workload_ids = defaultdict(list)
-
-        for w_ind, v in enumerate(new_placement_vectors):
-            for i, e in enumerate(v):
-                if e == 1:
-                    thread_id2workload_ids[tid_2order[i]].append(ordered_workload_ids_static[w_ind])
-
-        release_all_threads(cpu, workloads.values())
-        self.__assign_new_mapping(cpu, thread_id2workload_ids)
+        cpu.assign_placement(ordered_workload_ids_static, new_placement_vectors)
 
         # TODO: log what's in print_statistics of compute_v2
         return cpu
 
+    def __get_solver_key(self, num_threads, num_packages):
+        return num_threads, num_packages, self.__solver_name, str(self.__ip_solver_params)
+
+    def __get_placement_solver(self, solver_key) -> PlacementSolver:
+        solver = self.__solvers.get(solver_key)
+        if solver is None:
+            num_threads, num_packages, _, _ = solver_key
+            solver = PlacementSolver(
+                total_available_cus=num_threads,
+                num_sockets=num_packages,
+                solver_params=self.__ip_solver_params,
+                backend=self.__solver_name)
+            self.__solvers[solver_key] = solver
+        return solver
+
     def __compute_new_placement(
             self,
             cpu,
+            workload_ids,
             requested_units,
             current_placement,
-            predicted_usage):
+            predicted_usage,
+            operation):
 
         num_threads = len(cpu.get_threads())
         num_packages = len(cpu.get_packages())
+        solver_key = self.__get_solver_key(num_threads, num_packages)
+
+        # Most rebalances find the CPU as the last solve left it, with similar predictions, so the last solution stands
+        incumbent = self.__incumbents.get(solver_key)
+        if incumbent is not None and incumbent.is_current(
+                workload_ids, requested_units, predicted_usage, current_placement, self.__warm_start_usage_tolerance):
+            self.__warm_start_count += 1
+            self.__call_meta['ip_warm_start'] = 1
+            return [list(v) for v in incumbent.placement]
+        self.__call_meta['ip_warm_start'] = 0
 
         sparse_prev_alloc = None
         if current_placement is not None:
@@ -295,25 +407,29 @@ class ForecastIPCpuAllocator(CpuAllocator):
         if use_per_workload is not None:
             self.__call_meta['ip_solver_call_args']['use_per_workload'] = use_per_workload
 
+        canonical = get_canonical_placement(cpu, current_placement)
+        budget = self.__budget_controller.get_budget(operation, num_threads, len(requested_units))
+        self.__call_meta['ip_solver_budget'] = vars(budget)
+
         try:
-            placement_solver = PlacementSolver(
-                total_available_cus=num_threads,
-                num_sockets=num_packages,
-                solver_params=self.__ip_solver_params,
-                backend=self.__solver_name)
+            placement_solver = self.__get_placement_solver(solver_key)
 
             start_time = time.time()
 
             placement, status, prob, _ = placement_solver.optimize(
                 requested_cus=requested_units,
-                previous_allocation=current_placement,
+                previous_allocation=canonical.to_canonical(current_placement),
                 use_per_workload=predicted_usage,
                 verbose=False,
-                max_runtime_secs=self.__solver_max_runtime_secs,
-                mip_gap=self.__solver_mip_gap)
+                max_runtime_secs=budget.runtime_secs,
+                mip_gap=budget.mip_gap)
 
             stop_time = time.time()
 
+            self.__budget_controller.record(operation, num_threads, len(requested_units), stop_time - start_time)
+            self.__solve_count += 1
+            if self.__reg is not None:
+                self.__reg.distribution_summary(FORECAST_SOLVE_DURATION, self.__tags).record(stop_time - start_time)
             self.__call_meta['ip_solver_call_dur_secs'] = stop_time - start_time
             self.__call_meta['ip_success'] = 1
             internal_solver_time = prob.solution.attr.get('solve_time', None)
@@ -322,19 +438,30 @@ class ForecastIPCpuAllocator(CpuAllocator):
 
             if status == IP_SOLUTION_TIME_BOUND:
                 self.__time_bound_call_count += 1
+                mark_time_limited()
 
         except Exception as e:
             self.__call_meta['ip_success'] = 0
+            self.__incumbents.pop(solver_key, None)
             raise e
 
-        return placement
+        placement = canonical.from_canonical(placement)
+        self.__incumbents[solver_key] = Incumbent(workload_ids, requested_units, predicted_usage, placement)
+        return [list(v) for v in placement]
+
+    def get_budget_controller(self) -> SolverBudgetController:
+        return self.__budget_controller
 
     def set_solver_max_runtime_secs(self, val):
-        self.__solver_max_runtime_secs = val
+        self.__budget_controller.set_max_runtime_secs(val)
 
     def set_registry(self, registry, tags):
         self.__reg = registry
+        self.__tags = tags
 
     def report_metrics(self, tags):
         self.__reg.gauge(IP_ALLOCATOR_TIMEBOUND_COUNT, tags).set(self.__time_bound_call_count)
         self.__reg.gauge(FORECAST_REBALANCE_FAILURE_COUNT, tags).set(self.__rebalance_failure_count)
+        self.__reg.gauge(FORECAST_SOLVE_COUNT, tags).set(self.__solve_count)
+        self.__reg.gauge(FORECAST_WARM_START_COUNT, tags).set(self.__warm_start_count)
+        self.__budget_controller.report_metrics(self.__reg, tags)
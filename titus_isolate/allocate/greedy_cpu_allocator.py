@@ -1,6 +1,7 @@
 from titus_isolate import log
 from titus_isolate.allocate.allocate_request import AllocateRequest
 from titus_isolate.allocate.allocate_response import AllocateResponse, get_workload_allocations
+from titus_isolate.allocate.allocate_threads_batch_request import AllocateThreadsBatchRequest
 from titus_isolate.allocate.allocate_threads_request import AllocateThreadsRequest
 from titus_isolate.allocate.cpu_allocator import CpuAllocator
 from titus_isolate.event.constants import STATIC
@@ -35,6 +36,25 @@ class GreedyCpuAllocator(CpuAllocator):
             self.get_name(),
             metadata)
 
+    def assign_threads_batch(self, request: AllocateThreadsBatchRequest) -> AllocateResponse:
+        cpu = request.get_cpu()
+        workloads = request.get_workloads()
+
+        burst_workloads = get_burst_workloads(workloads.values())
+        release_all_threads(cpu, burst_workloads)
+        for workload_id in request.get_workload_ids():
+            if workloads[workload_id].get_type() == STATIC:
+                self.__assign_threads(cpu, workloads[workload_id])
+
+        metadata = {}
+        update_burst_workloads(cpu, workloads, self.__free_thread_provider, metadata)
+
+        return AllocateResponse(
+            cpu,
+            get_workload_allocations(cpu, workloads.values()),
+            self.get_name(),
+            metadata)
+
     def free_threads(self, request: AllocateThreadsRequest) -> AllocateResponse:
         cpu = request.get_cpu()
         workloads = request.get_workloads()
@@ -42,9 +62,7 @@ class GreedyCpuAllocator(CpuAllocator):
 
         burst_workloads = get_burst_workloads(workloads.values())
         release_all_threads(cpu, burst_workloads)
-        for t in cpu.get_threads():
-            if workload_id in t.get_workload_ids():
-                t.free(workload_id)
+        cpu.free(workload_id)
 
         workloads.pop(workload_id)
         metadata = {}
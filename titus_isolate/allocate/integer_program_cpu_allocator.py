@@ -1,14 +1,34 @@
+import time
+from concurrent.futures.process import BrokenProcessPool
+from threading import Lock
+from typing import Optional
+
+from titus_isolate import log
 from titus_isolate.allocate.allocate_request import AllocateRequest
 from titus_isolate.allocate.allocate_response import AllocateResponse, get_workload_allocations
+from titus_isolate.allocate.allocate_threads_batch_request import AllocateThreadsBatchRequest
 from titus_isolate.allocate.allocate_threads_request import AllocateThreadsRequest
+from titus_isolate.allocate.canonical import get_canonical_placement
 from titus_isolate.allocate.cpu_allocator import CpuAllocator
-from titus_isolate.config.constants import DEFAULT_MAX_SOLVER_RUNTIME, MAX_SOLVER_RUNTIME
+from titus_isolate.allocate.decompose import get_package_problems, merge_package_solutions, merge_statuses, \
+    solve_package_problem
+from titus_isolate.allocate.placement_atlas import PlacementAtlas, load_placement_atlas
+from titus_isolate.allocate.spawn_pool import SpawnPool
+from titus_isolate.allocate.solution_cache import SolutionCache, DiskSolutionStore, get_solution_key
+from titus_isolate.allocate.solver_budget import SolverBudgetController, ASSIGN, FREE, mark_time_limited
+from titus_isolate.config.constants import IP_SOLUTION_CACHE_MAX_ENTRIES, DEFAULT_IP_SOLUTION_CACHE_MAX_ENTRIES, \
+    IP_SOLUTION_CACHE_MAX_BYTES, DEFAULT_IP_SOLUTION_CACHE_MAX_BYTES, IP_SOLUTION_CACHE_DIR, IP_PACKAGE_DECOMPOSITION, \
+    DEFAULT_IP_PACKAGE_DECOMPOSITION, IP_DECOMPOSITION_WORKERS, DEFAULT_IP_DECOMPOSITION_WORKERS, IP_PLACEMENT_ATLAS, \
+    IP_SOLUTION_CACHE_DIR_MAX_BYTES, DEFAULT_IP_SOLUTION_CACHE_DIR_MAX_BYTES
 from titus_isolate.utils import get_config_manager
-from titus_optimize.compute import IP_SOLUTION_TIME_BOUND, optimize_ip
+from titus_optimize.compute import IP_SOLUTION_OPTIMAL, IP_SOLUTION_TIME_BOUND, optimize_ip
 
 from titus_isolate.event.constants import STATIC
-from titus_isolate.metrics.constants import IP_ALLOCATOR_TIMEBOUND_COUNT
-from titus_isolate.model.processor.utils import is_cpu_full
+from titus_isolate.metrics.constants import IP_ALLOCATOR_TIMEBOUND_COUNT, IP_ALLOCATOR_CACHE_HIT_COUNT, \
+    IP_ALLOCATOR_CACHE_DISK_HIT_COUNT, IP_ALLOCATOR_CACHE_MISS_COUNT, IP_ALLOCATOR_CACHE_EVICTION_COUNT, \
+    IP_ALLOCATOR_CACHE_SIZE, IP_ALLOCATOR_CACHE_BYTES, IP_ALLOCATOR_DECOMPOSED_COUNT, IP_ALLOCATOR_ATLAS_HIT_COUNT
+from titus_isolate.model.processor.config import get_cpu
+from titus_isolate.model.processor.utils import is_cpu_full, get_placement_vector
 from titus_isolate.model.utils import get_sorted_workloads, get_burst_workloads, release_all_threads, \
     update_burst_workloads, rebalance
 from titus_isolate.monitor.empty_free_thread_provider import EmptyFreeThreadProvider
@@ -16,15 +36,50 @@ from titus_isolate.monitor.empty_free_thread_provider import EmptyFreeThreadProv
 
 class IntegerProgramCpuAllocator(CpuAllocator):
 
-    def __init__(self, free_thread_provider=EmptyFreeThreadProvider()):
+    def __init__(
+            self,
+            free_thread_provider=EmptyFreeThreadProvider(),
+            solution_cache: SolutionCache = None,
+            decompose_packages: bool = None,
+            placement_atlas: PlacementAtlas = None,
+            budget_controller: SolverBudgetController = None):
 
         self.__reg = None
-        self.__cache = {}
         self.__time_bound_call_count = 0
+        self.__decomposed_call_count = 0
+        self.__atlas_hit_count = 0
 
-        self.__solver_max_runtime_secs = get_config_manager().get_float(MAX_SOLVER_RUNTIME, DEFAULT_MAX_SOLVER_RUNTIME)
+        config_manager = get_config_manager()
+        if budget_controller is None:
+            budget_controller = SolverBudgetController(config_manager)
+        self.__budget_controller = budget_controller
         self.__free_thread_provider = free_thread_provider
 
+        if solution_cache is None:
+            solution_cache = self.__get_solution_cache(config_manager)
+        self.__cache = solution_cache
+
+        if placement_atlas is None:
+            placement_atlas = self.__get_placement_atlas(config_manager)
+        self.__atlas = placement_atlas
+
+        if decompose_packages is None:
+            decompose_packages = config_manager.get_bool(IP_PACKAGE_DECOMPOSITION, DEFAULT_IP_PACKAGE_DECOMPOSITION)
+        self.__decompose_packages = decompose_packages
+        self.__decomposition_workers = \
+            config_manager.get_int(IP_DECOMPOSITION_WORKERS, DEFAULT_IP_DECOMPOSITION_WORKERS)
+        self.__pool_lock = Lock()
+        self.__pool = None
+
+    def close(self):
+        """
+        Shuts the package solver workers down, a later decomposed solve starts new ones.
+        """
+        with self.__pool_lock:
+            if self.__pool is not None:
+                self.__pool.shutdown(wait=False)
+                self.__pool = None
+
     def assign_threads(self, request: AllocateThreadsRequest) -> AllocateResponse:
         cpu = request.get_cpu()
         workloads = request.get_workloads()
@@ -44,6 +99,25 @@ class IntegerProgramCpuAllocator(CpuAllocator):
             self.get_name(),
             metadata)
 
+    def assign_threads_batch(self, request: AllocateThreadsBatchRequest) -> AllocateResponse:
+        cpu = request.get_cpu()
+        workloads = request.get_workloads()
+
+        burst_workloads = get_burst_workloads(workloads.values())
+        release_all_threads(cpu, burst_workloads)
+        static_workload_ids = [w_id for w_id in request.get_workload_ids() if workloads[w_id].get_type() == STATIC]
+        if len(static_workload_ids) > 0:
+            self.__assign_threads_batch(cpu, static_workload_ids, workloads)
+
+        metadata = {}
+        update_burst_workloads(cpu, workloads, self.__free_thread_provider, metadata)
+
+        return AllocateResponse(
+            cpu,
+            get_workload_allocations(cpu, workloads.values()),
+            self.get_name(),
+            metadata)
+
     def free_threads(self, request: AllocateThreadsRequest) -> AllocateResponse:
         cpu = request.get_cpu()
         workloads = request.get_workloads()
@@ -91,18 +165,13 @@ class IntegerProgramCpuAllocator(CpuAllocator):
         if is_cpu_full(cpu):
             raise ValueError("CPU is full, failed to add workload: '{}'".format(workload_id))
 
-        n_compute_units = len(cpu.get_threads())
         curr_ids_per_workload = cpu.get_workload_ids_to_thread_ids()
 
-        from titus_isolate.model.utils import get_sorted_workloads
         ordered_workload_ids = [w.get_id() for w in get_sorted_workloads(workloads.values())]
-        tid_2order = {i: t.get_id() for i, t in enumerate(cpu.get_threads())}
 
         curr_placement_vectors = []
         for wid in ordered_workload_ids:
-            cids = curr_ids_per_workload[wid]
-            v = [1 if tid_2order[i] in cids else 0 for i in range(n_compute_units)]
-            curr_placement_vectors.append(v)
+            curr_placement_vectors.append(get_placement_vector(cpu, curr_ids_per_workload[wid]))
         if len(curr_placement_vectors) == 0:
             curr_placement_vectors = None
             requested_cus = []
@@ -112,18 +181,37 @@ class IntegerProgramCpuAllocator(CpuAllocator):
         workload = workloads[workload_id]
         requested_cus += [workload.get_thread_count()]
 
-        new_placement_vectors = self.__compute_new_placement(cpu, curr_placement_vectors, requested_cus)
+        new_placement_vectors = self.__compute_new_placement(cpu, curr_placement_vectors, requested_cus, ASSIGN)
 
         ordered_workload_ids.append(workload.get_id())
+        cpu.assign_placement(ordered_workload_ids, new_placement_vectors)
+
+        return cpu
 
-        thread_id2workload_id = {}
-        for w_ind, v in enumerate(new_placement_vectors):
-            for i, e in enumerate(v):
-                if e == 1:
-                    thread_id2workload_id[tid_2order[i]] = ordered_workload_ids[w_ind]
+    def __assign_threads_batch(self, cpu, workload_ids, workloads):
+        """
+        Places all the given workloads with a single solve.  The workloads already running keep their current
+        placement vectors, the new workloads follow them in arrival order.
+        """
+
+        if is_cpu_full(cpu):
+            raise ValueError("CPU is full, failed to add workloads: {}".format(workload_ids))
 
-        self.__assign_new_mapping(cpu, thread_id2workload_id)
+        curr_ids_per_workload = cpu.get_workload_ids_to_thread_ids()
+
+        new_workload_ids = set(workload_ids)
+        ordered_workload_ids = [
+            w.get_id() for w in get_sorted_workloads(workloads.values()) if w.get_id() not in new_workload_ids]
 
+        curr_placement_vectors = [get_placement_vector(cpu, curr_ids_per_workload[wid]) for wid in ordered_workload_ids]
+        requested_cus = [sum(v) for v in curr_placement_vectors]
+        requested_cus += [workloads[wid].get_thread_count() for wid in workload_ids]
+        if len(curr_placement_vectors) == 0:
+            curr_placement_vectors = None
+
+        new_placement_vectors = self.__compute_new_placement(cpu, curr_placement_vectors, requested_cus, ASSIGN)
+
+        cpu.assign_placement(ordered_workload_ids + list(workload_ids), new_placement_vectors)
         return cpu
 
     def __free_threads(self, cpu, workload_id, workloads):
@@ -132,76 +220,222 @@ class IntegerProgramCpuAllocator(CpuAllocator):
         after removing the given workload from the cpu.
         """
 
-        n_compute_units = len(cpu.get_threads())
-
         curr_ids_per_workload = cpu.get_workload_ids_to_thread_ids()
 
         if workload_id not in curr_ids_per_workload:
             raise Exception("workload_id=`%s` is not placed on the instance. Cannot free it." % (workload_id,))
 
         ordered_workload_ids = [w.get_id() for w in get_sorted_workloads(workloads.values())]
-        tid_2order = {i: t.get_id() for i, t in enumerate(cpu.get_threads())}
 
         curr_placement_vectors = []
         for wid in ordered_workload_ids:
-            cids = curr_ids_per_workload[wid]
-            v = [1 if tid_2order[i] in cids else 0 for i in range(n_compute_units)]
-            curr_placement_vectors.append(v)
+            curr_placement_vectors.append(get_placement_vector(cpu, curr_ids_per_workload[wid]))
         if len(curr_placement_vectors) == 0:
             raise Exception("Cannot free a workload from an empty CPU")
 
         requested_cus = [len(curr_ids_per_workload[wid]) if wid != workload_id else 0 for wid in ordered_workload_ids]
 
-        new_placement_vectors = self.__compute_new_placement(cpu, curr_placement_vectors, requested_cus)
-
-        thread_id2workload_id = {}
-        for w_ind, v in enumerate(new_placement_vectors):
-            if ordered_workload_ids[w_ind] == workload_id:
-                continue
-            for i, e in enumerate(v):
-                if e == 1:
-                    thread_id2workload_id[tid_2order[i]] = ordered_workload_ids[w_ind]
+        new_placement_vectors = self.__compute_new_placement(cpu, curr_placement_vectors, requested_cus, FREE)
 
-        self.__assign_new_mapping(cpu, thread_id2workload_id)
+        remaining = [(wid, v) for wid, v in zip(ordered_workload_ids, new_placement_vectors) if wid != workload_id]
+        cpu.assign_placement([wid for wid, _ in remaining], [v for _, v in remaining])
         return cpu
 
-    @staticmethod
-    def __assign_new_mapping(cpu, thread_id2workload_id):
-        cpu.clear()
-        for t in cpu.get_threads():
-            wid = thread_id2workload_id.get(t.get_id(), None)
-            if wid is not None:
-                t.claim(wid)
-
-    def __compute_new_placement(self, cpu, current_placement, requested_units):
-        key_req = '-'.join([str(e) for e in requested_units])
-        cache_key = key_req
-        if current_placement is not None:
-            cache_key += '&' + '%'.join(['|'.join([str(e) for e in v]) for v in current_placement])
-
-        cache_val = self.__cache.get(cache_key, None)
+    def __compute_new_placement(self, cpu, current_placement, requested_units, operation):
+        if self.__decompose_packages:
+            problems = get_package_problems(cpu, current_placement, requested_units)
+            if problems is not None:
+                self.__decomposed_call_count += 1
+                return self.__compute_decomposed_placement(cpu, problems, len(requested_units), operation)
+
+        return self.__compute_global_placement(cpu, current_placement, requested_units, operation)
+
+    def __compute_global_placement(self, cpu, current_placement, requested_units, operation):
+        thread_count = len(cpu.get_threads())
+        package_count = len(cpu.get_packages())
+
+        # Solve and cache in canonical form, so states which only differ by a relabeling of packages, cores or threads
+        # share a solution
+        canonical = get_canonical_placement(cpu, current_placement)
+        current_placement = canonical.to_canonical(current_placement)
+        cache_key = get_solution_key(thread_count, package_count, requested_units, current_placement)
+
+        cache_val = self.__get_cached_solution(cache_key)
         if cache_val is None:
+            budget = self.__budget_controller.get_budget(operation, thread_count, len(requested_units))
+            start_time = time.time()
             placement, status = optimize_ip(
                 requested_units,
-                len(cpu.get_threads()),
-                len(cpu.get_packages()),
+                thread_count,
+                package_count,
                 current_placement,
                 verbose=False,
-                max_runtime_secs=self.__solver_max_runtime_secs)
-            self.__cache[cache_key] = (placement, status)
+                max_runtime_secs=budget.runtime_secs)
+            self.__budget_controller.record(operation, thread_count, len(requested_units), time.time() - start_time)
+            self.__cache.put(cache_key, placement, status)
         else:
-            placement, status = cache_val[0], cache_val[1]
+            placement, status = cache_val
 
         if status == IP_SOLUTION_TIME_BOUND:
             self.__time_bound_call_count += 1
+            mark_time_limited()
+
+        return canonical.from_canonical(placement)
+
+    def __compute_decomposed_placement(self, cpu, problems, workload_count, operation):
+        """
+        Solves every package on its own, in parallel, and merges the package solutions.  Package problems are much
+        smaller than the global problem and, being independent of the other packages, are more likely to be cached.
+        """
+        package = cpu.get_packages()[0]
+        package_size = len(package.get_threads())
+        package_cpu = get_cpu(1, len(package.get_cores()), len(package.get_cores()[0].get_threads()))
+        if len(package_cpu.get_threads()) != package_size:
+            package_cpu = None
+
+        solutions = [None] * len(problems)
+        misses = []
+        for i, problem in enumerate(problems):
+            if problem.is_empty():
+                solutions[i] = ([[0] * package_size for _ in problem.get_workload_indices()], IP_SOLUTION_OPTIMAL)
+                continue
+
+            current_placement = problem.get_current_placement()
+            canonical = get_canonical_placement(package_cpu, current_placement) if package_cpu is not None else None
+            if canonical is not None:
+                current_placement = canonical.to_canonical(current_placement)
+            cache_key = get_solution_key(package_size, 1, problem.get_requested_units(), current_placement)
+
+            cache_val = self.__get_cached_solution(cache_key)
+            if cache_val is None:
+                misses.append((i, canonical, cache_key, (problem.get_requested_units(), current_placement)))
+            else:
+                solutions[i] = (self.__from_canonical(canonical, cache_val[0]), cache_val[1])
+
+        results = []
+        if len(misses) > 0:
+            thread_count = len(cpu.get_threads())
+            budget = self.__budget_controller.get_budget(operation, thread_count, workload_count)
+            start_time = time.time()
+            results = self.__solve_package_problems(package_size, [m[3] for m in misses], budget.runtime_secs)
+            self.__budget_controller.record(operation, thread_count, workload_count, time.time() - start_time)
+
+        for (i, canonical, cache_key, _), (placement, status) in zip(misses, results):
+            self.__cache.put(cache_key, placement, status)
+            solutions[i] = (self.__from_canonical(canonical, placement), status)
+
+        if merge_statuses([status for _, status in solutions]) == IP_SOLUTION_TIME_BOUND:
+            self.__time_bound_call_count += 1
+            mark_time_limited()
+
+        return merge_package_solutions(
+            len(cpu.get_threads()),
+            workload_count,
+            problems,
+            [placement for placement, _ in solutions])
+
+    def __solve_package_problems(self, package_size, problems, max_runtime_secs):
+        args = [(requested_units, package_size, current_placement, max_runtime_secs)
+                for requested_units, current_placement in problems]
+
+        # A single problem is not worth the round trip to a worker process
+        if len(args) < 2 or self.__decomposition_workers == 1:
+            return [solve_package_problem(*a) for a in args]
+
+        pool = self.__get_pool(len(args))
+        try:
+            return pool.map(solve_package_problem, args)
+        except BrokenProcessPool:
+            log.exception("Package solver worker exited, solving packages in process")
+            # The pool replaces workers which exit, it is only dropped once it can not
+            if pool.is_broken():
+                with self.__pool_lock:
+                    if self.__pool is pool:
+                        self.__pool = None
+                pool.shutdown(wait=False)
+            return [solve_package_problem(*a) for a in args]
+
+    def __get_pool(self, package_count) -> SpawnPool:
+        with self.__pool_lock:
+            if self.__pool is None:
+                workers = self.__decomposition_workers if self.__decomposition_workers > 0 else package_count
+                self.__pool = SpawnPool(workers)
+            return self.__pool
+
+    @staticmethod
+    def __from_canonical(canonical, placement):
+        if canonical is None:
+            return placement
+        return canonical.from_canonical(placement)
+
+    def __get_cached_solution(self, cache_key):
+        """
+        Looks the solution up in the placement atlas, then in the solution cache.
+        """
+        if self.__atlas is not None:
+            placement = self.__atlas.get(cache_key)
+            if placement is not None:
+                self.__atlas_hit_count += 1
+                return placement, IP_SOLUTION_OPTIMAL
+
+        return self.__cache.get(cache_key)
+
+    @staticmethod
+    def __get_placement_atlas(config_manager) -> Optional[PlacementAtlas]:
+        path = config_manager.get_str(IP_PLACEMENT_ATLAS)
+        if path is None:
+            return None
+
+        try:
+            atlas = load_placement_atlas(path)
+            log.info("Loaded placement atlas of {} placements from: {}".format(len(atlas), path))
+            return atlas
+        except Exception:
+            log.exception("Failed to load placement atlas from: {}, solving every placement".format(path))
+            return None
+
+    @staticmethod
+    def __get_solution_cache(config_manager) -> SolutionCache:
+        store = None
+        cache_dir = config_manager.get_str(IP_SOLUTION_CACHE_DIR)
+        if cache_dir is not None:
+            store = DiskSolutionStore(
+                cache_dir,
+                config_manager.get_int(IP_SOLUTION_CACHE_DIR_MAX_BYTES, DEFAULT_IP_SOLUTION_CACHE_DIR_MAX_BYTES))
+
+        # Time bound solutions depend on the solver budget, so only optimal ones are shared through the store
+        return SolutionCache(
+            max_entries=config_manager.get_int(IP_SOLUTION_CACHE_MAX_ENTRIES, DEFAULT_IP_SOLUTION_CACHE_MAX_ENTRIES),
+            max_bytes=config_manager.get_int(IP_SOLUTION_CACHE_MAX_BYTES, DEFAULT_IP_SOLUTION_CACHE_MAX_BYTES),
+            store=store,
+            persisted_statuses=(IP_SOLUTION_OPTIMAL,))
+
+    def get_solution_cache(self) -> SolutionCache:
+        return self.__cache
+
+    def get_decomposed_call_count(self) -> int:
+        return self.__decomposed_call_count
+
+    def get_atlas_hit_count(self) -> int:
+        return self.__atlas_hit_count
 
-        return placement
+    def get_budget_controller(self) -> SolverBudgetController:
+        return self.__budget_controller
 
     def set_solver_max_runtime_secs(self, val):
-        self.__solver_max_runtime_secs = val
+        self.__budget_controller.set_max_runtime_secs(val)
 
     def set_registry(self, registry, tags):
         self.__reg = registry
 
     def report_metrics(self, tags):
         self.__reg.gauge(IP_ALLOCATOR_TIMEBOUND_COUNT, tags).set(self.__time_bound_call_count)
+        self.__reg.gauge(IP_ALLOCATOR_CACHE_HIT_COUNT, tags).set(self.__cache.get_hit_count())
+        self.__reg.gauge(IP_ALLOCATOR_CACHE_DISK_HIT_COUNT, tags).set(self.__cache.get_disk_hit_count())
+        self.__reg.gauge(IP_ALLOCATOR_CACHE_MISS_COUNT, tags).set(self.__cache.get_miss_count())
+        self.__reg.gauge(IP_ALLOCATOR_CACHE_EVICTION_COUNT, tags).set(self.__cache.get_eviction_count())
+        self.__reg.gauge(IP_ALLOCATOR_CACHE_SIZE, tags).set(self.__cache.get_size())
+        self.__reg.gauge(IP_ALLOCATOR_CACHE_BYTES, tags).set(self.__cache.get_bytes())
+        self.__reg.gauge(IP_ALLOCATOR_DECOMPOSED_COUNT, tags).set(self.__decomposed_call_count)
+        self.__reg.gauge(IP_ALLOCATOR_ATLAS_HIT_COUNT, tags).set(self.__atlas_hit_count)
+        self.__budget_controller.report_metrics(self.__reg, tags)
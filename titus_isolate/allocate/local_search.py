@@ -0,0 +1,276 @@
+import time
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from titus_isolate.model.processor.cpu import Cpu
+
+LOCAL_SEARCH_CONVERGED = 'converged'
+LOCAL_SEARCH_TIME_BOUND = 'time_bound'
+
+FREE = -1
+SWAP_BATCH_SIZE = 64
+PATIENCE = 16
+
+
+class PlacementObjective:
+    """
+    The cost of a placement, mirroring the objective of the integer program solvers.
+
+    A placement is an assignment vector in natural thread order holding the index of the workload claiming each thread,
+    or FREE.  Costs are computed for a batch of assignments at once, a (batch, threads) array.
+
+    - cross package: -alpha_nu / (n * k) for every workload which is on a single package
+    - last level cache: alpha_llc / n times the total deviation of the package loads from their median
+    - L1/L2: alpha_l12 / c for every core with all of its threads claimed
+    - order: alpha_order / (d * k * sV) times the ordering weight of every claimed thread, a tie breaker
+    - previous: alpha_prev / (d * k) for every change to the previous placement
+    """
+
+    def __init__(
+            self,
+            cpu: Cpu,
+            requested_units: List[int],
+            previous: Optional[np.ndarray],
+            alpha_nu: float,
+            alpha_llc: float,
+            alpha_l12: float,
+            alpha_order: float,
+            alpha_prev: float):
+        d = len(cpu.get_threads())
+        n = len(cpu.get_packages())
+        k = len(requested_units)
+
+        self.__package_count = n
+        self.__workload_count = k
+        self.__requested_units = np.asarray(requested_units, dtype=np.int64)
+
+        self.__thread_packages = np.empty(d, dtype=np.int64)
+        for p_index, thread_indices in enumerate(cpu.get_package_thread_indices()):
+            self.__thread_packages[list(thread_indices)] = p_index
+
+        core_thread_indices = cpu.get_core_thread_indices()
+        self.__core_count = len(core_thread_indices)
+        self.__thread_cores = np.empty(d, dtype=np.int64)
+        for c_index, thread_indices in enumerate(core_thread_indices):
+            self.__thread_cores[list(thread_indices)] = c_index
+        self.__core_sizes = np.array([len(t) for t in core_thread_indices], dtype=np.int64)
+
+        thread_weights = (np.arange(d) + 1) * (self.__thread_packages + 1)
+        order_scale = float(thread_weights.sum() * k * (k + 1) // 2 * d * k)
+        self.__order_weights = alpha_order * thread_weights / max(order_scale, 1.0)
+
+        self.__previous = previous
+        self.__nu_weight = alpha_nu / (n * max(k, 1))
+        self.__llc_weight = alpha_llc / n
+        self.__l12_weight = alpha_l12 / max(self.__core_count, 1)
+        self.__prev_weight = alpha_prev / (d * max(k, 1))
+
+    def get_costs(self, assignments: np.ndarray) -> np.ndarray:
+        batch_size = assignments.shape[0]
+        n, k = self.__package_count, self.__workload_count
+        claimed = assignments != FREE
+
+        # Threads per (assignment, package, workload), with the free threads in workload slot 0
+        slots = (np.arange(batch_size)[:, None] * n + self.__thread_packages) * (k + 1) + assignments + 1
+        counts = np.bincount(slots.ravel(), minlength=batch_size * n * (k + 1)).reshape(batch_size, n, k + 1)
+        workload_counts = counts[:, :, 1:]
+
+        single_package = (workload_counts.max(axis=1) == self.__requested_units) & (self.__requested_units > 0)
+        costs = -self.__nu_weight * single_package.sum(axis=1)
+
+        package_loads = workload_counts.sum(axis=2)
+        median = np.median(package_loads, axis=1)[:, None]
+        costs += self.__llc_weight * np.abs(package_loads - median).sum(axis=1)
+
+        core_slots = np.arange(batch_size)[:, None] * self.__core_count + self.__thread_cores
+        core_loads = np.bincount(core_slots.ravel(), weights=claimed.ravel(), minlength=batch_size * self.__core_count)
+        full_cores = core_loads.reshape(batch_size, self.__core_count) == self.__core_sizes
+        costs += self.__l12_weight * full_cores.sum(axis=1)
+
+        costs += (claimed * (assignments + 1) * self.__order_weights).sum(axis=1)
+
+        if self.__previous is not None:
+            changed = assignments != self.__previous
+            changes = claimed.astype(np.int64) + (self.__previous != FREE)
+            costs += self.__prev_weight * (changed * changes).sum(axis=1)
+
+        return costs
+
+    def get_cost(self, assignment: np.ndarray) -> float:
+        return float(self.get_costs(assignment[None, :])[0])
+
+
+def optimize_local_search(
+        cpu: Cpu,
+        requested_units: List[int],
+        current_placement: Optional[List[List[int]]],
+        objective_weights: dict,
+        max_runtime_ms: float,
+        rng: np.random.Generator) -> Tuple[List[List[int]], str]:
+    """
+    Finds a placement of workloads on the threads of the CPU by local search over an assignment vector.
+
+    The search starts from the current placement, greedily extended or trimmed to the requested thread counts, and
+    repeatedly applies the best of a batch of candidate moves until no move improves the objective or the time budget
+    runs out.  The candidates are random swaps of the claims on two threads and, for every workload spanning packages,
+    moving the whole workload onto each package.  Single swaps can not cross the step in the cross package cost.
+
+    :param current_placement: a 0/1 vector per placed workload in natural thread order, as for the integer program
+    :param objective_weights: the alpha_* weights of the PlacementObjective
+    :return: a 0/1 vector per workload in natural thread order and LOCAL_SEARCH_CONVERGED or LOCAL_SEARCH_TIME_BOUND
+    """
+    deadline = time.perf_counter() + max_runtime_ms / 1000.0
+    thread_count = len(cpu.get_threads())
+    if sum(requested_units) > thread_count:
+        raise ValueError("The total # of compute units requested is higher than the total available on the instance.")
+
+    previous = get_assignment(current_placement, thread_count)
+    objective = PlacementObjective(cpu, requested_units, previous, **objective_weights)
+    assignment = get_initial_assignment(cpu, requested_units, previous)
+    cost = objective.get_cost(assignment)
+
+    status = LOCAL_SEARCH_CONVERGED
+    stale_rounds = 0
+    while stale_rounds < PATIENCE:
+        if time.perf_counter() > deadline:
+            status = LOCAL_SEARCH_TIME_BOUND
+            break
+
+        candidates = __get_candidates(cpu, assignment, len(requested_units), rng)
+        if len(candidates) == 0:
+            break
+
+        costs = objective.get_costs(candidates)
+        best = int(np.argmin(costs))
+        if costs[best] < cost - 1e-9:
+            assignment, cost = candidates[best], float(costs[best])
+            stale_rounds = 0
+        else:
+            stale_rounds += 1
+
+    return get_placement(assignment, len(requested_units)), status
+
+
+def get_assignment(placement: Optional[List[List[int]]], thread_count: int) -> Optional[np.ndarray]:
+    """
+    Returns the assignment vector of a placement, the first workload wins on a thread claimed by several.
+    """
+    if placement is None or len(placement) == 0:
+        return None
+
+    matrix = np.asarray(placement, dtype=bool).reshape(len(placement), thread_count)
+    return np.where(matrix.any(axis=0), matrix.argmax(axis=0), FREE)
+
+
+def get_placement(assignment: np.ndarray, workload_count: int) -> List[List[int]]:
+    return (assignment[None, :] == np.arange(workload_count)[:, None]).astype(int).tolist()
+
+
+def get_initial_assignment(cpu: Cpu, requested_units: List[int], previous: Optional[np.ndarray]) -> np.ndarray:
+    """
+    Trims or extends the previous assignment to the requested thread counts.  Workloads grow on the package holding
+    most of their threads when it has room, otherwise on the emptiest packages, and onto empty cores first.
+    """
+    thread_count = len(cpu.get_threads())
+    assignment = np.full(thread_count, FREE, dtype=np.int64) if previous is None else previous.copy()
+    assignment[assignment >= len(requested_units)] = FREE
+
+    package_thread_indices = [np.array(indices) for indices in cpu.get_package_thread_indices()]
+    thread_cores = np.empty(thread_count, dtype=np.int64)
+    for c_index, thread_indices in enumerate(cpu.get_core_thread_indices()):
+        thread_cores[list(thread_indices)] = c_index
+
+    def package_counts(w_index):
+        return [int((assignment[indices] == w_index).sum()) for indices in package_thread_indices]
+
+    # Release surplus threads from the packages holding the fewest threads of the workload
+    for w_index, requested in enumerate(requested_units):
+        surplus = int((assignment == w_index).sum()) - requested
+        counts = package_counts(w_index)
+        for p_index in sorted(range(len(counts)), key=lambda p: counts[p]):
+            if surplus <= 0:
+                break
+            held = package_thread_indices[p_index][assignment[package_thread_indices[p_index]] == w_index]
+            released = held[::-1][:surplus]
+            assignment[released] = FREE
+            surplus -= len(released)
+
+    needs = [(requested - int((assignment == w_index).sum()), w_index) for w_index, requested in
+             enumerate(requested_units)]
+    for need, w_index in sorted(needs, reverse=True):
+        if need <= 0:
+            continue
+
+        counts = package_counts(w_index)
+        free_counts = [int((assignment[indices] == FREE).sum()) for indices in package_thread_indices]
+        home = int(np.argmax(counts))
+        if counts[home] > 0 and free_counts[home] >= need:
+            order = [home]
+        else:
+            order = sorted(range(len(free_counts)), key=lambda p: (free_counts[p] < need, -free_counts[p], p))
+
+        for p_index in order:
+            free = package_thread_indices[p_index][assignment[package_thread_indices[p_index]] == FREE]
+            # One thread on each of the emptiest cores, then a second, and so on
+            core_loads = np.bincount(thread_cores[assignment != FREE], minlength=len(cpu.get_core_thread_indices()))
+            ranks = np.zeros(len(free), dtype=np.int64)
+            for i in range(1, len(free)):
+                ranks[i] = ranks[i - 1] + 1 if thread_cores[free[i]] == thread_cores[free[i - 1]] else 0
+            free = free[np.argsort(core_loads[thread_cores[free]] + ranks, kind='stable')]
+            claimed = free[:need]
+            assignment[claimed] = w_index
+            need -= len(claimed)
+            if need == 0:
+                break
+
+    return assignment
+
+
+def __get_candidates(cpu: Cpu, assignment: np.ndarray, workload_count: int, rng: np.random.Generator) -> np.ndarray:
+    thread_count = len(assignment)
+    first = rng.integers(thread_count, size=SWAP_BATCH_SIZE)
+    second = rng.integers(thread_count, size=SWAP_BATCH_SIZE)
+    swaps = assignment[first] != assignment[second]
+    first, second = first[swaps], second[swaps]
+
+    candidates = np.repeat(assignment[None, :], len(first), axis=0)
+    rows = np.arange(len(first))
+    candidates[rows, first] = assignment[second]
+    candidates[rows, second] = assignment[first]
+
+    consolidations = list(__get_consolidations(cpu, assignment, workload_count))
+    if len(consolidations) > 0:
+        candidates = np.concatenate([candidates, np.array(consolidations)])
+    return candidates
+
+
+def __get_consolidations(cpu: Cpu, assignment: np.ndarray, workload_count: int):
+    """
+    Yields, for every workload on more than one package, the assignments moving it entirely onto each package with
+    room for it.  The displaced claims, free threads first, take the places it leaves.
+    """
+    package_thread_indices = [np.array(indices) for indices in cpu.get_package_thread_indices()]
+    thread_packages = np.empty(len(assignment), dtype=np.int64)
+    for p_index, thread_indices in enumerate(package_thread_indices):
+        thread_packages[thread_indices] = p_index
+
+    for w_index in range(workload_count):
+        held = np.flatnonzero(assignment == w_index)
+        packages = np.unique(thread_packages[held])
+        if len(packages) < 2:
+            continue
+
+        for p_index in packages:
+            outside = held[thread_packages[held] != p_index]
+            inside = package_thread_indices[p_index]
+            inside = inside[assignment[inside] != w_index]
+            inside = inside[np.argsort(assignment[inside] != FREE, kind='stable')]
+            if len(inside) < len(outside):
+                continue
+
+            inside = inside[:len(outside)]
+            candidate = assignment.copy()
+            candidate[outside] = assignment[inside]
+            candidate[inside] = w_index
+            yield candidate
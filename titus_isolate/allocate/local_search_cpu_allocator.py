@@ -0,0 +1,148 @@
+import numpy as np
+
+from titus_isolate.allocate.allocate_request import AllocateRequest
+from titus_isolate.allocate.allocate_response import AllocateResponse, get_workload_allocations
+from titus_isolate.allocate.allocate_threads_request import AllocateThreadsRequest
+from titus_isolate.allocate.cpu_allocator import CpuAllocator
+from titus_isolate.allocate.local_search import optimize_local_search, LOCAL_SEARCH_TIME_BOUND
+from titus_isolate.allocate.solver_budget import mark_time_limited
+from titus_isolate.config.constants import ALPHA_NU, DEFAULT_ALPHA_NU, ALPHA_LLC, DEFAULT_ALPHA_LLC, ALPHA_L12, \
+    DEFAULT_ALPHA_L12, ALPHA_ORDER, DEFAULT_ALPHA_ORDER, ALPHA_PREV, DEFAULT_ALPHA_PREV, \
+    LOCAL_SEARCH_MAX_RUNTIME_MS, DEFAULT_LOCAL_SEARCH_MAX_RUNTIME_MS
+from titus_isolate.event.constants import STATIC
+from titus_isolate.metrics.constants import LOCAL_SEARCH_TIMEBOUND_COUNT
+from titus_isolate.model.processor.utils import is_cpu_full, get_placement_vector
+from titus_isolate.model.utils import get_sorted_workloads, get_burst_workloads, release_all_threads, \
+    update_burst_workloads, rebalance
+from titus_isolate.monitor.empty_free_thread_provider import EmptyFreeThreadProvider
+from titus_isolate.utils import get_config_manager
+
+DEFAULT_SEED = 0
+
+
+class LocalSearchCpuAllocator(CpuAllocator):
+    """
+    Places static workloads by local search over the objective of the integer program, within a hard time budget.
+
+    The search is seeded identically on every call, so the same request always produces the same placement.
+    """
+
+    def __init__(self, free_thread_provider=EmptyFreeThreadProvider(), max_runtime_ms: float = None, seed=DEFAULT_SEED):
+        self.__reg = None
+        self.__time_bound_call_count = 0
+
+        config_manager = get_config_manager()
+        if max_runtime_ms is None:
+            max_runtime_ms = config_manager.get_float(LOCAL_SEARCH_MAX_RUNTIME_MS, DEFAULT_LOCAL_SEARCH_MAX_RUNTIME_MS)
+        self.__max_runtime_ms = max_runtime_ms
+        self.__seed = seed
+        self.__objective_weights = {
+            "alpha_nu": config_manager.get_float(ALPHA_NU, DEFAULT_ALPHA_NU),
+            "alpha_llc": config_manager.get_float(ALPHA_LLC, DEFAULT_ALPHA_LLC),
+            "alpha_l12": config_manager.get_float(ALPHA_L12, DEFAULT_ALPHA_L12),
+            "alpha_order": config_manager.get_float(ALPHA_ORDER, DEFAULT_ALPHA_ORDER),
+            "alpha_prev": config_manager.get_float(ALPHA_PREV, DEFAULT_ALPHA_PREV)
+        }
+        self.__free_thread_provider = free_thread_provider
+
+    def assign_threads(self, request: AllocateThreadsRequest) -> AllocateResponse:
+        cpu = request.get_cpu()
+        workloads = request.get_workloads()
+        workload_id = request.get_workload_id()
+
+        burst_workloads = get_burst_workloads(workloads.values())
+        release_all_threads(cpu, burst_workloads)
+        if workloads[workload_id].get_type() == STATIC:
+            self.__assign_threads(cpu, workload_id, workloads)
+
+        metadata = {}
+        update_burst_workloads(cpu, workloads, self.__free_thread_provider, metadata)
+
+        return AllocateResponse(
+            cpu,
+            get_workload_allocations(cpu, workloads.values()),
+            self.get_name(),
+            metadata)
+
+    def free_threads(self, request: AllocateThreadsRequest) -> AllocateResponse:
+        cpu = request.get_cpu()
+        workloads = request.get_workloads()
+        workload_id = request.get_workload_id()
+
+        burst_workloads = get_burst_workloads(workloads.values())
+        release_all_threads(cpu, burst_workloads)
+        if workloads[workload_id].get_type() == STATIC:
+            self.__free_threads(cpu, workload_id, workloads)
+        workloads.pop(workload_id)
+        metadata = {}
+        update_burst_workloads(cpu, workloads, self.__free_thread_provider, metadata)
+
+        return AllocateResponse(
+            cpu,
+            get_workload_allocations(cpu, workloads.values()),
+            self.get_name(),
+            metadata)
+
+    def rebalance(self, request: AllocateRequest) -> AllocateResponse:
+        cpu = request.get_cpu()
+        workloads = request.get_workloads()
+
+        metadata = {}
+        cpu = rebalance(cpu, workloads, self.__free_thread_provider, metadata)
+        return AllocateResponse(
+            cpu,
+            get_workload_allocations(cpu, workloads.values()),
+            self.get_name(),
+            metadata)
+
+    def get_name(self) -> str:
+        return self.__class__.__name__
+
+    def __assign_threads(self, cpu, workload_id, workloads):
+        if is_cpu_full(cpu):
+            raise ValueError("CPU is full, failed to add workload: '{}'".format(workload_id))
+
+        curr_ids_per_workload = cpu.get_workload_ids_to_thread_ids()
+        ordered_workload_ids = [w.get_id() for w in get_sorted_workloads(workloads.values())]
+
+        curr_placement_vectors = [get_placement_vector(cpu, curr_ids_per_workload[wid]) for wid in ordered_workload_ids]
+        requested_units = [sum(v) for v in curr_placement_vectors] + [workloads[workload_id].get_thread_count()]
+
+        ordered_workload_ids.append(workload_id)
+        cpu.assign_placement(ordered_workload_ids, self.__compute_new_placement(
+            cpu, curr_placement_vectors, requested_units))
+
+    def __free_threads(self, cpu, workload_id, workloads):
+        curr_ids_per_workload = cpu.get_workload_ids_to_thread_ids()
+        if workload_id not in curr_ids_per_workload:
+            raise Exception("workload_id=`%s` is not placed on the instance. Cannot free it." % (workload_id,))
+
+        ordered_workload_ids = [w.get_id() for w in get_sorted_workloads(workloads.values())]
+        curr_placement_vectors = [get_placement_vector(cpu, curr_ids_per_workload[wid]) for wid in ordered_workload_ids]
+        requested_units = [len(curr_ids_per_workload[wid]) if wid != workload_id else 0 for wid in ordered_workload_ids]
+
+        new_placement_vectors = self.__compute_new_placement(cpu, curr_placement_vectors, requested_units)
+
+        remaining = [(wid, v) for wid, v in zip(ordered_workload_ids, new_placement_vectors) if wid != workload_id]
+        cpu.assign_placement([wid for wid, _ in remaining], [v for _, v in remaining])
+
+    def __compute_new_placement(self, cpu, current_placement, requested_units):
+        placement, status = optimize_local_search(
+            cpu,
+            requested_units,
+            current_placement,
+            self.__objective_weights,
+            self.__max_runtime_ms,
+            np.random.default_rng(self.__seed))
+
+        if status == LOCAL_SEARCH_TIME_BOUND:
+            self.__time_bound_call_count += 1
+            mark_time_limited()
+
+        return placement
+
+    def set_registry(self, registry, tags):
+        self.__reg = registry
+
+    def report_metrics(self, tags):
+        self.__reg.gauge(LOCAL_SEARCH_TIMEBOUND_COUNT, tags).set(self.__time_bound_call_count)
@@ -44,8 +44,7 @@ class NaiveCpuAllocator(CpuAllocator):
         cpu = request.get_cpu()
         workload = request.get_workloads()[request.get_workload_id()]
 
-        for t in cpu.get_threads():
-            t.free(workload.get_id())
+        cpu.free(workload.get_id())
 
         return AllocateResponse(cpu, get_workload_allocations(cpu, request.get_workloads().values()), self.get_name())
 
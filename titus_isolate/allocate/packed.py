@@ -0,0 +1,420 @@
+"""
+A compact binary encoding of CPUs, allocation requests and allocation responses.
+
+Every message starts with a fixed header: the magic bytes, a schema version and the message kind.  All integers are
+little-endian.  Arrays are a uint32 element count followed by the packed elements.
+
+    cpu:        package ids, cores per package, core ids, threads per core and thread ids, all in natural order,
+                followed by the number of workloads on each thread and the workload table index of each of them
+    request:    workload table, cpu, workloads (JSON), usage, metadata (JSON) and, for threads requests, the table index
+                of the workload being added or removed, or for batch threads requests, the table indices of the
+                workloads being added.  Usage is sent as float32 series, so each value is kept within a relative
+                error of USAGE_REL_TOLERANCE.
+    response:   workload table, cpu, workload allocations (JSON) and metadata (JSON)
+
+Decoders reject messages with an unknown magic, version or kind.  Besides full decoding, the thread ids of a cpu and
+the thread ids claimed by each workload can be read without building the Cpu and its workloads.
+"""
+
+import json
+import struct
+from typing import Dict, List, Tuple, Union
+
+import numpy as np
+
+from titus_isolate.allocate.allocate_request import AllocateRequest
+from titus_isolate.allocate.allocate_response import AllocateResponse
+from titus_isolate.allocate.allocate_threads_batch_request import AllocateThreadsBatchRequest
+from titus_isolate.allocate.allocate_threads_request import AllocateThreadsRequest
+from titus_isolate.allocate.constants import TITUS_ISOLATE_CELL_HEADER, UNKNOWN_CELL, CELL, CPU_ALLOCATOR
+from titus_isolate.allocate.utils import parse_legacy_workloads
+from titus_isolate.allocate.workload_allocate_response import deserialize_workload_response
+from titus_isolate.model.processor.core import Core
+from titus_isolate.model.processor.cpu import Cpu
+from titus_isolate.model.processor.package import Package
+from titus_isolate.model.processor.thread import Thread
+from titus_isolate.model.processor.workload_ids import get_workload_id_registry
+
+PACKED_CONTENT_TYPE = "application/x-titus-isolate-packed"
+
+MAGIC = b'TIPK'
+VERSION = 1
+
+# Rounding to float32 keeps 24 significant bits
+USAGE_REL_TOLERANCE = 2 ** -24
+
+CPU_KIND = 1
+ALLOCATE_REQUEST_KIND = 2
+ALLOCATE_THREADS_REQUEST_KIND = 3
+ALLOCATE_RESPONSE_KIND = 4
+ALLOCATE_THREADS_BATCH_REQUEST_KIND = 5
+
+__HEADER = struct.Struct('<4sHB')
+
+
+class PackedWriter:
+
+    def __init__(self, kind: int):
+        self.__chunks = [_header(kind)]
+
+    def write_u32(self, value: int):
+        self.__chunks.append(struct.pack('<I', value))
+
+    def write_array(self, values, dtype):
+        array = np.ascontiguousarray(values, dtype=dtype)
+        self.write_u32(len(array))
+        self.__chunks.append(array.tobytes())
+
+    def write_str(self, value: str):
+        encoded = value.encode('utf-8')
+        self.write_u32(len(encoded))
+        self.__chunks.append(encoded)
+
+    def write_json(self, value):
+        self.write_str(json.dumps(value, separators=(',', ':')))
+
+    def to_bytes(self) -> bytes:
+        return b''.join(self.__chunks)
+
+
+class PackedReader:
+
+    def __init__(self, data: bytes, kinds: List[int]):
+        self.__data = memoryview(data)
+        self.kind = _read_header(self.__data, kinds)
+        self.__offset = _header_size()
+
+    def read_u32(self) -> int:
+        value = struct.unpack_from('<I', self.__data, self.__offset)[0]
+        self.__offset += 4
+        return value
+
+    def read_array(self, dtype) -> np.ndarray:
+        dtype = np.dtype(dtype)
+        count = self.read_u32()
+        array = np.frombuffer(self.__data, dtype=dtype, count=count, offset=self.__offset)
+        self.__offset += count * dtype.itemsize
+        return array
+
+    def read_str(self) -> str:
+        length = self.read_u32()
+        value = bytes(self.__data[self.__offset:self.__offset + length]).decode('utf-8')
+        self.__offset += length
+        return value
+
+    def read_json(self):
+        return json.loads(self.read_str())
+
+
+class WorkloadTable:
+    """
+    Maps workload ids to their position in a message, so each id is written once no matter how often it is referenced.
+    """
+
+    def __init__(self, workload_ids: List[str] = None):
+        self.__workload_ids = []
+        self.__indices = {}
+        for workload_id in workload_ids or []:
+            self.get_index(workload_id)
+
+    def get_index(self, workload_id) -> int:
+        index = self.__indices.get(workload_id)
+        if index is None:
+            index = len(self.__workload_ids)
+            self.__indices[workload_id] = index
+            self.__workload_ids.append(workload_id)
+        return index
+
+    def get_workload_id(self, index: int):
+        return self.__workload_ids[index]
+
+    def get_workload_ids(self) -> List:
+        return list(self.__workload_ids)
+
+
+def encode_cpu(cpu: Cpu) -> bytes:
+    writer = PackedWriter(CPU_KIND)
+    table = WorkloadTable(sorted(cpu.get_workload_ids(), key=str))
+    _write_table(writer, table)
+    _write_cpu(writer, cpu, table)
+    return writer.to_bytes()
+
+
+def decode_cpu(data: bytes) -> Cpu:
+    reader = PackedReader(data, [CPU_KIND])
+    table = _read_table(reader)
+    return _read_cpu(reader, table)
+
+
+def encode_allocate_request(request: AllocateRequest) -> bytes:
+    is_threads_request = isinstance(request, AllocateThreadsRequest)
+    is_batch_request = isinstance(request, AllocateThreadsBatchRequest)
+    if is_threads_request:
+        writer = PackedWriter(ALLOCATE_THREADS_REQUEST_KIND)
+    elif is_batch_request:
+        writer = PackedWriter(ALLOCATE_THREADS_BATCH_REQUEST_KIND)
+    else:
+        writer = PackedWriter(ALLOCATE_REQUEST_KIND)
+
+    usages = [
+        request.get_cpu_usage(),
+        request.get_mem_usage(),
+        request.get_net_recv_usage(),
+        request.get_net_trans_usage(),
+        request.get_disk_usage()]
+
+    table = WorkloadTable(sorted(request.get_cpu().get_workload_ids(), key=str))
+    for usage in usages:
+        for workload_id in usage.keys():
+            table.get_index(workload_id)
+    if is_threads_request:
+        table.get_index(request.get_workload_id())
+    if is_batch_request:
+        for workload_id in request.get_workload_ids():
+            table.get_index(workload_id)
+
+    _write_table(writer, table)
+    _write_cpu(writer, request.get_cpu(), table)
+    writer.write_json({w_id: w.to_dict() for w_id, w in request.get_workloads().items()})
+    for usage in usages:
+        _write_usage(writer, usage, table)
+    writer.write_json(request.get_metadata())
+    if is_threads_request:
+        writer.write_u32(table.get_index(request.get_workload_id()))
+    if is_batch_request:
+        writer.write_array([table.get_index(w_id) for w_id in request.get_workload_ids()], '<u4')
+
+    return writer.to_bytes()
+
+
+def decode_allocate_request(
+        data: bytes) -> Union[AllocateRequest, AllocateThreadsRequest, AllocateThreadsBatchRequest]:
+    reader = PackedReader(
+        data, [ALLOCATE_REQUEST_KIND, ALLOCATE_THREADS_REQUEST_KIND, ALLOCATE_THREADS_BATCH_REQUEST_KIND])
+    table = _read_table(reader)
+    cpu = _read_cpu(reader, table)
+    workloads = parse_legacy_workloads(reader.read_json())
+    cpu_usage, mem_usage, net_recv_usage, net_trans_usage, disk_usage = [_read_usage(reader, table) for _ in range(5)]
+    metadata = reader.read_json()
+
+    if reader.kind == ALLOCATE_REQUEST_KIND:
+        return AllocateRequest(
+            cpu=cpu,
+            workloads=workloads,
+            cpu_usage=cpu_usage,
+            mem_usage=mem_usage,
+            net_recv_usage=net_recv_usage,
+            net_trans_usage=net_trans_usage,
+            disk_usage=disk_usage,
+            metadata=metadata)
+
+    if reader.kind == ALLOCATE_THREADS_BATCH_REQUEST_KIND:
+        return AllocateThreadsBatchRequest(
+            cpu=cpu,
+            workload_ids=[table.get_workload_id(int(i)) for i in reader.read_array('<u4')],
+            workloads=workloads,
+            cpu_usage=cpu_usage,
+            mem_usage=mem_usage,
+            net_recv_usage=net_recv_usage,
+            net_trans_usage=net_trans_usage,
+            disk_usage=disk_usage,
+            metadata=metadata)
+
+    return AllocateThreadsRequest(
+        cpu=cpu,
+        workload_id=table.get_workload_id(reader.read_u32()),
+        workloads=workloads,
+        cpu_usage=cpu_usage,
+        mem_usage=mem_usage,
+        net_recv_usage=net_recv_usage,
+        net_trans_usage=net_trans_usage,
+        disk_usage=disk_usage,
+        metadata=metadata)
+
+
+def decode_request_problem(data: bytes) -> Tuple[List[List[List[int]]], Dict[str, List[int]], dict, dict, List[str]]:
+    """
+    Returns what places a request's workloads without building its Cpu and workloads: the thread ids per core per
+    package, the thread ids claimed by each workload, the serialized workloads, the cpu usage and the ids of the
+    workloads being added or removed.
+    """
+    reader = PackedReader(
+        data, [ALLOCATE_REQUEST_KIND, ALLOCATE_THREADS_REQUEST_KIND, ALLOCATE_THREADS_BATCH_REQUEST_KIND])
+    table = _read_table(reader)
+    topology, claims = _read_cpu_claims(reader, table)
+    workloads = reader.read_json()
+    cpu_usage = [_read_usage(reader, table) for _ in range(5)][0]
+    reader.read_str()
+
+    if reader.kind == ALLOCATE_REQUEST_KIND:
+        target_ids = []
+    elif reader.kind == ALLOCATE_THREADS_BATCH_REQUEST_KIND:
+        target_ids = [table.get_workload_id(int(i)) for i in reader.read_array('<u4')]
+    else:
+        target_ids = [table.get_workload_id(reader.read_u32())]
+    return topology, claims, workloads, cpu_usage, target_ids
+
+
+def decode_response_claims(data: bytes) -> Tuple[dict, Dict[str, List[int]]]:
+    """
+    Returns the metadata of the response and the thread ids claimed by each workload, without building the response.
+    """
+    reader = PackedReader(data, [ALLOCATE_RESPONSE_KIND])
+    table = _read_table(reader)
+    _, claims = _read_cpu_claims(reader, table)
+    reader.read_str()
+    return reader.read_json(), claims
+
+
+def encode_response(response: AllocateResponse) -> bytes:
+    writer = PackedWriter(ALLOCATE_RESPONSE_KIND)
+    table = WorkloadTable(sorted(response.get_cpu().get_workload_ids(), key=str))
+    _write_table(writer, table)
+    _write_cpu(writer, response.get_cpu(), table)
+    writer.write_json([w.to_dict() for w in response.get_workload_allocations()])
+    writer.write_json(response.get_metadata())
+    return writer.to_bytes()
+
+
+def decode_response(headers, data: bytes) -> AllocateResponse:
+    reader = PackedReader(data, [ALLOCATE_RESPONSE_KIND])
+    table = _read_table(reader)
+    cpu = _read_cpu(reader, table)
+    workload_allocations = [deserialize_workload_response(w_alloc) for w_alloc in reader.read_json()]
+    metadata = reader.read_json()
+    metadata[CELL] = headers.get(TITUS_ISOLATE_CELL_HEADER, UNKNOWN_CELL)
+    return AllocateResponse(cpu, workload_allocations, metadata[CPU_ALLOCATOR], metadata)
+
+
+def _header(kind: int) -> bytes:
+    return __HEADER.pack(MAGIC, VERSION, kind)
+
+
+def _header_size() -> int:
+    return __HEADER.size
+
+
+def _read_header(data, kinds: List[int]) -> int:
+    if len(data) < __HEADER.size:
+        raise ValueError("Packed message is too short: {} bytes".format(len(data)))
+
+    magic, version, kind = __HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise ValueError("Unexpected packed message magic: {}".format(magic))
+    if version != VERSION:
+        raise ValueError("Unsupported packed message version: {}, expected: {}".format(version, VERSION))
+    if kind not in kinds:
+        raise ValueError("Unexpected packed message kind: {}, expected one of: {}".format(kind, kinds))
+    return kind
+
+
+def _write_table(writer: PackedWriter, table: WorkloadTable):
+    workload_ids = table.get_workload_ids()
+    writer.write_u32(len(workload_ids))
+    for workload_id in workload_ids:
+        writer.write_str(str(workload_id))
+
+
+def _read_table(reader: PackedReader) -> WorkloadTable:
+    return WorkloadTable([reader.read_str() for _ in range(reader.read_u32())])
+
+
+def _write_cpu(writer: PackedWriter, cpu: Cpu, table: WorkloadTable):
+    packages = cpu.get_packages()
+    cores = cpu.get_cores()
+    threads = cpu.get_threads()
+    registry = get_workload_id_registry()
+
+    writer.write_array([p.get_id() for p in packages], np.int32)
+    writer.write_array([len(p.get_cores()) for p in packages], np.uint32)
+    writer.write_array([c.get_id() for c in cores], np.int32)
+    writer.write_array([len(c.get_threads()) for c in cores], np.uint32)
+    writer.write_array([t.get_id() for t in threads], np.int32)
+
+    claim_counts = []
+    claims = []
+    for t in threads:
+        handles = t.get_workload_handles()
+        claim_counts.append(len(handles))
+        claims.extend(table.get_index(registry.resolve(h)) for h in handles)
+    writer.write_array(claim_counts, np.uint16)
+    writer.write_array(claims, np.uint32)
+
+
+def _read_cpu(reader: PackedReader, table: WorkloadTable) -> Cpu:
+    package_ids = reader.read_array(np.int32).tolist()
+    cores_per_package = reader.read_array(np.uint32).tolist()
+    core_ids = reader.read_array(np.int32).tolist()
+    threads_per_core = reader.read_array(np.uint32).tolist()
+    thread_ids = reader.read_array(np.int32).tolist()
+    claim_counts = reader.read_array(np.uint16).tolist()
+    claims = reader.read_array(np.uint32).tolist()
+
+    registry = get_workload_id_registry()
+    handles = [registry.intern(w_id) for w_id in table.get_workload_ids()]
+
+    packages = []
+    core_index = 0
+    thread_index = 0
+    for p_id, core_count in zip(package_ids, cores_per_package):
+        cores = []
+        for c_id, thread_count in zip(core_ids[core_index:core_index + core_count],
+                                      threads_per_core[core_index:core_index + core_count]):
+            cores.append(Core(c_id, [Thread(t_id) for t_id in thread_ids[thread_index:thread_index + thread_count]]))
+            thread_index += thread_count
+        core_index += core_count
+        packages.append(Package(p_id, cores))
+
+    handles_per_thread = []
+    claim_index = 0
+    for count in claim_counts:
+        handles_per_thread.append([handles[i] for i in claims[claim_index:claim_index + count]])
+        claim_index += count
+
+    cpu = Cpu(packages)
+    cpu.assign_handles(handles_per_thread)
+    return cpu
+
+
+def _read_cpu_claims(reader: PackedReader, table: WorkloadTable) -> Tuple[List[List[List[int]]], Dict[str, List[int]]]:
+    reader.read_array(np.int32)
+    cores_per_package = reader.read_array(np.uint32).tolist()
+    reader.read_array(np.int32)
+    threads_per_core = reader.read_array(np.uint32).tolist()
+    thread_ids = reader.read_array(np.int32).tolist()
+    claim_counts = reader.read_array(np.uint16).tolist()
+    claims = reader.read_array(np.uint32).tolist()
+
+    topology = []
+    core_index = 0
+    thread_index = 0
+    for core_count in cores_per_package:
+        cores = []
+        for thread_count in threads_per_core[core_index:core_index + core_count]:
+            cores.append(thread_ids[thread_index:thread_index + thread_count])
+            thread_index += thread_count
+        core_index += core_count
+        topology.append(cores)
+
+    workload_threads = {}
+    claim_index = 0
+    for t_id, count in zip(thread_ids, claim_counts):
+        for i in claims[claim_index:claim_index + count]:
+            workload_threads.setdefault(table.get_workload_id(i), []).append(t_id)
+        claim_index += count
+    return topology, workload_threads
+
+
+def _write_usage(writer: PackedWriter, usage: dict, table: WorkloadTable):
+    writer.write_u32(len(usage))
+    for workload_id, series in usage.items():
+        writer.write_u32(table.get_index(workload_id))
+        writer.write_array(series, np.float32)
+
+
+def _read_usage(reader: PackedReader, table: WorkloadTable) -> dict:
+    usage = {}
+    for _ in range(reader.read_u32()):
+        workload_id = table.get_workload_id(reader.read_u32())
+        usage[workload_id] = reader.read_array(np.float32).tolist()
+    return usage
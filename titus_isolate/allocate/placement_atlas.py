@@ -0,0 +1,97 @@
+import struct
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from titus_isolate.allocate.solution_cache import KEY_VERSION
+
+ATLAS_MAGIC = b'TIPA'
+ATLAS_VERSION = 1
+KEY_BYTES = 16
+
+# magic, atlas version, solution key version, entry count
+HEADER = struct.Struct('<4sIII')
+
+
+class PlacementAtlas:
+    """
+    A read only table of precomputed optimal placements, keyed by solution key (see get_solution_key), built offline by
+    titus_isolate.allocate.build_placement_atlas.
+
+    The file holds a header, the sorted keys, the workload and thread counts of every entry, offsets into a blob of
+    bit packed placements and the blob itself.  Lookups are a binary search over the keys.
+    """
+
+    def __init__(self, data: bytes):
+        magic, version, key_version, count = HEADER.unpack_from(data, 0)
+        if magic != ATLAS_MAGIC or version != ATLAS_VERSION:
+            raise ValueError("Not a placement atlas, or an unsupported version: {}".format(version))
+
+        offset = HEADER.size
+        keys, offset = self.__read_array(data, offset, 'S{}'.format(KEY_BYTES), count)
+        workload_counts, offset = self.__read_array(data, offset, '<u2', count)
+        thread_counts, offset = self.__read_array(data, offset, '<u2', count)
+        blob_offsets, offset = self.__read_array(data, offset, '<u4', count + 1)
+
+        # Entries keyed by another key version can never be hit, but the atlas is still well formed
+        self.__key_version = key_version
+        self.__keys = keys if key_version == KEY_VERSION else keys[:0]
+        self.__workload_counts = workload_counts
+        self.__thread_counts = thread_counts
+        self.__blob_offsets = blob_offsets
+        self.__blob = np.frombuffer(data, dtype=np.uint8, offset=offset)
+
+    @staticmethod
+    def __read_array(data, offset, dtype, count):
+        array = np.frombuffer(data, dtype=dtype, count=count, offset=offset)
+        return array, offset + array.nbytes
+
+    def get(self, key: bytes) -> Optional[List[List[int]]]:
+        i = int(np.searchsorted(self.__keys, key))
+        # Fixed width byte strings drop their trailing zero bytes when read back
+        if i == len(self.__keys) or self.__keys[i].ljust(KEY_BYTES, b'\0') != key:
+            return None
+
+        k, d = int(self.__workload_counts[i]), int(self.__thread_counts[i])
+        packed = self.__blob[self.__blob_offsets[i]:self.__blob_offsets[i + 1]]
+        return np.unpackbits(packed, count=k * d).reshape(k, d).astype(int).tolist()
+
+    def get_key_version(self) -> int:
+        return self.__key_version
+
+    def __len__(self):
+        return len(self.__keys)
+
+    def __contains__(self, key: bytes):
+        return self.get(key) is not None
+
+
+def load_placement_atlas(path: str) -> PlacementAtlas:
+    with open(path, 'rb') as f:
+        return PlacementAtlas(f.read())
+
+
+def encode_placement_atlas(entries: List[Tuple[bytes, List[List[int]]]]) -> bytes:
+    """
+    :param entries: (solution key, placement) pairs, a 0/1 vector per workload in natural thread order
+    """
+    entries = sorted(dict(entries).items())
+    keys, workload_counts, thread_counts, blobs = [], [], [], []
+    for key, placement in entries:
+        if len(key) != KEY_BYTES:
+            raise ValueError("Unexpected key length: {}".format(len(key)))
+        matrix = np.asarray(placement, dtype=bool).reshape(len(placement), -1)
+        keys.append(key)
+        workload_counts.append(matrix.shape[0])
+        thread_counts.append(matrix.shape[1])
+        blobs.append(np.packbits(matrix.ravel()).tobytes())
+
+    blob_offsets = np.zeros(len(blobs) + 1, dtype='<u4')
+    blob_offsets[1:] = np.cumsum([len(b) for b in blobs])
+
+    return b''.join([
+        HEADER.pack(ATLAS_MAGIC, ATLAS_VERSION, KEY_VERSION, len(entries)),
+        np.array(keys, dtype='S{}'.format(KEY_BYTES)).tobytes(),
+        np.array(workload_counts, dtype='<u2').tobytes(),
+        np.array(thread_counts, dtype='<u2').tobytes(),
+        blob_offsets.tobytes()] + blobs)
@@ -1,16 +1,28 @@
-import requests
+import json
 
 from titus_isolate import log
 from titus_isolate.allocate.allocate_request import AllocateRequest
 from titus_isolate.allocate.allocate_response import AllocateResponse, deserialize_response
+from titus_isolate.allocate.allocate_threads_batch_request import AllocateThreadsBatchRequest
 from titus_isolate.allocate.allocate_threads_request import AllocateThreadsRequest
-from titus_isolate.allocate.constants import UNKNOWN_CPU_ALLOCATOR
-from titus_isolate.allocate.cpu_allocate_exception import CpuAllocationException
+from titus_isolate.allocate.constants import UNKNOWN_CPU_ALLOCATOR, RETRY_AFTER_HEADER
+from titus_isolate.allocate.cpu_allocate_exception import CpuAllocationException, SolverOverloadedException
 from titus_isolate.allocate.cpu_allocator import CpuAllocator
+from titus_isolate.allocate.packed import PACKED_CONTENT_TYPE, encode_allocate_request, decode_response
+from titus_isolate.allocate.remote_transport import RemoteSolverTransport
+from titus_isolate.allocate.session import SessionClient
 from titus_isolate.config.constants import REMOTE_ALLOCATOR_URL, MAX_SOLVER_RUNTIME, DEFAULT_MAX_SOLVER_RUNTIME, \
-    MAX_SOLVER_CONNECT_SEC, DEFAULT_MAX_SOLVER_CONNECT_SEC
+    MAX_SOLVER_CONNECT_SEC, DEFAULT_MAX_SOLVER_CONNECT_SEC, REMOTE_ALLOCATOR_PACKED_ENCODING, \
+    DEFAULT_REMOTE_ALLOCATOR_PACKED_ENCODING, REMOTE_ALLOCATOR_COMPRESSION, DEFAULT_REMOTE_ALLOCATOR_COMPRESSION, \
+    REMOTE_ALLOCATOR_MAX_RETRIES, DEFAULT_REMOTE_ALLOCATOR_MAX_RETRIES, REMOTE_ALLOCATOR_RETRY_BACKOFF_SEC, \
+    DEFAULT_REMOTE_ALLOCATOR_RETRY_BACKOFF_SEC, REMOTE_ALLOCATOR_POOL_SIZE, DEFAULT_REMOTE_ALLOCATOR_POOL_SIZE, \
+    REMOTE_ALLOCATOR_DELTA_SESSION, DEFAULT_REMOTE_ALLOCATOR_DELTA_SESSION
+from titus_isolate.metrics.constants import REMOTE_ALLOCATOR_SESSION_DELTA_COUNT, REMOTE_ALLOCATOR_SESSION_FULL_COUNT, \
+    REMOTE_ALLOCATOR_SESSION_RESYNC_COUNT
 from titus_isolate.utils import get_config_manager
 
+TOO_MANY_REQUESTS = 429
+
 
 class RemoteCpuAllocator(CpuAllocator):
 
@@ -21,57 +33,122 @@ class RemoteCpuAllocator(CpuAllocator):
         solver_max_runtime_secs = config_manager.get_float(MAX_SOLVER_RUNTIME, DEFAULT_MAX_SOLVER_RUNTIME)
         solver_max_connect_secs = config_manager.get_float(MAX_SOLVER_CONNECT_SEC, DEFAULT_MAX_SOLVER_CONNECT_SEC)
         self.__timeout = (solver_max_connect_secs, solver_max_runtime_secs)
-        self.__headers = {'Content-Type': "application/json"}
+        self.__packed = config_manager.get_bool(
+            REMOTE_ALLOCATOR_PACKED_ENCODING, DEFAULT_REMOTE_ALLOCATOR_PACKED_ENCODING)
+        self.__content_type = PACKED_CONTENT_TYPE if self.__packed else "application/json"
+        self.__transport = RemoteSolverTransport(
+            self.__url,
+            self.__timeout,
+            encoding=config_manager.get_str(REMOTE_ALLOCATOR_COMPRESSION, DEFAULT_REMOTE_ALLOCATOR_COMPRESSION),
+            max_retries=config_manager.get_int(REMOTE_ALLOCATOR_MAX_RETRIES, DEFAULT_REMOTE_ALLOCATOR_MAX_RETRIES),
+            retry_backoff_secs=config_manager.get_float(
+                REMOTE_ALLOCATOR_RETRY_BACKOFF_SEC, DEFAULT_REMOTE_ALLOCATOR_RETRY_BACKOFF_SEC),
+            pool_size=config_manager.get_int(REMOTE_ALLOCATOR_POOL_SIZE, DEFAULT_REMOTE_ALLOCATOR_POOL_SIZE))
+
+        # Packed requests are compact already and always carry the full state
+        self.__session = None
+        if not self.__packed and config_manager.get_bool(
+                REMOTE_ALLOCATOR_DELTA_SESSION, DEFAULT_REMOTE_ALLOCATOR_DELTA_SESSION):
+            self.__session = SessionClient()
         self.__reg = None
 
     def assign_threads(self, request: AllocateThreadsRequest) -> AllocateResponse:
-        url = "{}/assign_threads".format(self.__url)
-        body = request.to_dict()
-        log.debug("url: {}, body: {}".format(url, body))
-        response = requests.put(url, json=body, headers=self.__headers, timeout=self.__timeout)
+        path = "/assign_threads"
+        response = self.__put(path, request)
         log.debug("assign_threads response code: {}".format(response.status_code))
 
         if response.status_code == 200:
-            return deserialize_response(response.headers, response.json())
+            return self.__deserialize_response(response)
+        self.__raise_if_overloaded(response)
 
         raise CpuAllocationException("Failed to assign threads: {}".format(response.text))
 
-    def free_threads(self, request: AllocateThreadsRequest) -> AllocateResponse:
-        url = "{}/free_threads".format(self.__url)
-        body = request.to_dict()
+    def assign_threads_batch(self, request: AllocateThreadsBatchRequest) -> AllocateResponse:
+        path = "/assign_threads_batch"
+        log.info("assigning threads remotely for workloads: %s, path: %s", request.get_workload_ids(), path)
+        response = self.__put(path, request)
+        log.debug("assign_threads_batch response code: {}".format(response.status_code))
+
+        if response.status_code == 200:
+            return self.__deserialize_response(response)
+        self.__raise_if_overloaded(response)
+
+        raise CpuAllocationException("Failed to assign threads: {}".format(response.text))
 
-        log.info("freeing threads remotely for workload: %s, url: %s", request.get_workload_id(), url)
-        response = requests.put(url, json=body, headers=self.__headers, timeout=self.__timeout)
+    def free_threads(self, request: AllocateThreadsRequest) -> AllocateResponse:
+        path = "/free_threads"
+        log.info("freeing threads remotely for workload: %s, path: %s", request.get_workload_id(), path)
+        response = self.__put(path, request)
         log.info("freed threads remotely with response code: %s for workload: %s", response.status_code, request.get_workload_id())
 
         if response.status_code == 200:
-            return deserialize_response(response.headers, response.json())
+            return self.__deserialize_response(response)
+        self.__raise_if_overloaded(response)
 
         raise CpuAllocationException("Failed to free threads: {}".format(response.text))
 
     def rebalance(self, request: AllocateRequest) -> AllocateResponse:
-        url = "{}/rebalance".format(self.__url)
-        body = request.to_dict()
-        log.debug("url: {}, body: {}".format(url, body))
-        response = requests.put(url, json=body, headers=self.__headers, timeout=self.__timeout)
+        path = "/rebalance"
+        response = self.__put(path, request)
         log.debug("rebalance response code: {}".format(response.status_code))
 
         if response.status_code == 200:
-            return deserialize_response(response.headers, response.json())
+            return self.__deserialize_response(response)
+        self.__raise_if_overloaded(response)
 
         raise CpuAllocationException("Failed to rebalance threads: {}".format(response.text))
 
     def get_name(self) -> str:
-        url = "{}/cpu_allocator".format(self.__url)
         try:
-            response = requests.get(url, timeout=self.__timeout)
+            response = self.__transport.get("/cpu_allocator")
             return "Remote({})".format(response.text)
         except:
             log.exception("Failed to GET cpu allocator name.")
             return UNKNOWN_CPU_ALLOCATOR
 
+    def __put(self, path, request: AllocateRequest):
+        if self.__packed:
+            log.debug("path: {}, packed request".format(path))
+            return self.__transport.put(path, encode_allocate_request(request), self.__content_type)
+
+        body = request.to_dict()
+        log.debug("path: {}, body: {}".format(path, body))
+        if self.__session is not None:
+            return self.__session.put(body, lambda b: self.__transport.put(path, self.__encode(b), self.__content_type))
+        return self.__transport.put(path, self.__encode(body), self.__content_type)
+
+    @staticmethod
+    def __raise_if_overloaded(response):
+        if response.status_code != TOO_MANY_REQUESTS:
+            return
+
+        try:
+            retry_after_secs = float(response.headers.get(RETRY_AFTER_HEADER, 0))
+        except ValueError:
+            retry_after_secs = 0
+        raise SolverOverloadedException("Remote solver is overloaded: {}".format(response.text), retry_after_secs)
+
+    @staticmethod
+    def __encode(body: dict) -> bytes:
+        return json.dumps(body).encode("utf-8")
+
+    @staticmethod
+    def __deserialize_response(response) -> AllocateResponse:
+        if response.headers.get('Content-Type', '').startswith(PACKED_CONTENT_TYPE):
+            return decode_response(response.headers, response.content)
+        return deserialize_response(response.headers, response.json())
+
+    def get_session(self) -> SessionClient:
+        return self.__session
+
     def set_registry(self, registry, tags):
-        pass
+        self.__reg = registry
+        self.__transport.set_registry(registry, tags)
 
     def report_metrics(self, tags):
-        pass
+        self.__transport.report_metrics(tags)
+        if self.__session is not None:
+            delta_count, full_count, resync_count = self.__session.pop_counts()
+            self.__reg.counter(REMOTE_ALLOCATOR_SESSION_DELTA_COUNT, tags).increment(delta_count)
+            self.__reg.counter(REMOTE_ALLOCATOR_SESSION_FULL_COUNT, tags).increment(full_count)
+            self.__reg.counter(REMOTE_ALLOCATOR_SESSION_RESYNC_COUNT, tags).increment(resync_count)
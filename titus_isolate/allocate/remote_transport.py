@@ -0,0 +1,242 @@
+import random
+import time
+from threading import Lock, local
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3 import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.util.request import ACCEPT_ENCODING
+
+from titus_isolate import log
+from titus_isolate.allocate.constants import TITUS_ISOLATE_DEADLINE_HEADER
+from titus_isolate.allocate.content_encoding import IDENTITY, CONTENT_ENCODING_HEADER, ACCEPT_ENCODING_HEADER, \
+    MIN_COMPRESS_BYTES, compress, is_supported_encoding, choose_encoding
+from titus_isolate.allocate.server_timing import SERVER_TIMING_HEADER, TOTAL, parse_server_timing
+from titus_isolate.metrics.constants import REMOTE_ALLOCATOR_CONNECT_LATENCY, REMOTE_ALLOCATOR_TRANSFER_LATENCY, \
+    REMOTE_ALLOCATOR_SERVER_LATENCY, REMOTE_ALLOCATOR_REQUEST_BYTES, REMOTE_ALLOCATOR_RESPONSE_BYTES, \
+    REMOTE_ALLOCATOR_CONNECTION_COUNT, REMOTE_ALLOCATOR_RETRY_COUNT
+
+RETRY_STATUS_CODES = [502, 503, 504]
+UNSUPPORTED_MEDIA_TYPE = 415
+
+# Connections are opened on the thread which sends the request, so this attributes connect time to the request
+_connect_times = local()
+
+
+def _record_connect(duration: float):
+    _connect_times.total = getattr(_connect_times, "total", 0) + duration
+    _connect_times.count = getattr(_connect_times, "count", 0) + 1
+
+
+def _pop_connect_times():
+    total = getattr(_connect_times, "total", 0)
+    count = getattr(_connect_times, "count", 0)
+    _connect_times.total = 0
+    _connect_times.count = 0
+    return total, count
+
+
+class _TimedHTTPConnection(HTTPConnection):
+
+    def connect(self):
+        start_time = time.time()
+        super().connect()
+        _record_connect(time.time() - start_time)
+
+
+class _TimedHTTPSConnection(HTTPSConnection):
+
+    def connect(self):
+        start_time = time.time()
+        super().connect()
+        _record_connect(time.time() - start_time)
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class _TimedHTTPAdapter(HTTPAdapter):
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _TimedHTTPConnectionPool,
+            "https": _TimedHTTPSConnectionPool
+        }
+
+
+class RemoteSolverTransport:
+    """
+    Sends requests to the remote solver over a pool of persistent connections.
+
+    Request bodies are compressed with the configured encoding.  Should the solver not support it, it answers 415 with
+    the encodings it does support, and the transport switches to one of those, or to no compression, for good.
+    Responses are compressed by the solver with whatever the transport advertises it can decode.
+
+    Connection failures and gateway errors are retried with a full jitter exponential backoff, as long as the retry
+    fits in the read timeout.  Read timeouts are never retried, the solver is most likely still solving.
+
+    Every request carries the time after which the transport stops waiting for its response, so the solver can drop
+    or shorten solves whose results would arrive too late.
+
+    Every request's time is broken out into connecting, the solver's own time from the Server-Timing header, and the
+    remainder: transferring, encoding and decoding the bodies.
+    """
+
+    def __init__(
+            self,
+            url: str,
+            timeout: tuple,
+            encoding: str = IDENTITY,
+            max_retries: int = 0,
+            retry_backoff_secs: float = 0.05,
+            pool_size: int = 4):
+        """
+        :param timeout: (connect timeout, read timeout) in seconds
+        """
+        if not is_supported_encoding(encoding):
+            log.warning("Unsupported remote allocator compression: '{}', not compressing requests".format(encoding))
+            encoding = IDENTITY
+
+        self.__url = url
+        self.__timeout = timeout
+        self.__encoding = encoding
+        self.__max_retries = max_retries
+        self.__retry_backoff_secs = retry_backoff_secs
+
+        self.__session = requests.Session()
+        adapter = _TimedHTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.__session.mount("http://", adapter)
+        self.__session.mount("https://", adapter)
+
+        self.__lock = Lock()
+        self.__connection_count = 0
+        self.__retry_count = 0
+
+        self.__reg = None
+        self.__tags = None
+
+    def get_encoding(self) -> str:
+        return self.__encoding
+
+    def get_connection_count(self) -> int:
+        return self.__connection_count
+
+    def get_retry_count(self) -> int:
+        return self.__retry_count
+
+    def get(self, path: str) -> requests.Response:
+        return self.__send("GET", path, None, {})
+
+    def put(self, path: str, data: bytes, content_type: str) -> requests.Response:
+        return self.__send("PUT", path, data, {'Content-Type': content_type})
+
+    def __send(self, method, path, data, headers) -> requests.Response:
+        url = "{}{}".format(self.__url, path)
+        start_time = time.time()
+
+        # Retries happen within the read timeout, so every attempt carries the same deadline
+        headers = dict(headers)
+        headers[TITUS_ISOLATE_DEADLINE_HEADER] = "{:.3f}".format(start_time + self.__timeout[1])
+        attempt = 0
+        while True:
+            try:
+                response = self.__send_once(method, url, data, headers)
+                if response.status_code not in RETRY_STATUS_CODES:
+                    return response
+                if not self.__backoff(attempt, start_time):
+                    return response
+                log.warning("Retrying {} {} after response code: {}".format(method, url, response.status_code))
+            except requests.exceptions.ConnectionError:
+                if not self.__backoff(attempt, start_time):
+                    raise
+                log.warning("Retrying {} {} after failing to connect".format(method, url))
+            attempt += 1
+
+    def __send_once(self, method, url, data, headers) -> requests.Response:
+        encoding = self.__encoding
+        response = self.__timed_request(method, url, data, headers, encoding)
+
+        # The solver does not support our compression, use what it does support from now on
+        if response.status_code == UNSUPPORTED_MEDIA_TYPE and encoding != IDENTITY:
+            self.__encoding = choose_encoding(response.headers.get(ACCEPT_ENCODING_HEADER))
+            log.warning("Remote solver does not accept '{}' requests, switching to: '{}'".format(
+                encoding, self.__encoding))
+            response = self.__timed_request(method, url, data, headers, self.__encoding)
+
+        return response
+
+    def __timed_request(self, method, url, data, headers, encoding) -> requests.Response:
+        headers = dict(headers)
+        headers[ACCEPT_ENCODING_HEADER] = ACCEPT_ENCODING
+        if data is not None and encoding != IDENTITY and len(data) >= MIN_COMPRESS_BYTES:
+            data = compress(data, encoding)
+            headers[CONTENT_ENCODING_HEADER] = encoding
+
+        _pop_connect_times()
+        start_time = time.time()
+        try:
+            response = self.__session.request(method, url, data=data, headers=headers, timeout=self.__timeout)
+        finally:
+            connect_secs, connect_count = _pop_connect_times()
+            with self.__lock:
+                self.__connection_count += connect_count
+        duration = time.time() - start_time
+
+        server_timings = parse_server_timing(response.headers.get(SERVER_TIMING_HEADER))
+        server_secs = server_timings.get(TOTAL, 0)
+        transfer_secs = max(0.0, duration - connect_secs - server_secs)
+        stages = ", ".join("{}: {:.3f}s".format(s, secs) for s, secs in server_timings.items() if s != TOTAL)
+        log.info("{} {}: {} in {:.3f}s, connect: {:.3f}s, server: {:.3f}s, transfer: {:.3f}s{}".format(
+            method, url, response.status_code, duration, connect_secs, server_secs, transfer_secs,
+            "" if len(stages) == 0 else " ({})".format(stages)))
+
+        if self.__reg is not None:
+            if connect_count > 0:
+                self.__reg.distribution_summary(REMOTE_ALLOCATOR_CONNECT_LATENCY, self.__tags).record(connect_secs)
+            self.__reg.distribution_summary(REMOTE_ALLOCATOR_SERVER_LATENCY, self.__tags).record(server_secs)
+            self.__reg.distribution_summary(REMOTE_ALLOCATOR_TRANSFER_LATENCY, self.__tags).record(transfer_secs)
+            if data is not None:
+                self.__reg.distribution_summary(REMOTE_ALLOCATOR_REQUEST_BYTES, self.__tags).record(len(data))
+            response_bytes = response.headers.get('Content-Length')
+            if response_bytes is not None:
+                summary = self.__reg.distribution_summary(REMOTE_ALLOCATOR_RESPONSE_BYTES, self.__tags)
+                summary.record(int(response_bytes))
+
+        return response
+
+    def __backoff(self, attempt, start_time) -> bool:
+        """
+        Sleeps before the next attempt and returns True, or returns False when the retries are exhausted.
+        """
+        if attempt >= self.__max_retries:
+            return False
+
+        backoff_secs = random.uniform(0, self.__retry_backoff_secs * (2 ** attempt))
+        if time.time() - start_time + backoff_secs > self.__timeout[1]:
+            return False
+
+        with self.__lock:
+            self.__retry_count += 1
+        time.sleep(backoff_secs)
+        return True
+
+    def set_registry(self, registry, tags):
+        self.__reg = registry
+        self.__tags = tags
+
+    def report_metrics(self, tags):
+        with self.__lock:
+            connection_count = self.__connection_count
+            retry_count = self.__retry_count
+            self.__connection_count = 0
+            self.__retry_count = 0
+
+        self.__reg.counter(REMOTE_ALLOCATOR_CONNECTION_COUNT, tags).increment(connection_count)
+        self.__reg.counter(REMOTE_ALLOCATOR_RETRY_COUNT, tags).increment(retry_count)
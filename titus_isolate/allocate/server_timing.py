@@ -0,0 +1,53 @@
+"""
+The Server-Timing header through which the remote solver reports where it spent the time of a request, e.g.
+
+    Server-Timing: total;dur=12.3, parse;dur=0.4, deserialize;dur=1.1, allocate;dur=9.8, predict;dur=2.0, ...
+
+Besides the total, the solver may list the stages of the request.  Predictions and the IP solve are part of allocating,
+the other stages follow each other.
+
+Durations are in milliseconds on the wire and in seconds everywhere else.
+"""
+from collections import OrderedDict
+from typing import Dict, Optional
+
+SERVER_TIMING_HEADER = "Server-Timing"
+TOTAL = "total"
+
+PARSE = "parse"
+DESERIALIZE = "deserialize"
+QUEUE = "queue"
+ALLOCATE = "allocate"
+PREDICT = "predict"
+IP_SOLVE = "ip_solve"
+SERIALIZE = "serialize"
+JSONIFY = "jsonify"
+COMPRESS = "compress"
+
+STAGES = [PARSE, DESERIALIZE, QUEUE, ALLOCATE, PREDICT, IP_SOLVE, SERIALIZE, JSONIFY, COMPRESS]
+
+
+def format_server_timing(durations: Dict[str, float]) -> str:
+    """
+    :param durations: seconds per metric name, in the order they should be listed
+    """
+    return ", ".join("{};dur={:.3f}".format(name, secs * 1000) for name, secs in durations.items())
+
+
+def parse_server_timing(header: Optional[str]) -> Dict[str, float]:
+    """
+    Returns the seconds per metric name of a Server-Timing header, skipping metrics without a duration.
+    """
+    durations = OrderedDict()
+    if header is None:
+        return durations
+
+    for entry in header.split(","):
+        parts = [p.strip() for p in entry.split(";")]
+        for param in parts[1:]:
+            if param.startswith("dur="):
+                try:
+                    durations[parts[0]] = float(param[len("dur="):]) / 1000
+                except ValueError:
+                    pass
+    return durations
@@ -0,0 +1,341 @@
+"""
+A stateful session between an agent and the remote solver, so consecutive JSON requests from one instance only carry
+what changed since the previous request.
+
+The state of a request is its cpu, workloads and usage series.  Both sides identify a state by the hash of its
+canonical JSON.  A session request carries, under the session key, the hash of the state it was built on, the hash of
+the state it results in and the delta between the two:
+
+    cpu_claims:         the workload ids of every thread whose claims changed
+    cpu:                the whole cpu instead, should its topology have changed
+    workloads_set:      the workloads which were added or changed
+    workloads_removed:  the ids of the workloads which are gone
+    usage:              per resource and workload, how many samples dropped off the front of a series and the samples
+                        appended to it, or the whole series when it is not a continuation of the previous one
+    usage_removed:      per resource, the ids of the workloads without a series anymore
+
+The metadata and the ids of the workloads being added or removed are always sent in full.
+
+The solver keeps the last state of every instance in a single store, shared by the threads of its one serving
+process, up to a number of states and an estimate of their size.  Should it not know the base state, or should the
+state it rebuilds not match the resulting hash, it answers 409 Conflict and the agent resends the request with its full
+state, which establishes the session again.
+"""
+import copy
+import hashlib
+import json
+from collections import OrderedDict
+from threading import Lock
+from typing import Callable, Optional, Tuple
+
+from titus_isolate import log
+from titus_isolate.allocate.constants import CPU, WORKLOADS, RESOURCE_USAGE_NAMES, METADATA, INSTANCE_ID, SESSION, \
+    WORKLOAD_ID, WORKLOAD_IDS
+
+BASE_HASH = "base_hash"
+STATE_HASH = "state_hash"
+DELTA = "delta"
+
+CPU_CLAIMS = "cpu_claims"
+WORKLOADS_SET = "workloads_set"
+WORKLOADS_REMOVED = "workloads_removed"
+USAGE = "usage"
+USAGE_REMOVED = "usage_removed"
+DROP = "drop"
+APPEND = "append"
+SET = "set"
+
+CONFLICT = 409
+# A rough per session cost of the dict slot, the tuple and the hash, on top of the size of its state
+SESSION_OVERHEAD_BYTES = 200
+
+STATE_KEYS = [CPU, WORKLOADS] + RESOURCE_USAGE_NAMES
+PASSTHROUGH_KEYS = [METADATA, WORKLOAD_ID, WORKLOAD_IDS]
+
+
+class SessionResyncException(Exception):
+
+    def __init__(self, msg):
+        super().__init__(msg)
+
+
+def get_state(body: dict) -> dict:
+    """
+    Returns the part of a serialized request which is carried over from one request to the next.
+    """
+    return {k: body.get(k, {}) for k in STATE_KEYS}
+
+
+def get_state_hash(state: dict) -> str:
+    return get_state_hash_and_size(state)[0]
+
+
+def get_state_hash_and_size(state: dict) -> Tuple[str, int]:
+    """
+    Returns the hash of the state and the size of its canonical JSON.
+    """
+    encoded = json.dumps(state, sort_keys=True, separators=(',', ':')).encode("utf-8")
+    return hashlib.sha1(encoded).hexdigest(), len(encoded)
+
+
+def encode_delta(base: dict, state: dict) -> dict:
+    delta = {}
+
+    base_claims = __get_claims(base[CPU])
+    claims = __get_claims(state[CPU])
+    if base_claims.keys() != claims.keys():
+        delta[CPU] = state[CPU]
+    else:
+        delta[CPU_CLAIMS] = {t_id: w_ids for t_id, w_ids in claims.items() if base_claims[t_id] != w_ids}
+
+    delta[WORKLOADS_SET] = {w_id: w for w_id, w in state[WORKLOADS].items() if base[WORKLOADS].get(w_id) != w}
+    delta[WORKLOADS_REMOVED] = [w_id for w_id in base[WORKLOADS] if w_id not in state[WORKLOADS]]
+
+    delta[USAGE] = {}
+    delta[USAGE_REMOVED] = {}
+    for resource in RESOURCE_USAGE_NAMES:
+        base_usage = base[resource]
+        usage = state[resource]
+        series_deltas = {}
+        for w_id, series in usage.items():
+            base_series = base_usage.get(w_id)
+            if base_series != series:
+                series_deltas[w_id] = __encode_series_delta(base_series, series)
+        removed = [w_id for w_id in base_usage if w_id not in usage]
+        if len(series_deltas) > 0:
+            delta[USAGE][resource] = series_deltas
+        if len(removed) > 0:
+            delta[USAGE_REMOVED][resource] = removed
+
+    # Nothing changed is left out
+    return {k: v for k, v in delta.items() if len(v) > 0}
+
+
+def apply_delta(base: dict, delta: dict) -> dict:
+    """
+    Returns the state the delta results in.  The base state is left untouched.
+    """
+    state = dict(base)
+
+    if CPU in delta:
+        state[CPU] = delta[CPU]
+    elif len(delta.get(CPU_CLAIMS, {})) > 0:
+        cpu = copy.deepcopy(base[CPU])
+        claims = delta[CPU_CLAIMS]
+        for p in cpu["packages"]:
+            for c in p["cores"]:
+                for t in c["threads"]:
+                    w_ids = claims.get(str(t["id"]))
+                    if w_ids is not None:
+                        t["workload_id"] = w_ids
+        state[CPU] = cpu
+
+    workloads = dict(base[WORKLOADS])
+    for w_id in delta.get(WORKLOADS_REMOVED, []):
+        workloads.pop(w_id, None)
+    workloads.update(delta.get(WORKLOADS_SET, {}))
+    state[WORKLOADS] = workloads
+
+    for resource in RESOURCE_USAGE_NAMES:
+        usage = dict(base[resource])
+        for w_id in delta.get(USAGE_REMOVED, {}).get(resource, []):
+            usage.pop(w_id, None)
+        for w_id, series_delta in delta.get(USAGE, {}).get(resource, {}).items():
+            if SET in series_delta:
+                usage[w_id] = series_delta[SET]
+            else:
+                usage[w_id] = usage.get(w_id, [])[series_delta[DROP]:] + series_delta[APPEND]
+        state[resource] = usage
+
+    return state
+
+
+def __get_claims(cpu: dict) -> dict:
+    claims = {}
+    for p in cpu.get("packages", []):
+        for c in p["cores"]:
+            for t in c["threads"]:
+                claims[str(t["id"])] = t["workload_id"]
+    return claims
+
+
+def __encode_series_delta(base_series: Optional[list], series: list) -> dict:
+    """
+    Usage series are sliding windows: new samples are appended while the oldest drop off the front.
+    """
+    if base_series is not None:
+        for drop in range(len(base_series) + 1):
+            kept = len(base_series) - drop
+            if kept < len(series) and series[:kept] == base_series[drop:]:
+                return {DROP: drop, APPEND: series[kept:]}
+    return {SET: series}
+
+
+class SessionClient:
+    """
+    Sends the JSON requests of one instance as deltas against the state of its previous request.
+    """
+
+    def __init__(self):
+        self.__lock = Lock()
+        self.__state = None
+        self.__state_hash = None
+
+        self.__delta_count = 0
+        self.__full_count = 0
+        self.__resync_count = 0
+
+    def put(self, body: dict, send: Callable[[dict], object]):
+        """
+        :param body: the serialized request
+        :param send: sends a request body and returns the response
+        """
+        state = get_state(body)
+        state_hash = get_state_hash(state)
+
+        with self.__lock:
+            base = self.__state
+            base_hash = self.__state_hash
+
+        if base is not None:
+            delta_body = {k: body[k] for k in PASSTHROUGH_KEYS if k in body}
+            delta_body[SESSION] = {BASE_HASH: base_hash, STATE_HASH: state_hash, DELTA: encode_delta(base, state)}
+            self.__delta_count += 1
+            response = send(delta_body)
+            if response.status_code != CONFLICT:
+                self.__update(state, state_hash, response.status_code == 200)
+                return response
+
+            log.info("Remote solver lost the session state: {}, resending the full state".format(base_hash))
+            self.__resync_count += 1
+
+        full_body = dict(body)
+        full_body[SESSION] = {STATE_HASH: state_hash}
+        self.__full_count += 1
+        response = send(full_body)
+        self.__update(state, state_hash, response.status_code == 200)
+        return response
+
+    def __update(self, state, state_hash, succeeded):
+        # After a failure the solver's state is unknown, so the next request starts over with the full state
+        with self.__lock:
+            self.__state = state if succeeded else None
+            self.__state_hash = state_hash if succeeded else None
+
+    def get_delta_count(self) -> int:
+        return self.__delta_count
+
+    def get_full_count(self) -> int:
+        return self.__full_count
+
+    def get_resync_count(self) -> int:
+        return self.__resync_count
+
+    def pop_counts(self):
+        counts = self.__delta_count, self.__full_count, self.__resync_count
+        self.__delta_count = 0
+        self.__full_count = 0
+        self.__resync_count = 0
+        return counts
+
+
+class SessionStore:
+    """
+    Keeps the last state of the most recently seen instances, evicting the least recently used.  The store is bounded
+    by both a number of sessions and an estimate of their memory use, from the size of their canonical JSON.  That
+    size underestimates the dicts holding a state, max_bytes should leave room for it.
+    """
+
+    def __init__(self, max_sessions: int, max_bytes: int):
+        self.__lock = Lock()
+        self.__max_sessions = max_sessions
+        self.__max_bytes = max_bytes
+        self.__sessions = OrderedDict()
+        self.__bytes = 0
+
+        self.__delta_count = 0
+        self.__full_count = 0
+        self.__resync_count = 0
+
+    def resolve(self, body: dict) -> dict:
+        """
+        Returns the full serialized request of a session request and remembers its state.
+
+        :raises SessionResyncException: when the session's state is unknown or out of sync
+        """
+        session = body[SESSION]
+        instance_id = body.get(METADATA, {}).get(INSTANCE_ID)
+
+        if DELTA not in session:
+            with self.__lock:
+                self.__full_count += 1
+            state = get_state(body)
+            state_hash, size = get_state_hash_and_size(state)
+            if state_hash == session.get(STATE_HASH):
+                self.__put(instance_id, state_hash, state, size)
+            else:
+                log.warning("State hash mismatch for instance: {}, not keeping its session".format(instance_id))
+            return {k: v for k, v in body.items() if k != SESSION}
+
+        with self.__lock:
+            self.__delta_count += 1
+            entry = self.__sessions.get(instance_id)
+
+        if entry is None or entry[0] != session[BASE_HASH]:
+            self.__resync(instance_id, "Unknown session state: {} for instance: {}".format(
+                session[BASE_HASH], instance_id))
+
+        state = apply_delta(entry[1], session[DELTA])
+        state_hash, size = get_state_hash_and_size(state)
+        if state_hash != session[STATE_HASH]:
+            self.__resync(instance_id, "Session state: {} of instance: {} does not match expected: {}".format(
+                state_hash, instance_id, session[STATE_HASH]))
+
+        self.__put(instance_id, state_hash, state, size)
+        full_body = dict(state)
+        full_body.update({k: body[k] for k in PASSTHROUGH_KEYS if k in body})
+        return full_body
+
+    def __put(self, instance_id, state_hash, state, size):
+        if instance_id is None:
+            return
+
+        size += SESSION_OVERHEAD_BYTES
+        with self.__lock:
+            self.__pop(instance_id)
+            if size > self.__max_bytes or self.__max_sessions <= 0:
+                log.warning("Session state of instance: {} is too large to keep: {} bytes".format(instance_id, size))
+                return
+
+            self.__sessions[instance_id] = (state_hash, state, size)
+            self.__bytes += size
+            while len(self.__sessions) > self.__max_sessions or self.__bytes > self.__max_bytes:
+                _, (_, _, evicted_size) = self.__sessions.popitem(last=False)
+                self.__bytes -= evicted_size
+
+    def __pop(self, instance_id):
+        entry = self.__sessions.pop(instance_id, None)
+        if entry is not None:
+            self.__bytes -= entry[2]
+
+    def __resync(self, instance_id, msg):
+        with self.__lock:
+            self.__pop(instance_id)
+            self.__resync_count += 1
+        raise SessionResyncException(msg)
+
+    def get_session_count(self) -> int:
+        with self.__lock:
+            return len(self.__sessions)
+
+    def get_bytes(self) -> int:
+        return self.__bytes
+
+    def get_delta_count(self) -> int:
+        return self.__delta_count
+
+    def get_full_count(self) -> int:
+        return self.__full_count
+
+    def get_resync_count(self) -> int:
+        return self.__resync_count
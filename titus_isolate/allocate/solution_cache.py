@@ -0,0 +1,262 @@
+import hashlib
+import json
+import os
+import tempfile
+from collections import OrderedDict
+from threading import Lock
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from titus_isolate import log
+
+KEY_VERSION = 1
+
+# A rough per entry cost of the dict slot, the tuple and the bytes headers, on top of the key and placement bytes
+ENTRY_OVERHEAD_BYTES = 200
+# Pruning the store frees this fraction of its cap, so it does not scan the directory on every write once full
+PRUNE_TARGET_RATIO = 0.9
+SOLUTION_FILE_SUFFIX = '.json'
+
+
+def get_solution_key(
+        thread_count: int,
+        package_count: int,
+        requested_units: List[int],
+        current_placement: Optional[List[List[int]]]) -> bytes:
+    """
+    Returns a compact, canonical key for a placement problem.  The problem is written as fixed width binary, so the key
+    does not depend on how the vectors were built (ints, bools, numpy), and is then hashed.  The topology is part of the
+    key, so solutions can be shared between instances of the same shape.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(np.array([KEY_VERSION, thread_count, package_count, len(requested_units)], dtype='<i4').tobytes())
+    digest.update(np.asarray(requested_units, dtype='<i4').tobytes())
+    if current_placement is not None:
+        placement = np.asarray(current_placement, dtype=bool)
+        digest.update(np.array(placement.shape, dtype='<i4').tobytes())
+        digest.update(np.packbits(placement, axis=-1).tobytes())
+    return digest.digest()
+
+
+class DiskSolutionStore:
+    """
+    Persists solutions as one small JSON file per key, so a restarted agent, or any agent sharing the directory, can
+    reuse them.  Files are written to a temporary name and renamed into place, so readers never see partial files.
+    Failures are logged and treated as misses.
+
+    The directory is bounded by max_bytes.  Reads refresh the modification time of a file, and once the files exceed
+    the bound the least recently used ones are removed.  Files written by other agents sharing the directory are
+    counted when the directory is scanned, on start and when pruning.
+    """
+
+    def __init__(self, path: str, max_bytes: int):
+        self.__path = path
+        self.__max_bytes = max_bytes
+        os.makedirs(path, exist_ok=True)
+
+        self.__lock = Lock()
+        self.__bytes = sum(size for _, _, size in self.__list_files())
+        self.__pruned_count = 0
+
+    def get_path(self) -> str:
+        return self.__path
+
+    def get_bytes(self) -> int:
+        return self.__bytes
+
+    def get_pruned_count(self) -> int:
+        return self.__pruned_count
+
+    def get(self, key: bytes) -> Optional[Tuple[List[List[int]], str]]:
+        file_path = self.__get_file_path(key)
+        if not os.path.exists(file_path):
+            return None
+
+        try:
+            with open(file_path) as f:
+                entry = json.load(f)
+            if entry.get("version") != KEY_VERSION:
+                return None
+            placement = [[int(c) for c in row] for row in entry["placement"]]
+        except Exception:
+            log.exception("Failed to read cached solution: %s", file_path)
+            return None
+
+        try:
+            os.utime(file_path)
+        except OSError:
+            # Pruned since it was read
+            pass
+        return placement, entry["status"]
+
+    def put(self, key: bytes, placement: List[List[int]], status: str):
+        entry = {
+            "version": KEY_VERSION,
+            "status": status,
+            "placement": [''.join(str(int(e)) for e in row) for row in placement]
+        }
+
+        tmp_path = None
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.__path, suffix='.tmp')
+            with os.fdopen(fd, 'w') as f:
+                json.dump(entry, f)
+            size = os.path.getsize(tmp_path)
+            os.replace(tmp_path, self.__get_file_path(key))
+        except Exception:
+            log.exception("Failed to write cached solution to: %s", self.__path)
+            if tmp_path is not None:
+                try:
+                    os.unlink(tmp_path)
+                except OSError:
+                    pass
+            return
+
+        with self.__lock:
+            self.__bytes += size
+            if self.__bytes > self.__max_bytes:
+                self.__prune()
+
+    def __prune(self):
+        files = sorted(self.__list_files())
+        total = sum(size for _, _, size in files)
+        target = self.__max_bytes * PRUNE_TARGET_RATIO
+        for _, file_path, size in files:
+            if total <= target:
+                break
+            try:
+                os.unlink(file_path)
+                self.__pruned_count += 1
+            except OSError:
+                # Already removed, e.g. by another agent sharing the directory
+                pass
+            total -= size
+
+        self.__bytes = total
+        log.info("Pruned cached solutions in: %s to %d bytes", self.__path, total)
+
+    def __list_files(self) -> List[Tuple[float, str, int]]:
+        files = []
+        for name in os.listdir(self.__path):
+            if not name.endswith(SOLUTION_FILE_SUFFIX):
+                continue
+            file_path = os.path.join(self.__path, name)
+            try:
+                stat = os.stat(file_path)
+            except OSError:
+                continue
+            files.append((stat.st_mtime, file_path, stat.st_size))
+        return files
+
+    def __get_file_path(self, key: bytes) -> str:
+        return os.path.join(self.__path, key.hex() + SOLUTION_FILE_SUFFIX)
+
+
+class SolutionCache:
+    """
+    A thread safe LRU cache of solver solutions, bounded by both an entry count and an estimate of its memory use.
+    Placements are held as one byte per thread and handed out as fresh lists, so callers can not corrupt the cache.
+
+    When a disk store is given, in memory misses fall through to it and only solutions whose status is in
+    `persisted_statuses` are written to it.
+    """
+
+    def __init__(
+            self,
+            max_entries: int,
+            max_bytes: int,
+            store: DiskSolutionStore = None,
+            persisted_statuses: Tuple[str, ...] = None):
+        self.__max_entries = max_entries
+        self.__max_bytes = max_bytes
+        self.__store = store
+        self.__persisted_statuses = persisted_statuses
+
+        self.__lock = Lock()
+        self.__entries = OrderedDict()
+        self.__bytes = 0
+
+        self.__hit_count = 0
+        self.__disk_hit_count = 0
+        self.__miss_count = 0
+        self.__eviction_count = 0
+
+    def get(self, key: bytes) -> Optional[Tuple[List[List[int]], str]]:
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is not None:
+                self.__entries.move_to_end(key)
+                self.__hit_count += 1
+                return self.__to_solution(entry)
+
+        if self.__store is not None:
+            solution = self.__store.get(key)
+            if solution is not None:
+                with self.__lock:
+                    self.__disk_hit_count += 1
+                self.__put_memory(key, *solution)
+                return solution
+
+        with self.__lock:
+            self.__miss_count += 1
+        return None
+
+    def put(self, key: bytes, placement: List[List[int]], status: str):
+        self.__put_memory(key, placement, status)
+        if self.__store is not None and (self.__persisted_statuses is None or status in self.__persisted_statuses):
+            self.__store.put(key, placement, status)
+
+    def clear(self):
+        with self.__lock:
+            self.__entries.clear()
+            self.__bytes = 0
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def get_size(self) -> int:
+        return len(self.__entries)
+
+    def get_bytes(self) -> int:
+        return self.__bytes
+
+    def get_hit_count(self) -> int:
+        return self.__hit_count
+
+    def get_disk_hit_count(self) -> int:
+        return self.__disk_hit_count
+
+    def get_miss_count(self) -> int:
+        return self.__miss_count
+
+    def get_eviction_count(self) -> int:
+        return self.__eviction_count
+
+    def __put_memory(self, key: bytes, placement: List[List[int]], status: str):
+        entry = (tuple(bytes(int(e) for e in row) for row in placement), status)
+        size = self.__get_entry_bytes(key, entry)
+        if size > self.__max_bytes or self.__max_entries <= 0:
+            return
+
+        with self.__lock:
+            previous = self.__entries.pop(key, None)
+            if previous is not None:
+                self.__bytes -= self.__get_entry_bytes(key, previous)
+
+            self.__entries[key] = entry
+            self.__bytes += size
+
+            while len(self.__entries) > self.__max_entries or self.__bytes > self.__max_bytes:
+                old_key, old_entry = self.__entries.popitem(last=False)
+                self.__bytes -= self.__get_entry_bytes(old_key, old_entry)
+                self.__eviction_count += 1
+
+    @staticmethod
+    def __get_entry_bytes(key: bytes, entry) -> int:
+        return ENTRY_OVERHEAD_BYTES + len(key) + sum(len(row) for row in entry[0])
+
+    @staticmethod
+    def __to_solution(entry) -> Tuple[List[List[int]], str]:
+        rows, status = entry
+        return [list(row) for row in rows], status
@@ -0,0 +1,203 @@
+import time
+from collections import deque
+from contextlib import contextmanager
+from threading import Lock, local
+from typing import Optional
+
+import numpy as np
+
+from titus_isolate.config.config_manager import ConfigManager
+from titus_isolate.config.constants import MAX_SOLVER_RUNTIME, DEFAULT_MAX_SOLVER_RUNTIME, RELATIVE_MIP_GAP_STOP, \
+    DEFAULT_RELATIVE_MIP_GAP_STOP, SOLVER_BUDGET_ADAPTIVE, DEFAULT_SOLVER_BUDGET_ADAPTIVE, ASSIGN_SOLVER_LATENCY_SLO, \
+    DEFAULT_ASSIGN_SOLVER_LATENCY_SLO, FREE_SOLVER_LATENCY_SLO, DEFAULT_FREE_SOLVER_LATENCY_SLO, \
+    REBALANCE_SOLVER_LATENCY_SLO, DEFAULT_REBALANCE_SOLVER_LATENCY_SLO, MAX_RELATIVE_MIP_GAP_STOP, \
+    DEFAULT_MAX_RELATIVE_MIP_GAP_STOP
+from titus_isolate.metrics.constants import SOLVER_BUDGET_RUNTIME, SOLVER_BUDGET_MIP_GAP, SOLVER_DURATION_P95, \
+    SOLVER_DURATION_SAMPLE_COUNT
+
+ASSIGN = "assign"
+FREE = "free"
+REBALANCE = "rebalance"
+
+WINDOW = 50
+MIN_SAMPLES = 5
+LATENCY_PERCENTILE = 95
+MIN_RUNTIME_SECS = 0.05
+# Time left after the solve to build and send the response
+DEADLINE_MARGIN_SECS = 0.05
+
+# The budget shrinks quickly when the latency objective is missed and grows back slowly once there is headroom
+DECREASE_FACTOR = 0.7
+INCREASE_FACTOR = 1.1
+HEADROOM = 0.5
+
+# The deadline of the request being solved on this thread, and whether its solve was limited by time
+_deadline = local()
+
+
+@contextmanager
+def solve_deadline(deadline: Optional[float]):
+    """
+    Bounds the budgets handed out on this thread, while in the context, by the time left until the deadline.
+
+    :param deadline: seconds since the epoch, or None for no deadline
+    """
+    previous = getattr(_deadline, "value", None), getattr(_deadline, "time_limited", False)
+    _deadline.value = deadline
+    _deadline.time_limited = False
+    try:
+        yield
+    finally:
+        _deadline.value, _deadline.time_limited = previous
+
+
+def mark_time_limited():
+    """
+    Records that the solve on this thread stopped on its time budget, rather than at its best solution.
+    """
+    _deadline.time_limited = True
+
+
+def is_time_limited() -> bool:
+    """
+    Returns whether the solve in the current solve_deadline context was time bound, or had its budget cut to the
+    deadline.
+    """
+    return getattr(_deadline, "time_limited", False)
+
+
+def get_remaining_secs(deadline: Optional[float]) -> Optional[float]:
+    """
+    Returns the time a solve has until the deadline, leaving a margin for the response, or None without a deadline.
+    """
+    if deadline is None:
+        return None
+    return deadline - time.time() - DEADLINE_MARGIN_SECS
+
+
+class SolverBudget:
+
+    def __init__(self, runtime_secs: float, mip_gap: float):
+        self.runtime_secs = runtime_secs
+        self.mip_gap = mip_gap
+
+    def __eq__(self, other):
+        return isinstance(other, SolverBudget) and vars(self) == vars(other)
+
+    def __str__(self):
+        return str(vars(self))
+
+
+class _BudgetState:
+
+    def __init__(self, budget: SolverBudget):
+        self.budget = budget
+        self.durations = deque(maxlen=WINDOW)
+
+
+class SolverBudgetController:
+    """
+    Picks the solver runtime limit and relative MIP gap of each solve so solves of an operation meet that operation's
+    latency objective, typically tight for assigns on the container start path and loose for background rebalances.
+
+    Solve durations are kept per operation and problem size: the thread count and the workload count, rounded up to a
+    power of two.  Whenever the observed latency percentile misses the objective the runtime limit shrinks and the gap
+    widens.  Once there is ample headroom they relax back towards the configured MAX_SOLVER_RUNTIME and
+    RELATIVE_MIP_GAP_STOP.  When the controller is not adaptive every solve gets the configured budget and durations are
+    only recorded.
+
+    Within a solve_deadline context the runtime limit is further cut to the time left until the deadline.
+    """
+
+    def __init__(self, config_manager: ConfigManager):
+        self.__lock = Lock()
+        self.__adaptive = config_manager.get_bool(SOLVER_BUDGET_ADAPTIVE, DEFAULT_SOLVER_BUDGET_ADAPTIVE)
+        self.__max_runtime_secs = config_manager.get_float(MAX_SOLVER_RUNTIME, DEFAULT_MAX_SOLVER_RUNTIME)
+        self.__min_mip_gap = config_manager.get_float(RELATIVE_MIP_GAP_STOP, DEFAULT_RELATIVE_MIP_GAP_STOP)
+        self.__max_mip_gap = config_manager.get_float(MAX_RELATIVE_MIP_GAP_STOP, DEFAULT_MAX_RELATIVE_MIP_GAP_STOP)
+        self.__slos = {
+            ASSIGN: config_manager.get_float(ASSIGN_SOLVER_LATENCY_SLO, DEFAULT_ASSIGN_SOLVER_LATENCY_SLO),
+            FREE: config_manager.get_float(FREE_SOLVER_LATENCY_SLO, DEFAULT_FREE_SOLVER_LATENCY_SLO),
+            REBALANCE: config_manager.get_float(REBALANCE_SOLVER_LATENCY_SLO, DEFAULT_REBALANCE_SOLVER_LATENCY_SLO)
+        }
+        self.__states = {}
+
+    def get_budget(self, operation: str, thread_count: int, workload_count: int) -> SolverBudget:
+        with self.__lock:
+            budget = self.__get_state(operation, thread_count, workload_count).budget
+            runtime_secs, mip_gap = budget.runtime_secs, budget.mip_gap
+
+        remaining_secs = get_remaining_secs(getattr(_deadline, "value", None))
+        if remaining_secs is not None and remaining_secs < runtime_secs:
+            runtime_secs = max(MIN_RUNTIME_SECS, remaining_secs)
+            mark_time_limited()
+        return SolverBudget(runtime_secs, mip_gap)
+
+    def record(self, operation: str, thread_count: int, workload_count: int, duration_secs: float):
+        """
+        Records the wall clock duration of a solve which ran with the budget returned by get_budget.
+        """
+        with self.__lock:
+            state = self.__get_state(operation, thread_count, workload_count)
+            state.durations.append(duration_secs)
+            if self.__adaptive and len(state.durations) >= MIN_SAMPLES:
+                self.__adjust(state, self.__slos[operation])
+
+    def set_max_runtime_secs(self, val: float):
+        with self.__lock:
+            self.__max_runtime_secs = val
+            self.__states = {}
+
+    def is_adaptive(self) -> bool:
+        return self.__adaptive
+
+    def get_slo(self, operation: str) -> float:
+        return self.__slos[operation]
+
+    def __get_state(self, operation, thread_count, workload_count) -> _BudgetState:
+        key = (operation, thread_count, get_size_bucket(workload_count))
+        state = self.__states.get(key)
+        if state is None:
+            runtime_secs = self.__max_runtime_secs
+            if self.__adaptive:
+                runtime_secs = min(runtime_secs, self.__slos[operation])
+            state = _BudgetState(SolverBudget(runtime_secs, self.__min_mip_gap))
+            self.__states[key] = state
+        return state
+
+    def __adjust(self, state: _BudgetState, slo: float):
+        observed = float(np.percentile(state.durations, LATENCY_PERCENTILE))
+        budget = state.budget
+        max_runtime_secs = min(self.__max_runtime_secs, slo)
+
+        if observed > slo:
+            budget.runtime_secs = max(MIN_RUNTIME_SECS, budget.runtime_secs * DECREASE_FACTOR)
+            budget.mip_gap = min(self.__max_mip_gap, max(budget.mip_gap, 0.01) / DECREASE_FACTOR)
+            # Only judge the new budget by the solves which ran with it
+            state.durations.clear()
+        elif observed < slo * HEADROOM:
+            budget.runtime_secs = min(max_runtime_secs, budget.runtime_secs * INCREASE_FACTOR)
+            budget.mip_gap = max(self.__min_mip_gap, budget.mip_gap / INCREASE_FACTOR)
+
+    def report_metrics(self, registry, tags):
+        with self.__lock:
+            states = list(self.__states.items())
+
+        for (operation, thread_count, size), state in states:
+            budget_tags = dict(tags)
+            budget_tags["operation"] = operation
+            budget_tags["threads"] = str(thread_count)
+            budget_tags["workloads"] = str(size)
+            registry.gauge(SOLVER_BUDGET_RUNTIME, budget_tags).set(state.budget.runtime_secs)
+            registry.gauge(SOLVER_BUDGET_MIP_GAP, budget_tags).set(state.budget.mip_gap)
+            registry.gauge(SOLVER_DURATION_SAMPLE_COUNT, budget_tags).set(len(state.durations))
+            if len(state.durations) > 0:
+                p95 = float(np.percentile(state.durations, LATENCY_PERCENTILE))
+                registry.gauge(SOLVER_DURATION_P95, budget_tags).set(p95)
+
+
+def get_size_bucket(workload_count: int) -> int:
+    bucket = 1
+    while bucket < workload_count:
+        bucket *= 2
+    return bucket
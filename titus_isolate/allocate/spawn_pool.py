@@ -0,0 +1,256 @@
+"""
+A pool of spawned worker processes which survives its workers dying.
+
+Workers are spawned rather than forked, as the processes using the pool run threads which may hold locks.  Each worker
+talks to the pool over a pipe of its own, so a worker dying, even while holding a lock, can not stall the others, as
+it can in a multiprocessing.Pool.  A worker dying only fails the task it was running, which raises a BrokenProcessPool
+as it would from a ProcessPoolExecutor, and is replaced before it runs another task.  The pool is broken while a
+worker can not be replaced, or keeps exiting before it is ready, as when its initializer fails.
+
+This only relies on multiprocessing features available on Python 3.6.
+"""
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+from queue import Queue
+from typing import Callable, List, Set
+
+from titus_isolate import log
+
+POLL_INTERVAL_SECS = 0.1
+# Sent by a worker once its initializer completed
+READY = 'ready'
+
+
+def _run_worker(conn, initializer: Callable, initargs: tuple):
+    if initializer is not None:
+        initializer(*initargs)
+    conn.send(READY)
+
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            return
+        if task is None:
+            return
+
+        fn, args = task
+        try:
+            result = (True, fn(*args))
+        except Exception as e:
+            result = (False, e)
+
+        try:
+            conn.send(result)
+        except Exception as e:
+            # The result or the exception could not be pickled
+            conn.send((False, RuntimeError("Failed to send the result of {}: {}".format(fn.__name__, e))))
+
+
+class _Worker:
+
+    def __init__(self, context, initializer: Callable, initargs: tuple):
+        self.__conn, child_conn = context.Pipe()
+        self.__process = context.Process(target=_run_worker, args=(child_conn, initializer, initargs), daemon=True)
+        self.__process.start()
+        child_conn.close()
+        self.__ready = False
+
+    def get_pid(self) -> int:
+        return self.__process.pid
+
+    def is_alive(self) -> bool:
+        return self.__process.is_alive()
+
+    def is_ready(self) -> bool:
+        return self.__ready
+
+    def send(self, fn: Callable, args: tuple):
+        try:
+            self.__conn.send((fn, args))
+        except OSError as e:
+            raise self.__get_broken() from e
+
+    def receive(self):
+        try:
+            message = self.__receive()
+            if not self.__ready:
+                self.__ready = True
+                message = self.__receive()
+        except (EOFError, OSError) as e:
+            raise self.__get_broken() from e
+
+        succeeded, value = message
+        if not succeeded:
+            raise value
+        return value
+
+    def __receive(self):
+        while not self.__conn.poll(POLL_INTERVAL_SECS):
+            if not self.__process.is_alive():
+                raise self.__get_broken()
+        return self.__conn.recv()
+
+    def __get_broken(self) -> BrokenProcessPool:
+        # The pipe may close before the process can be reaped, a worker without a pipe is of no use either way
+        self.__process.terminate()
+        self.__process.join()
+        return BrokenProcessPool("Worker {} exited with code {}".format(self.get_pid(), self.__process.exitcode))
+
+    def stop(self, wait: bool):
+        if wait and self.__process.is_alive():
+            try:
+                self.__conn.send(None)
+            except OSError:
+                pass
+            self.__process.join()
+        else:
+            self.__process.terminate()
+            self.__process.join()
+        self.__conn.close()
+
+
+class SpawnPool:
+
+    def __init__(self, workers: int, initializer: Callable = None, initargs: tuple = ()):
+        """
+        :param initializer: called with initargs in every worker process before it runs any task
+        """
+        self.__context = get_context('spawn')
+        self.__initializer = initializer
+        self.__initargs = initargs
+        self.__size = workers
+        self.__broken = False
+        self.__shut_down = False
+
+        self.__idle = Queue()
+        self.__workers = [self.__start_worker() for _ in range(workers)]
+        for worker in self.__workers:
+            self.__idle.put(worker)
+
+    def submit(self, fn: Callable, *args) -> 'SpawnPoolResult':
+        """
+        Sends fn to an idle worker, waiting for one if every worker is busy.
+
+        :param fn: a module level function, it is pickled by name
+        """
+        worker = self.__acquire()
+        try:
+            worker.send(fn, args)
+        except Exception:
+            self.__release(worker)
+            raise
+        return SpawnPoolResult(worker, self.__release)
+
+    def map(self, fn: Callable, args: List[tuple]) -> List:
+        """
+        Calls fn with each tuple of arguments, on as many workers at once as the pool has, and returns the results
+        in order.  Raises the first exception any call raised, once every call has completed.
+        """
+        results = []
+        error = None
+        for i in range(0, len(args), self.__size):
+            pending = []
+            try:
+                for a in args[i:i + self.__size]:
+                    pending.append(self.submit(fn, *a))
+            except Exception as e:
+                error = e if error is None else error
+
+            for p in pending:
+                try:
+                    results.append(p.result())
+                except Exception as e:
+                    error = e if error is None else error
+
+        if error is not None:
+            raise error
+        return results
+
+    def get_pids(self) -> Set[int]:
+        return set(w.get_pid() for w in self.__workers)
+
+    def is_broken(self) -> bool:
+        return self.__broken
+
+    def shutdown(self, wait: bool = True):
+        """
+        :param wait: waits for the tasks in flight and lets the workers exit, rather than terminating them
+        """
+        self.__shut_down = True
+        if wait:
+            workers = [self.__idle.get() for _ in range(self.__size)]
+        else:
+            workers = list(self.__workers)
+
+        for worker in workers:
+            worker.stop(wait)
+
+        # Wakes up callers waiting for a worker, they find the pool shut down
+        if wait:
+            for worker in workers:
+                self.__idle.put(worker)
+
+    def __start_worker(self) -> _Worker:
+        return _Worker(self.__context, self.__initializer, self.__initargs)
+
+    def __acquire(self) -> _Worker:
+        worker = self.__idle.get()
+        if self.__shut_down:
+            self.__idle.put(worker)
+            raise RuntimeError("Cannot submit tasks after shutdown")
+
+        try:
+            return self.__replace_if_dead(worker)
+        except Exception:
+            self.__idle.put(worker)
+            raise
+
+    def __release(self, worker: _Worker):
+        """
+        Makes the worker available again, after replacing it if it exited.  A worker which can not be replaced is put
+        back as is, the next caller to pick it up tries again.
+        """
+        if not self.__shut_down:
+            try:
+                worker = self.__replace_if_dead(worker)
+            except Exception:
+                log.exception("Failed to replace worker %s", worker.get_pid())
+        self.__idle.put(worker)
+
+    def __replace_if_dead(self, worker: _Worker) -> _Worker:
+        if worker.is_alive():
+            return worker
+
+        try:
+            replacement = self.__start_worker()
+        except Exception:
+            self.__broken = True
+            raise
+
+        log.warning("Replaced exited worker %s with worker %s", worker.get_pid(), replacement.get_pid())
+        worker.stop(wait=False)
+        self.__workers = [replacement if w is worker else w for w in self.__workers]
+        self.__broken = not worker.is_ready()
+        return replacement
+
+
+class SpawnPoolResult:
+
+    def __init__(self, worker: _Worker, release: Callable[[_Worker], None]):
+        self.__worker = worker
+        self.__release = release
+        self.__released = False
+
+    def result(self):
+        """
+        Waits for the result and returns it, or raises the exception the task raised.
+
+        :raises BrokenProcessPool: when the worker running the task exited
+        """
+        try:
+            return self.__worker.receive()
+        finally:
+            if not self.__released:
+                self.__released = True
+                self.__release(self.__worker)
@@ -8,24 +8,26 @@ from titus_isolate.model.processor.core import Core
 from titus_isolate.model.processor.cpu import Cpu
 from titus_isolate.model.processor.package import Package
 from titus_isolate.model.processor.thread import Thread
+from titus_isolate.model.processor.workload_ids import intern_workload_id
 from titus_isolate.utils import get_config_manager
 
 
 def parse_cpu(cpu_dict: dict) -> Cpu:
     packages = []
+    handles = []
     for p in cpu_dict["packages"]:
         cores = []
         for c in p["cores"]:
             threads = []
             for t in c["threads"]:
-                thread = Thread(t["id"])
-                for w_id in t["workload_id"]:
-                    thread.claim(w_id)
-                threads.append(thread)
+                threads.append(Thread(t["id"]))
+                handles.append([intern_workload_id(w_id) for w_id in t["workload_id"]])
             cores.append(Core(c["id"], threads))
         packages.append(Package(p["id"], cores))
 
-    return Cpu(packages)
+    cpu = Cpu(packages)
+    cpu.assign_handles(handles)
+    return cpu
 
 
 def parse_legacy_workloads(workloads: dict) -> dict:
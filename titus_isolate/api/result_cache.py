@@ -0,0 +1,317 @@
+"""
+Answers repeated placement problems from a cache shared by every agent the solve service serves.
+
+Agents on instances of the same type, running workloads of the same shapes, send the same problems over and over.  A
+problem is identified by the hash of its canonical form: the operation, the allocator, the topology and, per
+workload, its requested threads, type, the threads it holds and its peak recent cpu usage in buckets.  Workload ids
+are replaced by labels in the order of those signatures, so the same problem with different task ids has the same
+key, and a cached placement is mapped back onto the ids of the request it answers.
+
+Keys are computed from the serialized request and placements are read from the serialized response, without building
+their Cpus and workloads, so that solving stays the only CPU-bound work of a miss.  Requests are deserialized only to
+answer them from the cache.
+
+Identical problems arriving while one of them is being solved wait for that solve rather than solving it again, up to
+their deadline.
+
+Only solves which reached their best placement are cached.  Responses marked TIME_LIMITED, as their solve was time
+bound or had its budget cut to the request's deadline, answer the requests waiting for them but are not cached, as a
+later request with more time may well be placed better.
+
+Responses answered from the cache carry only the allocator's name, not the metadata of the solve which produced the
+placement.
+"""
+import hashlib
+import json
+import math
+from collections import OrderedDict
+from threading import Lock, Event
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+from titus_isolate import log
+from titus_isolate.allocate.allocate_request import AllocateRequest
+from titus_isolate.allocate.allocate_response import AllocateResponse, get_workload_allocations
+from titus_isolate.allocate.constants import CPU, METADATA, CPU_ALLOCATOR, WORKLOADS, CPU_USAGE, WORKLOAD_ID, \
+    WORKLOAD_IDS, TIME_LIMITED
+from titus_isolate.allocate.packed import encode_response, decode_request_problem, decode_response_claims
+from titus_isolate.allocate.solver_budget import get_remaining_secs
+from titus_isolate.allocate.utils import parse_usage
+from titus_isolate.api.solver_pool import ASSIGN_THREADS_BATCH, REBALANCE, DeadlineExceededException, \
+    deserialize_request
+from titus_isolate.model.constants import THREAD_COUNT_KEY, WORKLOAD_TYPE_KEY, OPPORTUNISTIC_THREAD_COUNT_KEY
+
+KEY_VERSION = 1
+
+RESULT_CACHE = "result_cache"
+HIT = "hit"
+MISS = "miss"
+COALESCED = "coalesced"
+
+# The thread ids per core per package, the thread ids claimed by each workload, the serialized workloads, the cpu
+# usage and the ids of the workloads being added or removed
+Problem = Tuple[List[List[List[int]]], Dict[str, List[int]], dict, dict, List[str]]
+
+# The allocator's name and the labels held by each claimed thread
+Solution = Tuple[str, Tuple[Tuple[int, Tuple[int, ...]], ...]]
+
+
+def get_usage_bucket(series: Optional[List[float]], bucket_width: float) -> int:
+    """
+    Returns the bucket of the peak of a usage series, or -1 without usage.
+    """
+    samples = [s for s in ([] if series is None else series) if not math.isnan(s)]
+    if len(samples) == 0:
+        return -1
+    return int(math.ceil(max(samples) / bucket_width))
+
+
+def get_cpu_claims(cpu: dict) -> Tuple[List[List[List[int]]], Dict[str, List[int]]]:
+    """
+    Returns the thread ids per core per package of a serialized cpu and the thread ids claimed by each workload.
+    """
+    topology = []
+    claims = {}
+    for p in cpu["packages"]:
+        cores = []
+        for c in p["cores"]:
+            cores.append([t["id"] for t in c["threads"]])
+            for t in c["threads"]:
+                for w_id in t["workload_id"]:
+                    claims.setdefault(w_id, []).append(t["id"])
+        topology.append(cores)
+    return topology, claims
+
+
+def get_problem(operation: str, body: Union[bytes, dict], packed: bool) -> Problem:
+    """
+    :param body: the packed request, or the JSON request as a dict
+    """
+    if packed:
+        return decode_request_problem(body)
+
+    if operation == ASSIGN_THREADS_BATCH:
+        target_ids = body[WORKLOAD_IDS]
+    elif operation == REBALANCE:
+        target_ids = []
+    else:
+        target_ids = [body[WORKLOAD_ID]]
+    topology, claims = get_cpu_claims(body[CPU])
+    return topology, claims, body[WORKLOADS], parse_usage(body.get(CPU_USAGE, {})), target_ids
+
+
+def get_problem_key(
+        operation: str,
+        allocator_name: str,
+        problem: Problem,
+        usage_bucket_width: float) -> Tuple[bytes, List[str]]:
+    """
+    Returns the key of the request's problem and its workload ids in label order.
+
+    A workload's usage is only keyed by the bucket of its peak recent cpu usage.  Allocators forecasting usage predict
+    it from the full usage series and from workload features, such as the image or the job, which are not part of the
+    key, so the same key may be predicted differently.  The cached placement is then the one of the first prediction,
+    which is close enough while the peaks share a bucket.
+    """
+    topology, claims, workloads, cpu_usage, target_ids = problem
+    roles = {w_id: i + 1 for i, w_id in enumerate(target_ids)}
+
+    signatures = []
+    for w_id in sorted(set(workloads.keys()) | set(claims.keys()) | set(target_ids)):
+        w = workloads.get(w_id)
+        signature = [
+            roles.get(w_id, 0),
+            -1 if w is None else w[THREAD_COUNT_KEY],
+            "" if w is None else w[WORKLOAD_TYPE_KEY],
+            0 if w is None else w.get(OPPORTUNISTIC_THREAD_COUNT_KEY, 0),
+            get_usage_bucket(cpu_usage.get(w_id), usage_bucket_width),
+            sorted(claims.get(w_id, []))]
+        signatures.append((signature, w_id))
+    signatures.sort()
+
+    problem = [KEY_VERSION, operation, allocator_name, topology, [s for s, _ in signatures]]
+
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(json.dumps(problem, separators=(',', ':')).encode("utf-8"))
+    return digest.digest(), [w_id for _, w_id in signatures]
+
+
+def get_solution(result: Union[bytes, dict], packed: bool, workload_ids: List[str]) -> Tuple[Optional[Solution], bool]:
+    """
+    Returns the labelled placement of a serialized response, or None should it hold workloads the request did not, and
+    whether its solve was limited by time.
+    """
+    if packed:
+        metadata, claims = decode_response_claims(result)
+    else:
+        _, claims = get_cpu_claims(result[CPU])
+        metadata = result[METADATA]
+    time_limited = metadata.get(TIME_LIMITED, False)
+
+    labels = {w_id: i for i, w_id in enumerate(workload_ids)}
+    if any(w_id not in labels for w_id in claims.keys()):
+        return None, time_limited
+
+    thread_labels = {}
+    for w_id, thread_ids in claims.items():
+        for t_id in thread_ids:
+            thread_labels.setdefault(t_id, []).append(labels[w_id])
+    solution = metadata[CPU_ALLOCATOR], tuple((t_id, tuple(sorted(l))) for t_id, l in sorted(thread_labels.items()))
+    return solution, time_limited
+
+
+def get_result(
+        request: AllocateRequest,
+        solution: Solution,
+        workload_ids: List[str],
+        packed: bool,
+        outcome: str) -> Union[bytes, dict]:
+    """
+    Returns the serialized response placing the request's workloads as the solution does.
+    """
+    allocator_name, claims = solution
+    cpu = request.get_cpu()
+    cpu.clear()
+    for thread_id, labels in claims:
+        thread = cpu.get_thread(thread_id)
+        for label in labels:
+            thread.claim(workload_ids[label])
+
+    workload_allocations = get_workload_allocations(cpu, list(request.get_workloads().values()))
+    response = AllocateResponse(cpu, workload_allocations, allocator_name, {RESULT_CACHE: outcome})
+    if packed:
+        return encode_response(response)
+    return response.to_dict()
+
+
+class _Flight:
+    """
+    A solve in flight, once done it holds its solution for the requests which waited for it, whether it was cached
+    or not.
+    """
+
+    def __init__(self):
+        self.done = Event()
+        self.solution = None
+
+
+class ResultCache:
+    """
+    A thread safe LRU cache of labelled placements with single flight solving of identical problems.
+    """
+
+    def __init__(self, max_entries: int, usage_bucket_width: float):
+        self.__max_entries = max_entries
+        self.__usage_bucket_width = usage_bucket_width
+
+        self.__lock = Lock()
+        self.__entries = OrderedDict()
+        self.__in_flight = {}
+
+        self.__hit_count = 0
+        self.__miss_count = 0
+        self.__coalesced_count = 0
+
+    def solve(
+            self,
+            operation: str,
+            allocator_name: str,
+            body: Union[bytes, dict],
+            packed: bool,
+            solve: Callable[[], Union[bytes, dict]],
+            deadline: Optional[float] = None) -> Union[bytes, dict]:
+        """
+        Returns the serialized response to a request, from the cache, from an identical request in flight, or by
+        solving it.
+
+        :param solve: solves the request and returns the serialized response
+        :param deadline: seconds since the epoch after which the caller no longer waits for the response
+        :raises DeadlineExceededException: when the deadline passes waiting for an identical request in flight
+        """
+        problem = get_problem(operation, body, packed)
+        key, workload_ids = get_problem_key(operation, allocator_name, problem, self.__usage_bucket_width)
+
+        solved = []
+
+        def solve_and_label() -> Tuple[Optional[Solution], bool]:
+            result = solve()
+            solved.append(result)
+            return get_solution(result, packed, workload_ids)
+
+        solution, outcome = self.__get_or_solve(key, solve_and_label, deadline)
+        if len(solved) > 0:
+            return solved[0]
+        request = deserialize_request(operation, body, packed)
+        return get_result(request, solution, workload_ids, packed, outcome)
+
+    def __get_or_solve(
+            self,
+            key: bytes,
+            solve: Callable[[], Tuple[Optional[Solution], bool]],
+            deadline: Optional[float]) -> Tuple[Solution, str]:
+        waited = False
+        while True:
+            with self.__lock:
+                solution = self.__entries.get(key)
+                if solution is not None:
+                    self.__entries.move_to_end(key)
+                    if waited:
+                        self.__coalesced_count += 1
+                        return solution, COALESCED
+                    self.__hit_count += 1
+                    return solution, HIT
+
+                flight = self.__in_flight.get(key)
+                leader = flight is None
+                if leader:
+                    flight = _Flight()
+                    self.__in_flight[key] = flight
+                    self.__miss_count += 1
+
+            if leader:
+                try:
+                    solution, time_limited = solve()
+                    if solution is not None and not time_limited:
+                        self.__put(key, solution)
+                    flight.solution = solution
+                    return solution, MISS
+                finally:
+                    with self.__lock:
+                        self.__in_flight.pop(key, None)
+                    flight.done.set()
+
+            # Once the solve in flight completed it holds its solution, or it failed and this request solves anew
+            log.debug("Waiting for an identical problem in flight: %s", key.hex())
+            remaining_secs = get_remaining_secs(deadline)
+            if remaining_secs is None:
+                flight.done.wait()
+            elif not flight.done.wait(max(0.0, remaining_secs)):
+                raise DeadlineExceededException("Deadline passed waiting for an identical problem in flight: {}".format(
+                    key.hex()))
+
+            if flight.solution is not None:
+                with self.__lock:
+                    self.__coalesced_count += 1
+                return flight.solution, COALESCED
+            waited = True
+
+    def __put(self, key: bytes, solution: Solution):
+        if self.__max_entries <= 0:
+            return
+
+        with self.__lock:
+            self.__entries[key] = solution
+            self.__entries.move_to_end(key)
+            while len(self.__entries) > self.__max_entries:
+                self.__entries.popitem(last=False)
+
+    def get_size(self) -> int:
+        return len(self.__entries)
+
+    def get_hit_count(self) -> int:
+        return self.__hit_count
+
+    def get_miss_count(self) -> int:
+        return self.__miss_count
+
+    def get_coalesced_count(self) -> int:
+        return self.__coalesced_count
@@ -1,22 +1,49 @@
+import atexit
+import json
 import logging
 import os
 import sys
+import time
+from collections import OrderedDict, deque
 from threading import Lock
+from typing import Dict, Optional
 
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, g
 
 from titus_isolate import log
 from titus_isolate.allocate.allocate_request import AllocateRequest, deserialize_allocate_request
 from titus_isolate.allocate.allocate_threads_request import AllocateThreadsRequest, deserialize_allocate_threads_request
+from titus_isolate.allocate.constants import SESSION, TITUS_ISOLATE_DEADLINE_HEADER, RETRY_AFTER_HEADER
+from titus_isolate.allocate.content_encoding import IDENTITY, CONTENT_ENCODING_HEADER, ACCEPT_ENCODING_HEADER, \
+    MIN_COMPRESS_BYTES, compress, decompress, is_supported_encoding, choose_encoding, get_supported_encodings
 from titus_isolate.allocate.cpu_allocator import CpuAllocator
+from titus_isolate.allocate.packed import PACKED_CONTENT_TYPE
+from titus_isolate.allocate.server_timing import SERVER_TIMING_HEADER, TOTAL, PARSE, JSONIFY, COMPRESS, \
+    format_server_timing
+from titus_isolate.allocate.session import SessionStore, SessionResyncException, CONFLICT
+from titus_isolate.api.result_cache import ResultCache
 from titus_isolate.api.testing import is_testing
+from titus_isolate.api.solver_pool import SolverPool, SolverPoolOverloadedException, DeadlineExceededException, \
+    ASSIGN_THREADS, ASSIGN_THREADS_BATCH, FREE_THREADS, REBALANCE, solve_request, get_allocator_for_operation, \
+    check_deadline
 from titus_isolate.config.constants import REMOTE_ASSIGN_ALLOCATOR, REMOTE_FREE_ALLOCATOR, \
-    REMOTE_REBALANCE_ALLOCATOR
+    REMOTE_REBALANCE_ALLOCATOR, SOLVER_POOL_WORKERS, DEFAULT_SOLVER_POOL_WORKERS, SOLVER_POOL_MAX_QUEUE, \
+    DEFAULT_SOLVER_POOL_MAX_QUEUE, SOLVER_POOL_DRAIN_TIMEOUT_SEC, DEFAULT_SOLVER_POOL_DRAIN_TIMEOUT_SEC, \
+    SOLVER_RESULT_CACHE_MAX_ENTRIES, DEFAULT_SOLVER_RESULT_CACHE_MAX_ENTRIES, SOLVER_RESULT_CACHE_USAGE_BUCKET, \
+    DEFAULT_SOLVER_RESULT_CACHE_USAGE_BUCKET, SOLVER_OVERLOAD_RETRY_AFTER_SEC, \
+    DEFAULT_SOLVER_OVERLOAD_RETRY_AFTER_SEC, SOLVER_SERVER_TIMING_STAGES, DEFAULT_SOLVER_SERVER_TIMING_STAGES, \
+    SOLVER_SESSION_MAX_ENTRIES, DEFAULT_SOLVER_SESSION_MAX_ENTRIES, SOLVER_SESSION_MAX_BYTES, \
+    DEFAULT_SOLVER_SESSION_MAX_BYTES
 from titus_isolate.config.env_property_provider import EnvPropertyProvider
 from titus_isolate.isolate.utils import get_allocator
 from titus_isolate.metrics.constants import SOLVER_GET_CPU_ALLOCATOR_SUCCESS, SOLVER_GET_CPU_ALLOCATOR_FAILURE, \
     SOLVER_ASSIGN_THREADS_SUCCESS, SOLVER_ASSIGN_THREADS_FAILURE, SOLVER_FREE_THREADS_SUCCESS, \
-    SOLVER_FREE_THREADS_FAILURE, SOLVER_REBALANCE_SUCCESS, SOLVER_REBALANCE_FAILURE
+    SOLVER_FREE_THREADS_FAILURE, SOLVER_REBALANCE_SUCCESS, SOLVER_REBALANCE_FAILURE, \
+    SOLVER_ASSIGN_THREADS_BATCH_SUCCESS, SOLVER_ASSIGN_THREADS_BATCH_FAILURE, SOLVER_SESSION_COUNT, \
+    SOLVER_SESSION_DELTA_COUNT, SOLVER_SESSION_FULL_COUNT, SOLVER_SESSION_RESYNC_COUNT, SOLVER_RESULT_CACHE_HIT_COUNT, \
+    SOLVER_RESULT_CACHE_MISS_COUNT, SOLVER_RESULT_CACHE_COALESCED_COUNT, SOLVER_RESULT_CACHE_SIZE, \
+    SOLVER_DEADLINE_DROPPED_COUNT, SOLVER_ASSIGN_THREADS_DURATION, SOLVER_FREE_THREADS_DURATION, \
+    SOLVER_REBALANCE_DURATION, SOLVER_SESSION_BYTES
 from titus_isolate.metrics.keystone_event_log_manager import KeystoneEventLogManager
 from titus_isolate.metrics.metrics_manager import MetricsManager
 from titus_isolate.metrics.metrics_reporter import MetricsReporter
@@ -25,10 +52,32 @@ from titus_isolate.utils import get_config_manager, set_cpu_usage_predictor_mana
     start_periodic_scheduling, set_event_log_manager
 
 allocator_lock = Lock()
+# Requests are served on threads, without a solver pool they take turns with the allocators of this process
+solve_lock = Lock()
 assign_cpu_allocator = None
 free_cpu_allocator = None
 rebalance_cpu_allocator = None
 
+session_store = SessionStore(DEFAULT_SOLVER_SESSION_MAX_ENTRIES, DEFAULT_SOLVER_SESSION_MAX_BYTES)
+solver_pool = None
+result_cache = None
+overload_retry_after_secs = DEFAULT_SOLVER_OVERLOAD_RETRY_AFTER_SEC
+server_timing_stages = DEFAULT_SOLVER_SERVER_TIMING_STAGES
+
+TOO_MANY_REQUESTS = 429
+MAX_PENDING_STAGE_DURATIONS = 10000
+
+OPERATION_DURATIONS = {
+    ASSIGN_THREADS: SOLVER_ASSIGN_THREADS_DURATION,
+    ASSIGN_THREADS_BATCH: SOLVER_ASSIGN_THREADS_DURATION,
+    FREE_THREADS: SOLVER_FREE_THREADS_DURATION,
+    REBALANCE: SOLVER_REBALANCE_DURATION
+}
+
+# The stage durations of solved requests, waiting to be reported
+stage_durations_lock = Lock()
+stage_durations = deque(maxlen=MAX_PENDING_STAGE_DURATIONS)
+
 app = Flask(__name__)
 
 log = logging.getLogger()
@@ -96,23 +145,195 @@ def get_rebalance_request(body) -> AllocateRequest:
     return deserialize_allocate_request(body)
 
 
+def is_packed_request() -> bool:
+    return request.mimetype == PACKED_CONTENT_TYPE
+
+
+def get_request_encoding() -> str:
+    return request.headers.get(CONTENT_ENCODING_HEADER, IDENTITY).strip().lower()
+
+
+def get_request_data() -> bytes:
+    return decompress(request.get_data(), get_request_encoding())
+
+
+def get_request_deadline() -> Optional[float]:
+    deadline = request.headers.get(TITUS_ISOLATE_DEADLINE_HEADER)
+    if deadline is None:
+        return None
+
+    try:
+        return float(deadline)
+    except ValueError:
+        log.warning("Ignoring invalid deadline: '{}'".format(deadline))
+        return None
+
+
+def get_overloaded_response(e: Exception, retry_after_secs: int) -> Response:
+    """
+    Tells the caller to fall back right away, and not to send requests for the next retry_after_secs, if positive.
+    """
+    response = Response(str(e), TOO_MANY_REQUESTS)
+    if retry_after_secs > 0:
+        response.headers[RETRY_AFTER_HEADER] = str(retry_after_secs)
+    return response
+
+
+def get_request_body():
+    """
+    Returns a packed request as is, or a JSON request as a dict, with the full state of a session request.
+    """
+    if is_packed_request():
+        return get_request_data()
+
+    body = json.loads(get_request_data())
+    if SESSION in body:
+        body = session_store.resolve(body)
+    return body
+
+
+def allocate(operation: str):
+    """
+    Solves the request in the solver pool, if there is one, or with the allocators of this process, unless the result
+    cache can answer it.  Requests which can not be solved before the caller's deadline are dropped.  Responses use
+    the same encoding as the request they answer.
+    """
+    g.operation = operation
+    timings = g.timings
+
+    deadline = get_request_deadline()
+    check_deadline(operation, deadline)
+
+    start_time = time.time()
+    packed = is_packed_request()
+    body = get_request_body()
+    timings[PARSE] = time.time() - start_time
+
+    allocators = (get_assign_cpu_allocator(), get_free_cpu_allocator(), get_rebalance_cpu_allocator())
+    allocator = get_allocator_for_operation(allocators, operation)
+
+    def solve():
+        if solver_pool is not None:
+            return solver_pool.solve(operation, body, packed, deadline, timings)
+        with solve_lock:
+            return solve_request(allocator, operation, body, packed, deadline, timings)
+
+    if result_cache is not None:
+        result = result_cache.solve(operation, allocator.get_name(), body, packed, solve, deadline)
+    else:
+        result = solve()
+
+    start_time = time.time()
+    if packed:
+        response = Response(result, mimetype=PACKED_CONTENT_TYPE)
+    else:
+        response = jsonify(result)
+    timings[JSONIFY] = time.time() - start_time
+    return response
+
+
+def record_stage_durations(operation: str, durations: Dict[str, float]):
+    """
+    Queues the stage durations of a solved request, they are recorded when metrics are next reported.
+    """
+    with stage_durations_lock:
+        stage_durations.append((operation, durations))
+
+
 get_cpu_allocator_success_count = 0
 get_cpu_allocator_failure_count = 0
 
 assign_threads_success_count = 0
 assign_threads_failure_count = 0
 
+assign_threads_batch_success_count = 0
+assign_threads_batch_failure_count = 0
+
 free_threads_success_count = 0
 free_threads_failure_count = 0
 
 rebalance_success_count = 0
 rebalance_failure_count = 0
 
+deadline_dropped_count = 0
+
 FORWARDED_FOR_HEADER = "X-Forwarded-For"
 
+# Requests rejected by design, these are answered by the error handlers below rather than counted as failures
+REJECTED_REQUEST_EXCEPTIONS = (SessionResyncException, SolverPoolOverloadedException, DeadlineExceededException)
+
+
+@app.before_request
+def check_request_encoding():
+    g.start_time = time.time()
+    g.timings = OrderedDict()
+    if not is_supported_encoding(get_request_encoding()):
+        response = Response("Unsupported content encoding: '{}'".format(get_request_encoding()), 415)
+        response.headers[ACCEPT_ENCODING_HEADER] = ", ".join(get_supported_encodings() + [IDENTITY])
+        return response
+
+
+@app.after_request
+def encode_response_body(response: Response):
+    """
+    Compresses successful responses with the encoding the client prefers and reports the time spent on the request,
+    in total and per stage.
+    """
+    timings = g.get('timings', OrderedDict())
+    encoding = choose_encoding(request.headers.get(ACCEPT_ENCODING_HEADER))
+    if encoding != IDENTITY and response.status_code == 200 and not response.direct_passthrough and \
+            CONTENT_ENCODING_HEADER not in response.headers:
+        start_time = time.time()
+        data = response.get_data()
+        if len(data) >= MIN_COMPRESS_BYTES:
+            response.set_data(compress(data, encoding))
+            response.headers[CONTENT_ENCODING_HEADER] = encoding
+            timings[COMPRESS] = time.time() - start_time
+    response.vary.add(ACCEPT_ENCODING_HEADER)
+
+    start_time = g.get('start_time')
+    if start_time is None:
+        return response
+
+    durations = OrderedDict([(TOTAL, time.time() - start_time)])
+    durations.update(timings)
+    operation = g.get('operation')
+    if operation is not None and response.status_code == 200:
+        record_stage_durations(operation, durations)
+
+    if server_timing_stages:
+        response.headers[SERVER_TIMING_HEADER] = format_server_timing(durations)
+    else:
+        response.headers[SERVER_TIMING_HEADER] = format_server_timing({TOTAL: durations[TOTAL]})
+    return response
+
+
+@app.errorhandler(SessionResyncException)
+def request_session_resync(e: SessionResyncException):
+    log.info("Requesting session resync: %s", e)
+    return str(e), CONFLICT
+
+
+@app.errorhandler(SolverPoolOverloadedException)
+def reject_request(e: SolverPoolOverloadedException):
+    log.warning("Rejecting request: %s", e)
+    return get_overloaded_response(e, overload_retry_after_secs)
+
+
+@app.errorhandler(DeadlineExceededException)
+def drop_request(e: DeadlineExceededException):
+    log.info("Dropping request: %s", e)
+    global deadline_dropped_count
+    deadline_dropped_count += 1
+    return get_overloaded_response(e, 0)
+
 
 @app.route('/', methods=['GET'])
 def health_check():
+    if solver_pool is not None and solver_pool.is_draining():
+        return "Draining", 503
+    if solver_pool is not None and not solver_pool.is_healthy():
+        return "Solver pool unavailable", 503
     return remote_get_cpu_allocator()
 
 
@@ -134,18 +355,15 @@ def assign_threads():
         request_ip = request.headers.get(FORWARDED_FOR_HEADER)
         log.info("Processing assign threads request (from, proxy): {}".format(request_ip))
 
-        body = request.get_json()
-        threads_request = get_threads_request(body)
-        log.info("Processing assign threads request (from, proxy): %s for workload: %s",
-                 request_ip, threads_request.get_workload_id())
-        response = get_assign_cpu_allocator().assign_threads(threads_request)
+        response = allocate(ASSIGN_THREADS)
 
         global assign_threads_success_count
         assign_threads_success_count += 1
 
-        log.info("Processed assign threads request (from, proxy): %s for workload: %s",
-                 request_ip, threads_request.get_workload_id())
-        return jsonify(response.to_dict())
+        log.info("Processed assign threads request (from, proxy): {}".format(request_ip))
+        return response
+    except REJECTED_REQUEST_EXCEPTIONS:
+        raise
     except:
         log.exception("Failed to assign threads")
         global assign_threads_failure_count
@@ -153,24 +371,43 @@ def assign_threads():
         return "Failed to assign threads", 500
 
 
+@app.route('/assign_threads_batch', methods=['PUT'])
+def assign_threads_batch():
+    try:
+        request_ip = request.headers.get(FORWARDED_FOR_HEADER)
+        log.info("Processing assign threads batch request (from, proxy): {}".format(request_ip))
+
+        response = allocate(ASSIGN_THREADS_BATCH)
+
+        global assign_threads_batch_success_count
+        assign_threads_batch_success_count += 1
+
+        log.info("Processed assign threads batch request (from, proxy): {}".format(request_ip))
+        return response
+    except REJECTED_REQUEST_EXCEPTIONS:
+        raise
+    except:
+        log.exception("Failed to assign threads batch")
+        global assign_threads_batch_failure_count
+        assign_threads_batch_failure_count += 1
+        return "Failed to assign threads batch", 500
+
+
 @app.route('/free_threads', methods=['PUT'])
 def free_threads():
     try:
         request_ip = request.headers.get(FORWARDED_FOR_HEADER)
         log.info("Processing free threads request (from, proxy): {}".format(request_ip))
 
-        body = request.get_json()
-        threads_request = get_threads_request(body)
-        log.info("Processing free threads request (from, proxy): %s for workload: %s",
-                 request_ip, threads_request.get_workload_id())
-        response = get_free_cpu_allocator().free_threads(threads_request)
+        response = allocate(FREE_THREADS)
 
         global free_threads_success_count
         free_threads_success_count += 1
 
-        log.info("Processed free threads request (from, proxy): %s for workload: %s",
-                 request_ip, threads_request.get_workload_id())
-        return jsonify(response.to_dict())
+        log.info("Processed free threads request (from, proxy): {}".format(request_ip))
+        return response
+    except REJECTED_REQUEST_EXCEPTIONS:
+        raise
     except:
         log.exception("Failed to free threads")
         global free_threads_failure_count
@@ -184,15 +421,15 @@ def rebalance():
         request_ip = request.headers.get(FORWARDED_FOR_HEADER)
         log.info("Processing rebalance threads request (from, proxy): {}".format(request_ip))
 
-        body = request.get_json()
-        rebalance_request = get_rebalance_request(body)
-        response = get_rebalance_cpu_allocator().rebalance(rebalance_request)
+        response = allocate(REBALANCE)
 
         global rebalance_success_count
         rebalance_success_count += 1
 
         log.info("Processed rebalance threads request (from, proxy): {}".format(request_ip))
-        return jsonify(response.to_dict())
+        return response
+    except REJECTED_REQUEST_EXCEPTIONS:
+        raise
     except:
         log.exception("Failed to rebalance")
         global rebalance_failure_count
@@ -212,10 +449,13 @@ class SolverMetricsReporter(MetricsReporter):
         global get_cpu_allocator_failure_count
         global assign_threads_success_count
         global assign_threads_failure_count
+        global assign_threads_batch_success_count
+        global assign_threads_batch_failure_count
         global free_threads_success_count
         global free_threads_failure_count
         global rebalance_success_count
         global rebalance_failure_count
+        global deadline_dropped_count
 
         ec2_instance_id = 'EC2_INSTANCE_ID'
 
@@ -229,10 +469,34 @@ class SolverMetricsReporter(MetricsReporter):
         self.__reg.gauge(SOLVER_GET_CPU_ALLOCATOR_FAILURE, tags).set(get_cpu_allocator_failure_count)
         self.__reg.gauge(SOLVER_ASSIGN_THREADS_SUCCESS, tags).set(assign_threads_success_count)
         self.__reg.gauge(SOLVER_ASSIGN_THREADS_FAILURE, tags).set(assign_threads_failure_count)
+        self.__reg.gauge(SOLVER_ASSIGN_THREADS_BATCH_SUCCESS, tags).set(assign_threads_batch_success_count)
+        self.__reg.gauge(SOLVER_ASSIGN_THREADS_BATCH_FAILURE, tags).set(assign_threads_batch_failure_count)
         self.__reg.gauge(SOLVER_FREE_THREADS_SUCCESS, tags).set(free_threads_success_count)
         self.__reg.gauge(SOLVER_FREE_THREADS_FAILURE, tags).set(free_threads_failure_count)
         self.__reg.gauge(SOLVER_REBALANCE_SUCCESS, tags).set(rebalance_success_count)
         self.__reg.gauge(SOLVER_REBALANCE_FAILURE, tags).set(rebalance_failure_count)
+        self.__reg.gauge(SOLVER_SESSION_COUNT, tags).set(session_store.get_session_count())
+        self.__reg.gauge(SOLVER_SESSION_DELTA_COUNT, tags).set(session_store.get_delta_count())
+        self.__reg.gauge(SOLVER_SESSION_FULL_COUNT, tags).set(session_store.get_full_count())
+        self.__reg.gauge(SOLVER_SESSION_RESYNC_COUNT, tags).set(session_store.get_resync_count())
+        self.__reg.gauge(SOLVER_SESSION_BYTES, tags).set(session_store.get_bytes())
+        self.__reg.gauge(SOLVER_DEADLINE_DROPPED_COUNT, tags).set(deadline_dropped_count)
+
+        with stage_durations_lock:
+            durations = list(stage_durations)
+            stage_durations.clear()
+        for operation, stages in durations:
+            for stage, secs in stages.items():
+                stage_tags = dict(tags)
+                stage_tags["operation"] = operation
+                stage_tags["stage"] = stage
+                self.__reg.distribution_summary(OPERATION_DURATIONS[operation], stage_tags).record(secs)
+
+        if result_cache is not None:
+            self.__reg.gauge(SOLVER_RESULT_CACHE_HIT_COUNT, tags).set(result_cache.get_hit_count())
+            self.__reg.gauge(SOLVER_RESULT_CACHE_MISS_COUNT, tags).set(result_cache.get_miss_count())
+            self.__reg.gauge(SOLVER_RESULT_CACHE_COALESCED_COUNT, tags).set(result_cache.get_coalesced_count())
+            self.__reg.gauge(SOLVER_RESULT_CACHE_SIZE, tags).set(result_cache.get_size())
 
 
 if __name__ != '__main__' and not is_testing():
@@ -264,6 +528,37 @@ if __name__ != '__main__' and not is_testing():
     rebalance_allocator = get_allocator(rebalance_alloc_str, config_manager)
     set_cpu_allocators(assign_allocator, free_allocator, rebalance_allocator)
 
+    metrics_reporters = [SolverMetricsReporter()]
+
+    server_timing_stages = config_manager.get_bool(
+        SOLVER_SERVER_TIMING_STAGES, DEFAULT_SOLVER_SERVER_TIMING_STAGES)
+    overload_retry_after_secs = config_manager.get_int(
+        SOLVER_OVERLOAD_RETRY_AFTER_SEC, DEFAULT_SOLVER_OVERLOAD_RETRY_AFTER_SEC)
+    solver_pool_workers = config_manager.get_int(SOLVER_POOL_WORKERS, DEFAULT_SOLVER_POOL_WORKERS)
+    if solver_pool_workers > 0:
+        log.info("Starting solver pool with {} workers...".format(solver_pool_workers))
+        solver_pool = SolverPool(
+            solver_pool_workers,
+            config_manager.get_int(SOLVER_POOL_MAX_QUEUE, DEFAULT_SOLVER_POOL_MAX_QUEUE))
+        drain_timeout = config_manager.get_float(SOLVER_POOL_DRAIN_TIMEOUT_SEC, DEFAULT_SOLVER_POOL_DRAIN_TIMEOUT_SEC)
+        atexit.register(solver_pool.drain, drain_timeout)
+        # The allocators of this process only name the solved requests, the workers report their own metrics
+        metrics_reporters.append(solver_pool)
+    else:
+        metrics_reporters.extend([assign_allocator, free_allocator, rebalance_allocator])
+
+    session_store = SessionStore(
+        config_manager.get_int(SOLVER_SESSION_MAX_ENTRIES, DEFAULT_SOLVER_SESSION_MAX_ENTRIES),
+        config_manager.get_int(SOLVER_SESSION_MAX_BYTES, DEFAULT_SOLVER_SESSION_MAX_BYTES))
+
+    result_cache_max_entries = config_manager.get_int(
+        SOLVER_RESULT_CACHE_MAX_ENTRIES, DEFAULT_SOLVER_RESULT_CACHE_MAX_ENTRIES)
+    if result_cache_max_entries > 0:
+        log.info("Caching up to {} results...".format(result_cache_max_entries))
+        result_cache = ResultCache(
+            result_cache_max_entries,
+            config_manager.get_float(SOLVER_RESULT_CACHE_USAGE_BUCKET, DEFAULT_SOLVER_RESULT_CACHE_USAGE_BUCKET))
+
     log.info("Starting metrics reporting...")
-    MetricsManager([SolverMetricsReporter(), assign_allocator, free_allocator, rebalance_allocator])
+    MetricsManager(metrics_reporters)
     start_periodic_scheduling()
@@ -0,0 +1,347 @@
+"""
+Solves allocation requests in a pool of solver processes.
+
+Every worker process builds its own allocators and solves one request at a time, so no allocator state is shared
+between concurrent requests, and CPU-bound solves run in parallel instead of contending for the GIL of the process
+serving HTTP.  The pool is meant for a single serving process handling requests on threads, which shares one pool and
+its admission limit across every request.  Workers are spawned rather than forked, as the serving process already runs
+threads of its own, and set up their configuration and predictors themselves.  As the allocators of the serving
+process sit idle, workers also report the metrics of their own allocators, tagged with their pid.
+
+Requests are admitted as long as fewer than workers + max_queue are in flight, beyond that they are rejected right
+away.  Once draining, no requests are admitted and the pool shuts down as soon as the ones in flight have completed.
+A worker dying only fails the request it was solving and is replaced, the pool is unhealthy while it can not be.
+"""
+import os
+import time
+from concurrent.futures.process import BrokenProcessPool
+from threading import Lock, Condition
+from typing import Callable, Dict, Optional, Set, Tuple, Union
+
+from titus_isolate import log
+from titus_isolate.allocate.allocate_request import AllocateRequest, deserialize_allocate_request
+from titus_isolate.allocate.allocate_threads_batch_request import deserialize_allocate_threads_batch_request
+from titus_isolate.allocate.allocate_response import AllocateResponse
+from titus_isolate.allocate.allocate_threads_request import deserialize_allocate_threads_request
+from titus_isolate.allocate.constants import TIME_LIMITED
+from titus_isolate.allocate.cpu_allocator import CpuAllocator
+from titus_isolate.allocate.packed import decode_allocate_request, encode_response
+from titus_isolate.allocate.server_timing import DESERIALIZE, QUEUE, ALLOCATE, PREDICT, IP_SOLVE, SERIALIZE
+from titus_isolate.allocate.spawn_pool import SpawnPool
+from titus_isolate.allocate.solver_budget import MIN_RUNTIME_SECS, solve_deadline, get_remaining_secs, \
+    is_time_limited
+from titus_isolate.config.constants import REMOTE_ASSIGN_ALLOCATOR, REMOTE_FREE_ALLOCATOR, REMOTE_REBALANCE_ALLOCATOR
+from titus_isolate.isolate.utils import get_allocator
+from titus_isolate.metrics.constants import SOLVER_POOL_QUEUE_WAIT, SOLVER_POOL_SOLVE_DURATION, \
+    SOLVER_POOL_IN_FLIGHT, SOLVER_POOL_REJECTED_COUNT, SOLVER_POOL_WORKER_EXIT_COUNT
+from titus_isolate.metrics.metrics_manager import MetricsManager
+from titus_isolate.metrics.metrics_reporter import MetricsReporter
+from titus_isolate.config.env_property_provider import EnvPropertyProvider
+from titus_isolate.predict.cpu_usage_predictor_manager import ConfigurableCpuUsagePredictorManager
+from titus_isolate.utils import get_config_manager, set_config_manager, get_cpu_usage_predictor_manager, \
+    set_cpu_usage_predictor_manager, start_periodic_scheduling
+
+ASSIGN_THREADS = "assign_threads"
+ASSIGN_THREADS_BATCH = "assign_threads_batch"
+FREE_THREADS = "free_threads"
+REBALANCE = "rebalance"
+
+# The stages allocators report in the metadata of their responses
+ALLOCATOR_STAGE_METADATA = {
+    PREDICT: 'pred_cpu_usage_dur_secs',
+    IP_SOLVE: 'ip_solver_call_dur_secs'
+}
+
+# The allocators of a process: (assign, free, rebalance)
+Allocators = Tuple[CpuAllocator, CpuAllocator, CpuAllocator]
+
+__worker_allocators = None
+
+
+class SolverPoolOverloadedException(Exception):
+
+    def __init__(self, msg):
+        super().__init__(msg)
+
+
+class DeadlineExceededException(Exception):
+
+    def __init__(self, msg):
+        super().__init__(msg)
+
+
+def get_allocator_for_operation(allocators: Allocators, operation: str) -> CpuAllocator:
+    assign_allocator, free_allocator, rebalance_allocator = allocators
+    if operation in [ASSIGN_THREADS, ASSIGN_THREADS_BATCH]:
+        return assign_allocator
+    if operation == FREE_THREADS:
+        return free_allocator
+    if operation == REBALANCE:
+        return rebalance_allocator
+    raise ValueError("Unknown operation: '{}'".format(operation))
+
+
+def deserialize_request(operation: str, body: Union[bytes, dict], packed: bool) -> AllocateRequest:
+    """
+    :param body: the packed request, or the JSON request as a dict
+    """
+    if packed:
+        return decode_allocate_request(body)
+    if operation == ASSIGN_THREADS_BATCH:
+        return deserialize_allocate_threads_batch_request(body)
+    if operation == REBALANCE:
+        return deserialize_allocate_request(body)
+    return deserialize_allocate_threads_request(body)
+
+
+def check_deadline(operation: str, deadline: Optional[float]):
+    """
+    :raises DeadlineExceededException: when too little time is left until the deadline to solve a request
+    """
+    remaining_secs = get_remaining_secs(deadline)
+    if remaining_secs is not None and remaining_secs < MIN_RUNTIME_SECS:
+        raise DeadlineExceededException("Not solving {}, the deadline is {:.3f}s away".format(
+            operation, deadline - time.time()))
+
+
+def solve_request(
+        allocator: CpuAllocator,
+        operation: str,
+        body: Union[bytes, dict],
+        packed: bool,
+        deadline: Optional[float] = None,
+        timings: Optional[Dict[str, float]] = None):
+    """
+    Deserializes a request, solves it and serializes the response, in the encoding of the request.  Solver budgets are
+    cut to the time left until the deadline, responses of solves limited by time are marked TIME_LIMITED.
+
+    :param body: the packed request, or the JSON request as a dict
+    :param deadline: seconds since the epoch after which the caller no longer waits for the response
+    :param timings: receives the seconds spent per stage
+    :return: the packed response, or the JSON response as a dict
+    :raises DeadlineExceededException: when too little time is left to solve the request
+    """
+    timings = {} if timings is None else timings
+    check_deadline(operation, deadline)
+
+    with solve_deadline(deadline):
+        start_time = time.time()
+        request = deserialize_request(operation, body, packed)
+        timings[DESERIALIZE] = time.time() - start_time
+
+        start_time = time.time()
+        response = __solve(allocator, operation, request)
+        timings[ALLOCATE] = time.time() - start_time
+        if is_time_limited():
+            response.get_metadata()[TIME_LIMITED] = True
+
+    for stage, key in ALLOCATOR_STAGE_METADATA.items():
+        secs = response.get_metadata().get(key)
+        if isinstance(secs, (int, float)):
+            timings[stage] = secs
+
+    start_time = time.time()
+    result = encode_response(response) if packed else response.to_dict()
+    timings[SERIALIZE] = time.time() - start_time
+    return result
+
+
+def __solve(allocator: CpuAllocator, operation: str, request: AllocateRequest) -> AllocateResponse:
+    if operation == ASSIGN_THREADS_BATCH:
+        log.info("Solving %s for workloads: %s", operation, request.get_workload_ids())
+        return allocator.assign_threads_batch(request)
+    if operation == REBALANCE:
+        log.info("Solving %s", operation)
+        return allocator.rebalance(request)
+    if operation == FREE_THREADS:
+        log.info("Solving %s for workload: %s", operation, request.get_workload_id())
+        return allocator.free_threads(request)
+
+    log.info("Solving %s for workload: %s", operation, request.get_workload_id())
+    return allocator.assign_threads(request)
+
+
+class WorkerMetricsReporter(MetricsReporter):
+    """
+    Reports the metrics of the allocators of a worker process, tagged with its pid so workers don't overwrite each
+    other's gauges.
+    """
+
+    def __init__(self, allocators: Allocators):
+        self.__allocators = allocators
+
+    def set_registry(self, registry, tags):
+        for allocator in self.__allocators:
+            allocator.set_registry(registry, self.__get_tags(tags))
+
+    def report_metrics(self, tags):
+        for allocator in self.__allocators:
+            allocator.report_metrics(self.__get_tags(tags))
+
+    @staticmethod
+    def __get_tags(tags) -> Dict[str, str]:
+        tags = {} if tags is None else dict(tags)
+        tags["pid"] = str(os.getpid())
+        return tags
+
+
+def get_configured_allocators() -> Allocators:
+    """
+    Builds the allocators named by the REMOTE_*_ALLOCATOR properties.  In a spawned worker this first sets up the
+    configuration from the environment and the cpu usage predictor manager, and then starts reporting the metrics of
+    the allocators.
+    """
+    worker = get_cpu_usage_predictor_manager() is None
+    if worker:
+        set_config_manager(get_config_manager(EnvPropertyProvider()))
+        set_cpu_usage_predictor_manager(ConfigurableCpuUsagePredictorManager())
+
+    config_manager = get_config_manager()
+    allocators = (
+        get_allocator(config_manager.get_str(REMOTE_ASSIGN_ALLOCATOR), config_manager),
+        get_allocator(config_manager.get_str(REMOTE_FREE_ALLOCATOR), config_manager),
+        get_allocator(config_manager.get_str(REMOTE_REBALANCE_ALLOCATOR), config_manager))
+
+    if worker:
+        MetricsManager([WorkerMetricsReporter(allocators)])
+        start_periodic_scheduling()
+    return allocators
+
+
+def _init_worker(allocators_factory: Callable[[], Allocators]):
+    global __worker_allocators
+    __worker_allocators = allocators_factory()
+
+
+def _ping() -> int:
+    return os.getpid()
+
+
+def _solve_in_worker(operation: str, body: Union[bytes, dict], packed: bool, deadline: Optional[float]):
+    start_time = time.time()
+    allocator = get_allocator_for_operation(__worker_allocators, operation)
+    timings = {}
+    result = solve_request(allocator, operation, body, packed, deadline, timings)
+    return result, start_time, time.time(), timings
+
+
+class SolverPool(MetricsReporter):
+
+    def __init__(
+            self,
+            workers: int,
+            max_queue: int,
+            allocators_factory: Callable[[], Allocators] = get_configured_allocators):
+        """
+        :param allocators_factory: builds the allocators of a worker process, it must be picklable
+        """
+        self.__max_in_flight = workers + max_queue
+
+        self.__lock = Lock()
+        self.__idle = Condition(self.__lock)
+        self.__in_flight = 0
+        self.__rejected_count = 0
+        self.__worker_exit_count = 0
+        self.__draining = False
+
+        self.__reg = None
+        self.__tags = None
+
+        # Workers build their allocators right away, rather than on the first requests
+        self.__pool = SpawnPool(workers, _init_worker, (allocators_factory,))
+        self.__pool.map(_ping, [() for _ in range(workers)])
+        log.info("Started solver pool workers: %s", sorted(self.__pool.get_pids()))
+
+    def solve(
+            self,
+            operation: str,
+            body: Union[bytes, dict],
+            packed: bool,
+            deadline: Optional[float] = None,
+            timings: Optional[Dict[str, float]] = None):
+        """
+        Returns the serialized response, see solve_request.  The deadline is checked again once a worker picks the
+        request up, so requests which waited in the queue for too long are dropped.
+
+        :raises SolverPoolOverloadedException: when the queue is full or the pool is draining
+        :raises DeadlineExceededException: when too little time is left to solve the request
+        """
+        with self.__lock:
+            if self.__draining or self.__in_flight >= self.__max_in_flight:
+                self.__rejected_count += 1
+                raise SolverPoolOverloadedException("Solver pool is {} with {} requests in flight".format(
+                    "draining" if self.__draining else "full", self.__in_flight))
+            self.__in_flight += 1
+
+        try:
+            submit_time = time.time()
+            try:
+                result, start_time, stop_time, worker_timings = \
+                    self.__pool.submit(_solve_in_worker, operation, body, packed, deadline).result()
+            except BrokenProcessPool:
+                log.error("A solver pool worker exited while solving %s", operation)
+                with self.__lock:
+                    self.__worker_exit_count += 1
+                raise
+            queue_wait = max(0.0, start_time - submit_time)
+            if timings is not None:
+                timings[QUEUE] = queue_wait
+                timings.update(worker_timings)
+            if self.__reg is not None:
+                tags = dict(self.__tags)
+                tags["operation"] = operation
+                self.__reg.distribution_summary(SOLVER_POOL_QUEUE_WAIT, tags).record(queue_wait)
+                self.__reg.distribution_summary(SOLVER_POOL_SOLVE_DURATION, tags).record(stop_time - start_time)
+            return result
+        finally:
+            with self.__lock:
+                self.__in_flight -= 1
+                self.__idle.notify_all()
+
+    def get_in_flight(self) -> int:
+        return self.__in_flight
+
+    def get_rejected_count(self) -> int:
+        return self.__rejected_count
+
+    def get_worker_pids(self) -> Set[int]:
+        return self.__pool.get_pids()
+
+    def get_worker_exit_count(self) -> int:
+        return self.__worker_exit_count
+
+    def is_draining(self) -> bool:
+        return self.__draining
+
+    def is_healthy(self) -> bool:
+        """
+        Returns False while a worker which exited can not be replaced.
+        """
+        return not self.__pool.is_broken()
+
+    def drain(self, timeout_secs: float) -> bool:
+        """
+        Stops admitting requests, waits up to the timeout for the ones in flight and shuts the workers down.
+
+        :return: True when every request in flight completed
+        """
+        deadline = time.time() + timeout_secs
+        with self.__lock:
+            self.__draining = True
+            log.info("Draining solver pool with %s requests in flight", self.__in_flight)
+            while self.__in_flight > 0 and time.time() < deadline:
+                self.__idle.wait(deadline - time.time())
+            drained = self.__in_flight == 0
+
+        self.__pool.shutdown(wait=drained)
+        log.info("Solver pool shut down, drained: %s", drained)
+        return drained
+
+    def set_registry(self, registry, tags):
+        self.__reg = registry
+        self.__tags = {} if tags is None else tags
+
+    def report_metrics(self, tags):
+        self.__reg.gauge(SOLVER_POOL_IN_FLIGHT, tags).set(self.__in_flight)
+        self.__reg.gauge(SOLVER_POOL_REJECTED_COUNT, tags).set(self.__rejected_count)
+        self.__reg.gauge(SOLVER_POOL_WORKER_EXIT_COUNT, tags).set(self.__worker_exit_count)
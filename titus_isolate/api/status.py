@@ -90,14 +90,14 @@ def get_isolated_workload_ids():
 
 @app.route('/cpu')
 def get_cpu():
-    return json.dumps(get_workload_manager().get_cpu().to_dict())
+    return json.dumps(get_workload_manager().get_cpu_snapshot().to_dict())
 
 
 @app.route('/violations')
 def get_violations():
     return json.dumps({
-        "cross_package": get_cross_package_violations(get_workload_manager().get_cpu()),
-        "shared_core": get_shared_core_violations(get_workload_manager().get_cpu())
+        "cross_package": get_cross_package_violations(get_workload_manager().get_cpu_snapshot()),
+        "shared_core": get_shared_core_violations(get_workload_manager().get_cpu_snapshot())
     })
 
 
@@ -148,11 +148,10 @@ def health_check(local_exit_handler: ExitHandler, local_event_manager: EventMana
 def init():
     # Initialize currently running containers as workloads
     log.info("Isolating currently running workloads...")
-    for workload in get_current_workloads(docker.from_env()):
-        try:
-            workload_manager.add_workload(workload)
-        except:
-            log.exception("Failed to add currently running workload: '{}', maybe it exited.".format(workload.get_id()))
+    try:
+        workload_manager.add_workloads(get_current_workloads(docker.from_env()))
+    except:
+        log.exception("Failed to add currently running workloads, maybe some exited.")
 
     log.info("Isolated currently running workloads.")
     # Start processing events after adding running workloads to avoid processing a die event before we add a workload
@@ -38,6 +38,9 @@ DEFAULT_CPU_PREDICTOR = LEGACY_CPU_PREDICTOR
 # CPU Allocator
 CPU_ALLOCATOR = 'TITUS_ISOLATE_ALLOCATOR'
 FALLBACK_ALLOCATOR = 'TITUS_ISOLATE_FALLBACK_ALLOCATOR'
+# When positive the fallback allocator is also called once the primary is slower than this percentile of its recent
+# latencies, and the first successful response wins
+FALLBACK_HEDGE_PERCENTILE = 'TITUS_ISOLATE_FALLBACK_HEDGE_PERCENTILE'
 
 # Remote Allocator
 REMOTE_ALLOCATOR_URL = 'TITUS_ISOLATE_REMOTE_ALLOCATOR_URL'
@@ -45,15 +48,22 @@ REMOTE_ASSIGN_ALLOCATOR = 'REMOTE_ASSIGN_ALLOCATOR'
 REMOTE_FREE_ALLOCATOR = 'REMOTE_FREE_ALLOCATOR'
 REMOTE_REBALANCE_ALLOCATOR = 'REMOTE_REBALANCE_ALLOCATOR'
 
+# Anytime Allocator
+ANYTIME_BACKGROUND_ALLOCATOR = 'TITUS_ISOLATE_ANYTIME_BACKGROUND_ALLOCATOR'
+
 IP = 'IP'
 FORECAST_CPU_IP = 'FORECAST_CPU_IP'
 GREEDY = 'GREEDY'
 NAIVE = 'NAIVE'
 NOOP = 'NOOP'
 REMOTE = 'REMOTE'
+ANYTIME = 'ANYTIME'
+LOCAL_SEARCH = 'LOCAL_SEARCH'
 DEFAULT_ALLOCATOR = IP
 DEFAULT_FALLBACK_ALLOCATOR = GREEDY
-CPU_ALLOCATORS = [IP, FORECAST_CPU_IP, GREEDY, NAIVE, NOOP, REMOTE]
+DEFAULT_FALLBACK_HEDGE_PERCENTILE = 0
+DEFAULT_ANYTIME_BACKGROUND_ALLOCATOR = IP
+CPU_ALLOCATORS = [IP, FORECAST_CPU_IP, GREEDY, NAIVE, NOOP, REMOTE, ANYTIME, LOCAL_SEARCH]
 
 # Forecast CPU Allocator
 ALPHA_NU = 'TITUS_ISOLATE_ALPHA_NU'
@@ -89,6 +99,11 @@ DEFAULT_RELATIVE_MIP_GAP_STOP = 0.05
 MIP_SOLVER = 'TITUS_ISOLATE_MIP_SOLVER'
 DEFAULT_MIP_SOLVER = 'GLPK_MI'
 
+# The largest relative change in any workload's predicted usage for which the last solution is reused without solving.
+# A negative value always solves.
+WARM_START_USAGE_TOLERANCE = 'TITUS_ISOLATE_WARM_START_USAGE_TOLERANCE'
+DEFAULT_WARM_START_USAGE_TOLERANCE = 0.1
+
 # Free Thread Provider
 FREE_THREAD_PROVIDER = 'FREE_THREAD_PROVIDER'
 EMPTY = 'EMPTY'
@@ -145,9 +160,88 @@ EC2_LOCAL_IPV4 = "EC2_LOCAL_IPV4"
 MAX_SOLVER_RUNTIME = 'TITUS_ISOLATE_MAX_SOLVER_RUNTIME'
 DEFAULT_MAX_SOLVER_RUNTIME = 5
 
+# Adaptive solver budgets, latency objectives are in seconds
+SOLVER_BUDGET_ADAPTIVE = 'TITUS_ISOLATE_SOLVER_BUDGET_ADAPTIVE'
+DEFAULT_SOLVER_BUDGET_ADAPTIVE = False
+
+ASSIGN_SOLVER_LATENCY_SLO = 'TITUS_ISOLATE_ASSIGN_SOLVER_LATENCY_SLO'
+DEFAULT_ASSIGN_SOLVER_LATENCY_SLO = 1.0
+
+FREE_SOLVER_LATENCY_SLO = 'TITUS_ISOLATE_FREE_SOLVER_LATENCY_SLO'
+DEFAULT_FREE_SOLVER_LATENCY_SLO = 2.0
+
+REBALANCE_SOLVER_LATENCY_SLO = 'TITUS_ISOLATE_REBALANCE_SOLVER_LATENCY_SLO'
+DEFAULT_REBALANCE_SOLVER_LATENCY_SLO = DEFAULT_MAX_SOLVER_RUNTIME
+
+MAX_RELATIVE_MIP_GAP_STOP = 'TITUS_ISOLATE_MAX_RELATIVE_MIP_GAP_STOP'
+DEFAULT_MAX_RELATIVE_MIP_GAP_STOP = 0.5
+
+IP_SOLUTION_CACHE_MAX_ENTRIES = 'TITUS_ISOLATE_IP_SOLUTION_CACHE_MAX_ENTRIES'
+DEFAULT_IP_SOLUTION_CACHE_MAX_ENTRIES = 4096
+
+IP_SOLUTION_CACHE_MAX_BYTES = 'TITUS_ISOLATE_IP_SOLUTION_CACHE_MAX_BYTES'
+DEFAULT_IP_SOLUTION_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+IP_SOLUTION_CACHE_DIR = 'TITUS_ISOLATE_IP_SOLUTION_CACHE_DIR'
+IP_SOLUTION_CACHE_DIR_MAX_BYTES = 'TITUS_ISOLATE_IP_SOLUTION_CACHE_DIR_MAX_BYTES'
+DEFAULT_IP_SOLUTION_CACHE_DIR_MAX_BYTES = 256 * 1024 * 1024
+
+IP_PACKAGE_DECOMPOSITION = 'TITUS_ISOLATE_IP_PACKAGE_DECOMPOSITION'
+DEFAULT_IP_PACKAGE_DECOMPOSITION = False
+
+IP_DECOMPOSITION_WORKERS = 'TITUS_ISOLATE_IP_DECOMPOSITION_WORKERS'
+DEFAULT_IP_DECOMPOSITION_WORKERS = 0
+
+IP_PLACEMENT_ATLAS = 'TITUS_ISOLATE_IP_PLACEMENT_ATLAS'
+
+LOCAL_SEARCH_MAX_RUNTIME_MS = 'TITUS_ISOLATE_LOCAL_SEARCH_MAX_RUNTIME_MS'
+DEFAULT_LOCAL_SEARCH_MAX_RUNTIME_MS = 20
+
 MAX_SOLVER_CONNECT_SEC = 'TITUS_ISOLATE_MAX_SOLVER_CONNECT_SEC'
 DEFAULT_MAX_SOLVER_CONNECT_SEC = 1
 
+REMOTE_ALLOCATOR_PACKED_ENCODING = 'TITUS_ISOLATE_REMOTE_ALLOCATOR_PACKED_ENCODING'
+DEFAULT_REMOTE_ALLOCATOR_PACKED_ENCODING = False
+
+# gzip, zstd (with the zstandard package installed) or identity
+REMOTE_ALLOCATOR_COMPRESSION = 'TITUS_ISOLATE_REMOTE_ALLOCATOR_COMPRESSION'
+DEFAULT_REMOTE_ALLOCATOR_COMPRESSION = 'gzip'
+REMOTE_ALLOCATOR_MAX_RETRIES = 'TITUS_ISOLATE_REMOTE_ALLOCATOR_MAX_RETRIES'
+DEFAULT_REMOTE_ALLOCATOR_MAX_RETRIES = 2
+REMOTE_ALLOCATOR_RETRY_BACKOFF_SEC = 'TITUS_ISOLATE_REMOTE_ALLOCATOR_RETRY_BACKOFF_SEC'
+DEFAULT_REMOTE_ALLOCATOR_RETRY_BACKOFF_SEC = 0.05
+REMOTE_ALLOCATOR_POOL_SIZE = 'TITUS_ISOLATE_REMOTE_ALLOCATOR_POOL_SIZE'
+DEFAULT_REMOTE_ALLOCATOR_POOL_SIZE = 4
+# Solve service: solve in this many worker processes, or in the serving process when 0.  The service runs in a single
+# gunicorn process whose threads should outnumber workers + max queue, so requests beyond them are rejected with 429.
+# Workers report the metrics of their own allocators, tagged with their pid.
+SOLVER_POOL_WORKERS = 'TITUS_ISOLATE_SOLVER_POOL_WORKERS'
+DEFAULT_SOLVER_POOL_WORKERS = 0
+SOLVER_POOL_MAX_QUEUE = 'TITUS_ISOLATE_SOLVER_POOL_MAX_QUEUE'
+DEFAULT_SOLVER_POOL_MAX_QUEUE = 16
+SOLVER_POOL_DRAIN_TIMEOUT_SEC = 'TITUS_ISOLATE_SOLVER_POOL_DRAIN_TIMEOUT_SEC'
+DEFAULT_SOLVER_POOL_DRAIN_TIMEOUT_SEC = 30
+# Solve service: list the time of every stage of a request in its Server-Timing response header, not only the total
+SOLVER_SERVER_TIMING_STAGES = 'TITUS_ISOLATE_SOLVER_SERVER_TIMING_STAGES'
+DEFAULT_SOLVER_SERVER_TIMING_STAGES = True
+# Solve service: how long agents are asked to fall back without trying the solver once it is overloaded
+SOLVER_OVERLOAD_RETRY_AFTER_SEC = 'TITUS_ISOLATE_SOLVER_OVERLOAD_RETRY_AFTER_SEC'
+DEFAULT_SOLVER_OVERLOAD_RETRY_AFTER_SEC = 1
+# Solve service: answer repeated problems from a cache of this many results, usage is compared in buckets this wide
+SOLVER_RESULT_CACHE_MAX_ENTRIES = 'TITUS_ISOLATE_SOLVER_RESULT_CACHE_MAX_ENTRIES'
+DEFAULT_SOLVER_RESULT_CACHE_MAX_ENTRIES = 0
+SOLVER_RESULT_CACHE_USAGE_BUCKET = 'TITUS_ISOLATE_SOLVER_RESULT_CACHE_USAGE_BUCKET'
+DEFAULT_SOLVER_RESULT_CACHE_USAGE_BUCKET = 0.5
+# Solve service: keep the session state of up to this many instances, and of up to about this many bytes
+SOLVER_SESSION_MAX_ENTRIES = 'TITUS_ISOLATE_SOLVER_SESSION_MAX_ENTRIES'
+DEFAULT_SOLVER_SESSION_MAX_ENTRIES = 10000
+SOLVER_SESSION_MAX_BYTES = 'TITUS_ISOLATE_SOLVER_SESSION_MAX_BYTES'
+DEFAULT_SOLVER_SESSION_MAX_BYTES = 256 * 1024 * 1024
+
+# Send JSON requests as deltas against the previous request's state, which the solve service keeps per instance
+REMOTE_ALLOCATOR_DELTA_SESSION = 'TITUS_ISOLATE_REMOTE_ALLOCATOR_DELTA_SESSION'
+DEFAULT_REMOTE_ALLOCATOR_DELTA_SESSION = False
+
 OPPORTUNISTIC_SHARES_SCALE_KEY = "OPPORTUNISTIC_SHARES_SCALE"
 DEFAULT_SHARES_SCALE = 100
 DEFAULT_OPPORTUNISTIC_SHARES_SCALE = DEFAULT_SHARES_SCALE
@@ -160,19 +254,50 @@ RESTART_PROPERTIES = [
     ALPHA_L12,
     ALPHA_ORDER,
     ALPHA_PREV,
+    ANYTIME_BACKGROUND_ALLOCATOR,
+    ASSIGN_SOLVER_LATENCY_SLO,
     BURST_CORE_COLLOC_USAGE_THRESH,
     BURST_MULTIPLIER,
     CPU_ALLOCATOR,
     FALLBACK_ALLOCATOR,
+    FALLBACK_HEDGE_PERCENTILE,
+    FREE_SOLVER_LATENCY_SLO,
     FREE_THREAD_PROVIDER,
+    IP_DECOMPOSITION_WORKERS,
+    IP_PACKAGE_DECOMPOSITION,
+    IP_PLACEMENT_ATLAS,
+    IP_SOLUTION_CACHE_DIR,
+    IP_SOLUTION_CACHE_DIR_MAX_BYTES,
+    IP_SOLUTION_CACHE_MAX_BYTES,
+    IP_SOLUTION_CACHE_MAX_ENTRIES,
+    LOCAL_SEARCH_MAX_RUNTIME_MS,
     MAX_BURST_POOL_INCREASE_RATIO,
+    MAX_RELATIVE_MIP_GAP_STOP,
     MAX_SOLVER_RUNTIME,
     METRICS_QUERY_TIMEOUT_KEY,
     MODEL_BUCKET_FORMAT_STR,
     MODEL_PREFIX_FORMAT_STR,
     OPPORTUNISTIC_SHARES_SCALE_KEY,
     REBALANCE_FREQUENCY_KEY,
+    REBALANCE_SOLVER_LATENCY_SLO,
     RECONCILE_FREQUENCY_KEY,
+    REMOTE_ALLOCATOR_COMPRESSION,
+    REMOTE_ALLOCATOR_DELTA_SESSION,
+    REMOTE_ALLOCATOR_MAX_RETRIES,
+    REMOTE_ALLOCATOR_PACKED_ENCODING,
+    REMOTE_ALLOCATOR_POOL_SIZE,
+    REMOTE_ALLOCATOR_RETRY_BACKOFF_SEC,
     REMOTE_ALLOCATOR_URL,
+    SOLVER_BUDGET_ADAPTIVE,
+    SOLVER_OVERLOAD_RETRY_AFTER_SEC,
+    SOLVER_POOL_DRAIN_TIMEOUT_SEC,
+    SOLVER_POOL_MAX_QUEUE,
+    SOLVER_POOL_WORKERS,
+    SOLVER_RESULT_CACHE_MAX_ENTRIES,
+    SOLVER_RESULT_CACHE_USAGE_BUCKET,
+    SOLVER_SERVER_TIMING_STAGES,
+    SOLVER_SESSION_MAX_BYTES,
+    SOLVER_SESSION_MAX_ENTRIES,
     TOTAL_THRESHOLD,
+    WARM_START_USAGE_TOLERANCE,
     WEIGHT_CPU_USE_BURST]
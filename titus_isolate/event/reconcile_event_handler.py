@@ -1,5 +1,3 @@
-import copy
-
 from titus_isolate.event.constants import ACTION, RECONCILE
 from titus_isolate.event.event_handler import EventHandler
 from titus_isolate.isolate.reconciler import Reconciler
@@ -15,7 +13,7 @@ class ReconcileEventHandler(EventHandler):
         if not self.__relevant(event):
             return
 
-        cpu = copy.deepcopy(get_workload_manager().get_cpu())
+        cpu = get_workload_manager().get_cpu_snapshot()
         self.handling_event(event, "reconciling titus-isolate and cgroup state")
         self.__reconciler.reconcile(cpu)
         self.handled_event(event, "reconciled titus-isolate and cgroup state")
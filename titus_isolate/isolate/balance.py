@@ -1,4 +1,4 @@
-from titus_isolate.isolate.detect import get_cross_package_violations, get_shared_core_violations
+from titus_isolate.isolate.detect import get_cross_package_violation_count, get_shared_core_violation_count
 
 
 def has_better_isolation(cur_cpu, new_cpu):
@@ -42,11 +42,11 @@ def has_better_isolation(cur_cpu, new_cpu):
 
     :return: True if the new_cpu has better placement, False otherwise
     """
-    cur_cross_package_violation_count = len(get_cross_package_violations(cur_cpu))
-    new_cross_package_violation_count = len(get_cross_package_violations(new_cpu))
+    cur_cross_package_violation_count = get_cross_package_violation_count(cur_cpu)
+    new_cross_package_violation_count = get_cross_package_violation_count(new_cpu)
 
-    cur_shared_core_violation_count = len(get_shared_core_violations(cur_cpu))
-    new_shared_core_violation_count = len(get_shared_core_violations(new_cpu))
+    cur_shared_core_violation_count = get_shared_core_violation_count(cur_cpu)
+    new_shared_core_violation_count = get_shared_core_violation_count(new_cpu)
 
     # More violations is bad, so a positive change is bad
     cross_package_violation_change = new_cross_package_violation_count - cur_cross_package_violation_count
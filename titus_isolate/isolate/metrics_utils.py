@@ -6,11 +6,11 @@ from titus_isolate.model.utils import get_burst_workloads
 
 
 def get_allocated_size(cpu: Cpu) -> int:
-    return len([t for t in cpu.get_threads() if t.is_claimed()])
+    return len(cpu.get_claimed_threads())
 
 
 def get_unallocated_size(cpu: Cpu) -> int:
-    return len([t for t in cpu.get_threads() if not t.is_claimed()])
+    return len(cpu.get_empty_threads())
 
 
 def get_burst_request_size(workloads: list) -> int:
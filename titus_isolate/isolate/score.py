@@ -0,0 +1,131 @@
+from typing import List
+
+import numpy as np
+
+from titus_isolate.model.processor.cpu import Cpu
+
+
+class PlacementScores:
+    """
+    The scores of a batch of candidate placements.  Every field is an integer array with one entry per candidate.
+
+        cross_package: the number of workloads placed on more than one package
+        shared_core: the number of cores holding more than one distinct workload
+        llc_spread: the number of extra last level cache groups touched, summed over workloads.  A workload within a
+                    single LLC group contributes 0.
+        migration: the number of (thread, workload) claims added or removed relative to the current placement, or 0
+                   when no current placement was given
+    """
+
+    def __init__(self, cross_package: np.ndarray, shared_core: np.ndarray, llc_spread: np.ndarray, migration: np.ndarray):
+        self.cross_package = cross_package
+        self.shared_core = shared_core
+        self.llc_spread = llc_spread
+        self.migration = migration
+
+    def __len__(self):
+        return len(self.cross_package)
+
+
+class PlacementScorer:
+    """
+    Scores batches of candidate placements against the topology of a CPU in a single vectorized pass.
+
+    A placement is a (threads x workloads) 0/1 matrix whose rows are in natural thread order, i.e. the order of
+    Cpu.get_threads() and of the placement vectors produced by the solvers.  A batch of candidates is a
+    (candidates x threads x workloads) array.
+    """
+
+    def __init__(self, cpu: Cpu):
+        thread_count = len(cpu.get_threads())
+        original_2_natural = cpu.get_original_indexing_2_natural_indexing()
+
+        self.__thread_count = thread_count
+        self.__package_matrix = self.__get_incidence_matrix(
+            thread_count, [[original_2_natural[t.get_id()] for t in p.get_threads()] for p in cpu.get_packages()])
+        self.__core_matrix = self.__get_incidence_matrix(
+            thread_count, [[original_2_natural[t.get_id()] for t in c.get_threads()] for c in cpu.get_cores()])
+        self.__llc_matrix = self.__get_incidence_matrix(
+            thread_count, [[original_2_natural[t_id] for t_id in g] for g in cpu.get_llc_groups()])
+
+    def get_thread_count(self) -> int:
+        return self.__thread_count
+
+    def score(self, candidates: np.ndarray, current: np.ndarray = None) -> PlacementScores:
+        """
+        :param candidates: a (candidates x threads x workloads) array, or a single (threads x workloads) placement
+        :param current: the (threads x workloads) placement the candidates would replace
+        """
+        candidates = np.asarray(candidates, dtype=np.float32)
+        if candidates.ndim == 2:
+            candidates = candidates[np.newaxis]
+        if candidates.ndim != 3 or candidates.shape[1] != self.__thread_count:
+            raise ValueError("Expected candidates of shape (candidates, {}, workloads), received: {}".format(
+                self.__thread_count, candidates.shape))
+
+        # (candidates x workloads x threads) @ (threads x groups) -> threads of each workload in each group
+        by_workload = np.swapaxes(candidates, 1, 2)
+        package_counts = by_workload @ self.__package_matrix > 0
+        core_counts = by_workload @ self.__core_matrix > 0
+        llc_counts = by_workload @ self.__llc_matrix > 0
+
+        packages_per_workload = package_counts.sum(axis=2)
+        cross_package = (packages_per_workload > 1).sum(axis=1)
+        shared_core = (core_counts.sum(axis=1) > 1).sum(axis=1)
+        llc_per_workload = llc_counts.sum(axis=2)
+        llc_spread = np.maximum(llc_per_workload - 1, 0).sum(axis=1)
+
+        if current is None:
+            migration = np.zeros(len(candidates), dtype=np.int64)
+        else:
+            current = np.asarray(current, dtype=np.float32)
+            if current.shape != candidates.shape[1:]:
+                raise ValueError("Expected a current placement of shape {}, received: {}".format(
+                    candidates.shape[1:], current.shape))
+            migration = np.abs(candidates - current).sum(axis=(1, 2)).astype(np.int64)
+
+        return PlacementScores(
+            cross_package.astype(np.int64),
+            shared_core.astype(np.int64),
+            llc_spread.astype(np.int64),
+            migration)
+
+    @staticmethod
+    def __get_incidence_matrix(thread_count: int, groups: List[List[int]]) -> np.ndarray:
+        matrix = np.zeros((thread_count, len(groups)), dtype=np.float32)
+        for g_i, thread_indices in enumerate(groups):
+            matrix[thread_indices, g_i] = 1
+        return matrix
+
+
+def get_placement_matrix(cpu: Cpu, workload_ids: List[str]) -> np.ndarray:
+    """
+    Returns the (threads x workloads) placement matrix of the given workloads on the given CPU, in natural thread order.
+    """
+    original_2_natural = cpu.get_original_indexing_2_natural_indexing()
+    placement = np.zeros((len(cpu.get_threads()), len(workload_ids)), dtype=np.float32)
+    for w_i, workload_id in enumerate(workload_ids):
+        placement[[original_2_natural[t_id] for t_id in cpu.get_workload_thread_ids(workload_id)], w_i] = 1
+    return placement
+
+
+def is_better_isolated(cur: PlacementScores, new: PlacementScores) -> np.ndarray:
+    """
+    Compares batches of scored candidates as balance.has_better_isolation compares two CPUs.  Fewer cross package
+    violations always win; with equal cross package violations, fewer shared core violations win.
+
+    :param cur: the scores of the current placement, broadcast against the candidates
+    :param new: the scores of the candidate placements
+    :return: a boolean array with one entry per candidate
+    """
+    cross_package_change = new.cross_package - cur.cross_package
+    shared_core_change = new.shared_core - cur.shared_core
+    return (cross_package_change < 0) | ((cross_package_change == 0) & (shared_core_change < 0))
+
+
+def get_best_candidate_index(scores: PlacementScores) -> int:
+    """
+    Returns the index of the best candidate.  Candidates are ordered by cross package violations, then shared core
+    violations, then LLC spread and finally migration.  Ties go to the earliest candidate.
+    """
+    return int(np.lexsort((scores.migration, scores.llc_spread, scores.shared_core, scores.cross_package))[0])
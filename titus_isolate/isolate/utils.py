@@ -1,9 +1,11 @@
 
 from titus_isolate import log
+from titus_isolate.allocate.anytime_cpu_allocator import AnytimeCpuAllocator
 from titus_isolate.allocate.fall_back_cpu_allocator import FallbackCpuAllocator
 from titus_isolate.allocate.greedy_cpu_allocator import GreedyCpuAllocator
 from titus_isolate.allocate.integer_program_cpu_allocator import IntegerProgramCpuAllocator
 from titus_isolate.allocate.forecast_ip_cpu_allocator import ForecastIPCpuAllocator
+from titus_isolate.allocate.local_search_cpu_allocator import LocalSearchCpuAllocator
 from titus_isolate.allocate.naive_cpu_allocator import NaiveCpuAllocator
 from titus_isolate.allocate.noop_allocator import NoopCpuAllocator
 from titus_isolate.allocate.remote_cpu_allocator import RemoteCpuAllocator
@@ -11,7 +13,9 @@ from titus_isolate.config.config_manager import ConfigManager
 from titus_isolate.config.constants import CPU_ALLOCATOR, CPU_ALLOCATORS, DEFAULT_ALLOCATOR, \
     IP, GREEDY, NOOP, FORECAST_CPU_IP, \
     FREE_THREAD_PROVIDER, DEFAULT_FREE_THREAD_PROVIDER, EMPTY, DEFAULT_TOTAL_THRESHOLD, \
-    TOTAL_THRESHOLD, REMOTE, FALLBACK_ALLOCATOR, DEFAULT_FALLBACK_ALLOCATOR, OVERSUBSCRIBE, NAIVE
+    TOTAL_THRESHOLD, REMOTE, FALLBACK_ALLOCATOR, DEFAULT_FALLBACK_ALLOCATOR, OVERSUBSCRIBE, NAIVE, ANYTIME, \
+    ANYTIME_BACKGROUND_ALLOCATOR, DEFAULT_ANYTIME_BACKGROUND_ALLOCATOR, LOCAL_SEARCH, FALLBACK_HEDGE_PERCENTILE, \
+    DEFAULT_FALLBACK_HEDGE_PERCENTILE
 from titus_isolate.monitor.empty_free_thread_provider import EmptyFreeThreadProvider
 from titus_isolate.monitor.free_thread_provider import FreeThreadProvider
 from titus_isolate.monitor.oversubscribe_free_thread_provider import OversubscribeFreeThreadProvider
@@ -22,7 +26,8 @@ CPU_ALLOCATOR_NAME_TO_CLASS_MAP = {
     GREEDY: GreedyCpuAllocator,
     NAIVE: NaiveCpuAllocator,
     NOOP: NoopCpuAllocator,
-    REMOTE: RemoteCpuAllocator
+    REMOTE: RemoteCpuAllocator,
+    LOCAL_SEARCH: LocalSearchCpuAllocator
 }
 
 
@@ -48,7 +53,9 @@ def get_fallback_allocator(config_manager) -> FallbackCpuAllocator:
     primary_allocator = get_allocator(primary_alloc_str, config_manager)
     secondary_allocator = get_allocator(secondary_alloc_str, config_manager)
 
-    return FallbackCpuAllocator(primary_allocator, secondary_allocator)
+    hedge_percentile = config_manager.get_float(FALLBACK_HEDGE_PERCENTILE, DEFAULT_FALLBACK_HEDGE_PERCENTILE)
+
+    return FallbackCpuAllocator(primary_allocator, secondary_allocator, hedge_percentile)
 
 
 def get_allocator(allocator_str, config_manager):
@@ -56,6 +63,9 @@ def get_allocator(allocator_str, config_manager):
         log.error("Unexpected CPU allocator specified: '{}', falling back to default: '{}'".format(allocator_str, DEFAULT_ALLOCATOR))
         allocator_str = DEFAULT_ALLOCATOR
 
+    if allocator_str == ANYTIME:
+        return get_anytime_allocator(config_manager)
+
     free_thread_provider = get_free_thread_provider(config_manager)
     if allocator_str != FORECAST_CPU_IP:
         return CPU_ALLOCATOR_NAME_TO_CLASS_MAP[allocator_str](free_thread_provider)
@@ -64,3 +74,15 @@ def get_allocator(allocator_str, config_manager):
         cpu_usage_predictor_manager=get_cpu_usage_predictor_manager(),
         config_manager=config_manager,
         free_thread_provider=free_thread_provider)
+
+
+def get_anytime_allocator(config_manager) -> AnytimeCpuAllocator:
+    background_alloc_str = config_manager.get_str(ANYTIME_BACKGROUND_ALLOCATOR, DEFAULT_ANYTIME_BACKGROUND_ALLOCATOR)
+    if background_alloc_str == ANYTIME:
+        log.error("The anytime allocator can not run itself in the background, falling back to default: '{}'".format(
+            DEFAULT_ANYTIME_BACKGROUND_ALLOCATOR))
+        background_alloc_str = DEFAULT_ANYTIME_BACKGROUND_ALLOCATOR
+
+    return AnytimeCpuAllocator(
+        GreedyCpuAllocator(get_free_thread_provider(config_manager)),
+        get_allocator(background_alloc_str, config_manager))
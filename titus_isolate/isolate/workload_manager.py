@@ -1,7 +1,7 @@
-import copy
 from threading import Lock
 import time
-from typing import List, Dict
+from types import MappingProxyType
+from typing import List, Dict, Mapping
 
 from titus_isolate import log
 
@@ -11,10 +11,11 @@ from titus_isolate.allocate.constants import *
 from titus_isolate.allocate.cpu_allocator import CpuAllocator
 from titus_isolate.allocate.noop_allocator import NoopCpuAllocator
 from titus_isolate.allocate.allocate_threads_request import AllocateThreadsRequest
+from titus_isolate.allocate.allocate_threads_batch_request import AllocateThreadsBatchRequest
 from titus_isolate.allocate.workload_allocate_response import WorkloadAllocateResponse
 from titus_isolate.cgroup.cgroup_manager import CgroupManager
 from titus_isolate.config.constants import EC2_INSTANCE_ID
-from titus_isolate.isolate.detect import get_cross_package_violations, get_shared_core_violations
+from titus_isolate.isolate.detect import get_cross_package_violation_count, get_shared_core_violation_count
 from titus_isolate.isolate.metrics_utils import *
 from titus_isolate.metrics.constants import *
 from titus_isolate.metrics.event_log import report_cpu_event
@@ -50,6 +51,8 @@ class WorkloadManager(MetricsReporter):
         self.__workloads = {}
         self.__last_response = None
 
+        self.__cpu_allocator.set_improvement_listener(self.__apply_improvement)
+
         log.info("Created workload manager")
 
     def add_workload(self, workload):
@@ -61,6 +64,30 @@ class WorkloadManager(MetricsReporter):
         else:
             self.__remove_workload(workload.get_id())
 
+    def add_workloads(self, workloads: List[Workload]):
+        """
+        Adds several workloads with a single allocation and a single isolation pass.  If the batch fails the workloads
+        are added one at a time, so one bad workload does not keep the others from being isolated.
+        """
+        if len(workloads) == 0:
+            return
+        if len(workloads) == 1:
+            self.add_workload(workloads[0])
+            return
+
+        for workload in workloads:
+            update_numa_balancing(workload, self.__cpu)
+
+        workload_ids = [w.get_id() for w in workloads]
+        succeeded = self.__update_workload(self.__add_workloads, workloads, workload_ids)
+        if succeeded:
+            self.__added_count += len(workloads)
+            return
+
+        log.warning("Failed to add workloads: {} as a batch, adding them one at a time".format(workload_ids))
+        for workload in workloads:
+            self.add_workload(workload)
+
     def remove_workload(self, workload_id):
         self.__cgroup_manager.release_container(workload_id)
         self.__update_workload(self.__remove_workload, workload_id, workload_id)
@@ -105,6 +132,20 @@ class WorkloadManager(MetricsReporter):
         self.__update_state(response, workload_map)
         report_cpu_event(request, response)
 
+    def __add_workloads(self, workloads):
+        log.info("Assigning threads to workloads: {}".format(
+            ["{}: {}".format(w.get_id(), w.get_thread_count()) for w in workloads]))
+
+        workload_map = self.get_workload_map_copy()
+        for workload in workloads:
+            workload_map[workload.get_id()] = workload
+
+        request = self.__get_threads_batch_request([w.get_id() for w in workloads], workload_map, "assign_batch")
+        response = self.__cpu_allocator.assign_threads_batch(request)
+
+        self.__update_state(response, workload_map)
+        report_cpu_event(request, response)
+
     def __remove_workload(self, workload_id):
         log.info("Removing workload: {}".format(workload_id))
         if workload_id not in self.__workloads:
@@ -127,9 +168,22 @@ class WorkloadManager(MetricsReporter):
         self.__update_state(response, request.get_workloads())
         report_cpu_event(request, response)
 
+    def __apply_improvement(self, expected_cpu: Cpu, response: AllocateResponse, workloads) -> bool:
+        """
+        Applies a placement improved in the background, unless the workloads or their placement have changed since the
+        request it improves upon was answered.
+        """
+        with self.__lock:
+            if set(workloads.keys()) != set(self.__workloads.keys()) or self.__cpu != expected_cpu:
+                log.info("Discarding improved placement, the workloads changed since it was requested")
+                return False
+
+            self.__update_state(response, self.__workloads)
+            return True
+
     def __update_state(self, response: AllocateResponse, new_workloads):
         start_time = time.time()
-        old_cpu = self.get_cpu_copy()
+        old_cpu = self.__cpu
         new_cpu = response.get_cpu()
 
         self.__apply_isolation(response)
@@ -192,7 +246,7 @@ class WorkloadManager(MetricsReporter):
         pcp_usage = self.__wmm.get_pcp_usage()
 
         return AllocateThreadsRequest(
-            cpu=self.get_cpu_copy(),
+            cpu=self.__cpu,
             workload_id=workload_id,
             workloads=workload_map,
             cpu_usage=pcp_usage.get(CPU_USAGE, {}),
@@ -202,12 +256,26 @@ class WorkloadManager(MetricsReporter):
             disk_usage=pcp_usage.get(DISK_USAGE, {}),
             metadata=self.__get_request_metadata(request_type))
 
+    def __get_threads_batch_request(self, workload_ids, workload_map, request_type):
+        pcp_usage = self.__wmm.get_pcp_usage()
+
+        return AllocateThreadsBatchRequest(
+            cpu=self.__cpu,
+            workload_ids=workload_ids,
+            workloads=workload_map,
+            cpu_usage=pcp_usage.get(CPU_USAGE, {}),
+            mem_usage=pcp_usage.get(MEM_USAGE, {}),
+            net_recv_usage=pcp_usage.get(NET_RECV_USAGE, {}),
+            net_trans_usage=pcp_usage.get(NET_TRANS_USAGE, {}),
+            disk_usage=pcp_usage.get(DISK_USAGE, {}),
+            metadata=self.__get_request_metadata(request_type))
+
     def __get_rebalance_request(self):
         pcp_usage = self.__wmm.get_pcp_usage()
 
         return AllocateRequest(
-            cpu=self.get_cpu_copy(),
-            workloads=self.get_workload_map_copy(),
+            cpu=self.__cpu,
+            workloads=self.get_workload_map_snapshot(),
             cpu_usage=pcp_usage.get(CPU_USAGE, {}),
             mem_usage=pcp_usage.get(MEM_USAGE, {}),
             net_recv_usage=pcp_usage.get(NET_RECV_USAGE, {}),
@@ -219,7 +287,17 @@ class WorkloadManager(MetricsReporter):
         return list(self.__workloads.values())
 
     def get_workload_map_copy(self):
-        return copy.deepcopy(self.__workloads)
+        """
+        Returns a mutable copy of the workload map.  Workloads themselves are immutable and are shared with the copy.
+        """
+        return dict(self.__workloads)
+
+    def get_workload_map_snapshot(self) -> Mapping[str, Workload]:
+        """
+        Returns a read-only view of the workload map.  The map is replaced rather than modified on every update, so the
+        view remains a consistent snapshot for as long as the caller holds it.
+        """
+        return MappingProxyType(self.__workloads)
 
     def get_isolated_workload_ids(self):
         return self.__cgroup_manager.get_isolated_workload_ids()
@@ -230,11 +308,21 @@ class WorkloadManager(MetricsReporter):
 
         return workload_id in self.get_isolated_workload_ids()
 
-    def get_cpu(self):
+    def get_cpu(self) -> Cpu:
         return self.__cpu
 
-    def get_cpu_copy(self):
-        return copy.deepcopy(self.__cpu)
+    def get_cpu_snapshot(self) -> Cpu:
+        """
+        Returns an immutable snapshot of the current CPU state.  This is free unless the CPU has changed since the
+        last snapshot.
+        """
+        return self.__cpu.snapshot()
+
+    def get_cpu_copy(self) -> Cpu:
+        """
+        Returns a mutable copy-on-write fork of the current CPU state.
+        """
+        return self.__cpu.fork()
 
     def get_added_count(self):
         return self.__added_count
@@ -297,8 +385,8 @@ class WorkloadManager(MetricsReporter):
         self.__cgroup_manager.set_registry(registry, tags)
 
     def report_metrics(self, tags):
-        cpu = self.get_cpu_copy()
-        workload_map = self.get_workload_map_copy()
+        cpu = self.get_cpu_snapshot()
+        workload_map = self.get_workload_map_snapshot()
 
         self.__reg.gauge(RUNNING, tags).set(1)
         self.__reg.gauge(WORKLOAD_COUNT_KEY, tags).set(len(self.get_workloads()))
@@ -314,8 +402,8 @@ class WorkloadManager(MetricsReporter):
         self.__rebalanced_count = 0
         self.__error_count = 0
 
-        cross_package_violation_count = len(get_cross_package_violations(cpu))
-        shared_core_violation_count = len(get_shared_core_violations(cpu))
+        cross_package_violation_count = get_cross_package_violation_count(cpu)
+        shared_core_violation_count = get_shared_core_violation_count(cpu)
         self.__reg.gauge(PACKAGE_VIOLATIONS_KEY, tags).set(cross_package_violation_count)
         self.__reg.gauge(CORE_VIOLATIONS_KEY, tags).set(shared_core_violation_count)
 
@@ -17,7 +17,23 @@ QUEUE_LATENCY_KEY = 'titus-isolate.queueLatency'
 ISOLATE_LATENCY_KEY = 'titus-isolate.isolateLatency'
 
 IP_ALLOCATOR_TIMEBOUND_COUNT = 'titus-isolate.ipAllocatorTimeBoundSolutionCount'
+IP_ALLOCATOR_CACHE_HIT_COUNT = 'titus-isolate.ipAllocatorCacheHitCount'
+IP_ALLOCATOR_CACHE_DISK_HIT_COUNT = 'titus-isolate.ipAllocatorCacheDiskHitCount'
+IP_ALLOCATOR_CACHE_MISS_COUNT = 'titus-isolate.ipAllocatorCacheMissCount'
+IP_ALLOCATOR_CACHE_EVICTION_COUNT = 'titus-isolate.ipAllocatorCacheEvictionCount'
+IP_ALLOCATOR_CACHE_SIZE = 'titus-isolate.ipAllocatorCacheSize'
+IP_ALLOCATOR_CACHE_BYTES = 'titus-isolate.ipAllocatorCacheBytes'
+IP_ALLOCATOR_DECOMPOSED_COUNT = 'titus-isolate.ipAllocatorDecomposedSolveCount'
+IP_ALLOCATOR_ATLAS_HIT_COUNT = 'titus-isolate.ipAllocatorAtlasHitCount'
+LOCAL_SEARCH_TIMEBOUND_COUNT = 'titus-isolate.localSearchTimeBoundSolutionCount'
+SOLVER_BUDGET_RUNTIME = 'titus-isolate.solverBudgetRuntimeSec'
+SOLVER_BUDGET_MIP_GAP = 'titus-isolate.solverBudgetMipGap'
+SOLVER_DURATION_P95 = 'titus-isolate.solverDurationP95Sec'
+SOLVER_DURATION_SAMPLE_COUNT = 'titus-isolate.solverDurationSampleCount'
 FORECAST_REBALANCE_FAILURE_COUNT = 'titus-isolate.forecastRebalanceFailureCount'
+FORECAST_SOLVE_COUNT = 'titus-isolate.forecastSolveCount'
+FORECAST_WARM_START_COUNT = 'titus-isolate.forecastWarmStartCount'
+FORECAST_SOLVE_DURATION = 'titus-isolate.forecastSolveDurationSec'
 
 WRITE_CPUSET_SUCCEEDED_KEY = 'titus-isolate.writeCpusetSucceeded'
 WRITE_CPUSET_FAILED_KEY = 'titus-isolate.writeCpusetFailed'
@@ -46,18 +62,60 @@ PRIMARY_REBALANCE_COUNT = 'titus-isolate.rebalancePrimary'
 FALLBACK_ASSIGN_COUNT = 'titus-isolate.assignThreadsFallback'
 FALLBACK_FREE_COUNT = 'titus-isolate.freeThreadsFallback'
 FALLBACK_REBALANCE_COUNT = 'titus-isolate.rebalanceFallback'
+PRIMARY_WIN_COUNT = 'titus-isolate.primaryAllocatorWins'
+FALLBACK_WIN_COUNT = 'titus-isolate.fallbackAllocatorWins'
+PRIMARY_LATENCY = 'titus-isolate.primaryAllocatorLatencySec'
+FALLBACK_LATENCY = 'titus-isolate.fallbackAllocatorLatencySec'
+HEDGED_COUNT = 'titus-isolate.hedgedAllocations'
+PRIMARY_OVERLOADED_COUNT = 'titus-isolate.primaryAllocatorOverloaded'
+PRIMARY_SKIPPED_COUNT = 'titus-isolate.primaryAllocatorSkipped'
+HEDGED_PRIMARIES_IN_FLIGHT = 'titus-isolate.hedgedPrimariesInFlight'
+
+ANYTIME_IMPROVED_COUNT = 'titus-isolate.anytimeImprovedCount'
+ANYTIME_DISCARDED_COUNT = 'titus-isolate.anytimeDiscardedCount'
+ANYTIME_SUPERSEDED_COUNT = 'titus-isolate.anytimeSupersededCount'
+ANYTIME_REJECTED_COUNT = 'titus-isolate.anytimeRejectedCount'
+ANYTIME_FAILED_COUNT = 'titus-isolate.anytimeFailedCount'
+
+REMOTE_ALLOCATOR_CONNECT_LATENCY = 'titus-isolate.remoteAllocatorConnectLatencySec'
+REMOTE_ALLOCATOR_TRANSFER_LATENCY = 'titus-isolate.remoteAllocatorTransferLatencySec'
+REMOTE_ALLOCATOR_SERVER_LATENCY = 'titus-isolate.remoteAllocatorServerLatencySec'
+REMOTE_ALLOCATOR_REQUEST_BYTES = 'titus-isolate.remoteAllocatorRequestBytes'
+REMOTE_ALLOCATOR_RESPONSE_BYTES = 'titus-isolate.remoteAllocatorResponseBytes'
+REMOTE_ALLOCATOR_CONNECTION_COUNT = 'titus-isolate.remoteAllocatorConnectionCount'
+REMOTE_ALLOCATOR_RETRY_COUNT = 'titus-isolate.remoteAllocatorRetryCount'
+REMOTE_ALLOCATOR_SESSION_DELTA_COUNT = 'titus-isolate.remoteAllocatorSessionDeltaCount'
+REMOTE_ALLOCATOR_SESSION_FULL_COUNT = 'titus-isolate.remoteAllocatorSessionFullCount'
+REMOTE_ALLOCATOR_SESSION_RESYNC_COUNT = 'titus-isolate.remoteAllocatorSessionResyncCount'
 
 SOLVER_GET_CPU_ALLOCATOR_SUCCESS = 'titus-isolate.getCpuAllocatorSuccessCount'
 SOLVER_GET_CPU_ALLOCATOR_FAILURE = 'titus-isolate.getCpuAllocatorFailureCount'
 SOLVER_ASSIGN_THREADS_SUCCESS = 'titus-isolate.assignThreadsSuccessCount'
 SOLVER_ASSIGN_THREADS_FAILURE = 'titus-isolate.assignThreadsFailureCount'
 SOLVER_ASSIGN_THREADS_DURATION = 'titus-isolate.assignThreadsDurationSec'
+SOLVER_ASSIGN_THREADS_BATCH_SUCCESS = 'titus-isolate.assignThreadsBatchSuccessCount'
+SOLVER_ASSIGN_THREADS_BATCH_FAILURE = 'titus-isolate.assignThreadsBatchFailureCount'
 SOLVER_FREE_THREADS_SUCCESS = 'titus-isolate.freeThreadsSuccessCount'
 SOLVER_FREE_THREADS_FAILURE = 'titus-isolate.freeThreadsFailureCount'
 SOLVER_FREE_THREADS_DURATION = 'titus-isolate.freeThreadsDurationSec'
 SOLVER_REBALANCE_SUCCESS = 'titus-isolate.rebalanceSuccessCount'
 SOLVER_REBALANCE_FAILURE = 'titus-isolate.rebalanceFailureCount'
 SOLVER_REBALANCE_DURATION = 'titus-isolate.rebalanceThreadsDurationSec'
+SOLVER_POOL_QUEUE_WAIT = 'titus-isolate.solverPoolQueueWaitSec'
+SOLVER_POOL_SOLVE_DURATION = 'titus-isolate.solverPoolSolveDurationSec'
+SOLVER_POOL_IN_FLIGHT = 'titus-isolate.solverPoolInFlight'
+SOLVER_POOL_REJECTED_COUNT = 'titus-isolate.solverPoolRejectedCount'
+SOLVER_POOL_WORKER_EXIT_COUNT = 'titus-isolate.solverPoolWorkerExitCount'
+SOLVER_RESULT_CACHE_HIT_COUNT = 'titus-isolate.solverResultCacheHitCount'
+SOLVER_RESULT_CACHE_MISS_COUNT = 'titus-isolate.solverResultCacheMissCount'
+SOLVER_RESULT_CACHE_COALESCED_COUNT = 'titus-isolate.solverResultCacheCoalescedCount'
+SOLVER_RESULT_CACHE_SIZE = 'titus-isolate.solverResultCacheSize'
+SOLVER_DEADLINE_DROPPED_COUNT = 'titus-isolate.solverDeadlineDroppedCount'
+SOLVER_SESSION_COUNT = 'titus-isolate.solverSessionCount'
+SOLVER_SESSION_DELTA_COUNT = 'titus-isolate.solverSessionDeltaCount'
+SOLVER_SESSION_FULL_COUNT = 'titus-isolate.solverSessionFullCount'
+SOLVER_SESSION_RESYNC_COUNT = 'titus-isolate.solverSessionResyncCount'
+SOLVER_SESSION_BYTES = 'titus-isolate.solverSessionBytes'
 
 STATIC_POOL_USAGE_KEY = 'titus-isolate.staticPoolUsage'
 BURST_POOL_USAGE_KEY = 'titus-isolate.burstPoolUsage'
@@ -4,22 +4,22 @@ import subprocess
 from titus_isolate.model.processor.core import Core
 from titus_isolate.model.processor.cpu import Cpu
 from titus_isolate.model.processor.package import Package
+from titus_isolate.model.processor.sysfs import get_cpu_from_sysfs
 from titus_isolate.model.processor.thread import Thread
 from titus_isolate.model.processor.utils import DEFAULT_PACKAGE_COUNT, DEFAULT_CORE_COUNT, DEFAULT_THREAD_COUNT
 
 
 def get_cpu_from_env():
     system = platform.system()
-    processor = None
 
-    if system == 'Darwin':
-        processor = MacProcessor()
-    elif system == 'Linux':
-        processor = LinuxProcessor()
+    if system == 'Linux':
+        return get_cpu_from_sysfs()
 
-    if processor is None:
+    if system != 'Darwin':
         raise EnvironmentError("Unexpected system type: '{}'".format(system))
 
+    processor = MacProcessor()
+
     print(
         "package count: " + str(processor.get_package_count()) + " cores_per_package:" + str(processor.get_cores_per_package()) +
         " threads_per_core:" + str(processor.get_threads_per_core()))
@@ -30,7 +30,6 @@ def get_cpu(
         package_count=DEFAULT_PACKAGE_COUNT,
         cores_per_package=DEFAULT_CORE_COUNT,
         threads_per_core=DEFAULT_THREAD_COUNT):
-    print("package count: " + str(package_count) + " cores_per_package:" + str(cores_per_package) + " threads_per_core:" + str(threads_per_core))
     packages = []
     for p_i in range(package_count):
 
@@ -40,11 +39,7 @@ def get_cpu(
                 Core(c_i, __get_threads(p_i, c_i, package_count, cores_per_package, threads_per_core)))
 
         packages.append(Package(p_i, cores))
-    print("-------------")
-    print(Cpu(packages))
-    print(Cpu(packages).get_threads())
-    print(len(Cpu(packages).get_threads()))
-    print("-------------")
+
     return Cpu(packages)
 
 
@@ -74,28 +69,6 @@ class Processor:
         return self.__threads_per_core
 
 
-class LinuxProcessor(Processor):
-    def __init__(self):
-        super(LinuxProcessor, self).__init__(
-            self.__get_package_count(),
-            self.__get_cores_per_package(),
-            self.__get_threads_per_core())
-
-    def __get_package_count(self):
-        return self.__get_lscpu_value('^Socket')
-
-    def __get_cores_per_package(self):
-        return self.__get_lscpu_value('^Core')
-
-    def __get_threads_per_core(self):
-        return self.__get_lscpu_value('^Thread')
-
-    @staticmethod
-    def __get_lscpu_value(grep_filter):
-        output = subprocess.check_output("lscpu | grep -E {}".format(grep_filter), shell=True).decode('utf-8')
-        return int(output.split(':')[1].strip())
-
-
 class MacProcessor(Processor):
     def __init__(self):
         super(MacProcessor, self).__init__(
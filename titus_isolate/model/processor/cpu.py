@@ -1,19 +1,88 @@
 from collections import defaultdict
-from functools import reduce
-from typing import List
+from typing import Dict, Iterable, List, Mapping, Tuple
 
 from titus_isolate.model.processor import utils
 from titus_isolate.model.processor.core import Core
 from titus_isolate.model.processor.package import Package
 from titus_isolate.model.processor.thread import Thread
+from titus_isolate.model.processor.thread_claims import ThreadClaims, iter_bits
+from titus_isolate.model.processor.topology import TopologyIndex
+from titus_isolate.model.processor.workload_ids import intern_workload_id, get_workload_id_registry
 
 
 class Cpu:
-    def __init__(self, packages):
+    def __init__(
+            self,
+            packages,
+            claims: ThreadClaims = None,
+            llc_groups: Iterable[Iterable[int]] = None,
+            numa_nodes: Mapping[int, Iterable[int]] = None):
         if len(packages) < 1:
             raise ValueError("A CPU must contain at least 1 package.")
 
         self.__packages = packages
+        self.__topology = TopologyIndex(packages, llc_groups, numa_nodes)
+
+        threads = self.__topology.get_threads()
+        if claims is None:
+            claims = ThreadClaims(
+                len(threads),
+                self.__topology.get_package_thread_indices(),
+                self.__topology.get_core_thread_indices())
+        elif claims.get_thread_count() != len(threads):
+            raise ValueError("Thread claims cover {} threads, but the CPU has {}.".format(
+                claims.get_thread_count(), len(threads)))
+
+        self.__claims = claims
+        for i, t in enumerate(threads):
+            t._bind(self.__claims, i)
+
+        self.__snapshot = None
+        self.__snapshot_version = None
+
+    def fork(self) -> 'Cpu':
+        """
+        Returns a mutable copy of this CPU.  The copy shares thread claims with this CPU until either one is modified.
+        """
+        claims = self.__claims.fork()
+        index = iter(range(len(self.get_threads())))
+        packages = []
+        for p in self.get_packages():
+            cores = [Core(c.get_id(), [Thread(t.get_id(), claims, next(index)) for t in c.get_threads()])
+                     for c in p.get_cores()]
+            packages.append(Package(p.get_id(), cores))
+
+        return Cpu(
+            packages,
+            claims,
+            self.__topology.get_llc_groups(),
+            self.__topology.get_numa_nodes())
+
+    def freeze(self):
+        """
+        Makes this CPU immutable.  Any subsequent attempt to claim, free or clear threads raises a ValueError.
+        """
+        self.__claims.freeze()
+
+    def is_frozen(self) -> bool:
+        return self.__claims.is_frozen()
+
+    def snapshot(self) -> 'Cpu':
+        """
+        Returns an immutable view of the current state of this CPU.  The snapshot is cached until this CPU is next
+        modified, so repeated snapshots of an unchanged CPU are free.
+        """
+        if self.is_frozen():
+            return self
+
+        version = self.__claims.get_version()
+        if self.__snapshot is None or self.__snapshot_version != version:
+            snapshot = self.fork()
+            snapshot.freeze()
+            self.__snapshot = snapshot
+            self.__snapshot_version = version
+
+        return self.__snapshot
 
     def get_packages(self) -> List[Package]:
         return self.__packages
@@ -31,32 +100,118 @@ class Cpu:
 
         return emptiest_package
 
-    def get_cores(self) -> List[Core]:
-        return reduce(list.__add__, [package.get_cores() for package in self.get_packages()])
+    def get_cores(self) -> Tuple[Core, ...]:
+        return self.__topology.get_cores()
+
+    def get_threads(self) -> Tuple[Thread, ...]:
+        return self.__topology.get_threads()
+
+    def get_thread(self, thread_id: int) -> Thread:
+        return self.__topology.get_thread(thread_id)
+
+    def get_thread_core(self, thread_id: int) -> Core:
+        return self.__topology.get_core(thread_id)
+
+    def get_thread_package(self, thread_id: int) -> Package:
+        return self.__topology.get_package(thread_id)
 
-    def get_threads(self) -> List[Thread]:
-        return reduce(list.__add__, [package.get_threads() for package in self.get_packages()])
+    def get_llc_groups(self) -> Tuple[Tuple[int, ...], ...]:
+        return self.__topology.get_llc_groups()
+
+    def get_numa_nodes(self) -> Mapping[int, Tuple[int, ...]]:
+        return self.__topology.get_numa_nodes()
+
+    def get_package_thread_indices(self) -> Tuple[Tuple[int, ...], ...]:
+        return self.__topology.get_package_thread_indices()
+
+    def get_core_thread_indices(self) -> Tuple[Tuple[int, ...], ...]:
+        return self.__topology.get_core_thread_indices()
 
     def get_empty_threads(self):
-        return utils.get_empty_threads(self.get_threads())
+        return self.__get_threads_in_mask(self.__claims.get_empty_mask())
 
     def get_claimed_threads(self):
-        return utils.get_claimed_threads(self.get_threads())
+        return self.__get_threads_in_mask(self.__claims.get_claimed_mask())
 
     def clear(self):
-        for t in self.get_threads():
-            t.clear()
+        self.__claims.clear_all()
+
+    def assign_placement(self, workload_ids: List[str], placement_vectors):
+        """
+        Replaces all claims on this CPU with the given placement, as produced by the placement solvers.
+
+        :param workload_ids: the workload placed by each placement vector
+        :param placement_vectors: a 0/1 vector per workload, indexed by natural thread index
+        """
+        handles_per_thread = [[] for _ in range(len(self.get_threads()))]
+        for workload_id, vector in zip(workload_ids, placement_vectors):
+            handle = intern_workload_id(workload_id)
+            for i, e in enumerate(vector):
+                if e == 1:
+                    handles_per_thread[i].append(handle)
+        self.__claims.assign(handles_per_thread)
+
+    def assign_handles(self, handles_per_thread):
+        """
+        Replaces all claims on this CPU.  The i-th entry lists the workload handles to claim on the thread with natural
+        index i, in claim order.
+        """
+        self.__claims.assign(handles_per_thread)
+
+    def free(self, workload_id):
+        self.__claims.free_workload(workload_id)
+
+    def get_workload_ids(self) -> set:
+        return self.__claims.get_all_workload_ids()
+
+    def get_workload_thread_ids(self, workload_id) -> List[int]:
+        return [t.get_id() for t in self.__get_threads_in_mask(self.__claims.get_mask(workload_id))]
 
     def get_workload_ids_to_thread_ids(self):
+        threads = self.get_threads()
         res = defaultdict(list)
-        for t in self.get_threads():
-            if t.is_claimed():
-                for w_id in t.get_workload_ids():
-                    res[w_id] += [t.get_id()]
+        for w_id, indices in self.__claims.get_workload_ids_to_indices().items():
+            res[w_id] = [threads[i].get_id() for i in indices]
         return res
 
-    def get_natural_indexing_2_original_indexing(self):
-        return {i: t.get_id() for i, t in enumerate(self.get_threads())}
+    def get_cross_package_violations(self) -> Dict[str, List]:
+        """
+        Returns a dictionary mapping the id of each workload placed on more than one package to those package ids.
+        """
+        registry = get_workload_id_registry()
+        packages = self.get_packages()
+        return {registry.resolve(h): [packages[i].get_id() for i in package_indices]
+                for h, package_indices in self.__claims.get_cross_package_handles().items()}
+
+    def get_cross_package_violation_count(self) -> int:
+        return len(self.__claims.get_cross_package_handles())
+
+    def get_shared_core_violations(self) -> Dict[str, List]:
+        """
+        Returns a dictionary mapping '<package id>:<core id>' to the ids of the workloads sharing that core, for every
+        core with more than one workload.
+        """
+        registry = get_workload_id_registry()
+        cores = self.__topology.get_cores()
+        violations = {}
+        for core_index in sorted(self.__claims.get_shared_core_indices()):
+            package = self.__topology.get_core_package(core_index)
+            violation_key = ':'.join([str(package.get_id()), str(cores[core_index].get_id())])
+            violations[violation_key] = list(set(registry.resolve_all(self.__claims.get_core_handles(core_index))))
+        return violations
+
+    def get_shared_core_violation_count(self) -> int:
+        return len(self.__claims.get_shared_core_indices())
+
+    def get_natural_indexing_2_original_indexing(self) -> Mapping[int, int]:
+        return self.__topology.get_natural_indexing_2_original_indexing()
+
+    def get_original_indexing_2_natural_indexing(self) -> Mapping[int, int]:
+        return self.__topology.get_original_indexing_2_natural_indexing()
+
+    def __get_threads_in_mask(self, mask: int) -> List[Thread]:
+        threads = self.get_threads()
+        return [threads[i] for i in iter_bits(mask)]
 
     def to_dict(self):
         packages = []
@@ -113,6 +268,8 @@ class Cpu:
 
     def __eq__(self, other):
         if isinstance(other, Cpu):
+            if self.__topology.get_layout() == other.__topology.get_layout():
+                return self.__claims.has_same_claims(other.__claims)
             return set(self.get_packages()) == set(other.get_packages())
         return NotImplemented
 
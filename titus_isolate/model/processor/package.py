@@ -1,5 +1,3 @@
-from functools import reduce
-
 from titus_isolate.model.processor import utils
 
 
@@ -10,6 +8,7 @@ class Package:
 
         self.__identifier = identifier
         self.__cores = cores
+        self.__threads = tuple(t for core in cores for t in core.get_threads())
 
     def get_id(self):
         return self.__identifier
@@ -18,7 +17,7 @@ class Package:
         return self.__cores
 
     def get_threads(self):
-        return reduce(list.__add__, [core.get_threads() for core in self.get_cores()])
+        return self.__threads
 
     def get_empty_threads(self):
         return utils.get_empty_threads(self.get_threads())
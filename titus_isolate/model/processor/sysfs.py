@@ -0,0 +1,111 @@
+import os
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from titus_isolate import log
+from titus_isolate.cgroup.utils import parse_cpuset
+from titus_isolate.model.processor.core import Core
+from titus_isolate.model.processor.cpu import Cpu
+from titus_isolate.model.processor.package import Package
+from titus_isolate.model.processor.thread import Thread
+
+SYS_CPU_PATH = '/sys/devices/system/cpu'
+SYS_NODE_PATH = '/sys/devices/system/node'
+
+LLC_LEVEL = 3
+
+
+def get_cpu_from_sysfs(cpu_path: str = SYS_CPU_PATH, node_path: str = SYS_NODE_PATH) -> Cpu:
+    """
+    Builds a Cpu from the topology the kernel exposes under sysfs.  Threads are grouped into cores by their real
+    sibling lists, so no assumption is made about how the host numbers its processors.
+
+    :param cpu_path: the sysfs cpu directory, e.g. /sys/devices/system/cpu
+    :param node_path: the sysfs NUMA node directory, e.g. /sys/devices/system/node
+    """
+    thread_ids = __get_online_thread_ids(cpu_path)
+    if len(thread_ids) == 0:
+        raise EnvironmentError("Found no online threads under: '{}'".format(cpu_path))
+
+    online = set(thread_ids)
+    cores_by_package = defaultdict(dict)
+    llc_groups = set()
+
+    for thread_id in thread_ids:
+        thread_path = os.path.join(cpu_path, 'cpu{}'.format(thread_id))
+        package_id = int(__read(thread_path, 'topology', 'physical_package_id'))
+        core_id = int(__read(thread_path, 'topology', 'core_id'))
+        siblings = tuple(sorted(online.intersection(parse_cpuset(__read(thread_path, 'topology', 'thread_siblings_list')))))
+        cores_by_package[package_id][siblings] = core_id
+
+        llc = __get_llc_thread_ids(thread_path)
+        if llc is not None:
+            llc_groups.add(tuple(sorted(online.intersection(llc))))
+
+    packages = []
+    for package_id, cores in sorted(cores_by_package.items()):
+        ordered = sorted(cores.items(), key=lambda item: (item[1], item[0]))
+        packages.append(Package(package_id, [Core(c_id, [Thread(t_id) for t_id in s]) for s, c_id in ordered]))
+
+    numa_nodes = __get_numa_nodes(node_path, online)
+    cpu = Cpu(
+        packages,
+        llc_groups=llc_groups if len(llc_groups) > 0 else None,
+        numa_nodes=numa_nodes if len(numa_nodes) > 0 else None)
+
+    log.info("Read CPU topology from sysfs: %d packages, %d cores, %d threads, %d LLC groups, %d NUMA nodes",
+             len(packages), len(cpu.get_cores()), len(cpu.get_threads()),
+             len(cpu.get_llc_groups()), len(cpu.get_numa_nodes()))
+    return cpu
+
+
+def __get_online_thread_ids(cpu_path: str) -> List[int]:
+    online_path = os.path.join(cpu_path, 'online')
+    if os.path.isfile(online_path):
+        return sorted(parse_cpuset(__read(online_path)))
+
+    # Without an online mask, every thread with topology information is considered online
+    thread_ids = []
+    for name in os.listdir(cpu_path):
+        if name.startswith('cpu') and name[3:].isdigit() and os.path.isdir(os.path.join(cpu_path, name, 'topology')):
+            thread_ids.append(int(name[3:]))
+    return sorted(thread_ids)
+
+
+def __get_llc_thread_ids(thread_path: str) -> Optional[List[int]]:
+    cache_path = os.path.join(thread_path, 'cache')
+    if not os.path.isdir(cache_path):
+        return None
+
+    for name in os.listdir(cache_path):
+        if not name.startswith('index'):
+            continue
+        index_path = os.path.join(cache_path, name)
+        if int(__read(index_path, 'level')) == LLC_LEVEL:
+            return parse_cpuset(__read(index_path, 'shared_cpu_list'))
+
+    return None
+
+
+def __get_numa_nodes(node_path: str, online: set) -> Dict[int, Tuple[int, ...]]:
+    numa_nodes = {}
+    if not os.path.isdir(node_path):
+        return numa_nodes
+
+    for name in os.listdir(node_path):
+        if not (name.startswith('node') and name[4:].isdigit()):
+            continue
+
+        cpu_list = __read(node_path, name, 'cpulist')
+        thread_ids = tuple(sorted(online.intersection(parse_cpuset(cpu_list)))) if len(cpu_list) > 0 else ()
+
+        # Memory only nodes have no threads
+        if len(thread_ids) > 0:
+            numa_nodes[int(name[4:])] = thread_ids
+
+    return numa_nodes
+
+
+def __read(*path) -> str:
+    with open(os.path.join(*path), 'r') as f:
+        return f.readline().strip()
@@ -1,45 +1,65 @@
-import copy
-
 from titus_isolate import log
+from titus_isolate.model.processor.thread_claims import ThreadClaims
 
 
 class Thread:
-    def __init__(self, processor_id):
-        self.__workload_ids = []
+    def __init__(self, processor_id, claims: ThreadClaims = None, index: int = 0):
         self.__processor_id = int(processor_id)
 
         if self.__processor_id < 0:
             raise ValueError("Thread processor ids must be non-negative.")
 
+        # A standalone thread owns its claims.  Once the thread is part of a Cpu its claims live in the Cpu's store.
+        if claims is None:
+            claims = ThreadClaims(1)
+        self.__claims = claims
+        self.__index = index
+
+    def _bind(self, claims: ThreadClaims, index: int):
+        """
+        Moves this thread's claims into the given store, at the given natural index.  A thread belongs to at most one
+        Cpu, the last one to bind it.
+        """
+        if claims is self.__claims and index == self.__index:
+            return
+
+        for handle in self.get_workload_handles():
+            claims.claim_handle(index, handle)
+
+        self.__claims = claims
+        self.__index = index
+
     def get_id(self):
         return self.__processor_id
 
     def claim(self, workload_id):
-        workload_ids = list(self.__workload_ids)
-        workload_ids.append(workload_id)
-        self.__workload_ids = list(set(workload_ids))
+        self.__claims.claim(self.__index, workload_id)
 
     def free(self, workload_id):
         log.debug("Removing workload: '{}' from thread '{}'".format(workload_id, self.get_id()))
-        if workload_id in self.__workload_ids:
-            self.__workload_ids.remove(workload_id)
+        self.__claims.free(self.__index, workload_id)
 
     def clear(self):
-        log.debug("Removing all workloads: '{}' from thread '{}'".format(self.__workload_ids, self.get_id()))
-        self.__workload_ids = []
+        log.debug("Removing all workloads: '{}' from thread '{}'".format(self.get_workload_ids(), self.get_id()))
+        self.__claims.clear(self.__index)
 
     def get_workload_ids(self):
-        return copy.deepcopy(self.__workload_ids)
+        return self.__claims.get_workload_ids(self.__index)
+
+    def get_workload_handles(self):
+        return self.__claims.get_workload_handles(self.__index)
+
+    def has_workload(self, workload_id) -> bool:
+        return self.__claims.has_workload(self.__index, workload_id)
 
     def is_claimed(self):
-        return len(self.get_workload_ids()) > 0
+        return self.__claims.is_claimed(self.__index)
 
     def __eq__(self, other):
         if isinstance(other, Thread):
             return self.get_id() == other.get_id() and \
-                   set(self.get_workload_ids()) == set(other.get_workload_ids())
+                   set(self.get_workload_handles()) == set(other.get_workload_handles())
         return NotImplemented
 
     def __hash__(self):
-        return hash(tuple([self.get_id(), frozenset(self.get_workload_ids())]))
-
+        return hash((self.get_id(), frozenset(self.get_workload_handles())))
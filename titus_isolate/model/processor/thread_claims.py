@@ -0,0 +1,322 @@
+from collections import defaultdict
+from typing import Dict, Iterator, List, Sequence, Set, Tuple
+
+from titus_isolate.model.processor.workload_ids import get_workload_id_registry
+
+
+def iter_bits(mask: int) -> Iterator[int]:
+    """
+    Yields the indices of the set bits of the given mask in ascending order.
+    """
+    while mask:
+        low_bit = mask & -mask
+        yield low_bit.bit_length() - 1
+        mask ^= low_bit
+
+
+class ThreadClaims:
+    """
+    ThreadClaims is the backing store for the workloads placed on the threads of a CPU.  Threads are addressed by their
+    natural index (position in Cpu.get_threads()), not by their processor id.
+
+    Workloads are held as interned integer handles (see workload_ids.py) and only translated back to workload ids on
+    the way out.  Two views of the same state are maintained:
+        1. A dense per-thread tuple of workload handles, ordered by claim time
+        2. A per-handle integer bitmask of the thread indices it has claimed
+
+    The bitmasks make per-workload queries (which threads does a workload hold, which threads are empty) proportional to
+    the number of set bits rather than the number of threads.
+
+    Forks share their containers with the original until one side writes, at which point the writer takes a shallow
+    copy.  Per-thread entries are immutable tuples, so that copy never has to descend into them.  A frozen store
+    rejects all writes.  The version increases on every write, so holders of a fork can tell whether it is still current.
+
+    Isolation violations are maintained as claims change, rather than computed by scanning:
+        1. The package indices of every workload on more than one package
+        2. The indices of every core with more than one distinct workload
+    Each write only revisits the core of the thread it touched and the packages of the workload it touched.
+    """
+
+    def __init__(self, thread_count: int, packages: Sequence[Sequence[int]] = None, cores: Sequence[Sequence[int]] = None):
+        """
+        :param thread_count: the number of threads covered
+        :param packages: the thread indices of each package, all threads are on one package by default
+        :param cores: the thread indices of each core, each thread is its own core by default
+        """
+        if thread_count < 1:
+            raise ValueError("Thread claims must cover at least 1 thread.")
+
+        if packages is None:
+            packages = [range(thread_count)]
+        if cores is None:
+            cores = [[i] for i in range(thread_count)]
+
+        core_of = [None] * thread_count
+        for core_index, thread_indices in enumerate(cores):
+            for i in thread_indices:
+                core_of[i] = core_index
+        if None in core_of:
+            raise ValueError("Every thread must belong to a core.")
+
+        self.__registry = get_workload_id_registry()
+        self.__thread_count = thread_count
+        self.__full_mask = (1 << thread_count) - 1
+        self.__package_masks = tuple(sum(1 << i for i in thread_indices) for thread_indices in packages)
+        self.__cores = tuple(tuple(thread_indices) for thread_indices in cores)
+        self.__core_of = tuple(core_of)
+        self.__workload_ids = [()] * thread_count
+        self.__masks = {}
+        self.__claimed_mask = 0
+        self.__cross_package = {}
+        self.__shared_cores = set()
+        self.__shared = False
+        self.__frozen = False
+        self.__version = 0
+        self.__registry.track(self)
+
+    def fork(self) -> 'ThreadClaims':
+        # Copy the attributes directly, copy.copy would go through the pickling state and translate every handle
+        fork = ThreadClaims.__new__(ThreadClaims)
+        fork.__dict__.update(self.__dict__)
+        fork.__frozen = False
+        fork.__shared = True
+        self.__shared = True
+        self.__registry.track(fork)
+        return fork
+
+    def freeze(self):
+        self.__frozen = True
+
+    def is_frozen(self) -> bool:
+        return self.__frozen
+
+    def get_version(self) -> int:
+        return self.__version
+
+    def get_thread_count(self) -> int:
+        return self.__thread_count
+
+    def claim(self, index: int, workload_id):
+        self.claim_handle(index, self.__registry.intern(workload_id))
+
+    def claim_handle(self, index: int, handle: int):
+        handles = self.__workload_ids[index]
+        if handle in handles:
+            return
+
+        self.__prepare_write()
+        bit = 1 << index
+        self.__workload_ids[index] = handles + (handle,)
+        self.__masks[handle] = self.__masks.get(handle, 0) | bit
+        self.__claimed_mask |= bit
+        self.__update_packages(handle)
+        self.__update_core(index)
+
+    def free(self, index: int, workload_id):
+        handle = self.__registry.lookup(workload_id)
+        if handle is not None:
+            self.free_handle(index, handle)
+
+    def free_handle(self, index: int, handle: int):
+        handles = self.__workload_ids[index]
+        if handle not in handles:
+            return
+
+        self.__prepare_write()
+        bit = 1 << index
+        remaining = tuple(h for h in handles if h != handle)
+        self.__workload_ids[index] = remaining
+        self.__remove_from_mask(handle, bit)
+        if len(remaining) == 0:
+            self.__claimed_mask &= ~bit
+        self.__update_packages(handle)
+        self.__update_core(index)
+
+    def free_workload(self, workload_id):
+        handle = self.__registry.lookup(workload_id)
+        if handle is None:
+            return
+
+        for index in iter_bits(self.__masks.get(handle, 0)):
+            self.free_handle(index, handle)
+
+    def clear(self, index: int):
+        if len(self.__workload_ids[index]) == 0:
+            return
+
+        self.__prepare_write()
+        bit = 1 << index
+        handles = self.__workload_ids[index]
+        self.__workload_ids[index] = ()
+        self.__claimed_mask &= ~bit
+        for handle in handles:
+            self.__remove_from_mask(handle, bit)
+            self.__update_packages(handle)
+        self.__update_core(index)
+
+    def clear_all(self):
+        if self.__frozen:
+            raise ValueError("Cannot modify frozen thread claims.")
+
+        self.__shared = False
+        self.__version += 1
+        self.__workload_ids = [()] * self.__thread_count
+        self.__masks = {}
+        self.__claimed_mask = 0
+        self.__cross_package = {}
+        self.__shared_cores = set()
+
+    def assign(self, handles_per_thread: Sequence[Sequence[int]]):
+        """
+        Replaces all claims in one pass.  The i-th entry lists the workload handles claimed on thread index i, in claim
+        order.  Violations are recomputed once at the end rather than on every claim.
+        """
+        if self.__frozen:
+            raise ValueError("Cannot modify frozen thread claims.")
+
+        workload_ids = [()] * self.__thread_count
+        masks = {}
+        claimed_mask = 0
+        for i, handles in enumerate(handles_per_thread):
+            if len(handles) == 0:
+                continue
+            handles = tuple(dict.fromkeys(handles))
+            bit = 1 << i
+            workload_ids[i] = handles
+            claimed_mask |= bit
+            for handle in handles:
+                masks[handle] = masks.get(handle, 0) | bit
+
+        self.__shared = False
+        self.__version += 1
+        self.__workload_ids = workload_ids
+        self.__masks = masks
+        self.__claimed_mask = claimed_mask
+        self.__cross_package = {}
+        self.__shared_cores = set()
+        for handle in masks.keys():
+            self.__update_packages(handle)
+        for core_index in range(len(self.__cores)):
+            if len(self.get_core_handles(core_index)) > 1:
+                self.__shared_cores.add(core_index)
+
+    def get_workload_ids(self, index: int) -> List:
+        return self.__registry.resolve_all(self.__workload_ids[index])
+
+    def get_workload_handles(self, index: int) -> Tuple[int, ...]:
+        return self.__workload_ids[index]
+
+    def get_handles(self):
+        """
+        Returns the handles of every workload holding a thread.
+        """
+        return self.__masks.keys()
+
+    def get_workload_count(self, index: int) -> int:
+        return len(self.__workload_ids[index])
+
+    def is_claimed(self, index: int) -> bool:
+        return (self.__claimed_mask >> index) & 1 == 1
+
+    def has_workload(self, index: int, workload_id) -> bool:
+        return (self.get_mask(workload_id) >> index) & 1 == 1
+
+    def get_mask(self, workload_id) -> int:
+        handle = self.__registry.lookup(workload_id)
+        if handle is None:
+            return 0
+        return self.__masks.get(handle, 0)
+
+    def get_claimed_mask(self) -> int:
+        return self.__claimed_mask
+
+    def get_empty_mask(self) -> int:
+        return self.__full_mask & ~self.__claimed_mask
+
+    def get_workload_ids_to_indices(self) -> Dict[object, List[int]]:
+        res = defaultdict(list)
+        for handle, mask in self.__masks.items():
+            res[self.__registry.resolve(handle)] = list(iter_bits(mask))
+        return res
+
+    def get_all_workload_ids(self) -> set:
+        return set(self.__registry.resolve_all(self.__masks.keys()))
+
+    def get_cross_package_handles(self) -> Dict[int, Tuple[int, ...]]:
+        """
+        Returns the package indices of every workload handle found on more than one package.  Do not modify the result.
+        """
+        return self.__cross_package
+
+    def get_shared_core_indices(self) -> Set[int]:
+        """
+        Returns the indices of every core holding more than one distinct workload.  Do not modify the result.
+        """
+        return self.__shared_cores
+
+    def get_core_handles(self, core_index: int) -> Set[int]:
+        handles = set()
+        for i in self.__cores[core_index]:
+            handles.update(self.__workload_ids[i])
+        return handles
+
+    def has_same_claims(self, other: 'ThreadClaims') -> bool:
+        """
+        Returns True if both stores hold exactly the same workloads on the same thread indices.
+        """
+        return self.__thread_count == other.__thread_count and self.__masks == other.__masks
+
+    def __prepare_write(self):
+        if self.__frozen:
+            raise ValueError("Cannot modify frozen thread claims.")
+
+        self.__version += 1
+        if self.__shared:
+            self.__workload_ids = list(self.__workload_ids)
+            self.__masks = dict(self.__masks)
+            self.__cross_package = dict(self.__cross_package)
+            self.__shared_cores = set(self.__shared_cores)
+            self.__shared = False
+
+    def __remove_from_mask(self, handle, bit):
+        mask = self.__masks[handle] & ~bit
+        if mask == 0:
+            self.__masks.pop(handle)
+        else:
+            self.__masks[handle] = mask
+
+    def __update_packages(self, handle):
+        mask = self.__masks.get(handle, 0)
+        packages = tuple(i for i, package_mask in enumerate(self.__package_masks) if mask & package_mask)
+        if len(packages) > 1:
+            self.__cross_package[handle] = packages
+        else:
+            self.__cross_package.pop(handle, None)
+
+    def __update_core(self, index):
+        core_index = self.__core_of[index]
+        if len(self.get_core_handles(core_index)) > 1:
+            self.__shared_cores.add(core_index)
+        else:
+            self.__shared_cores.discard(core_index)
+
+    def __getstate__(self):
+        # Handles are local to this process, so the pickled form carries workload ids
+        state = self.__dict__.copy()
+        state.pop('_ThreadClaims__registry')
+        state['_ThreadClaims__workload_ids'] = [self.__registry.resolve_all(h) for h in self.__workload_ids]
+        state['_ThreadClaims__masks'] = {self.__registry.resolve(h): m for h, m in self.__masks.items()}
+        state['_ThreadClaims__cross_package'] = {self.__registry.resolve(h): p for h, p in self.__cross_package.items()}
+        return state
+
+    def __setstate__(self, state):
+        registry = get_workload_id_registry()
+        state['_ThreadClaims__registry'] = registry
+        state['_ThreadClaims__workload_ids'] = \
+            [tuple(registry.intern(w_id) for w_id in w_ids) for w_ids in state['_ThreadClaims__workload_ids']]
+        state['_ThreadClaims__masks'] = {registry.intern(w_id): m for w_id, m in state['_ThreadClaims__masks'].items()}
+        state['_ThreadClaims__cross_package'] = \
+            {registry.intern(w_id): p for w_id, p in state['_ThreadClaims__cross_package'].items()}
+        state['_ThreadClaims__shared'] = False
+        self.__dict__.update(state)
+        registry.track(self)
@@ -0,0 +1,130 @@
+from types import MappingProxyType
+from typing import Iterable, Mapping, Tuple
+
+from titus_isolate.model.processor.core import Core
+from titus_isolate.model.processor.package import Package
+from titus_isolate.model.processor.thread import Thread
+
+
+class TopologyIndex:
+    """
+    An immutable index over the packages, cores and threads of a CPU.  The topology of a CPU never changes after
+    construction, so everything here is computed once and shared by every query against that CPU.
+
+    The "natural" index of a thread is its position in the flattened package -> core -> thread ordering.  This is the
+    ordering used by the placement solvers, and it is generally not the same as the processor id.
+
+    Last level cache groups and NUMA nodes default to one per package when they are not known.
+    """
+
+    def __init__(
+            self,
+            packages,
+            llc_groups: Iterable[Iterable[int]] = None,
+            numa_nodes: Mapping[int, Iterable[int]] = None):
+        threads = []
+        cores = []
+        layout = []
+        package_thread_indices = []
+        core_thread_indices = []
+        core_packages = []
+        thread_by_id = {}
+        core_by_thread_id = {}
+        package_by_thread_id = {}
+
+        for package in packages:
+            package_thread_indices.append([])
+            for core in package.get_cores():
+                cores.append(core)
+                core_packages.append(package)
+                core_thread_indices.append([])
+                for thread in core.get_threads():
+                    package_thread_indices[-1].append(len(threads))
+                    core_thread_indices[-1].append(len(threads))
+                    threads.append(thread)
+                    layout.append((package.get_id(), core.get_id(), thread.get_id()))
+                    thread_by_id[thread.get_id()] = thread
+                    core_by_thread_id[thread.get_id()] = core
+                    package_by_thread_id[thread.get_id()] = package
+
+        self.__threads = tuple(threads)
+        self.__cores = tuple(cores)
+        self.__layout = tuple(layout)
+        self.__package_thread_indices = tuple(tuple(indices) for indices in package_thread_indices)
+        self.__core_thread_indices = tuple(tuple(indices) for indices in core_thread_indices)
+        self.__core_packages = tuple(core_packages)
+        self.__thread_by_id = thread_by_id
+        self.__core_by_thread_id = core_by_thread_id
+        self.__package_by_thread_id = package_by_thread_id
+        self.__natural_2_original = {i: t.get_id() for i, t in enumerate(threads)}
+        self.__original_2_natural = {t.get_id(): i for i, t in enumerate(threads)}
+
+        if llc_groups is None:
+            llc_groups = [[t.get_id() for t in p.get_threads()] for p in packages]
+        if numa_nodes is None:
+            numa_nodes = {p.get_id(): [t.get_id() for t in p.get_threads()] for p in packages}
+
+        self.__llc_groups = tuple(sorted(self.__get_thread_id_group(g) for g in llc_groups))
+        self.__numa_nodes = {n: self.__get_thread_id_group(g) for n, g in sorted(numa_nodes.items())}
+
+    def __get_thread_id_group(self, thread_ids: Iterable[int]) -> Tuple[int, ...]:
+        group = tuple(sorted(set(thread_ids)))
+        for thread_id in group:
+            if thread_id not in self.__thread_by_id:
+                raise ValueError("Unknown thread id: '{}'".format(thread_id))
+        return group
+
+    def get_threads(self) -> Tuple[Thread, ...]:
+        return self.__threads
+
+    def get_cores(self) -> Tuple[Core, ...]:
+        return self.__cores
+
+    def get_layout(self) -> Tuple[Tuple[int, int, int], ...]:
+        """
+        Returns the (package id, core id, thread id) of every thread in natural order.  Two CPUs with the same layout
+        address their threads identically.
+        """
+        return self.__layout
+
+    def get_package_thread_indices(self) -> Tuple[Tuple[int, ...], ...]:
+        """
+        Returns the natural indices of the threads of each package, in package order.
+        """
+        return self.__package_thread_indices
+
+    def get_core_thread_indices(self) -> Tuple[Tuple[int, ...], ...]:
+        """
+        Returns the natural indices of the threads of each core, in the order of get_cores().
+        """
+        return self.__core_thread_indices
+
+    def get_core_package(self, core_index: int) -> Package:
+        return self.__core_packages[core_index]
+
+    def get_thread(self, thread_id: int) -> Thread:
+        return self.__thread_by_id[thread_id]
+
+    def get_core(self, thread_id: int) -> Core:
+        return self.__core_by_thread_id[thread_id]
+
+    def get_package(self, thread_id: int) -> Package:
+        return self.__package_by_thread_id[thread_id]
+
+    def get_llc_groups(self) -> Tuple[Tuple[int, ...], ...]:
+        """
+        Returns the ids of the threads sharing each last level cache (L3 or CCX).
+        """
+        return self.__llc_groups
+
+    def get_numa_nodes(self) -> Mapping[int, Tuple[int, ...]]:
+        """
+        Returns the ids of the threads local to each NUMA node, keyed by node id.
+        """
+        return MappingProxyType(self.__numa_nodes)
+
+    def get_natural_indexing_2_original_indexing(self) -> Mapping[int, int]:
+        return MappingProxyType(self.__natural_2_original)
+
+    def get_original_indexing_2_natural_indexing(self) -> Mapping[int, int]:
+        return MappingProxyType(self.__original_2_natural)
@@ -1,4 +1,4 @@
-from functools import reduce
+from typing import List
 
 from titus_isolate.model.processor.thread import Thread
 
@@ -30,17 +30,23 @@ def get_emptiest_core(package):
 
 
 def is_cpu_full(cpu):
-    empty_threads = reduce(list.__add__, [p.get_empty_threads() for p in cpu.get_packages()])
-    return len(empty_threads) == 0
+    return len(cpu.get_empty_threads()) == 0
 
 
 # Workloads
 def get_workload_ids(cpu):
-    workload_ids = []
-    for t in cpu.get_threads():
-        workload_ids += t.get_workload_ids()
+    return cpu.get_workload_ids()
 
-    return set(workload_ids)
+
+def get_placement_vector(cpu, thread_ids) -> List[int]:
+    """
+    Returns a 0/1 vector in natural thread order, with a 1 at each of the given thread (processor) ids.
+    """
+    original_2_natural = cpu.get_original_indexing_2_natural_indexing()
+    vector = [0] * len(cpu.get_threads())
+    for thread_id in thread_ids:
+        vector[original_2_natural[thread_id]] = 1
+    return vector
 
 
 def get_packages_with_workload(cpu, workload_id):
@@ -52,7 +58,7 @@ def is_on_package(package, workload_id):
 
 
 def get_threads_with_workload(core, workload_id):
-    return [thread for thread in core.get_threads() if workload_id in thread.get_workload_ids()]
+    return [thread for thread in core.get_threads() if thread.has_workload(workload_id)]
 
 
 def __get_str_repr(ind):
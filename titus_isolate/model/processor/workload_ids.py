@@ -0,0 +1,133 @@
+import weakref
+from threading import Lock
+from typing import List
+
+SWEEP_MIN_HANDLES = 1024
+
+
+class WorkloadIdRegistry:
+    """
+    Interns workload ids into small integer handles.  Handles start at 0 and are never reused, so they can be compared,
+    hashed and used as keys far more cheaply than the workload id strings they stand for.
+
+    Handles are only meaningful within the process that issued them.  Anything leaving the process must be translated
+    back to workload ids.
+
+    The registry tracks the thread claims holding handles and releases the handles none of them holds anymore, so
+    long-lived processes only keep the workload ids in use.  A sweep runs once as many handles were issued as were live
+    after the previous one.  Handles issued or interned since the previous sweep are kept, as their holders may not have
+    claimed any threads with them yet.
+    """
+
+    def __init__(self):
+        self.__lock = Lock()
+        self.__handles = {}
+        self.__workload_ids = {}
+        self.__next_handle = 0
+
+        self.__stores = []
+        self.__compact_after = SWEEP_MIN_HANDLES
+        self.__used = set()
+        self.__swept_handle = 0
+        self.__sweep_after = SWEEP_MIN_HANDLES
+        self.__sweeping = False
+        self.__sweep_count = 0
+
+    def intern(self, workload_id) -> int:
+        # Without a sweep overlapping the lookup, marking the handle used keeps it from being released
+        sweep_count = self.__sweep_count
+        handle = self.__handles.get(workload_id)
+        if handle is not None:
+            self.__used.add(handle)
+            if not self.__sweeping and sweep_count == self.__sweep_count:
+                return handle
+
+        with self.__lock:
+            handle = self.__handles.get(workload_id)
+            if handle is None:
+                if self.__next_handle - self.__swept_handle >= self.__sweep_after:
+                    self.__sweep()
+                handle = self.__next_handle
+                self.__next_handle += 1
+                self.__workload_ids[handle] = workload_id
+                self.__handles[workload_id] = handle
+            else:
+                self.__used.add(handle)
+            return handle
+
+    def lookup(self, workload_id) -> int:
+        """
+        Returns the handle of the given workload id, or None if it has never been interned or has been released.
+        """
+        return self.__handles.get(workload_id)
+
+    def resolve(self, handle: int):
+        return self.__workload_ids[handle]
+
+    def resolve_all(self, handles) -> List:
+        workload_ids = self.__workload_ids
+        return [workload_ids[h] for h in handles]
+
+    def size(self) -> int:
+        return len(self.__workload_ids)
+
+    def track(self, store):
+        """
+        :param store: holds handles, which it lists with get_handles()
+        """
+        # Appending needs no lock, compacting only replaces the stores that were tracked when it started
+        self.__stores.append(weakref.ref(store))
+        if len(self.__stores) >= self.__compact_after:
+            with self.__lock:
+                if len(self.__stores) >= self.__compact_after:
+                    self.__compact()
+
+    def sweep(self) -> int:
+        """
+        Releases the handles no tracked store holds and returns how many were released.
+        """
+        with self.__lock:
+            return self.__sweep()
+
+    def __compact(self):
+        stores = self.__stores
+        count = len(stores)
+        stores[:count] = [ref for ref in stores[:count] if ref() is not None]
+        self.__compact_after = max(SWEEP_MIN_HANDLES, 2 * len(stores))
+
+    def __sweep(self) -> int:
+        self.__sweeping = True
+        try:
+            self.__compact()
+            live = set(self.__used)
+            for ref in list(self.__stores):
+                store = ref()
+                if store is not None:
+                    live.update(store.get_handles())
+
+            released = [h for h in self.__workload_ids.keys() if h < self.__swept_handle and h not in live]
+            for handle in released:
+                self.__handles.pop(self.__workload_ids.pop(handle))
+
+            self.__used = set()
+            self.__swept_handle = self.__next_handle
+            self.__sweep_after = max(SWEEP_MIN_HANDLES, len(self.__workload_ids))
+            self.__sweep_count += 1
+            return len(released)
+        finally:
+            self.__sweeping = False
+
+
+__registry = WorkloadIdRegistry()
+
+
+def get_workload_id_registry() -> WorkloadIdRegistry:
+    return __registry
+
+
+def intern_workload_id(workload_id) -> int:
+    return __registry.intern(workload_id)
+
+
+def resolve_workload_id(handle: int):
+    return __registry.resolve(handle)
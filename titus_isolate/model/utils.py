@@ -158,8 +158,7 @@ def release_all_threads(cpu, workloads):
 
 
 def release_threads(cpu, workload_id):
-    for t in cpu.get_threads():
-        t.free(workload_id)
+    cpu.free(workload_id)
 
 
 def update_burst_workloads(
@@ -13,4 +13,4 @@ class EmptyFreeThreadProvider(FreeThreadProvider):
             cpu: Cpu,
             workload_map: Dict[str, Workload],
             cpu_usage: Dict[str, float] = None) -> List[Thread]:
-        return [t for t in cpu.get_threads() if len(t.get_workload_ids()) == 0]
+        return cpu.get_empty_threads()